@@ -60,6 +60,10 @@ class Action(MoatlessComponent, ABC):
 
     args_schema: ClassVar[type[ActionArguments]]
 
+    # Read-only actions don't change the repository, the runtime or the artifacts and only add to the file context,
+    # so the agent can run them concurrently
+    is_read_only: ClassVar[bool] = False
+
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
     is_terminal: bool = Field(default=False, description="Whether the action will finish the flow")
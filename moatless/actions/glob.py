@@ -1,3 +1,5 @@
+from typing import ClassVar
+
 from pydantic import ConfigDict, Field
 
 from moatless.actions.action import Action
@@ -36,6 +38,7 @@ class GlobArgs(ActionArguments):
 
 class GlobTool(Action):
     args_schema = GlobArgs
+    is_read_only: ClassVar[bool] = True
 
     async def _execute(
         self,
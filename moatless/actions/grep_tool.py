@@ -2,7 +2,7 @@ import logging
 import re
 import shlex
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
 
 from pydantic import ConfigDict, Field
 
@@ -108,6 +108,7 @@ class GrepTool(Action):
     """
 
     args_schema = GrepToolArgs
+    is_read_only: ClassVar[bool] = True
 
     async def execute(
             self,
@@ -1,6 +1,6 @@
 from pydantic import ConfigDict, Field
 import logging
-from typing import List
+from typing import ClassVar, List
 
 from moatless.actions.action import Action
 from moatless.actions.schema import (
@@ -87,6 +87,7 @@ class ListFilesArgs(ActionArguments):
 
 class ListFiles(Action):
     args_schema = ListFilesArgs
+    is_read_only: ClassVar[bool] = True
 
     ignored_dirs: List[str] = Field(
         default_factory=lambda: DEFAULT_IGNORED_DIRS.copy(),
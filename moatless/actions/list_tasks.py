@@ -54,6 +54,7 @@ class ListTasksArgs(ActionArguments):
 
 class ListTasks(Action):
     args_schema: ClassVar[type[ActionArguments]] = ListTasksArgs
+    is_read_only: ClassVar[bool] = True
 
     async def _execute(self, args: ListTasksArgs, file_context: FileContext | None = None) -> str:
         # Check if we have a task handler in the workspace
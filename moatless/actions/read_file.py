@@ -79,6 +79,7 @@ class ReadFile(Action):
     """
 
     args_schema = ReadFileArgs
+    is_read_only: ClassVar[bool] = True
 
     max_lines: int = Field(200, description="The maximum number of lines to read from the file.")
 
@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, List, Dict
+from typing import ClassVar, Dict, List, Optional
 
 from pydantic import ConfigDict, Field
 
@@ -66,6 +66,7 @@ class ReadFiles(Action):
     """
 
     args_schema = ReadFilesArgs
+    is_read_only: ClassVar[bool] = True
 
     async def execute(
         self,
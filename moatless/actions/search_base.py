@@ -80,6 +80,7 @@ class Identify(ResponseSchema):
 
 class SearchBaseAction(Action, CompletionModelMixin, ABC):
     args_schema: ClassVar[type[ActionArguments]] = SearchBaseArgs
+    is_read_only: ClassVar[bool] = True
 
     max_search_tokens: int = Field(
         2000,
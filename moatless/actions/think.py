@@ -1,3 +1,5 @@
+from typing import ClassVar
+
 from pydantic import ConfigDict, Field
 
 from moatless.actions.action import Action
@@ -32,6 +34,7 @@ class ThinkArgs(ActionArguments):
 
 class Think(Action):
     args_schema = ThinkArgs
+    is_read_only: ClassVar[bool] = True
 
     async def execute(self, args: ThinkArgs, file_context: FileContext):
         return Observation.create(message="The thought was logged")
@@ -1,5 +1,5 @@
 import logging
-from typing import Optional
+from typing import ClassVar, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -102,6 +102,7 @@ class ViewCodeArgs(ActionArguments):
 
 class ViewCode(Action, IdentifyMixin):
     args_schema = ViewCodeArgs
+    is_read_only: ClassVar[bool] = True
 
     max_tokens: int = Field(
         3000,
@@ -1,4 +1,5 @@
 import logging
+from typing import ClassVar
 
 from pydantic import ConfigDict
 
@@ -38,6 +39,7 @@ class ViewDiff(Action):
     """
 
     args_schema = ViewDiffArgs
+    is_read_only: ClassVar[bool] = True
 
     async def execute(self, args: ViewDiffArgs, file_context: FileContext | None = None) -> Observation:
         if file_context.shadow_mode:
@@ -1,7 +1,10 @@
+import asyncio
+import contextlib
 from datetime import datetime
 import logging
 import traceback
 from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Any, Awaitable, Optional, cast
 
 from opentelemetry import trace
@@ -30,6 +33,7 @@ from moatless.exceptions import (
     RejectError,
     RuntimeError,
 )
+from moatless.file_context import FileContext
 from moatless.message_history.base import BaseMemory
 from moatless.message_history.message_history import MessageHistoryGenerator
 from moatless.node import ActionStep, Node, Thoughts
@@ -39,6 +43,21 @@ logger = logging.getLogger(__name__)
 tracer = trace.get_tracer("moatless.agent")
 
 
+@dataclass
+class _StepOutcome:
+    """How executing an action step changes the node, applied when the step is reached in step order."""
+
+    terminal: bool = False
+    error: Optional[str] = None
+    exception: Optional[BaseException] = None
+
+    def apply(self, node: Node):
+        if self.terminal:
+            node.terminal = True
+        if self.error:
+            node.error = self.error
+
+
 class ActionAgent(MoatlessComponent):
     agent_id: Optional[str] = Field(None, description="Agent ID")
     model_id: Optional[str] = Field(None, description="Model ID")
@@ -55,10 +74,14 @@ class ActionAgent(MoatlessComponent):
         description="Message history generator to be used for generating completions",
     )
     shadow_mode: bool = Field(True, description="Set to true to not persist changes done by the agent.")
+    parallel_read_only_actions: bool = Field(
+        True, description="Run consecutive read-only actions concurrently on snapshots of the file context."
+    )
 
     _action_map: dict[type[ActionArguments], Action] = PrivateAttr(default_factory=dict)
     _workspace: Workspace | None = PrivateAttr(default=None)
     _on_event: Optional[Callable[[BaseEvent], Awaitable[None]]] = PrivateAttr(default=None)
+    _mutating_action_lock: Optional[asyncio.Lock] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -112,10 +135,14 @@ class ActionAgent(MoatlessComponent):
 
             action_names = [action_step.action.name for action_step in node.action_steps]
             logger.info(f"Node{node.node_id}: Execute actions: {action_names}")
-            for i, action_step in enumerate(node.action_steps):
-                current_action_step.set(i)  # Used in logging to identify the action step
-                await self._execute(node, action_step)
-                current_action_step.set(None)
+            for action_steps in self._group_action_steps(node.action_steps):
+                if len(action_steps) > 1:
+                    await self._execute_concurrently(node, action_steps)
+                else:
+                    i, action_step = action_steps[0]
+                    current_action_step.set(i)  # Used in logging to identify the action step
+                    await self._execute(node, action_step)
+                    current_action_step.set(None)
                 if node.terminal:
                     break
 
@@ -123,6 +150,9 @@ class ActionAgent(MoatlessComponent):
             logger.exception(f"Node{node.node_id}: Failed to run.")
             node.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"
             raise e
+        finally:
+            # The completions, action steps and file context of the node are changed in place
+            node.mark_changed()
 
     async def _generate_actions(self, node: Node):
         node.possible_actions = [action.name for action in self.actions]
@@ -165,7 +195,6 @@ class ActionAgent(MoatlessComponent):
                     )
 
         except CompletionError as e:
-
             if e.completion_invocation:
                 logger.error(f"Node{node.node_id}: Build action failed with completion error: {e}")
                 node.completions["build_action"] = e.completion_invocation
@@ -206,8 +235,67 @@ class ActionAgent(MoatlessComponent):
 
             raise e
 
+    def _group_action_steps(self, action_steps: list[ActionStep]) -> list[list[tuple[int, ActionStep]]]:
+        """Group consecutive read-only action steps to run them concurrently, other steps are run one by one."""
+        groups: list[list[tuple[int, ActionStep]]] = []
+        previous_read_only = False
+        for i, action_step in enumerate(action_steps):
+            action = self.action_map.get(type(action_step.action))
+            read_only = self.parallel_read_only_actions and action is not None and action.is_read_only
+            if read_only and previous_read_only:
+                groups[-1].append((i, action_step))
+            else:
+                groups.append([(i, action_step)])
+            previous_read_only = read_only
+        return groups
+
+    @tracer.start_as_current_span("ActionAgent._execute_concurrently")
+    async def _execute_concurrently(self, node: Node, action_steps: list[tuple[int, ActionStep]]):
+        """
+        Run read-only action steps concurrently, each on its own clone of a snapshot of the file context, and apply
+        their outcomes and changes to the file context in step order. As when run one by one, the steps after a step
+        that fails or ends the node are not kept and don't change the node.
+        """
+        logger.info(f"Node{node.node_id}: Execute {len(action_steps)} read-only actions concurrently")
+        snapshot = node.file_context.clone() if node.file_context else None
+
+        async def execute(i: int, action_step: ActionStep) -> tuple[FileContext | None, _StepOutcome]:
+            current_action_step.set(i)  # Set in the task's own copy of the context
+            file_context = snapshot.clone() if snapshot else None
+            outcome = await self._execute_step(node, action_step, file_context)
+            return file_context, outcome
+
+        results = await asyncio.gather(
+            *[execute(i, action_step) for i, action_step in action_steps], return_exceptions=True
+        )
+
+        for position, result in enumerate(results):
+            if isinstance(result, BaseException):
+                self._discard_action_steps(action_steps[position + 1 :])
+                raise result
+
+            file_context, outcome = result
+            if node.file_context and snapshot and file_context:
+                node.file_context.add_context_changes(snapshot, file_context)
+
+            outcome.apply(node)
+            if outcome.exception:
+                self._discard_action_steps(action_steps[position + 1 :])
+                raise outcome.exception
+
+            if node.terminal:
+                self._discard_action_steps(action_steps[position + 1 :])
+                break
+
+    def _discard_action_steps(self, action_steps: list[tuple[int, ActionStep]]):
+        for _, action_step in action_steps:
+            action_step.observation = None
+            action_step.completion = None
+
     @tracer.start_as_current_span("ActionAgent._execute_action_step")
-    async def _execute_action_step(self, node: Node, action_step: ActionStep) -> Observation:
+    async def _execute_action_step(
+        self, node: Node, action_step: ActionStep, file_context: FileContext | None = None
+    ) -> Observation:
         action = self.action_map.get(type(action_step.action))
         if not action:
             logger.error(
@@ -218,20 +306,44 @@ class ActionAgent(MoatlessComponent):
                 f"Action {type(action_step.action)} not found in action map with actions: {list(self.action_map.keys())}"
             )
 
-        observation = await action.execute(action_step.action, file_context=node.file_context)
-        if action.is_terminal:
-            node.terminal = True
-        return observation
+        return await action.execute(
+            action_step.action, file_context=file_context if file_context is not None else node.file_context
+        )
 
-    @tracer.start_as_current_span("ActionAgent._execute")
-    async def _execute(self, node: Node, action_step: ActionStep):
+    def _get_action_lock(self, action_step: ActionStep) -> contextlib.AbstractAsyncContextManager:
+        """Actions that are not read-only are executed one at a time when nodes are simulated concurrently."""
+        action = self.action_map.get(type(action_step.action))
+        if self._mutating_action_lock is None or (action and action.is_read_only):
+            return contextlib.nullcontext()
+        return self._mutating_action_lock
+
+    async def _execute(self, node: Node, action_step: ActionStep, file_context: FileContext | None = None):
+        outcome = await self._execute_step(node, action_step, file_context)
+        outcome.apply(node)
+        if outcome.exception:
+            raise outcome.exception
+
+    @tracer.start_as_current_span("ActionAgent._execute_step")
+    async def _execute_step(
+        self, node: Node, action_step: ActionStep, file_context: FileContext | None = None
+    ) -> _StepOutcome:
+        """Execute an action step and return how it changes the node instead of changing the node."""
+        if file_context is None:
+            file_context = node.file_context
+
+        outcome = _StepOutcome()
         try:
             action_step.start_time = datetime.now()
-            previous_context = node.file_context.clone() if node.file_context else None
-            action_step.observation = await self._execute_action_step(node, action_step)
+            previous_context = file_context.clone() if file_context else None
+            async with self._get_action_lock(action_step):
+                if file_context is node.file_context:
+                    # Keeps the signature for overrides of _execute_action_step without the file context
+                    action_step.observation = await self._execute_action_step(node, action_step)
+                else:
+                    action_step.observation = await self._execute_action_step(node, action_step, file_context)
 
-            if previous_context and node.file_context:
-                action_step.observation.artifact_changes = node.file_context.get_artifact_changes(previous_context)
+            if previous_context and file_context:
+                action_step.observation.artifact_changes = file_context.get_artifact_changes(previous_context)
 
             await self._emit_event(
                 ActionExecutedEvent(
@@ -241,11 +353,15 @@ class ActionAgent(MoatlessComponent):
                 )
             )
 
+            action = self.action_map.get(type(action_step.action))
+            if action and action.is_terminal:
+                outcome.terminal = True
+
             if not action_step.observation:
                 logger.warning(f"Node{node.node_id}: Action {action_step.action.name} returned no observation")
             else:
                 if action_step.observation.terminal:
-                    node.terminal = True
+                    outcome.terminal = True
                 if action_step.observation.execution_completion:
                     action_step.completion = action_step.observation.execution_completion
 
@@ -259,28 +375,31 @@ class ActionAgent(MoatlessComponent):
             logger.debug(
                 f"Node{node.node_id}: Observation: {action_step.observation.message if node.observation else None}"
             )
+            return outcome
 
         except CompletionError as e:
             if e.completion_invocation:
                 action_step.completion = e.completion_invocation
 
-            node.terminal = True
+            outcome.terminal = True
 
             if isinstance(e, CompletionRejectError):
-                node.error = f"Completion validation error: {str(e)}\n\n{traceback.format_exc()}"  # TODO: Remove this when we got support in the UI to show action_step.error
+                outcome.error = f"Completion validation error: {str(e)}\n\n{traceback.format_exc()}"  # TODO: Remove this when we got support in the UI to show action_step.error
                 # action_step.observation.error = f"Completion validation error: {e.message}"
-                return
+                return outcome
             else:
-                node.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"
+                outcome.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"
                 # action_step.observation.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"  # TODO: Remove this when we got support in the UI to show action_step.error
-                raise e
+                outcome.exception = e
+                return outcome
 
         except Exception as e:
             logger.exception(f"Node{node.node_id}: Execution of action {action_step.action.name} failed.")
-            node.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"  # TODO: Remove this when we got support in the UI to show action_step.error
+            outcome.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"  # TODO: Remove this when we got support in the UI to show action_step.error
             # action_step.observation.error = f"{e.__class__.__name__}: {str(e)}\n\n{traceback.format_exc()}"
-            node.terminal = True
-            raise e
+            outcome.terminal = True
+            outcome.exception = e
+            return outcome
 
     @classmethod
     def get_component_type(cls) -> str:
@@ -316,13 +435,13 @@ class ActionAgent(MoatlessComponent):
             raise RuntimeError("Completion model not set")
 
         self._workspace = workspace
-        
+
         try:
             self.workspace.repository.shadow_mode = self.shadow_mode
         except ValueError:
             # Repository not set, skip setting shadow_mode
             pass
-            
+
         for action in self.actions:
             await action.initialize(workspace)
 
@@ -217,6 +217,14 @@ async def cleanup_resources():
         await _event_bus.close()
         logger.info(f"Event bus closed for worker {WORKER_ID}")
 
+    # Persist evaluation changes that are written behind
+    if _evaluation_manager:
+        await _evaluation_manager.close()
+
+    # Flush events and other appends buffered by the storage
+    if _storage:
+        await _storage.flush()
+
     # Reset all references
     _storage = None
     _event_bus = None
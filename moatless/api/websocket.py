@@ -1,23 +1,160 @@
-"""WebSocket module for Moatless API."""
-
+"""WebSocket module for Moatless API.
+
+Events are serialized once and fanned out to the subscribed connections through one bounded message queue per
+connection, each sent by its own writer task, so a slow client never delays delivery to the others. Node events,
+published at a high rate while a tree is expanded, are collected for batch_interval_seconds and consecutive node events
+are sent together as one `{"type": "batch", "events": [...]}` frame. All other events are sent as plain frames.
+When a connection has coalesce_backlog or more unsent messages, a newer event carrying the state of a node replaces
+the queued one for the same node. A connection that falls max_queue_size messages behind is closed with code 1013,
+clients are expected to reconnect and reload.
+"""
+
+import asyncio
+import itertools
 import json
 import logging
-from typing import Dict, Set
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
 
 from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
 from moatless.events import BaseEvent
 
 logger = logging.getLogger(__name__)
 
+# (scope, event_type) of the events that carry the latest state of a node, a newer one supersedes a queued one
+SNAPSHOT_EVENTS = {("node", "reward_generated")}
+
+# Scopes of the high-frequency events that are sent in batch frames
+BATCHED_SCOPES = {"node"}
+
+# Close code sent to connections that fell too far behind, "Try Again Later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ConnectionQueue:
+    """Bounded queue of serialized messages for one WebSocket connection, sent by its own writer task."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_error: Callable[[WebSocket], Awaitable[None]],
+        max_queue_size: int = 1000,
+        batch_interval_seconds: float = 0.05,
+        coalesce_backlog: int = 100,
+    ):
+        self.websocket = websocket
+        self.max_queue_size = max_queue_size
+        self.batch_interval_seconds = batch_interval_seconds
+        self.coalesce_backlog = coalesce_backlog
+        self.frames_sent = 0
+        self.messages_sent = 0
+        self.messages_coalesced = 0
+
+        self._on_error = on_error
+        # Queued messages and whether they can be sent in a batch frame
+        self._messages: OrderedDict[int, tuple[str, bool]] = OrderedDict()
+        # Id of the queued message per coalesce key
+        self._coalescable: Dict[Hashable, int] = {}
+        self._message_ids = itertools.count()
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._send_messages())
+
+    def put(self, message: str, coalesce_key: Optional[Hashable] = None, batch: bool = False) -> bool:
+        """Queue a serialized message.
+
+        Args:
+            message: The JSON message
+            coalesce_key: Optional key of the messages this message supersedes while the connection is backlogged
+            batch: Whether the message can be sent in a batch frame with other batched messages
+
+        Returns:
+            False if the queue is full, True otherwise
+        """
+        if coalesce_key is not None and len(self._messages) >= self.coalesce_backlog:
+            message_id = self._coalescable.get(coalesce_key)
+            if message_id in self._messages:
+                self._messages[message_id] = (message, batch)
+                self.messages_coalesced += 1
+                return True
+
+        if len(self._messages) >= self.max_queue_size:
+            return False
+
+        message_id = next(self._message_ids)
+        self._messages[message_id] = (message, batch)
+        if coalesce_key is not None:
+            self._coalescable[coalesce_key] = message_id
+        self._ready.set()
+        return True
+
+    def close(self):
+        """Stop the writer task, queued messages are discarded."""
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def _send_messages(self):
+        try:
+            while True:
+                await self._ready.wait()
+                if self.batch_interval_seconds and any(batch for _, batch in self._messages.values()):
+                    # Collect the batched messages published meanwhile into one frame
+                    await asyncio.sleep(self.batch_interval_seconds)
+
+                self._ready.clear()
+                messages = list(self._messages.values())
+                self._messages.clear()
+                self._coalescable.clear()
+
+                for frame in _frames(messages):
+                    await self.websocket.send_text(frame)
+                    self.frames_sent += 1
+                self.messages_sent += len(messages)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Failed to send message to client: {e}")
+            await self._on_error(self.websocket)
+
+
+def _frames(messages: List[tuple[str, bool]]) -> List[str]:
+    """Join consecutive batched messages into batch frames, other messages are sent as they are."""
+    frames: List[str] = []
+    batched: List[str] = []
+
+    def flush_batch():
+        if len(batched) == 1:
+            frames.append(batched[0])
+        elif batched:
+            frames.append('{"type": "batch", "events": [' + ", ".join(batched) + "]}")
+        batched.clear()
+
+    for message, batch in messages:
+        if batch:
+            batched.append(message)
+        else:
+            flush_batch()
+            frames.append(message)
+    flush_batch()
+    return frames
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, max_queue_size: int = 1000, batch_interval_seconds: float = 0.05, coalesce_backlog: int = 100):
+        self.max_queue_size = max_queue_size
+        self.batch_interval_seconds = batch_interval_seconds
+        self.coalesce_backlog = coalesce_backlog
         self.active_connections: Set[WebSocket] = set()
+        # Outgoing message queue per connection
+        self.connection_queues: Dict[WebSocket, ConnectionQueue] = {}
         # Maps for subscriptions
         self.project_subscriptions: Dict[str, Set[WebSocket]] = {}
         self.trajectory_subscriptions: Dict[str, Set[WebSocket]] = {}
         # Maps each socket to its subscriptions for cleanup
         self.socket_subscriptions: Dict[WebSocket, Dict[str, Set[str]]] = {}
+        # Number of connections disconnected because they fell too far behind
+        self.slow_disconnects = 0
 
     async def connect(self, websocket: WebSocket):
         """Accept a new WebSocket connection."""
@@ -25,17 +162,28 @@ class ConnectionManager:
             logger.debug("Accepting WebSocket connection")
             await websocket.accept()
             self.active_connections.add(websocket)
+            self.connection_queues[websocket] = ConnectionQueue(
+                websocket,
+                on_error=self.disconnect,
+                max_queue_size=self.max_queue_size,
+                batch_interval_seconds=self.batch_interval_seconds,
+                coalesce_backlog=self.coalesce_backlog,
+            )
             self.socket_subscriptions[websocket] = {"projects": set(), "trajectories": set()}
             logger.debug(f"WebSocket connected. Total connections: {len(self.active_connections)}")
         except Exception as e:
             logger.error(f"Failed to accept WebSocket connection: {e}")
             raise
 
-    async def disconnect(self, websocket: WebSocket):
+    async def disconnect(self, websocket: WebSocket, code: int = 1000):
         """Safely disconnect a WebSocket connection and clean up subscriptions."""
         try:
             self.active_connections.discard(websocket)
 
+            queue = self.connection_queues.pop(websocket, None)
+            if queue:
+                queue.close()
+
             # Clean up subscriptions
             if websocket in self.socket_subscriptions:
                 for project_id in self.socket_subscriptions[websocket]["projects"]:
@@ -52,8 +200,8 @@ class ConnectionManager:
 
                 del self.socket_subscriptions[websocket]
 
-            if not websocket.client_state.DISCONNECTED:
-                await websocket.close()
+            if websocket.client_state != WebSocketState.DISCONNECTED:
+                await websocket.close(code=code)
             logger.debug(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
         except Exception as e:
             logger.error(f"Error during WebSocket disconnect: {e}")
@@ -120,60 +268,55 @@ class ConnectionManager:
             return
 
         logger.debug(f"Broadcasting message to {len(self.active_connections)} clients")
-
-        connections = self.active_connections.copy()
-        disconnected = set()
-
-        for connection in connections:
-            try:
-                await connection.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Failed to send message to client: {e}")
-                disconnected.add(connection)
-
-        for connection in disconnected:
-            await self.disconnect(connection)
+        await self._publish(json.dumps(message), self.active_connections.copy())
 
     async def broadcast_event(self, event: BaseEvent):
         """Handle system events and broadcast them to subscribers or all clients."""
-        logger.info(f"Broadcasting event: {event.scope}:{event.event_type}")
-
         event_dict = event.model_dump(mode="json")
 
         project_id = event_dict.get("project_id")
         trajectory_id = event_dict.get("trajectory_id")
 
-        # Track connections that received the message via specific subscription
-        notified_connections = set()
+        subscribers = set()
 
         # Only send flow and evaluation events to project subscribers
         if event_dict.get("scope") == "flow" or event_dict.get("scope") == "evaluation":
             if project_id and project_id in self.project_subscriptions:
-                logger.info(f"Broadcasting event to project subscribers: {project_id}")
-                for connection in self.project_subscriptions[project_id].copy():
-                    # Skip if already notified via trajectory subscription
-                    if connection in notified_connections:
-                        continue
-
-                    try:
-                        await connection.send_text(json.dumps(event_dict))
-                        notified_connections.add(connection)
-                    except Exception as e:
-                        logger.error(f"Failed to send message to project subscriber: {e}")
-                        await self.disconnect(connection)
+                subscribers.update(self.project_subscriptions[project_id])
 
         if trajectory_id and trajectory_id in self.trajectory_subscriptions:
-            logger.info(f"Broadcasting event to trajectory subscribers: {trajectory_id}")
-            for connection in self.trajectory_subscriptions[trajectory_id].copy():
-                if connection in notified_connections:
-                    continue
-
-                try:
-                    await connection.send_text(json.dumps(event_dict))
-                    notified_connections.add(connection)
-                except Exception as e:
-                    logger.error(f"Failed to send message to trajectory subscriber: {e}")
-                    await self.disconnect(connection)
+            subscribers.update(self.trajectory_subscriptions[trajectory_id])
+
+        if not subscribers:
+            return
+
+        logger.debug(f"Broadcasting event {event.scope}:{event.event_type} to {len(subscribers)} subscribers")
+
+        coalesce_key = None
+        if (event_dict.get("scope"), event.event_type) in SNAPSHOT_EVENTS and event_dict.get("node_id") is not None:
+            coalesce_key = (event_dict["scope"], event.event_type, project_id, trajectory_id, event_dict["node_id"])
+
+        batch = event_dict.get("scope") in BATCHED_SCOPES
+        await self._publish(json.dumps(event_dict), subscribers, coalesce_key, batch)
+
+    async def _publish(
+        self,
+        message: str,
+        connections: Set[WebSocket],
+        coalesce_key: Optional[Hashable] = None,
+        batch: bool = False,
+    ):
+        """Queue a serialized message for each connection, disconnecting the connections that fell too far behind."""
+        slow_connections: List[WebSocket] = []
+        for connection in connections:
+            queue = self.connection_queues.get(connection)
+            if queue and not queue.put(message, coalesce_key, batch):
+                slow_connections.append(connection)
+
+        for connection in slow_connections:
+            logger.warning(f"Disconnecting client with {self.max_queue_size} unsent messages")
+            self.slow_disconnects += 1
+            await self.disconnect(connection, code=SLOW_CONSUMER_CLOSE_CODE)
 
     async def handle_message(self, websocket: WebSocket, data: dict):
         """Handle incoming WebSocket messages."""
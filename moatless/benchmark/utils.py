@@ -377,7 +377,7 @@ def read_search_trees(dir: str) -> list[SearchTree]:
                 logger.warning(f"Empty trajectory file: {trajectory_path}")
                 continue
 
-            search_tree = SearchTree.from_file(trajectory_path)
+            search_tree = SearchTree.from_dir(Path(root))
             search_trees.append(search_tree)
         except Exception as e:
             logger.exception(f"Failed to load trajectory from {trajectory_path}: {e}")
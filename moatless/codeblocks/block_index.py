@@ -0,0 +1,101 @@
+from bisect import bisect_left
+from collections import defaultdict
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from moatless.codeblocks.codeblocks import CodeBlock, CodeBlockType
+
+
+class BlockIndex:
+    """
+    Lookup tables over all blocks in a module.
+
+    Blocks are numbered in pre-order, so the blocks in the subtree of a block are the range from its own
+    position to the end of its subtree. Span ids and identifiers map to sorted positions, which makes the
+    lookups a binary search instead of a walk over the tree.
+
+    Sibling blocks don't overlap, so the children of a block are also sorted by line. The running maximum
+    of their end lines is kept to find the first child that ends on or after a line.
+    """
+
+    def __init__(self, root: "CodeBlock"):
+        self._blocks: list[CodeBlock] = []
+        self._positions: dict[int, tuple[int, int]] = {}
+        self._by_span_id: dict[str, list[int]] = defaultdict(list)
+        self._by_identifier: dict[str, list[int]] = defaultdict(list)
+        self._child_end_lines: dict[int, list[int]] = {}
+        self._add_block(root)
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def _add_block(self, block: "CodeBlock"):
+        position = len(self._blocks)
+        self._blocks.append(block)
+
+        if block.belongs_to_span:
+            self._by_span_id[block.belongs_to_span.span_id].append(position)
+        if block.identifier:
+            self._by_identifier[block.identifier].append(position)
+
+        if block.children:
+            max_end_lines = []
+            max_end_line = 0
+            for child in block.children:
+                max_end_line = max(max_end_line, child.end_line)
+                max_end_lines.append(max_end_line)
+                self._add_block(child)
+            self._child_end_lines[id(block)] = max_end_lines
+
+        self._positions[id(block)] = (position, len(self._blocks))
+
+    def contains(self, block: "CodeBlock") -> bool:
+        position = self._positions.get(id(block))
+        return position is not None and self._blocks[position[0]] is block
+
+    def _in_subtree(self, positions: list[int], block: "CodeBlock", include_self: bool) -> list[int]:
+        start, end = self._positions[id(block)]
+        if not include_self:
+            start += 1
+        return positions[bisect_left(positions, start) : bisect_left(positions, end)]
+
+    def find_blocks_by_span_id(self, block: "CodeBlock", span_id: str) -> list["CodeBlock"]:
+        positions = self._in_subtree(self._by_span_id.get(span_id, []), block, include_self=True)
+        return [self._blocks[position] for position in positions]
+
+    def find_first_by_span_id(self, block: "CodeBlock", span_id: str) -> Optional["CodeBlock"]:
+        positions = self._in_subtree(self._by_span_id.get(span_id, []), block, include_self=True)
+        return self._blocks[positions[0]] if positions else None
+
+    def find_last_by_span_id(self, block: "CodeBlock", span_id: str) -> Optional["CodeBlock"]:
+        """
+        The last child with a matching block in its subtree is searched, and the child itself is returned if it
+        matches. This is the outermost matching ancestor of the last matching descendant.
+        """
+        positions = self._in_subtree(self._by_span_id.get(span_id, []), block, include_self=False)
+        if not positions:
+            return None
+
+        found = self._blocks[positions[-1]]
+        current = found.parent
+        while current is not None and current is not block:
+            if current.belongs_to_span and current.belongs_to_span.span_id == span_id:
+                found = current
+            current = current.parent
+        return found
+
+    def find_blocks_with_identifier(
+        self, block: "CodeBlock", identifier: str, type: Optional["CodeBlockType"] = None
+    ) -> list["CodeBlock"]:
+        positions = self._in_subtree(self._by_identifier.get(identifier, []), block, include_self=False)
+        blocks = [self._blocks[position] for position in positions]
+        if type:
+            blocks = [found for found in blocks if found.type == type]
+        return blocks
+
+    def first_child_ending_from(self, block: "CodeBlock", line: int) -> int:
+        """Index of the first child of the block that ends on or after the line."""
+        max_end_lines = self._child_end_lines.get(id(block))
+        if not max_end_lines:
+            return 0
+        return bisect_left(max_end_lines, line)
@@ -5,6 +5,7 @@ from typing import Optional
 
 from typing_extensions import deprecated
 
+from moatless.codeblocks.block_index import BlockIndex
 from moatless.codeblocks.parser.comment import get_comment_symbol
 from moatless.utils.colors import Colors
 
@@ -283,6 +284,10 @@ class ValidationError:
     error: str
 
 
+class FrozenModuleError(Exception):
+    """Raised when changing a module shared by the parse cache, use Module.copy() to get a module to change."""
+
+
 @dataclass(eq=False, repr=False, slots=True)
 class CodeBlock:
     type: CodeBlockType
@@ -338,7 +343,29 @@ class CodeBlock:
             return self.next.last()
         return self
 
+    def check_mutable(self):
+        module = self.module
+        if module is not None and module.frozen:
+            raise FrozenModuleError("Can't change a module shared by the parse cache, use Module.copy()")
+
+    def _prepare_change(self):
+        """Check that the tree can be changed and reset the lookup index of the module."""
+        self.check_mutable()
+        module = self.module
+        if module is not None:
+            module.reset_block_index()
+
+    def _get_block_index(self) -> Optional[BlockIndex]:
+        module = self.module
+        if module is None:
+            return None
+        index = module.block_index
+        if not index.contains(self):
+            return None
+        return index
+
     def insert_child(self, index: int, child: "CodeBlock"):
+        self._prepare_change()
         if index == 0 and self.children[0].pre_lines == 0:
             self.children[0].pre_lines = 1
 
@@ -351,6 +378,7 @@ class CodeBlock:
             index += 1
 
     def append_child(self, child: "CodeBlock"):
+        self._prepare_change()
         self.children.append(child)
         self.span_ids.update(child.span_ids)
         child.parent = self
@@ -360,12 +388,14 @@ class CodeBlock:
             self.append_child(child)
 
     def replace_children(self, start_index: int, end_index: int, children: list["CodeBlock"]):
+        self._prepare_change()
         self.children = self.children[:start_index] + children + self.children[end_index:]
         for child in children:
             child.parent = self
 
     def replace_child(self, index: int, child: "CodeBlock"):
         # TODO: Do a proper update of everything when replacing child blocks
+        self._prepare_change()
         child.pre_code = self.children[index].pre_code
         child.pre_lines = self.children[index].pre_lines
         self.sync_indentation(self.children[index], child)
@@ -374,6 +404,7 @@ class CodeBlock:
         child.parent = self
 
     def remove_child(self, index: int):
+        self._prepare_change()
         del self.children[index]
 
     def sync_indentation(self, original_block: "CodeBlock", updated_block: "CodeBlock"):
@@ -427,6 +458,7 @@ class CodeBlock:
         self,
         span_id: Optional[str] = None,  # TODO: Set max tokens to show
     ):
+        self.check_mutable()
         related_spans = self.find_related_spans(span_id)
         for span in related_spans:
             span.visible = True
@@ -785,8 +817,20 @@ class CodeBlock:
         return None
 
     def find_spans_by_line_numbers(self, start_line: int, end_line: int | None = None) -> list[BlockSpan]:
+        return self._find_spans_by_line_numbers(start_line, end_line, self._get_block_index())
+
+    def _find_spans_by_line_numbers(
+        self, start_line: int, end_line: int | None, index: Optional[BlockIndex]
+    ) -> list[BlockSpan]:
+        # Skip the children ending before the start line with a binary search when the module is indexed,
+        # scanning is faster for blocks with few children
+        if index and len(self.children) > 16:
+            first_child = index.first_child_ending_from(self, start_line)
+        else:
+            first_child = 0
+
         spans = []
-        for child in self.children:
+        for child in self.children[first_child:]:
             if end_line is None:
                 end_line = start_line
 
@@ -813,7 +857,7 @@ class CodeBlock:
             ):
                 spans.append(child.belongs_to_span)
 
-            child_spans = child.find_spans_by_line_numbers(start_line, end_line)
+            child_spans = child._find_spans_by_line_numbers(start_line, end_line, index)
             for span in child_spans:
                 if span not in spans:
                     spans.append(span)
@@ -977,13 +1021,18 @@ class CodeBlock:
         return None
 
     def find_blocks_by_span_id(self, span_id: str) -> list["CodeBlock"]:
+        index = self._get_block_index()
+        if index:
+            return index.find_blocks_by_span_id(self, span_id)
+        return self._find_blocks_by_span_id(span_id)
+
+    def _find_blocks_by_span_id(self, span_id: str) -> list["CodeBlock"]:
         blocks = []
         if self.belongs_to_span and self.belongs_to_span.span_id == span_id:
             blocks.append(self)
 
         for child in self.children:
-            # TODO: Optimize to just check relevant children (by mapping spans?
-            blocks.extend(child.find_blocks_by_span_id(span_id))
+            blocks.extend(child._find_blocks_by_span_id(span_id))
 
         return blocks
 
@@ -1007,22 +1056,34 @@ class CodeBlock:
         return None
 
     def find_first_by_span_id(self, span_id: str) -> Optional["CodeBlock"]:
+        index = self._get_block_index()
+        if index:
+            return index.find_first_by_span_id(self, span_id)
+        return self._find_first_by_span_id(span_id)
+
+    def _find_first_by_span_id(self, span_id: str) -> Optional["CodeBlock"]:
         if self.belongs_to_span and self.belongs_to_span.span_id == span_id:
             return self
 
         for child in self.children:
-            found = child.find_first_by_span_id(span_id)
+            found = child._find_first_by_span_id(span_id)
             if found:
                 return found
 
         return None
 
     def find_last_by_span_id(self, span_id: str) -> Optional["CodeBlock"]:
+        index = self._get_block_index()
+        if index:
+            return index.find_last_by_span_id(self, span_id)
+        return self._find_last_by_span_id(span_id)
+
+    def _find_last_by_span_id(self, span_id: str) -> Optional["CodeBlock"]:
         for child in reversed(self.children):
             if child.belongs_to_span and child.belongs_to_span.span_id == span_id:
                 return child
 
-            found = child.find_last_by_span_id(span_id)
+            found = child._find_last_by_span_id(span_id)
             if found:
                 return found
 
@@ -1040,6 +1101,12 @@ class CodeBlock:
         type: CodeBlockType | None = None,
         recursive: bool = False,
     ):
+        if recursive and identifier:
+            index = self._get_block_index()
+            if index:
+                found = index.find_blocks_with_identifier(self, identifier, type)
+                return found[0] if found else None
+
         for child in self.children:
             if child.identifier == identifier and (not type or child.type == type):
                 return child
@@ -1051,11 +1118,17 @@ class CodeBlock:
         return None
 
     def find_blocks_with_identifier(self, identifier: str) -> list["CodeBlock"]:
+        index = self._get_block_index() if identifier else None
+        if index:
+            return index.find_blocks_with_identifier(self, identifier)
+        return self._find_blocks_with_identifier(identifier)
+
+    def _find_blocks_with_identifier(self, identifier: str) -> list["CodeBlock"]:
         blocks = []
         for child_block in self.children:
             if child_block.identifier == identifier:
                 blocks.append(child_block)
-            blocks.extend(child_block.find_blocks_with_identifier(identifier))
+            blocks.extend(child_block._find_blocks_with_identifier(identifier))
         return blocks
 
     def find_incomplete_blocks_with_type(self, block_type: CodeBlockType):
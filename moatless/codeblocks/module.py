@@ -5,6 +5,7 @@ from typing import Optional
 from networkx import DiGraph
 
 from moatless.codeblocks import CodeBlock, CodeBlockType
+from moatless.codeblocks.block_index import BlockIndex
 from moatless.codeblocks.codeblocks import BlockSpan, SpanType
 
 logger = logging.getLogger(__name__)
@@ -18,11 +19,46 @@ class Module(CodeBlock):
     language: Optional[str] = None
     code_block: CodeBlock = field(default_factory=lambda: CodeBlock(content="", type=CodeBlockType.MODULE))
     _graph: DiGraph = field(default_factory=DiGraph, init=False)  # TODO: Move to central CodeGraph
+    _source: Optional[str] = field(default=None, init=False)
+    _frozen: bool = field(default=False, init=False)
+    _block_index: Optional[BlockIndex] = field(default=None, init=False)
 
     def __post_init__(self):
         if self.code_block.type != CodeBlockType.MODULE:
             self.code_block.type = CodeBlockType.MODULE
 
+    @property
+    def frozen(self) -> bool:
+        return self._frozen
+
+    @property
+    def source(self) -> Optional[str]:
+        return self._source
+
+    def freeze(self, source: str):
+        """Mark the module as shared, changing the tree will raise FrozenModuleError."""
+        self._source = source
+        self._frozen = True
+
+    @property
+    def block_index(self) -> BlockIndex:
+        """Index for span, identifier and line lookups, built on first use and reset when the tree is changed."""
+        if self._block_index is None:
+            self._block_index = BlockIndex(self)
+        return self._block_index
+
+    def reset_block_index(self):
+        self._block_index = None
+
+    def copy(self) -> "Module":
+        """Return a module that can be changed, frozen modules are parsed again from their source."""
+        if not self._frozen:
+            return self
+
+        from moatless.codeblocks.parser.create import create_parser
+
+        return create_parser(self.language).parse(self._source, file_path=self.file_path)
+
     # Delegate other methods to self.code_block as needed
     def __getattr__(self, name):
         return getattr(self.code_block, name)
@@ -52,6 +88,7 @@ class Module(CodeBlock):
         show_related: bool = False,
         max_tokens: int = 2000,
     ) -> bool:
+        self.check_mutable()
         for span in self.spans_by_id.values():
             span.visible = False
 
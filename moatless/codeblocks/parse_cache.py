@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from moatless.codeblocks.module import Module
+from moatless.codeblocks.parser.create import create_parser
+from moatless.codeblocks.parser.parser import CodeParser
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[str, str, Optional[str]]
+
+
+def get_language_by_path(file_path: str) -> Optional[str]:
+    if file_path.endswith(".py"):
+        return "python"
+    elif file_path.endswith(".java"):
+        return "java"
+    return None
+
+
+class ParseCache:
+    """
+    Size-bounded LRU cache of parsed modules keyed by language and content hash.
+
+    Cached modules are frozen and shared between all callers, use Module.copy() to get a tree that can be
+    changed.
+    """
+
+    def __init__(self, max_entries: int = 512, max_content_size: int = 64 * 1024 * 1024):
+        self._max_entries = max_entries
+        self._max_content_size = max_content_size
+        self._modules: OrderedDict[CacheKey, Module] = OrderedDict()
+        self._content_size = 0
+        self._parsers: dict[str, CodeParser] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._modules)
+
+    def parse(self, language: str, content: str, file_path: Optional[str] = None) -> Module:
+        key = (language, hashlib.sha256(content.encode("utf-8", errors="surrogatepass")).hexdigest(), file_path)
+
+        with self._lock:
+            module = self._modules.get(key)
+            if module is not None:
+                self._modules.move_to_end(key)
+                self.hits += 1
+                return module
+
+            self.misses += 1
+
+            # Parsers keep state while parsing and are not thread safe, parse while holding the lock
+            parser = self._parsers.get(language)
+            if parser is None:
+                parser = create_parser(language)
+                self._parsers[language] = parser
+
+            module = parser.parse(content, file_path=file_path)
+            module.freeze(content)
+
+            self._modules[key] = module
+            self._content_size += len(content)
+            while self._modules and (
+                len(self._modules) > self._max_entries or self._content_size > self._max_content_size
+            ):
+                _, evicted = self._modules.popitem(last=False)
+                self._content_size -= len(evicted.source)
+
+            return module
+
+    def clear(self):
+        with self._lock:
+            self._modules.clear()
+            self._content_size = 0
+
+
+_parse_cache: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> ParseCache:
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache()
+    return _parse_cache
+
+
+def parse_module(file_path: str, content: str) -> Optional[Module]:
+    """Parse the content of a file with the process-wide parse cache, returns None for unsupported file types."""
+    language = get_language_by_path(file_path)
+    if not language:
+        return None
+    return get_parse_cache().parse(language, content)
@@ -21,6 +21,7 @@ from moatless.codeblocks.codeblocks import (
 )
 from moatless.codeblocks.module import Module
 from moatless.codeblocks.parser.comment import get_comment_symbol
+from moatless.utils.tokenizer import count_tokens
 
 commented_out_keywords = ["rest of the code", "existing code", "other code"]
 child_block_types = ["ERROR", "block"]
@@ -107,9 +108,8 @@ class CodeParser:
         self._enable_code_graph = enable_code_graph
         self._graph = None
 
-        from llama_index.core import get_tokenizer
-
-        self.tokenizer = tokenizer or get_tokenizer()
+        # Without a custom tokenizer the cached count_tokens() is used
+        self.tokenizer = tokenizer
         self._max_tokens_in_span = max_tokens_in_span
         self._min_tokens_for_docs_span = min_tokens_for_docs_span
         self._min_lines_to_parse_block = min_lines_to_parse_block
@@ -862,7 +862,7 @@ class CodeParser:
 
     def _count_tokens(self, content: str):
         if not self.tokenizer:
-            return 0
+            return count_tokens(content)
         return len(self.tokenizer(content))
 
     def debug_log(self, message: str):
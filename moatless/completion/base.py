@@ -1,3 +1,4 @@
+import json
 import logging
 from abc import ABC, abstractmethod
 from collections.abc import Awaitable, Callable
@@ -15,6 +16,8 @@ from opentelemetry import trace
 from pydantic import BaseModel, Field, PrivateAttr
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from moatless.completion.cache import CompletionCacheMode, get_completion_cache
+from moatless.completion.rate_limiter import get_rate_limiter
 from moatless.completion.schema import (
     AllMessageValues,
     ChatCompletionCachedContent,
@@ -23,7 +26,7 @@ from moatless.completion.schema import (
     ChatCompletionUserMessage,
     ResponseSchema,
 )
-from moatless.completion.stats import CompletionAttempt, CompletionInvocation
+from moatless.completion.stats import CompletionAttempt, CompletionInvocation, Usage
 from moatless.component import MoatlessComponent
 from moatless.exceptions import CompletionRejectError, CompletionRuntimeError
 
@@ -464,11 +467,43 @@ class BaseCompletionModel(MoatlessComponent, ABC):
         if self.merge_same_role_messages:
             messages = self._merge_same_role_messages(messages)
 
+        completion_cache = get_completion_cache()
+        cache_key = None
+        if completion_cache:
+            cache_key = completion_cache.next_key(
+                self.model,
+                messages,
+                {"temperature": self.temperature, "max_tokens": self.max_tokens, **(self._completion_params or {})},
+            )
+
+            if completion_cache.mode != CompletionCacheMode.RECORD:
+                response = await completion_cache.get(cache_key)
+                if response is not None:
+                    with invocation:
+                        if invocation.current_attempt:
+                            invocation.current_attempt.update_from_response(response, self.model)
+                            invocation.current_attempt.from_cache = True
+                    return response
+
+                if completion_cache.mode == CompletionCacheMode.REPLAY:
+                    raise CompletionRuntimeError(
+                        f"No recorded completion for model {self.model} with cache key {cache_key}",
+                        completion_invocation=invocation,
+                    )
+
         attempt_count = 0
+        rate_limiter = get_rate_limiter()
+        backoff = wait_exponential(multiplier=5, min=5, max=60)
+
+        def wait_before_retry(retry_state: tenacity.RetryCallState) -> float:
+            # The rate limiter waits until the retry-after time of rate limited calls before the next call
+            if rate_limiter and isinstance(retry_state.outcome.exception(), RateLimitError):
+                return 0
+            return backoff(retry_state)
 
         @retry(
             retry=tenacity.retry_if_not_exception_type((BadRequestError, CompletionRuntimeError)),
-            wait=wait_exponential(multiplier=5, min=5, max=60),
+            wait=wait_before_retry,
             stop=stop_after_attempt(3),
             reraise=True,
             before_sleep=lambda retry_state: logger.warning(
@@ -484,15 +519,16 @@ class BaseCompletionModel(MoatlessComponent, ABC):
                     if "claude" in self.model:
                         self._inject_prompt_caching(messages)
 
-                    response = await litellm.acompletion(
-                        model=self.model,
-                        max_tokens=self.max_tokens,
-                        temperature=self.temperature,
-                        messages=messages,
-                        metadata=self.metadata or {},
-                        timeout=self.timeout,
-                        **self._completion_params,
-                    )
+                    if rate_limiter:
+                        estimated_tokens = self._estimate_tokens(messages)
+                        async with rate_limiter.limit(self.model, estimated_tokens) as reservation:
+                            if invocation.current_attempt:
+                                invocation.current_attempt.queue_wait_ms = reservation.wait_seconds * 1000
+                            response = await self._acompletion(messages)
+                            usage = Usage.from_completion_response(response, self.model)
+                            reservation.tokens = usage.prompt_tokens + usage.completion_tokens or estimated_tokens
+                    else:
+                        response = await self._acompletion(messages)
 
                     if invocation.current_attempt:
                         invocation.current_attempt.update_from_response(response, self.model)
@@ -536,7 +572,30 @@ class BaseCompletionModel(MoatlessComponent, ABC):
                     error = CompletionRuntimeError(message=str(e), completion_invocation=invocation)
                     raise error from e
 
-        return await _do_completion_with_rate_limit_retry()
+        response = await _do_completion_with_rate_limit_retry()
+
+        if completion_cache and cache_key:
+            await completion_cache.put(cache_key, response)
+
+        return response
+
+    async def _acompletion(self, messages: list[dict]) -> LitellmModelResponse:
+        return await litellm.acompletion(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=messages,
+            metadata=self.metadata or {},
+            timeout=self.timeout,
+            **self._completion_params,
+        )
+
+    def _estimate_tokens(self, messages: list[dict]) -> int:
+        """Estimate the tokens of a completion from the size of the request, before the usage is known."""
+        request_size = len(json.dumps(messages, default=str))
+        if self._completion_params and self._completion_params.get("tools"):
+            request_size += len(json.dumps(self._completion_params["tools"], default=str))
+        return request_size // 4 + (self.max_tokens or 0)
 
     def _get_schema_names(self):
         return [schema.__name__ for schema in self._response_schema] if self._response_schema else ["None"]
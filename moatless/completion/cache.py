@@ -0,0 +1,139 @@
+"""
+Completion cache stored in BaseStorage.
+
+Responses are stored by a key of the model, the normalized messages, the tools, the response format and the sampling
+parameters, so a trajectory can be run again without calling the LLM, for example after a change to an action or a
+parser, or to benchmark the agent loop offline.
+
+The same request can be sent more than once, for example when expanding several children of a node with the same
+messages, so each occurrence of a request in the process is stored separately and replayed in the same order.
+"""
+
+import hashlib
+import json
+import logging
+from enum import Enum
+from typing import Any, Optional
+
+from litellm.types.utils import ModelResponse
+from pydantic import BaseModel
+
+from moatless.storage.base import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+# Completion parameters that don't change the response
+IGNORED_PARAMS = {"api_key", "api_base", "headers", "metadata", "timeout"}
+
+
+class CompletionCacheMode(str, Enum):
+    RECORD = "record"  # Always call the LLM and store the response
+    REPLAY = "replay"  # Only use stored responses, a completion without a stored response fails
+    READ_THROUGH = "read_through"  # Use stored responses and call the LLM and store the response if there is none
+
+
+class CompletionCache:
+    """
+    Stores completion responses in `completion_cache/<key[:2]>/<key>.json`.
+
+    Set the cache used by all completion models in the process with set_completion_cache().
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        mode: CompletionCacheMode = CompletionCacheMode.READ_THROUGH,
+        prefix: str = "completion_cache",
+    ):
+        self._storage = storage
+        self.mode = CompletionCacheMode(mode)
+        self._prefix = prefix
+
+        self._occurrences: dict[str, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def get_key(self, model: str, messages: list[dict], params: dict[str, Any]) -> str:
+        """
+        Get the cache key of a completion request.
+
+        Args:
+            model: The model name
+            messages: The messages sent to the model
+            params: The completion parameters, like temperature, tools and response_format
+
+        Returns:
+            A hex digest of the normalized request
+        """
+        request = {
+            "model": model,
+            "messages": _normalize(messages),
+            "params": _normalize({key: value for key, value in params.items() if key not in IGNORED_PARAMS}),
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+    def next_key(self, model: str, messages: list[dict], params: dict[str, Any]) -> str:
+        """
+        Get the cache key of the next occurrence of a completion request, counted per cache.
+
+        The first occurrence has the key returned by get_key, later occurrences have the occurrence number appended.
+        """
+        key = self.get_key(model, messages, params)
+        occurrence = self._occurrences.get(key, 0)
+        self._occurrences[key] = occurrence + 1
+        return key if occurrence == 0 else f"{key}-{occurrence}"
+
+    async def get(self, key: str) -> Optional[ModelResponse]:
+        """Get the stored response for a key, None if there is none."""
+        path = self._get_path(key)
+        try:
+            data = await self._storage.read(path)
+        except KeyError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read cached completion {path}: {e}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return ModelResponse(**data["response"])
+
+    async def put(self, key: str, response: ModelResponse) -> None:
+        """Store the response for a key. Failing to store the response is logged and not raised."""
+        path = self._get_path(key)
+        try:
+            await self._storage.write(path, {"key": key, "response": response.model_dump()})
+            self.writes += 1
+        except Exception as e:
+            logger.warning(f"Failed to store completion {path}: {e}")
+
+    def _get_path(self, key: str) -> str:
+        return f"{self._prefix}/{key[:2]}/{key}.json"
+
+
+def _normalize(value: Any) -> Any:
+    """Convert models to dicts and remove prompt caching breakpoints, which are set on the messages per request."""
+    if isinstance(value, BaseModel):
+        value = value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items() if key != "cache_control" and item is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+_completion_cache: Optional[CompletionCache] = None
+
+
+def set_completion_cache(cache: Optional[CompletionCache]) -> None:
+    """Set the completion cache used by all completion models in the process, or None to not cache completions."""
+    global _completion_cache
+    _completion_cache = cache
+
+
+def get_completion_cache() -> Optional[CompletionCache]:
+    """Get the completion cache used by all completion models in the process."""
+    return _completion_cache
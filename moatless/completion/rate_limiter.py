@@ -0,0 +1,438 @@
+"""
+Rate limiter for LLM calls, shared by all completion models in a process and by all processes when using Redis.
+
+Calls are limited per model by requests and tokens per minute in a sliding window and by the number of concurrent
+calls, and callers wait in line in the order they arrived. When a provider responds with 429 Too Many Requests, the
+model is blocked for all callers until the retry-after time and its limits are lowered, to be raised again with each
+successful call, so concurrent trajectories don't back off blindly and then retry all at once.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60.0
+
+
+class Clock:
+    """The time used by the rate limiter, replaced in tests to not depend on the wall clock."""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+@dataclass
+class RateLimits:
+    """Limits for the calls to a model, None for no limit."""
+
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    max_concurrent: Optional[int] = None
+
+
+@dataclass
+class RateLimitReservation:
+    """A call reserved in the rate limit window. Set tokens to the actual usage before the reservation is released."""
+
+    key: str
+    reservation_id: str
+    tokens: int
+    wait_seconds: float = 0.0
+
+
+class RateLimiter:
+    """
+    Rate limiter keeping the rate limit windows in memory, shared by the completion models in the process.
+
+    Limits are looked up by the key, usually the model name, then by the provider prefix of the key, like
+    `anthropic` for `anthropic/claude-3-5-sonnet-20241022`, then default_limits is used. The limits are multiplied by
+    a limit factor that is halved when a call is rate limited, down to min_limit_factor, and raised by
+    recovery_step with each successful call. Without configured limits, rate limited calls still block the key until
+    the retry-after time.
+    """
+
+    def __init__(
+        self,
+        default_limits: Optional[RateLimits] = None,
+        limits: Optional[dict[str, RateLimits]] = None,
+        min_limit_factor: float = 0.1,
+        recovery_step: float = 0.05,
+        default_retry_after: float = 10.0,
+        clock: Optional[Clock] = None,
+    ):
+        self._default_limits = default_limits or RateLimits()
+        self._limits = limits or {}
+        self.min_limit_factor = min_limit_factor
+        self.recovery_step = recovery_step
+        self.default_retry_after = default_retry_after
+        self._clock = clock or Clock()
+
+        self._queues: dict[str, asyncio.Lock] = {}
+        self._slots: dict[str, asyncio.Condition] = {}
+        self._in_flight: dict[str, int] = {}
+
+        self._windows: dict[str, deque[list]] = {}
+        self._blocked_until: dict[str, float] = {}
+        self._limit_factors: dict[str, float] = {}
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+
+    def get_limits(self, key: str) -> RateLimits:
+        """Get the limits for a key, by the key, its provider prefix or the default limits."""
+        if key in self._limits:
+            return self._limits[key]
+        provider = key.split("/")[0]
+        if provider in self._limits:
+            return self._limits[provider]
+        return self._default_limits
+
+    @asynccontextmanager
+    async def limit(self, key: str, tokens: int) -> AsyncIterator[RateLimitReservation]:
+        """
+        Wait for a call to be allowed and reserve it until the context exits.
+
+        A 429 response raised from the context blocks the key until its retry-after time and lowers the limits.
+
+        Args:
+            key: The key to limit by, usually the model name
+            tokens: The estimated number of tokens of the call
+
+        Yields:
+            The reservation, with the time waited in line
+        """
+        reservation = await self.acquire(key, tokens)
+        try:
+            yield reservation
+        except BaseException as e:
+            if _is_rate_limit_error(e):
+                retry_after = _get_retry_after(e) or self.default_retry_after
+                logger.info(f"Calls to {key} are rate limited, waiting {retry_after:.1f} seconds")
+                self.rate_limited += 1
+                await self._backoff(key, retry_after)
+            await self.release(reservation, success=False)
+            raise
+        else:
+            await self.release(reservation, success=True)
+
+    async def acquire(self, key: str, tokens: int) -> RateLimitReservation:
+        """Wait in line until a call is allowed by the limits for the key and reserve it."""
+        start = self._clock.monotonic()
+        limits = self.get_limits(key)
+
+        async with self._queues.setdefault(key, asyncio.Lock()):
+            while True:
+                wait, reservation_id, limit_factor = await self._reserve(key, tokens, limits)
+                if reservation_id:
+                    break
+                logger.debug(f"Waiting {wait:.2f} seconds for the rate limit of {key}")
+                await self._clock.sleep(wait)
+
+            if limits.max_concurrent:
+                max_concurrent = max(1, int(limits.max_concurrent * limit_factor))
+                slots = self._slots.setdefault(key, asyncio.Condition())
+                async with slots:
+                    await slots.wait_for(lambda: self._in_flight.get(key, 0) < max_concurrent)
+
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+        wait_seconds = self._clock.monotonic() - start
+        self.requests += 1
+        self.wait_seconds += wait_seconds
+        return RateLimitReservation(key=key, reservation_id=reservation_id, tokens=tokens, wait_seconds=wait_seconds)
+
+    async def release(self, reservation: RateLimitReservation, success: bool = True) -> None:
+        """Release the concurrency slot of a call and update the tokens of its reservation."""
+        key = reservation.key
+        self._in_flight[key] = max(0, self._in_flight.get(key, 0) - 1)
+        if key in self._slots:
+            async with self._slots[key]:
+                self._slots[key].notify_all()
+
+        try:
+            await self._complete(key, reservation.reservation_id, reservation.tokens, success)
+        except Exception as e:
+            logger.warning(f"Failed to update rate limit reservation for {key}: {e}")
+
+    async def _reserve(self, key: str, tokens: int, limits: RateLimits) -> tuple[float, Optional[str], float]:
+        """
+        Reserve a call in the window if the limits allow it.
+
+        Returns:
+            The seconds to wait before trying again, the reservation id if reserved and the limit factor
+        """
+        now = self._clock.time()
+        limit_factor = self._limit_factors.get(key, 1.0)
+
+        blocked_until = self._blocked_until.get(key, 0.0)
+        if blocked_until > now:
+            return blocked_until - now, None, limit_factor
+
+        window = self._windows.setdefault(key, deque())
+        while window and window[0][0] <= now - WINDOW_SECONDS:
+            window.popleft()
+
+        wait = _get_window_wait(now, window, tokens, limits, limit_factor)
+        if wait > 0:
+            return wait, None, limit_factor
+
+        reservation_id = uuid.uuid4().hex
+        window.append([now, reservation_id, tokens])
+        return 0.0, reservation_id, limit_factor
+
+    async def _complete(self, key: str, reservation_id: str, tokens: int, success: bool) -> None:
+        """Set the actual tokens of a reservation and raise the limit factor after a successful call."""
+        for entry in self._windows.get(key, ()):
+            if entry[1] == reservation_id:
+                entry[2] = tokens
+                break
+
+        if success and self._limit_factors.get(key, 1.0) < 1.0:
+            self._limit_factors[key] = min(1.0, self._limit_factors[key] + self.recovery_step)
+
+    async def _backoff(self, key: str, retry_after: float) -> None:
+        """Block the key until the retry-after time and halve the limit factor, once per rate limited period."""
+        now = self._clock.time()
+        if self._blocked_until.get(key, 0.0) <= now:
+            self._limit_factors[key] = max(self.min_limit_factor, self._limit_factors.get(key, 1.0) * 0.5)
+        self._blocked_until[key] = max(self._blocked_until.get(key, 0.0), now + retry_after)
+
+
+# Reserve a call in the window of a key if the limits allow it.
+# KEYS: window sorted set of reservation ids scored by time, reservation tokens hash, state hash
+# ARGV: now, window seconds, tokens, requests per minute, tokens per minute (0 for no limit), reservation id
+# Returns the seconds to wait, 0 if reserved, and the limit factor as strings
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local factor = tonumber(redis.call('HGET', KEYS[3], 'limit_factor') or '1')
+local blocked_until = tonumber(redis.call('HGET', KEYS[3], 'blocked_until') or '0')
+if blocked_until > now then
+    return {tostring(blocked_until - now), tostring(factor)}
+end
+
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+    redis.call('HDEL', KEYS[2], unpack(expired))
+end
+
+local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+local count = #entries / 2
+local wait = 0
+
+local rpm = tonumber(ARGV[4])
+if rpm > 0 then
+    local limit = math.max(1, math.floor(rpm * factor))
+    if count + 1 > limit then
+        wait = math.max(wait, tonumber(entries[(count - limit + 1) * 2]) + window - now)
+    end
+end
+
+local tpm = tonumber(ARGV[5])
+local tokens = tonumber(ARGV[3])
+if tpm > 0 and count > 0 then
+    local limit = math.max(1, math.floor(tpm * factor))
+    local ids = {}
+    for i = 1, count do
+        ids[i] = entries[i * 2 - 1]
+    end
+    local values = redis.call('HMGET', KEYS[2], unpack(ids))
+    local used = 0
+    for i = 1, count do
+        used = used + (tonumber(values[i]) or 0)
+    end
+    if used + tokens > limit then
+        local token_wait = tonumber(entries[count * 2]) + window - now
+        for i = 1, count do
+            used = used - (tonumber(values[i]) or 0)
+            if used + tokens <= limit then
+                token_wait = tonumber(entries[i * 2]) + window - now
+                break
+            end
+        end
+        wait = math.max(wait, token_wait)
+    end
+end
+
+if wait > 0 then
+    return {tostring(wait), tostring(factor)}
+end
+
+redis.call('ZADD', KEYS[1], now, ARGV[6])
+redis.call('HSET', KEYS[2], ARGV[6], tokens)
+redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+redis.call('EXPIRE', KEYS[2], math.ceil(window * 2))
+return {'0', tostring(factor)}
+"""
+
+# Set the actual tokens of a reservation and raise the limit factor after a successful call.
+# KEYS: window sorted set, reservation tokens hash, state hash
+# ARGV: reservation id, tokens, 1 if the call succeeded, recovery step
+COMPLETE_SCRIPT = """
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+if ARGV[3] == '1' then
+    local factor = tonumber(redis.call('HGET', KEYS[3], 'limit_factor') or '1')
+    if factor < 1 then
+        redis.call('HSET', KEYS[3], 'limit_factor', tostring(math.min(1, factor + tonumber(ARGV[4]))))
+    end
+end
+return 1
+"""
+
+# Block a key until the retry-after time and halve the limit factor, once per rate limited period.
+# KEYS: state hash
+# ARGV: now, retry after seconds, min limit factor
+BACKOFF_SCRIPT = """
+local now = tonumber(ARGV[1])
+local blocked_until = tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0')
+if blocked_until <= now then
+    local factor = tonumber(redis.call('HGET', KEYS[1], 'limit_factor') or '1')
+    redis.call('HSET', KEYS[1], 'limit_factor', tostring(math.max(tonumber(ARGV[3]), factor * 0.5)))
+end
+redis.call('HSET', KEYS[1], 'blocked_until', tostring(math.max(blocked_until, now + tonumber(ARGV[2]))))
+redis.call('EXPIRE', KEYS[1], 86400)
+return 1
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Rate limiter keeping the rate limit windows, the blocked periods and the limit factors in Redis, shared by all
+    processes using the same Redis. Reservations are made with Lua scripts, so processes can't exceed the limits
+    together. Callers are queued in order within each process and concurrent calls are limited per process.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "moatless:rate_limits:", **kwargs):
+        """Initialize the Redis rate limiter.
+
+        Args:
+            redis_url: Redis connection URL
+            prefix: Key prefix for Redis storage
+            **kwargs: The limits and settings of RateLimiter
+        """
+        super().__init__(**kwargs)
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("redis is not installed. Please install it with `pip install redis`.")
+
+        self._redis = redis.from_url(redis_url)
+        self._prefix = prefix
+        self._reserve_script = self._redis.register_script(RESERVE_SCRIPT)
+        self._complete_script = self._redis.register_script(COMPLETE_SCRIPT)
+        self._backoff_script = self._redis.register_script(BACKOFF_SCRIPT)
+
+    async def _reserve(self, key: str, tokens: int, limits: RateLimits) -> tuple[float, Optional[str], float]:
+        reservation_id = uuid.uuid4().hex
+        wait, limit_factor = await self._reserve_script(
+            keys=self._get_keys(key),
+            args=[
+                self._clock.time(),
+                WINDOW_SECONDS,
+                tokens,
+                limits.requests_per_minute or 0,
+                limits.tokens_per_minute or 0,
+                reservation_id,
+            ],
+        )
+        wait = float(wait)
+        return wait, reservation_id if wait <= 0 else None, float(limit_factor)
+
+    async def _complete(self, key: str, reservation_id: str, tokens: int, success: bool) -> None:
+        await self._complete_script(
+            keys=self._get_keys(key), args=[reservation_id, tokens, 1 if success else 0, self.recovery_step]
+        )
+
+    async def _backoff(self, key: str, retry_after: float) -> None:
+        await self._backoff_script(
+            keys=[self._get_keys(key)[2]], args=[self._clock.time(), retry_after, self.min_limit_factor]
+        )
+
+    def _get_keys(self, key: str) -> list[str]:
+        return [f"{self._prefix}{key}:window", f"{self._prefix}{key}:tokens", f"{self._prefix}{key}:state"]
+
+
+def _get_window_wait(now: float, window: deque, tokens: int, limits: RateLimits, limit_factor: float) -> float:
+    """Seconds until the oldest calls in the window have expired so another call with the tokens is allowed."""
+    wait = 0.0
+
+    if limits.requests_per_minute:
+        limit = max(1, int(limits.requests_per_minute * limit_factor))
+        if len(window) + 1 > limit:
+            wait = max(wait, window[len(window) - limit][0] + WINDOW_SECONDS - now)
+
+    # A call with more tokens than the limit is allowed when the window is empty
+    if limits.tokens_per_minute and window:
+        limit = max(1, int(limits.tokens_per_minute * limit_factor))
+        used = sum(entry[2] for entry in window)
+        if used + tokens > limit:
+            token_wait = window[-1][0] + WINDOW_SECONDS - now
+            for timestamp, _, entry_tokens in window:
+                used -= entry_tokens
+                if used + tokens <= limit:
+                    token_wait = timestamp + WINDOW_SECONDS - now
+                    break
+            wait = max(wait, token_wait)
+
+    return wait
+
+
+def _is_rate_limit_error(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _get_retry_after(error: BaseException) -> Optional[float]:
+    """Get the retry-after seconds from the headers of a rate limit error, None if not set."""
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        headers = {key.lower(): value for key, value in headers.items()}
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def set_rate_limiter(rate_limiter: Optional[RateLimiter]) -> None:
+    """Set the rate limiter used by all completion models in the process, or None to not limit calls."""
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """Get the rate limiter used by all completion models in the process."""
+    return _rate_limiter
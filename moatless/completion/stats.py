@@ -85,6 +85,20 @@ class Usage(BaseModel):
             reasoning_tokens=self.reasoning_tokens + other.reasoning_tokens,
         )
 
+    def __sub__(self, other: "Usage") -> "Usage":
+        """Subtract the usage of another Usage object."""
+        if not isinstance(other, Usage):
+            return self
+
+        return Usage(
+            completion_cost=self.completion_cost - other.completion_cost,
+            completion_tokens=self.completion_tokens - other.completion_tokens,
+            prompt_tokens=self.prompt_tokens - other.prompt_tokens,
+            cache_read_tokens=self.cache_read_tokens - other.cache_read_tokens,
+            cache_write_tokens=self.cache_write_tokens - other.cache_write_tokens,
+            reasoning_tokens=self.reasoning_tokens - other.reasoning_tokens,
+        )
+
     @staticmethod
     def calculate_cost(
         model: str,
@@ -201,6 +215,8 @@ class CompletionAttempt(BaseModel):
         default=None, description="Reason for failure if the attempt was unsuccessful"
     )
     attempt_number: int = Field(default=1, description="The attempt number for this completion")
+    from_cache: bool = Field(default=False, description="Whether the response was replayed from the completion cache")
+    queue_wait_ms: float = Field(default=0, description="Time waited for the rate limiter in milliseconds")
 
     @staticmethod
     def _current_time_ms() -> float:
@@ -391,6 +407,11 @@ class CompletionInvocation(BaseModel):
         """Return the duration of the invocation in seconds."""
         return self.duration_ms / 1000
 
+    @property
+    def queue_wait_ms(self) -> float:
+        """Return the time waited for the rate limiter across all attempts in milliseconds."""
+        return sum(attempt.queue_wait_ms for attempt in self.attempts)
+
     def __str__(self) -> str:
         num_attempts = len(self.attempts)
         success = any(attempt.success for attempt in self.attempts) if self.attempts else False
@@ -1,3 +1,5 @@
+import asyncio
+import hashlib
 import json
 import logging
 from datetime import datetime, timezone
@@ -17,11 +19,13 @@ from moatless.evaluation.schema import (
     EvaluationSummary,
     RepoStats,
 )
+from moatless.evaluation.state_store import EvaluationStateStore
 from moatless.evaluation.utils import get_swebench_instance
 from moatless.eventbus.base import BaseEventBus
 from moatless.events import BaseEvent
 from moatless.flow.flow import AgenticFlow
 from moatless.flow.manager import FlowManager
+from moatless.flow.trajectory_journal import read_trajectory_data
 from moatless.flow.search_tree import SearchTree
 from moatless.node import EvaluationResult, Node
 from moatless.runner.runner import BaseRunner, JobStatus
@@ -40,6 +44,7 @@ class EvaluationManager:
         storage: BaseStorage,
         eventbus: BaseEventBus,
         flow_manager: FlowManager,
+        max_concurrent_reads: int = 16,
     ):
         self.runner = runner
         self.storage = storage
@@ -48,6 +53,13 @@ class EvaluationManager:
         self._cached_datasets = {}
         self._initialized = False
         self._subscribed_to_events = False
+        self._state_store = EvaluationStateStore(storage)
+
+        # Bounds the instances whose results are read from storage at the same time
+        self._read_semaphore = asyncio.Semaphore(max_concurrent_reads)
+        self._instance_cache: dict[str, tuple[str, EvaluationInstance]] = {}
+        self.instance_cache_hits = 0
+        self.instance_cache_misses = 0
 
     async def initialize(self):
         if self._initialized:
@@ -430,7 +442,8 @@ class EvaluationManager:
         elif event.event_type == "error":
             instance.fail(event.data.get("error", "Unknown error") if event.data else "Unknown error")
 
-        await self._save_evaluation(evaluation)
+        # Written behind, events from all instances within the flush interval are persisted together
+        self._state_store.mark_changed(evaluation)
 
     async def _sync_instance_with_job_status(self, instance: EvaluationInstance, job_status: JobStatus | None):
         """Sync instance execution status with job status from runner"""
@@ -455,27 +468,41 @@ class EvaluationManager:
             instance.fail("Job was stopped unexpectedly")
 
     async def _process_trajectory_results(
-        self, evaluation: Evaluation, instance: EvaluationInstance, force_update: bool = True
+        self,
+        evaluation: Evaluation,
+        instance: EvaluationInstance,
+        force_update: bool = True,
+        trajectory_exists: Optional[bool] = None,
     ):
-        """Process the results of a trajectory and update the instance with the results."""
+        """
+        Process the results of a trajectory and update the instance with the results.
+
+        trajectory_exists can be set if already known from a listing, to not check it in storage.
+        """
 
         if instance.is_finished() and instance.is_evaluated() and not force_update:
             logger.info(f"Instance {instance.instance_id} is already completed and evaluated, skipping processing")
             return instance
 
         # Check if the instance information exists in storage
-        if not await self.storage.exists_in_trajectory(
-            "trajectory.json",
-            project_id=evaluation.evaluation_name,
-            trajectory_id=instance.instance_id,
-        ):
+        if trajectory_exists is None:
+            trajectory_exists = await self.storage.exists_in_trajectory(
+                "trajectory.json",
+                project_id=evaluation.evaluation_name,
+                trajectory_id=instance.instance_id,
+            )
+
+        if not trajectory_exists:
             logger.warning(f"Instance {instance.instance_id} not found in storage {self.storage}, will create it")
             await self._create_trajectory(evaluation, instance)
             return instance
 
         try:
-            await self._sync_event_timestamps(evaluation, instance)
-            flow = await self._read_flow(trajectory_id=instance.instance_id, project_id=evaluation.evaluation_name)
+            # The events and the flow are read at the same time, the flow overrides the event timestamps below
+            _, flow = await asyncio.gather(
+                self._sync_event_timestamps(evaluation, instance),
+                self._read_flow(trajectory_id=instance.instance_id, project_id=evaluation.evaluation_name),
+            )
             logger.debug(f"Read flow with {len(flow.root.get_all_nodes())} nodes")
 
             instance.usage = flow.total_usage()
@@ -540,7 +567,7 @@ class EvaluationManager:
         trajectory_id: str,
         project_id: str,
     ) -> "AgenticFlow":
-        traj_dict = await self.storage.read_from_trajectory("trajectory.json", project_id, trajectory_id)
+        traj_dict = await read_trajectory_data(self.storage, project_id, trajectory_id)
         if not traj_dict:
             raise ValueError("Trajectory not found")
 
@@ -598,6 +625,7 @@ class EvaluationManager:
         instance.start_evaluating_at = None
         instance.started_at = None
         instance.completed_at = None
+        instance.trajectory_version = None
         instance._sync_legacy_status()
 
         # If the instance was already started, cancel any existing jobs
@@ -643,8 +671,34 @@ class EvaluationManager:
             logger.error(f"Error processing evaluation results for {evaluation_name}: {e}")
 
         logger.debug(f"Processing evaluation results for {evaluation_name} with {len(evaluation.instances)} instances")
-        for instance in evaluation.instances:
-            await self._process_trajectory_results(evaluation, instance)
+        trajectory_files = await self._list_trajectory_files(evaluation_name)
+
+        async def process_instance(instance: EvaluationInstance) -> bool:
+            if trajectory_files is None:
+                async with self._read_semaphore:
+                    await self._process_trajectory_results(evaluation, instance)
+                return True
+
+            # Instances are only processed again when a file in their trajectory has changed
+            files = trajectory_files.get(instance.instance_id, {})
+            version = self._get_trajectory_version(files)
+            if version and version == instance.trajectory_version:
+                return False
+
+            async with self._read_semaphore:
+                await self._process_trajectory_results(
+                    evaluation, instance, trajectory_exists="trajectory.json" in files
+                )
+
+            # Failed instances are processed again, the failure may not be caused by the trajectory
+            instance.trajectory_version = version if not instance.error else None
+            return True
+
+        processed = await asyncio.gather(*(process_instance(instance) for instance in evaluation.instances))
+        logger.info(
+            f"Processed results for {sum(processed)} of {len(processed)} instances in {evaluation_name}, "
+            f"the others are unchanged"
+        )
 
         all_evaluated = self._is_evaluation_completed(evaluation)
         if all_evaluated and evaluation.status != EvaluationStatus.COMPLETED:
@@ -653,6 +707,37 @@ class EvaluationManager:
         await self._save_evaluation(evaluation)
         return evaluation
 
+    async def _list_trajectory_files(self, evaluation_name: str) -> Optional[dict[str, dict[str, str]]]:
+        """
+        List the files in all trajectories of an evaluation with their versions, in one listing of the storage.
+
+        Returns:
+            A dict of trajectory ids to dicts of file paths, relative to the trajectory, to versions. None if the
+            storage can't list versions.
+        """
+        prefix = f"projects/{evaluation_name}/trajs/"
+        try:
+            versions = await self.storage.list_versions(prefix)
+        except Exception as e:
+            logger.warning(f"Failed to list trajectory versions for {evaluation_name}: {e}")
+            return None
+
+        if versions is None:
+            return None
+
+        trajectory_files: dict[str, dict[str, str]] = {}
+        for path, version in versions.items():
+            trajectory_id, _, file_path = path[len(prefix) :].partition("/")
+            if file_path:
+                trajectory_files.setdefault(trajectory_id, {})[file_path] = version
+        return trajectory_files
+
+    def _get_trajectory_version(self, files: dict[str, str]) -> Optional[str]:
+        """Combine the versions of the files in a trajectory into one version, None if there are no files."""
+        if not files:
+            return None
+        return hashlib.sha256(json.dumps(sorted(files.items())).encode()).hexdigest()[:16]
+
     async def save_evaluation(self, evaluation: Evaluation):
         """Save evaluation metadata to storage."""
         await self._save_evaluation(evaluation)
@@ -660,57 +745,27 @@ class EvaluationManager:
     async def _save_evaluation(self, evaluation: Evaluation):
         """Save evaluation data using project storage."""
         try:
-            eval_dump = evaluation.model_dump()
-            del eval_dump["flow"]
-            await self.storage.write_to_project(
-                "evaluation.json",
-                eval_dump,
-                project_id=evaluation.evaluation_name,
-            )
+            await self._state_store.save(evaluation)
 
             # Mark the evaluation as created in the storage system
             # Use this pattern to avoid linter errors with private attributes
             if hasattr(self.storage, "_created_evaluations"):
                 storage_created_evaluations = getattr(self.storage, "_created_evaluations", set())
                 storage_created_evaluations.add(evaluation.evaluation_name)
-
-            # Also update the evaluation summary for fast lookups
-            await self._update_evaluation_summary(evaluation)
         except Exception as e:
             logger.error(f"Failed to save evaluation {evaluation.evaluation_name}: {e}")
 
-    async def _update_evaluation_summary(self, evaluation: Evaluation):
-        """Update or create a lightweight evaluation summary for the evaluation."""
-        try:
-            summary = EvaluationSummary.from_evaluation(evaluation)
-
-            all_summaries = await self._load_all_summaries()
-            all_summaries[evaluation.evaluation_name] = json.loads(summary.model_dump_json())
+    async def flush(self):
+        """Persist evaluation changes that are written behind."""
+        await self._state_store.flush()
 
-            await self.storage.write("evaluation_summaries.json", all_summaries)
-
-        except Exception as e:
-            logger.error(f"Failed to update evaluation summary for {evaluation.evaluation_name}: {e}")
+    async def close(self):
+        """Persist pending evaluation changes and stop the scheduled flush."""
+        await self._state_store.close()
 
     async def _load_all_summaries(self) -> dict:
-        """Load all evaluation summaries from a single file."""
-        try:
-            if await self.storage.exists("evaluation_summaries.json"):
-                data = await self.storage.read("evaluation_summaries.json")
-                # Handle different return types from storage.read
-                if isinstance(data, dict):
-                    return data
-                elif isinstance(data, str):
-                    return json.loads(data)
-                elif isinstance(data, list):
-                    # Convert list to dict if needed
-                    return {str(i): item for i, item in enumerate(data)}
-                return {}
-            else:
-                return {}
-        except Exception as e:
-            logger.error(f"Failed to load evaluation summaries: {e}")
-            return {}
+        """Load all evaluation summaries, including changes that haven't been flushed yet."""
+        return await self._state_store.load_summaries()
 
     async def list_evaluation_summaries(self) -> list[EvaluationSummary]:
         """List all evaluation summaries."""
@@ -740,13 +795,8 @@ class EvaluationManager:
         )
 
     async def _load_evaluation(self, evaluation_name: str) -> Optional[Evaluation]:
-        """Load evaluation metadata from storage."""
-        if await self.storage.exists_in_project("evaluation.json", project_id=evaluation_name):
-            data = await self.storage.read_from_project("evaluation.json", project_id=evaluation_name)
-            evaluation = Evaluation.model_validate(data)
-            return evaluation
-        else:
-            return None
+        """Load evaluation metadata from the state store, which reads it from storage once."""
+        return await self._state_store.get(evaluation_name)
 
     def get_dataset_instance_ids(self, dataset_name: str) -> list[str]:
         """Get instance IDs for a dataset."""
@@ -898,25 +948,47 @@ class EvaluationManager:
         # Get all instance IDs for this evaluation
         instance_ids = await self.list_evaluation_instances(evaluation_name)
 
-        # Get the instance data for each ID
-        instances = []
-        for instance_id in instance_ids:
+        # Existence and versions of all instance files are known from one listing if the storage supports it
+        trajectory_files = await self._list_trajectory_files(evaluation_name)
+
+        async def load_instance(instance_id: str) -> Optional[EvaluationInstance]:
+            version = None
+            if trajectory_files is not None:
+                version = trajectory_files.get(instance_id, {}).get("instance.json")
+                if version is None:
+                    return None
+
+                # Unchanged instance files are not read again
+                cached = self._instance_cache.get(f"{evaluation_name}/{instance_id}")
+                if cached and cached[0] == version:
+                    self.instance_cache_hits += 1
+                    return cached[1].model_copy(deep=True)
+                self.instance_cache_misses += 1
+
             try:
-                # Try to read the instance data from trajectory storage
-                if await self.storage.exists_in_trajectory(
-                    "instance.json", project_id=evaluation_name, trajectory_id=instance_id
-                ):
+                async with self._read_semaphore:
+                    # Try to read the instance data from trajectory storage
+                    if version is None and not await self.storage.exists_in_trajectory(
+                        "instance.json", project_id=evaluation_name, trajectory_id=instance_id
+                    ):
+                        return None
+
                     instance_data = await self.storage.read_from_trajectory(
                         "instance.json",
                         project_id=evaluation_name,
                         trajectory_id=instance_id,
                     )
-                    instance = EvaluationInstance.model_validate(instance_data)
-                    instances.append(instance)
+                instance = EvaluationInstance.model_validate(instance_data)
             except Exception as e:
                 logger.error(f"Error loading instance {instance_id}: {e}")
+                return None
+
+            if version is not None:
+                self._instance_cache[f"{evaluation_name}/{instance_id}"] = (version, instance.model_copy(deep=True))
+            return instance
 
-        return instances
+        instances = await asyncio.gather(*(load_instance(instance_id) for instance_id in instance_ids))
+        return [instance for instance in instances if instance is not None]
 
     async def _sync_event_timestamps(self, evaluation: Evaluation, instance: EvaluationInstance):
         if instance.started_at and instance.completed_at and instance.start_evaluating_at and instance.evaluated_at:
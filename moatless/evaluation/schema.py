@@ -118,6 +118,9 @@ class EvaluationInstance(BaseModel):
     benchmark_result: Optional[dict[str, Any]] = Field(default=None, description="Benchmark result")
     duration: Optional[float] = Field(default=None, description="Time taken to evaluate in seconds")
     last_event_timestamp: Optional[datetime] = Field(default=None, description="Timestamp of the last event")
+    trajectory_version: Optional[str] = Field(
+        default=None, description="Version of the trajectory files the results were last processed from"
+    )
     resolved_by: Optional[int] = Field(default=None, description="Number of agents that have resolved the evaluation")
 
     issues: List[str] = Field(default_factory=list, description="Issues in the instance")
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+from typing import Any, Optional
+
+from moatless.evaluation.schema import Evaluation, EvaluationSummary
+from moatless.storage.base import BaseStorage
+from moatless.storage.snapshot_journal import JournalConflictError, JournalFormat, SnapshotJournal
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_FILE = "evaluation.json"
+JOURNAL_FILE = "evaluation_journal.jsonl"
+SUMMARIES_FILE = "evaluation_summaries.json"
+
+
+EVALUATION_JOURNAL_FORMAT = JournalFormat(
+    items_field="instances", item_id_field="instance_id", item_record="instance", metadata_record="evaluation"
+)
+
+# Times to merge changes made by other writers before giving up on persisting an evaluation
+MAX_MERGE_ATTEMPTS = 3
+
+# Evaluation fields stored as the evaluation record in the journal, the flow isn't stored with the evaluation
+_METADATA_FIELDS = [name for name in Evaluation.model_fields if name not in ("flow", "instances")]
+
+
+class EvaluationStateStore:
+    """
+    Keeps loaded evaluations in memory and persists them as a snapshot in evaluation.json with changed instances
+    appended to evaluation_journal.jsonl.
+
+    Changes marked with mark_changed are written behind: all changes made within flush_interval_seconds are
+    persisted together, as one journal append per evaluation with the instances that changed since the last
+    persist, and one write of the summary index with the summaries that changed. save persists right away.
+
+    Other API workers and evaluation scripts write the same evaluations. The versions of the snapshot and journal are
+    checked before each write, and if another writer has changed them, the evaluation is reloaded and the instances
+    changed in this process are applied on top before persisting. get reloads evaluations changed by other writers
+    unless they have changes that haven't been persisted yet.
+    """
+
+    def __init__(self, storage: BaseStorage, flush_interval_seconds: float = 1.0, compaction_ratio: float = 1.0):
+        self._storage = storage
+        self.flush_interval_seconds = flush_interval_seconds
+        self._compaction_ratio = compaction_ratio
+
+        self._evaluations: dict[str, Evaluation] = {}
+        self._journals: dict[str, SnapshotJournal] = {}
+        self._summary_fingerprints: dict[str, int] = {}
+        self._dirty: set[str] = set()
+        self._dirty_summaries: set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.summary_writes = 0
+
+    @property
+    def snapshot_writes(self) -> int:
+        return sum(journal.snapshot_writes for journal in self._journals.values())
+
+    @property
+    def journal_appends(self) -> int:
+        return sum(journal.journal_appends for journal in self._journals.values())
+
+    async def get(self, evaluation_name: str) -> Optional[Evaluation]:
+        """
+        Get an evaluation, reading it from storage the first time or when another writer has changed it.
+
+        All callers share the returned instance, changes to it are persisted by the next save or flush.
+        """
+        evaluation = self._evaluations.get(evaluation_name)
+        if evaluation is not None and evaluation_name in self._dirty:
+            return evaluation
+
+        async with self._lock:
+            evaluation = self._evaluations.get(evaluation_name)
+            journal = self._get_journal(evaluation_name)
+            if evaluation is not None and (evaluation_name in self._dirty or await journal.is_current()):
+                return evaluation
+
+            data = await journal.load()
+            if data is None:
+                return evaluation
+
+            loaded = Evaluation.model_validate(data)
+            journal.track(_dump_evaluation(loaded))
+            return self._update_evaluation(evaluation_name, loaded)
+
+    async def save(self, evaluation: Evaluation) -> None:
+        """Persist an evaluation and its summary now."""
+        self._evaluations[evaluation.evaluation_name] = evaluation
+        self._dirty.discard(evaluation.evaluation_name)
+
+        async with self._lock:
+            await self._persist(evaluation)
+            await self._write_summaries({evaluation.evaluation_name})
+
+    def mark_changed(self, evaluation: Evaluation) -> None:
+        """Mark an evaluation as changed, to be persisted with the next flush."""
+        self._evaluations[evaluation.evaluation_name] = evaluation
+        self._dirty.add(evaluation.evaluation_name)
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        """Persist all evaluations marked as changed and their summaries."""
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            for evaluation_name in dirty:
+                try:
+                    await self._persist(self._evaluations[evaluation_name])
+                except Exception:
+                    logger.exception(f"Failed to persist evaluation {evaluation_name}")
+                    self._dirty.add(evaluation_name)
+
+            await self._write_summaries(dirty)
+
+    async def close(self) -> None:
+        """Flush pending changes and stop the scheduled flush."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def load_summaries(self) -> dict:
+        """Load the summary index, with the summaries of evaluations that haven't been flushed yet."""
+        summaries = await self._read_summaries()
+        for evaluation_name in self._dirty | self._dirty_summaries:
+            summary = EvaluationSummary.from_evaluation(self._evaluations[evaluation_name])
+            summaries[evaluation_name] = json.loads(summary.model_dump_json())
+        return summaries
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval_seconds)
+        except asyncio.CancelledError:
+            return
+
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to flush evaluations")
+
+    async def _persist(self, evaluation: Evaluation) -> None:
+        evaluation_name = evaluation.evaluation_name
+        journal = self._get_journal(evaluation_name)
+
+        for _ in range(MAX_MERGE_ATTEMPTS):
+            try:
+                await journal.persist(_dump_evaluation(evaluation))
+                self._dirty_summaries.add(evaluation_name)
+                return
+            except JournalConflictError:
+                logger.info(f"Evaluation {evaluation_name} was changed by another writer, merging the changes")
+                await self._merge(evaluation, journal)
+
+        raise JournalConflictError(f"Evaluation {evaluation_name} kept being changed by other writers while persisting")
+
+    async def _merge(self, evaluation: Evaluation, journal: SnapshotJournal) -> None:
+        """
+        Reload the evaluation and apply the changes made in this process since it was last loaded or persisted.
+
+        Instances changed both here and by another writer get the version from this process.
+        """
+        data = _dump_evaluation(evaluation)
+        changed_instances, metadata_changed = journal.changes(data)
+
+        latest_data = await journal.load()
+        if latest_data is None:
+            # Removed by another writer, the next persist writes a new snapshot
+            return
+
+        latest = Evaluation.model_validate(latest_data)
+        journal.track(_dump_evaluation(latest))
+
+        instances = {instance.instance_id: instance for instance in latest.instances}
+        for instance in evaluation.instances:
+            if instance.instance_id in changed_instances:
+                instances[instance.instance_id] = instance
+        latest.instances = list(instances.values())
+
+        if metadata_changed:
+            for field_name in _METADATA_FIELDS:
+                setattr(latest, field_name, getattr(evaluation, field_name))
+
+        self._update_evaluation(evaluation.evaluation_name, latest)
+
+    def _update_evaluation(self, evaluation_name: str, loaded: Evaluation) -> Evaluation:
+        """Set the loaded evaluation, updating the shared instance in place if callers already hold it."""
+        evaluation = self._evaluations.get(evaluation_name)
+        if evaluation is None:
+            self._evaluations[evaluation_name] = loaded
+            return loaded
+
+        for field_name in [*_METADATA_FIELDS, "instances"]:
+            setattr(evaluation, field_name, getattr(loaded, field_name))
+        return evaluation
+
+    def _get_journal(self, evaluation_name: str) -> SnapshotJournal:
+        journal = self._journals.get(evaluation_name)
+        if journal is None:
+            project_path = self._storage.get_project_path(evaluation_name)
+            journal = SnapshotJournal(
+                self._storage,
+                EVALUATION_JOURNAL_FORMAT,
+                snapshot_path=f"{project_path}/{EVALUATION_FILE}",
+                journal_path=f"{project_path}/{JOURNAL_FILE}",
+                # Covers both evaluation.json and evaluation_journal.jsonl
+                version_prefix=f"{project_path}/evaluation",
+                compaction_ratio=self._compaction_ratio,
+            )
+            self._journals[evaluation_name] = journal
+        return journal
+
+    async def _write_summaries(self, evaluation_names: set[str]) -> None:
+        """Update the summaries of the given evaluations in the summary index, if any of them changed."""
+        changed = {}
+        for evaluation_name in evaluation_names & self._dirty_summaries:
+            summary = EvaluationSummary.from_evaluation(self._evaluations[evaluation_name])
+            summary_data = json.loads(summary.model_dump_json())
+            fingerprint = hash(json.dumps(summary_data, sort_keys=True))
+            if self._summary_fingerprints.get(evaluation_name) != fingerprint:
+                changed[evaluation_name] = (summary_data, fingerprint)
+
+        if not changed:
+            self._dirty_summaries -= evaluation_names
+            return
+
+        try:
+            # Other processes update the index too, so merge into the latest version
+            all_summaries = await self._read_summaries()
+            all_summaries.update({name: summary_data for name, (summary_data, _) in changed.items()})
+            await self._storage.write(SUMMARIES_FILE, all_summaries)
+            self.summary_writes += 1
+        except Exception as e:
+            logger.error(f"Failed to update evaluation summaries for {', '.join(changed)}: {e}")
+            return
+
+        for name, (_, fingerprint) in changed.items():
+            self._summary_fingerprints[name] = fingerprint
+        self._dirty_summaries -= evaluation_names
+
+    async def _read_summaries(self) -> dict:
+        """Load all evaluation summaries from a single file."""
+        try:
+            if await self._storage.exists(SUMMARIES_FILE):
+                data = await self._storage.read(SUMMARIES_FILE)
+                # Handle different return types from storage.read
+                if isinstance(data, dict):
+                    return data
+                elif isinstance(data, str):
+                    return json.loads(data)
+                elif isinstance(data, list):
+                    # Convert list to dict if needed
+                    return {str(i): item for i, item in enumerate(data)}
+                return {}
+            else:
+                return {}
+        except Exception as e:
+            logger.error(f"Failed to load evaluation summaries: {e}")
+            return {}
+
+
+def _dump_evaluation(evaluation: Evaluation) -> dict[str, Any]:
+    # The flow is stored separately in flow.json
+    data = evaluation.model_dump(mode="json")
+    data.pop("flow", None)
+    return data
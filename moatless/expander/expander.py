@@ -55,4 +55,4 @@ class Expander(MoatlessComponent):
             node.add_child(child_node)
 
     def _generate_unique_id(self, node: Node):
-        return len(node.get_root().get_all_nodes())
+        return node.get_root().node_count()
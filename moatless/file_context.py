@@ -11,7 +11,7 @@ from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from unidiff import PatchSet
 
 from moatless.artifacts.artifact import ArtifactChange
-from moatless.codeblocks import CodeBlockType, get_parser_by_path
+from moatless.codeblocks import CodeBlockType
 from moatless.codeblocks.codeblocks import (
     BlockSpan,
     CodeBlock,
@@ -20,6 +20,7 @@ from moatless.codeblocks.codeblocks import (
     SpanType,
 )
 from moatless.codeblocks.module import Module
+from moatless.codeblocks.parse_cache import parse_module
 from moatless.repository import FileRepository
 from moatless.repository.git import GitRepository
 from moatless.repository.repository import Repository
@@ -79,6 +80,7 @@ class ContextFile(BaseModel):
     _cached_base_content: Optional[str] = PrivateAttr(None)
     _cached_content: Optional[str] = PrivateAttr(None)
     _cached_module: Optional[Module] = PrivateAttr(None)
+    _cached_prompts: dict[tuple, tuple[tuple, str]] = PrivateAttr(default_factory=dict)
 
     _repo: Repository = PrivateAttr()
 
@@ -184,10 +186,7 @@ class ContextFile(BaseModel):
         if self._cached_module is not None:
             return self._cached_module
 
-        parser = get_parser_by_path(self.file_path)
-        if parser:
-            self._cached_module = parser.parse(self.content)
-
+        self._cached_module = parse_module(self.file_path, self.content)
         return self._cached_module
 
     @property
@@ -771,6 +770,41 @@ class ContextFile(BaseModel):
         only_signatures: bool = False,
         max_tokens: Optional[int] = None,
     ):
+        # The prompt is cached per set of arguments until the content or the spans of the file change
+        prompt_args = (
+            show_span_ids,
+            show_line_numbers,
+            exclude_comments,
+            show_outcommented_code,
+            outcomment_code_comment,
+            show_all_spans,
+            only_signatures,
+            max_tokens,
+        )
+        state = self._prompt_state()
+        cached = self._cached_prompts.get(prompt_args)
+        if cached and cached[0] == state:
+            return cached[1]
+
+        result = self._render_prompt(*prompt_args)
+        self._cached_prompts[prompt_args] = (state, result)
+        return result
+
+    def _prompt_state(self) -> tuple:
+        spans = tuple((span.span_id, span.start_line, span.end_line, span.tokens) for span in self.spans)
+        return self.content, self.show_all_spans, spans
+
+    def _render_prompt(
+        self,
+        show_span_ids: bool,
+        show_line_numbers: bool,
+        exclude_comments: bool,
+        show_outcommented_code: bool,
+        outcomment_code_comment: str,
+        show_all_spans: bool,
+        only_signatures: bool,
+        max_tokens: Optional[int],
+    ) -> str:
         if self.module:
             if not self.show_all_spans and self.span_ids is not None and len(self.span_ids) == 0:
                 logger.warning(f"No span ids provided for {self.file_path}, return empty")
@@ -1172,6 +1206,15 @@ class ContextFile(BaseModel):
         """
         return self._is_new
 
+    def clone(self) -> "ContextFile":
+        """
+        Returns a copy of the file with its own spans that shares the cached base content, content and parsed
+        module with this file.
+        """
+        cloned_file = self.model_copy(update={"spans": [span.model_copy() for span in self.spans]})
+        cloned_file._cached_prompts = dict(self._cached_prompts)
+        return cloned_file
+
     def model_dump(self, **kwargs):
         """Override model_dump to ensure patch is always included."""
         dump = super().model_dump(**kwargs)
@@ -1182,6 +1225,14 @@ class ContextFile(BaseModel):
 
 
 class FileContext(BaseModel):
+    """
+    The files and spans in context for a node.
+
+    Clones share the context files that haven't been changed with the context they were cloned from. A shared file
+    is copied the first time it's returned to a caller that may change it, from get_context_file(), add_file() or
+    the files property, so cloning only copies the files that were edited or viewed in the cloned context.
+    """
+
     show_code_blocks: bool = Field(
         False,
         description="Whether to show the parsed code blocks in the response or just the line span.",
@@ -1191,6 +1242,7 @@ class FileContext(BaseModel):
 
     _files: dict[str, ContextFile] = PrivateAttr(default_factory=dict)
     _test_files: dict[str, TestFile] = PrivateAttr(default_factory=dict)  # Changed to Dict
+    _shared_files: set[str] = PrivateAttr(default_factory=set)
     _max_tokens: int = PrivateAttr(default=8000)
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -1212,12 +1264,15 @@ class FileContext(BaseModel):
         if "_test_files" not in self.__dict__:
             self.__dict__["_test_files"] = {}
 
+        if "_shared_files" not in self.__dict__:
+            self.__dict__["_shared_files"] = set()
+
         if "_max_tokens" not in self.__dict__:
             self.__dict__["_max_tokens"] = data.get("max_tokens", 8000)
 
     def __setattr__(self, name: str, value):
         """Override __setattr__ to handle private attributes properly."""
-        if name in ("_files", "_test_files", "_max_tokens"):
+        if name in ("_files", "_test_files", "_shared_files", "_max_tokens"):
             # Handle the private attributes that are managed via __dict__
             self.__dict__[name] = value
         else:
@@ -1285,6 +1340,7 @@ class FileContext(BaseModel):
                 patch=file_data.get("patch"),
                 repo=self._repo,
             )
+            self._shared_files.discard(file_path)
 
         # Load test files
         if test_files:
@@ -1317,8 +1373,9 @@ class FileContext(BaseModel):
     @repository.setter
     def repository(self, repo: Repository):
         self._repo = repo
-        for file in self._files.values():
-            file._repo = repo
+        for file_path, file in self._files.items():
+            if file._repo is not repo:
+                self._get_file_for_update(file_path)._repo = repo
 
     @property
     def workspace(self):
@@ -1349,18 +1406,19 @@ class FileContext(BaseModel):
             if add_extra:
                 self._files[file_path]._add_import_span()
 
-        return self._files[file_path]
+        return self._get_file_for_update(file_path)
 
     def add_file_with_lines(self, file_path: str, start_line: int, end_line: Optional[int] = None):
         end_line = end_line or start_line
         if file_path not in self._files:
             self.add_file(file_path)
 
-        self._files[file_path].add_line_span(start_line, end_line)
+        self._get_file_for_update(file_path).add_line_span(start_line, end_line)
 
     def remove_file(self, file_path: str):
         if file_path in self._files:
             del self._files[file_path]
+            self._shared_files.discard(file_path)
 
     def remove_files(self, file_paths: list[str]) -> dict[str, bool]:
         """
@@ -1376,6 +1434,7 @@ class FileContext(BaseModel):
         for file_path in file_paths:
             if file_path in self._files:
                 del self._files[file_path]
+                self._shared_files.discard(file_path)
                 removal_results[file_path] = True
             else:
                 removal_results[file_path] = False
@@ -1390,6 +1449,7 @@ class FileContext(BaseModel):
 
     @property
     def files(self):
+        """The files in context for reading, they may be shared with clones so use get_context_file() to change one."""
         return list(self._files.values())
 
     @property
@@ -1474,7 +1534,7 @@ class FileContext(BaseModel):
         if self._repo and hasattr(self._repo, "get_relative_path"):
             file_path = self.repository.get_relative_path(file_path)
 
-        context_file = self._files.get(file_path)
+        context_file = self._get_file_for_update(file_path)
 
         if not context_file:
             if not self.repository.file_exists(file_path):
@@ -1490,31 +1550,46 @@ class FileContext(BaseModel):
 
         return context_file
 
+    def _get_file_for_update(self, file_path: str) -> Optional[ContextFile]:
+        """Returns the context file, copied first if it's shared with another context."""
+        context_file = self._files.get(file_path)
+        if context_file is not None and file_path in self._shared_files:
+            context_file = context_file.clone()
+            self._files[file_path] = context_file
+            self._shared_files.discard(file_path)
+        return context_file
+
     def get_context_files(self) -> list[ContextFile]:
         """
-        Returns all context files that exist in the repository.
+        Returns all context files that exist in the repository. The files may be shared with clones, use
+        get_context_file() to get a file to change.
 
         Returns:
             list[ContextFile]: A list of all context files
         """
-        file_paths = list(self._files.keys())
-        result = []
-        for file_path in file_paths:
-            context_file = self.get_context_file(file_path)
-            if context_file is not None:
-                result.append(context_file)
-        return result
+        return list(self._files.values())
 
     def context_size(self):
+        """
+        Returns the number of tokens in the prompt for the files in context.
+
+        The tokens are counted per file. The prompt and its token count are cached in each file until its content
+        or spans change, so only files that changed since the last call are rendered and tokenized. File prompts
+        end with a newline that the blank line between files is merged into, so the separators add no tokens.
+        """
         if self._repo:
-            content = self.create_prompt(
-                show_span_ids=False,
-                show_line_numbers=True,
-                show_outcommented_code=True,
-                outcomment_code_comment="...",
-                only_signatures=False,
-            )
-            return count_tokens(content)
+            tokens = 0
+            for context_file in list(self._files.values()):
+                content = context_file.to_prompt(
+                    show_span_ids=False,
+                    show_line_numbers=True,
+                    show_outcommented_code=True,
+                    outcomment_code_comment="...",
+                    only_signatures=False,
+                )
+                if content:
+                    tokens += count_tokens(content)
+            return tokens
 
         # TODO: This doesnt give accure results. Will count tokens in the generated prompt instead
         # sum(file.context_size() for file in self._files.values())
@@ -1529,6 +1604,7 @@ class FileContext(BaseModel):
 
     def reset(self):
         self._files = {}
+        self._shared_files = set()
 
     def is_empty(self):
         return not self._files
@@ -1550,7 +1626,7 @@ class FileContext(BaseModel):
         file_contexts = []
         current_tokens = 0
 
-        for context_file in self.get_context_files():
+        for context_file in list(self._files.values()):
             if not files or context_file.file_path in files:
                 content = context_file.to_prompt(
                     show_span_ids,
@@ -1575,9 +1651,23 @@ class FileContext(BaseModel):
         return "\n\n".join(file_contexts)
 
     def clone(self):
-        dump = self.model_dump(exclude={"files": {"__all__": {"was_edited", "was_viewed"}}})
-        cloned_context = FileContext(repo=self._repo, runtime=self._runtime)
-        cloned_context.load_files_from_dict(files=dump.get("files", []), test_files=dump.get("test_files", []))
+        cloned_context = FileContext(repo=self._repo, runtime=self._runtime, max_tokens=self._max_tokens)
+
+        for file_path, context_file in self._files.items():
+            if context_file.was_edited or context_file.was_viewed:
+                # The edited and viewed flags are tracked per context and not copied to the clone
+                cloned_file = context_file.clone()
+                cloned_file.was_edited = False
+                cloned_file.was_viewed = False
+                cloned_context._files[file_path] = cloned_file
+            else:
+                cloned_context._files[file_path] = context_file
+                cloned_context._shared_files.add(file_path)
+                self._shared_files.add(file_path)
+
+        cloned_context._test_files = {
+            file_path: test_file.model_copy(deep=True) for file_path, test_file in self._test_files.items()
+        }
         return cloned_context
 
     def has_patch(self, ignore_tests: bool = False):
@@ -1737,6 +1827,8 @@ class FileContext(BaseModel):
             if old_file is None:
                 logger.info(f"File {file_path} is new")
                 diff_context._files[file_path] = current_file
+                diff_context._shared_files.add(file_path)
+                self._shared_files.add(file_path)
             else:
                 current_spans = current_file.span_ids
                 old_spans = old_file.span_ids
@@ -1827,6 +1919,52 @@ class FileContext(BaseModel):
 
         return added_new_spans
 
+    def add_context_changes(self, old_context: "FileContext", new_context: "FileContext") -> bool:
+        """
+        Adds the files and spans added to new_context since it was cloned from old_context, to merge the changes of
+        actions run concurrently on clones of the same context. Span tokens and pinning changed in new_context are
+        copied to existing spans.
+
+        Args:
+            old_context: The context new_context was cloned from
+            new_context: The context with the changes to add
+
+        Returns:
+            bool: True if any files or spans were added
+        """
+        added = False
+
+        for file_path, new_file in new_context._files.items():
+            old_file = old_context._files.get(file_path)
+            if new_file is old_file:
+                # Shared with the old context and not changed
+                continue
+
+            context_file = self._get_file_for_update(file_path)
+            if context_file is None:
+                self._files[file_path] = new_file.clone()
+                added = True
+                continue
+
+            if new_file.show_all_spans and not context_file.show_all_spans:
+                context_file.show_all_spans = True
+                added = True
+
+            old_spans = {span.span_id: span for span in old_file.spans} if old_file else {}
+            existing_spans = {span.span_id: span for span in context_file.spans}
+            for span in new_file.spans:
+                existing_span = existing_spans.get(span.span_id)
+                if existing_span is None:
+                    context_file.spans.append(span.model_copy())
+                    added = True
+                elif span != old_spans.get(span.span_id):
+                    existing_span.tokens = span.tokens
+                    existing_span.pinned = span.pinned
+
+            context_file.was_viewed = context_file.was_viewed or new_file.was_viewed
+
+        return added
+
     def span_count(self) -> int:
         """
         Returns the total number of span IDs across all files in the context.
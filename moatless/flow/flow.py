@@ -21,6 +21,7 @@ from moatless.events import (
     FlowStartedEvent,
 )
 from moatless.flow.schema import FlowStatus
+from moatless.flow.trajectory_journal import read_trajectory_data
 from moatless.node import Node
 from moatless.repository.repository import Repository
 from moatless.workspace import Workspace
@@ -199,10 +200,7 @@ class AgenticFlow(MoatlessComponent):
 
     def get_node_by_id(self, node_id: int) -> Node | None:
         """Get a node by its ID."""
-        return next(
-            (node for node in self.root.get_all_nodes() if node.node_id == node_id),
-            None,
-        )
+        return self.root.get_node_by_id(node_id)
 
     def total_usage(self) -> Usage:
         """Calculate total token usage across all nodes."""
@@ -210,7 +208,7 @@ class AgenticFlow(MoatlessComponent):
 
     @property
     def status(self) -> FlowStatus:
-        if self.root.get_all_nodes()[-1].error:
+        if self.root.get_last_node().error:
             return FlowStatus.ERROR
         if self.is_finished():
             return FlowStatus.COMPLETED
@@ -226,26 +224,27 @@ class AgenticFlow(MoatlessComponent):
             logger.info(f"Flow {self.trajectory_id} finished due to max cost {total_cost} >= {self.max_cost}")
             return "max_cost"
 
-        nodes = self.root.get_all_nodes()
-        if len(nodes) >= self.max_iterations:
+        node_count = self.root.node_count()
+        if node_count >= self.max_iterations:
             logger.info(
-                f"Flow {self.trajectory_id} finished due to max iterations {len(nodes)} >= {self.max_iterations}"
+                f"Flow {self.trajectory_id} finished due to max iterations {node_count} >= {self.max_iterations}"
             )
             return "max_iterations"
 
+        last_node = self.root.get_last_node()
         if (
-            nodes[-1].action_steps
-            and nodes[-1].action_steps[-1].observation
-            and nodes[-1].action_steps[-1].observation.terminal
+            last_node.action_steps
+            and last_node.action_steps[-1].observation
+            and last_node.action_steps[-1].observation.terminal
         ):
-            logger.info(f"Flow {self.trajectory_id} finished due to terminal node {nodes[-1].node_id}")
+            logger.info(f"Flow {self.trajectory_id} finished due to terminal node {last_node.node_id}")
             return "terminal"
 
         return None
 
     def _generate_unique_id(self) -> int:
         """Generate a unique ID for a new node."""
-        return len(self.root.get_all_nodes())
+        return self.root.node_count()
 
     def log(self, logger_fn: Callable, message: str, **kwargs):
         """Log a message with metadata."""
@@ -309,7 +308,7 @@ class AgenticFlow(MoatlessComponent):
         from moatless.settings import get_storage
 
         storage = await get_storage()
-        traj_dict = await storage.read_from_trajectory("trajectory.json", project_id, trajectory_id)
+        traj_dict = await read_trajectory_data(storage, project_id, trajectory_id)
         if not traj_dict:
             raise ValueError("Trajectory not found")
 
@@ -323,13 +322,13 @@ class AgenticFlow(MoatlessComponent):
 
         return cls.from_dicts(flow_dict, traj_dict)
 
-    def get_trajectory_data(self) -> dict:
-        """Get trajectory data for persistence."""
+    def get_trajectory_data(self, nodes: Optional[list[Node]] = None) -> dict:
+        """Get trajectory data for persistence, with all nodes or only the given nodes."""
         return {
             "trajectory_id": self.trajectory_id,
             "project_id": self.project_id,
             "metadata": self.metadata,
-            "nodes": self.root.dump_as_list(exclude_none=True, exclude_unset=True),
+            "nodes": self.root.dump_as_list(nodes, exclude_none=True, exclude_unset=True),
         }
 
     def get_flow_settings(self) -> dict:
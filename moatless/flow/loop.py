@@ -31,7 +31,7 @@ class AgenticLoop(AgenticFlow):
         finish_reason = None
         while node_id or not (finish_reason := self.is_finished()):
             total_cost = self.total_usage().completion_cost
-            iteration = len(self.root.get_all_nodes())
+            iteration = self.root.node_count()
 
             self.log(
                 logger.info,
@@ -66,7 +66,7 @@ class AgenticLoop(AgenticFlow):
                 break
 
         logger.info(
-            f"Loop finished with {len(self.root.get_all_nodes())} iterations and {self.total_usage().completion_cost} cost"
+            f"Loop finished with {self.root.node_count()} iterations and {self.total_usage().completion_cost} cost"
         )
 
         return self.get_last_node(), finish_reason
@@ -87,15 +87,14 @@ class AgenticLoop(AgenticFlow):
         if self.max_cost and self.total_usage().completion_cost and total_cost >= self.max_cost:
             return "max_cost"
 
-        nodes = self.root.get_all_nodes()
-        if len(nodes) >= self.max_iterations:
+        if self.root.node_count() >= self.max_iterations:
             return "max_iterations"
 
-        if nodes[-1].is_terminal():
+        if self.root.get_last_node().is_terminal():
             return "terminal"
 
         return None
 
     def get_last_node(self) -> Node:
         """Get the last node in the action sequence."""
-        return self.root.get_all_nodes()[-1]
+        return self.root.get_last_node()
@@ -28,6 +28,7 @@ from moatless.flow.schema import (
     StartTrajectoryRequest,
     FlowStatus,
 )
+from moatless.flow.trajectory_journal import read_trajectory_data
 from moatless.flow.trajectory_tree import create_node_tree
 from moatless.index.code_index import CodeIndex
 from moatless.node import ActionStep, Node
@@ -401,7 +402,7 @@ class FlowManager:
             await self._storage.assert_exists_in_trajectory("trajectory.json", project_id, trajectory_id)
 
         if trajectory_id:
-            trajectory_data = await self._storage.read_from_trajectory("trajectory.json", project_id, trajectory_id)
+            trajectory_data = await read_trajectory_data(self._storage, project_id, trajectory_id)
             try:
                 settings_data = await self._storage.read_from_trajectory("flow.json", project_id, trajectory_id)
             except Exception:
@@ -430,7 +431,7 @@ class FlowManager:
         await self._storage.assert_exists_in_trajectory("trajectory.json", project_id, trajectory_id)
 
         try:
-            trajectory_data = await self._storage.read_from_trajectory("trajectory.json", project_id, trajectory_id)
+            trajectory_data = await read_trajectory_data(self._storage, project_id, trajectory_id)
 
             try:
                 settings_data = await self._storage.read_from_trajectory("flow.json", project_id, trajectory_id)
@@ -780,7 +781,7 @@ class FlowManager:
     async def read_trajectory_node(self, project_id: str, trajectory_id: str) -> Node:
         await self._storage.assert_exists_in_trajectory("trajectory.json", project_id, trajectory_id)
 
-        trajectory_data = await self._storage.read_from_trajectory("trajectory.json", project_id, trajectory_id)
+        trajectory_data = await read_trajectory_data(self._storage, project_id, trajectory_id)
 
         node = Node.from_dict(trajectory_data)
         logger.info(f"Read trajectory node {node.node_id} with {len(node.get_all_nodes())} children")
@@ -19,7 +19,7 @@ class OneOffFlow(AgenticFlow):
     async def _run(self, message: str | None = None, node_id: int | None = None) -> tuple[Node, str | None]:
         """Run the agentic loop until completion or max iterations."""
 
-        current_node = self.root.get_all_nodes()[-1]
+        current_node = self.root.get_last_node()
 
         if message:  # Assume to continue with a new node if a message is provided
             current_node = self._create_next_node(current_node)
@@ -41,4 +41,4 @@ class OneOffFlow(AgenticFlow):
 
     def get_last_node(self) -> Node:
         """Get the last node in the action sequence."""
-        return self.root.get_all_nodes()[-1]
+        return self.root.get_last_node()
@@ -12,6 +12,7 @@ from moatless.context_data import current_project_id, current_trajectory_id
 from moatless.environment.local import LocalBashEnvironment
 from moatless.events import BaseEvent
 from moatless.flow.flow import AgenticFlow
+from moatless.flow.trajectory_journal import TrajectoryJournal, read_trajectory_data
 from moatless.index.code_index import CodeIndex
 from moatless.repository.git import GitRepository
 from moatless.runner.utils import (
@@ -20,7 +21,7 @@ from moatless.runner.utils import (
     setup_job_logging,
 )
 from moatless.runtime.runtime import RuntimeEnvironment
-from moatless.settings import get_storage
+from moatless.settings import get_storage, setup_completion_cache, setup_rate_limiter
 from moatless.workspace import Workspace
 
 logger = logging.getLogger(__name__)
@@ -28,6 +29,7 @@ logger = logging.getLogger(__name__)
 
 _flow_lock = asyncio.Lock()
 _pending_event_tasks = set()
+_trajectory_journals: dict[tuple[str, str], TrajectoryJournal] = {}
 
 
 async def setup_flow(project_id: str, trajectory_id: str) -> AgenticFlow:
@@ -39,6 +41,8 @@ async def setup_flow(project_id: str, trajectory_id: str) -> AgenticFlow:
     current_trajectory_id.set(trajectory_id)
 
     litellm.callbacks = [LogHandler(storage=storage)]
+    await setup_completion_cache()
+    setup_rate_limiter()
 
     logger.info(f"setup_flow(project_id: {project_id}, trajectory_id: {trajectory_id})")
 
@@ -53,9 +57,7 @@ async def setup_flow(project_id: str, trajectory_id: str) -> AgenticFlow:
     else:
         logger.info(f"Settings found in trajectory")
 
-    trajectory_dict: dict | None = await storage.read_from_trajectory(
-        path="trajectory.json", trajectory_id=trajectory_id, project_id=project_id
-    )  # type: ignore
+    trajectory_dict = await read_trajectory_data(storage, project_id=project_id, trajectory_id=trajectory_id)
     flow = AgenticFlow.from_dicts(settings=settings, trajectory=trajectory_dict)
 
     async def on_event(event: BaseEvent) -> None:
@@ -142,14 +144,37 @@ async def setup_workspace(project_id: str, trajectory_id: str) -> Workspace:
     )
 
 
-async def persist_trajectory_data(flow: AgenticFlow) -> None:
+async def persist_trajectory_data(flow: AgenticFlow, compact: bool = True) -> None:
+    """
+    Persist the trajectory, with compact=False only the nodes that changed since the trajectory was last persisted are
+    serialized and appended to the trajectory journal.
+    """
     storage = await get_storage()
 
-    trajectory_data = flow.get_trajectory_data()
-    await storage.write_to_trajectory("trajectory.json", trajectory_data, flow.project_id, flow.trajectory_id)
-    logger.info(
-        f"Trajectory data with {len(trajectory_data['nodes'])} nodes written to {flow.project_id}/{flow.trajectory_id}/trajectory.json"
-    )
+    key = (flow.project_id, flow.trajectory_id)
+    if key not in _trajectory_journals:
+        _trajectory_journals[key] = TrajectoryJournal(storage, flow.project_id, flow.trajectory_id)
+    journal = _trajectory_journals[key]
+
+    changed_nodes = flow.root.pop_changed_nodes()
+    try:
+        appended = None
+        if not compact:
+            appended = await journal.append(flow.get_trajectory_data(changed_nodes))
+
+        if appended is not None:
+            logger.info(f"Appended {appended} records to trajectory journal of {flow.project_id}/{flow.trajectory_id}")
+        else:
+            trajectory_data = flow.get_trajectory_data()
+            await journal.persist(trajectory_data, compact=True)
+            logger.info(
+                f"Trajectory data with {len(trajectory_data['nodes'])} nodes written to {flow.project_id}/{flow.trajectory_id}/trajectory.json"
+            )
+    except Exception:
+        # Persist the nodes with the next call instead
+        for node in changed_nodes:
+            node.mark_changed()
+        raise
 
 
 async def handle_flow_event(flow: AgenticFlow, event: BaseEvent) -> None:
@@ -169,9 +194,11 @@ async def handle_flow_event(flow: AgenticFlow, event: BaseEvent) -> None:
     async def process_event_task():
         try:
             async with _flow_lock:
-                if (event.scope == "node" and event.event_type == "expanded") or event.scope == "flow":
+                if event.scope == "node" and event.event_type == "expanded":
+                    await persist_trajectory_data(flow, compact=False)
+                    logger.info(f"Event {event.scope}:{event.event_type}. Trajectory journal updated.")
+                elif event.scope == "flow":
                     await persist_trajectory_data(flow)
-
                     logger.info(
                         f"Event {event.scope}:{event.event_type}. Trajectory data written to {flow.project_id}/{flow.trajectory_id}/trajectory.json. "
                     )
@@ -230,7 +257,9 @@ async def run_flow(project_id: str, trajectory_id: str, node_id: int | None = No
         )
         raise e
     finally:
+        _trajectory_journals.pop((project_id, trajectory_id), None)
         cleanup_job_logging(original_handlers)
 
         trajectory_key = storage.get_trajectory_path(project_id=project_id, trajectory_id=trajectory_id)
         await storage.write_raw(f"{trajectory_key}/logs/{log_path.name}", log_path.read_text())
+        await storage.flush()
@@ -1,9 +1,10 @@
+import asyncio
 import logging
 from collections.abc import Callable
 from typing import Any, Dict, Optional
 
 from opentelemetry import trace
-from pydantic import ConfigDict, Field, model_validator
+from pydantic import ConfigDict, Field, PrivateAttr, model_validator
 
 from moatless.agent.agent import ActionAgent
 from moatless.completion.stats import Usage
@@ -53,6 +54,13 @@ class SearchTree(AgenticFlow):
         None, description="The min reward threshold to consider before finishing."
     )
     max_depth: Optional[int] = Field(None, description="The maximum depth for one trajectory in simulations.")
+    max_concurrent_simulations: int = Field(
+        1,
+        description="The maximum number of nodes to simulate and evaluate concurrently. Only used when the agent runs "
+        "in shadow mode, actions that are not read-only are still executed one at a time.",
+    )
+
+    _in_flight: dict[int, Node] = PrivateAttr(default_factory=dict)
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -72,6 +80,7 @@ class SearchTree(AgenticFlow):
         max_finished_nodes: Optional[int] = None,
         reward_threshold: Optional[float] = None,
         max_depth: Optional[int] = None,
+        max_concurrent_simulations: int = 1,
         **kwargs,
     ):
         expander = expander or Expander(max_expansions=max_expansions)  # type: ignore
@@ -89,6 +98,7 @@ class SearchTree(AgenticFlow):
             max_finished_nodes=max_finished_nodes,
             reward_threshold=reward_threshold,
             max_depth=max_depth,
+            max_concurrent_simulations=max_concurrent_simulations,
             **kwargs,
         )
 
@@ -100,10 +110,10 @@ class SearchTree(AgenticFlow):
 
         self.log(logger.info, generate_ascii_tree(self.root))
 
-        if len(self.root.get_all_nodes()) > 1:
+        if self.root.node_count() > 1:
             self.log(
                 logger.info,
-                f"Restarting search tree with {len(self.root.get_all_nodes())} nodes",
+                f"Restarting search tree with {self.root.node_count()} nodes",
             )
 
         if node_id:
@@ -113,54 +123,65 @@ class SearchTree(AgenticFlow):
         else:
             node = self.root
 
-        finish_reason = None
-        while node_id or not (finish_reason := self.is_finished()):
-            total_cost = self.total_usage().completion_cost
+        concurrent = self.max_concurrent_simulations > 1 and not node_id
+        if concurrent and not self.agent.shadow_mode:
             self.log(
-                logger.info,
-                f"Run iteration {len(self.root.get_all_nodes())}",
-                cost=total_cost,
+                logger.warning,
+                "Simulations share one workspace and are only run concurrently in shadow mode, running them one by one.",
             )
+            concurrent = False
 
-            node = await self._select(node)
+        if concurrent:
+            finish_reason = await self._run_concurrently(node)
+        else:
+            finish_reason = None
+            while node_id or not (finish_reason := self.is_finished()):
+                total_cost = self.total_usage().completion_cost
+                self.log(
+                    logger.info,
+                    f"Run iteration {self.root.node_count()}",
+                    cost=total_cost,
+                )
 
-            if node:
-                new_node = await self._expand(node)
-                if new_node:
-                    await self._simulate(new_node)
-                    self._backpropagate(new_node)
-                    node = new_node
-                else:
-                    self.log(logger.warning, f"No node expanded from Node{node.node_id}")
-                    await self._emit_event(
-                        FlowErrorEvent(
-                            node_id=node.node_id,
-                            error="No node expanded",
+                node = await self._select(node)
+
+                if node:
+                    new_node = await self._expand(node)
+                    if new_node:
+                        await self._simulate(new_node)
+                        self._backpropagate(new_node)
+                        node = new_node
+                    else:
+                        self.log(logger.warning, f"No node expanded from Node{node.node_id}")
+                        await self._emit_event(
+                            FlowErrorEvent(
+                                node_id=node.node_id,
+                                error="No node expanded",
+                            )
                         )
-                    )
-                    break
+                        break
 
-                self.log(logger.info, generate_ascii_tree(self.root, node))
+                    self.log(logger.info, generate_ascii_tree(self.root, node))
 
-            else:
-                self.log(logger.info, "Search complete: no more nodes to expand.")
-                finish_reason = "no_selectable_nodes"
-                break
+                else:
+                    self.log(logger.info, "Search complete: no more nodes to expand.")
+                    finish_reason = "no_selectable_nodes"
+                    break
 
-            if node_id:
-                self.log(logger.info, f"Node{node.node_id} finished. Returning.")
-                break
+                if node_id:
+                    self.log(logger.info, f"Node{node.node_id} finished. Returning.")
+                    break
 
         finished_nodes = len(self.get_finished_nodes())
         if not finished_nodes:
             self.log(
                 logger.warning,
-                f"Search completed with no finished nodes. {len(self.root.get_all_nodes())} nodes created. Finish reason: {finish_reason}",
+                f"Search completed with no finished nodes. {self.root.node_count()} nodes created. Finish reason: {finish_reason}",
             )
         else:
             self.log(
                 logger.info,
-                f"Search completed with {finished_nodes} finished nodes. {len(self.root.get_all_nodes())} nodes created. Finish reason: {finish_reason}",
+                f"Search completed with {finished_nodes} finished nodes. {self.root.node_count()} nodes created. Finish reason: {finish_reason}",
             )
 
         if not self.root.discriminator_result and self.discriminator:
@@ -177,21 +198,96 @@ class SearchTree(AgenticFlow):
 
         return self.root.get_last_node(), finish_reason
 
+    async def _run_concurrently(self, node: Node) -> str | None:
+        """
+        Run the search with up to max_concurrent_simulations nodes simulated at the same time.
+
+        Nodes that are simulated are excluded from selection, which is what spreads the simulations over the tree.
+        Visits and values are only updated when the results are backpropagated as the simulations finish, so
+        selectors don't see the simulations running below a node.
+        No new nodes are started when the search is finished, the simulations already running are awaited.
+
+        The simulations share the workspace and its runtime. Changes to files are kept in the file context of each
+        node in shadow mode, but actions that are not read-only are executed one at a time as they may use the
+        runtime. Completions, read-only actions and value functions run concurrently.
+        """
+        finish_reason = None
+        expand_failed = False
+        simulations: dict[asyncio.Task, Node] = {}
+        self.agent._mutating_action_lock = asyncio.Lock()
+
+        try:
+            while True:
+                while not expand_failed and len(simulations) < self.max_concurrent_simulations:
+                    finish_reason = self.is_finished()
+                    if finish_reason:
+                        break
+
+                    self.log(
+                        logger.info,
+                        f"Run iteration {self.root.node_count()} with {len(simulations)} simulations running",
+                        cost=self.total_usage().completion_cost,
+                    )
+
+                    selected_node = await self._select(node)
+                    if not selected_node:
+                        break
+
+                    new_node = await self._expand(selected_node)
+                    if not new_node:
+                        self.log(logger.warning, f"No node expanded from Node{selected_node.node_id}")
+                        await self._emit_event(FlowErrorEvent(node_id=selected_node.node_id, error="No node expanded"))
+                        expand_failed = True
+                        break
+
+                    self._in_flight[new_node.node_id] = new_node
+                    simulations[asyncio.create_task(self._simulate(new_node))] = new_node
+                    node = new_node
+
+                if not simulations:
+                    if not finish_reason and not expand_failed:
+                        self.log(logger.info, "Search complete: no more nodes to expand.")
+                        finish_reason = "no_selectable_nodes"
+                    return finish_reason
+
+                done, _ = await asyncio.wait(simulations, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node = simulations.pop(task)
+                    self._in_flight.pop(node.node_id, None)
+                    task.result()
+
+                    self._backpropagate(node)
+                    self.log(logger.info, generate_ascii_tree(self.root, node))
+
+        finally:
+            for task in simulations:
+                task.cancel()
+            if simulations:
+                await asyncio.gather(*simulations, return_exceptions=True)
+            for node in simulations.values():
+                self._in_flight.pop(node.node_id, None)
+            self.agent._mutating_action_lock = None
+
     @tracer.start_as_current_span("SearchTree._select")
     async def _select(self, node: Node) -> Node | None:
         """Select a node for expansion using the UCT algorithm."""
 
-        if not node.is_executed():
+        if not node.is_executed() and node.node_id not in self._in_flight:
             self.log(logger.info, f"Node{node.node_id} has not been executed. Skipping selection.")
             return node
 
         # Find first unexecuted node if it exists
-        for check_node in self.root.get_all_nodes():
-            if not check_node.observation and not check_node.children:
+        for check_node in self.root.get_leaf_nodes():
+            if not check_node.observation and check_node.node_id not in self._in_flight:
                 logger.info(f"Selecting unexecuted node {check_node.node_id} as it is the first unexecuted node")
                 return check_node
 
-        expandable_nodes = self.root.get_expandable_descendants()
+        expandable_nodes = [
+            node for node in self.root.get_expandable_descendants() if node.node_id not in self._in_flight
+        ]
+        if not expandable_nodes and self._in_flight:
+            # Wait for the running simulations before selecting again
+            return None
 
         selection = await self.selector.select(expandable_nodes)
 
@@ -233,7 +329,7 @@ class SearchTree(AgenticFlow):
 
         # Find first unexecuted child if it exists
         for child in node.children:
-            if not child.observation:
+            if not child.observation and child.node_id not in self._in_flight:
                 logger.info(f"Found unexecuted child {child.node_id} for node {node.node_id}")
                 return child
 
@@ -351,7 +447,7 @@ class SearchTree(AgenticFlow):
             return "max_cost"
 
         # Check max iterations
-        if len(self.root.get_all_nodes()) >= self.max_iterations:
+        if self.root.node_count() >= self.max_iterations:
             return "max_iterations"
 
         finished_nodes = self.get_finished_nodes()
@@ -385,21 +481,18 @@ class SearchTree(AgenticFlow):
         return finished_nodes
 
     def get_node_by_id(self, node_id: int) -> Node | None:
-        return next(
-            (node for node in self.root.get_all_nodes() if node.node_id == node_id),
-            None,
-        )
+        return self.root.get_node_by_id(node_id)
 
     def get_leaf_nodes(self) -> list[Node]:
         """Get all leaf nodes in the search tree."""
-        return [node for node in self.root.get_all_nodes() if node.is_leaf()]
+        return self.root.get_leaf_nodes()
 
     def total_usage(self) -> Usage:
         """Calculate total token usage across all nodes."""
         return self.root.total_usage()
 
     def _generate_unique_id(self) -> int:
-        return len(self.root.get_all_nodes()) + 1
+        return self.root.node_count() + 1
 
     def assert_runnable(self):
         if self.root is None:
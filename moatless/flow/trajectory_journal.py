@@ -0,0 +1,107 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Optional
+
+from moatless.storage.base import BaseStorage
+from moatless.storage.snapshot_journal import JournalConflictError, JournalFormat, SnapshotJournal
+
+logger = logging.getLogger(__name__)
+
+TRAJECTORY_FILE = "trajectory.json"
+JOURNAL_FILE = "trajectory_journal.jsonl"
+
+TRAJECTORY_JOURNAL_FORMAT = JournalFormat(
+    items_field="nodes",
+    item_id_field="node_id",
+    item_record="node",
+    metadata_record="metadata",
+    metadata_field="metadata",
+)
+
+
+class TrajectoryJournal:
+    """
+    Persists the trajectory of a running flow as a snapshot in trajectory.json and appends new or changed
+    nodes to trajectory_journal.jsonl.
+
+    The running flow is the only writer of the journal, so only the version of the snapshot is checked before each
+    append. If someone else has rewritten the snapshot, like FlowManager does on reset, a new snapshot is written
+    instead of appending records that would be ignored. See SnapshotJournal for how the journal is compacted.
+    """
+
+    def __init__(self, storage: BaseStorage, project_id: str, trajectory_id: str, compaction_ratio: float = 1.0):
+        trajectory_path = storage.get_trajectory_path(project_id, trajectory_id)
+        self._trajectory_path = f"{trajectory_path}/{TRAJECTORY_FILE}"
+        self._journal = SnapshotJournal(
+            storage,
+            TRAJECTORY_JOURNAL_FORMAT,
+            snapshot_path=self._trajectory_path,
+            journal_path=f"{trajectory_path}/{JOURNAL_FILE}",
+            version_prefix=self._trajectory_path,
+            compaction_ratio=compaction_ratio,
+        )
+
+    async def persist(self, trajectory_data: dict[str, Any], compact: bool = False) -> int:
+        """
+        Persist the trajectory data and return the number of records appended to the journal.
+
+        A new snapshot is written on the first call, when compact is set or when the journal has grown too large.
+        """
+        try:
+            return await self._journal.persist(trajectory_data, compact=compact)
+        except JournalConflictError:
+            logger.warning(f"{self._trajectory_path} was rewritten by another writer, writing a new snapshot")
+            await self._journal.write_snapshot(trajectory_data)
+            return 0
+
+    async def append(self, trajectory_data: dict[str, Any]) -> Optional[int]:
+        """
+        Append the nodes in the trajectory data, usually only the nodes that changed, to the journal.
+
+        Returns:
+            The number of records appended, or None if a new snapshot must be written with persist
+        """
+        try:
+            return await self._journal.append(trajectory_data)
+        except JournalConflictError:
+            logger.warning(f"{self._trajectory_path} was rewritten by another writer, a new snapshot must be written")
+            return None
+
+
+async def read_trajectory_data(
+    storage: BaseStorage, project_id: Optional[str] = None, trajectory_id: Optional[str] = None
+) -> dict[str, Any]:
+    """
+    Read trajectory.json and replay the records in the trajectory journal on top of it.
+
+    Raises:
+        KeyError: If the trajectory does not exist
+    """
+    trajectory_data = await storage.read_from_trajectory(TRAJECTORY_FILE, project_id, trajectory_id)
+    if not isinstance(trajectory_data, dict) or not trajectory_data.get("journal_id"):
+        return trajectory_data
+
+    trajectory_path = storage.get_trajectory_path(project_id, trajectory_id)
+    try:
+        records = await storage.read_lines(f"{trajectory_path}/{JOURNAL_FILE}")
+    except KeyError:
+        records = []
+
+    return TRAJECTORY_JOURNAL_FORMAT.replay(trajectory_data, records, f"trajectory {trajectory_path}")
+
+
+def read_trajectory_file(trajectory_path: Path) -> dict[str, Any]:
+    """Read a trajectory.json file and replay the records in the trajectory journal in the same directory on top of it."""
+    with open(trajectory_path) as f:
+        trajectory_data = json.load(f)
+    if not isinstance(trajectory_data, dict) or not trajectory_data.get("journal_id"):
+        return trajectory_data
+
+    journal_path = Path(trajectory_path).parent / JOURNAL_FILE
+    records = []
+    if journal_path.exists():
+        with open(journal_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    return TRAJECTORY_JOURNAL_FORMAT.replay(trajectory_data, records, f"trajectory {trajectory_path}")
@@ -29,7 +29,14 @@ class CodeBlockIndex:
         # Our tree index for file paths
         self._file_tree: dict = {}
 
+        # Class and function names per file, built on first update
+        self._identifiers_by_file: Optional[dict[str, tuple[set[str], set[str]]]] = None
+
     async def _build_indexes(self):
+        """Build the tree index from blocks."""
+        self.build_file_tree()
+
+    def build_file_tree(self):
         """Build the tree index from blocks."""
         # Process class blocks
         for blocks in self._blocks_by_class_name.values():
@@ -43,6 +50,73 @@ class CodeBlockIndex:
 
         logger.debug(f"Built file tree index: {self._file_tree}")
 
+    def _get_identifiers_by_file(self) -> dict[str, tuple[set[str], set[str]]]:
+        if self._identifiers_by_file is None:
+            self._identifiers_by_file = {}
+            for class_name, blocks in self._blocks_by_class_name.items():
+                for file_path, _ in blocks:
+                    self._identifiers_by_file.setdefault(file_path, (set(), set()))[0].add(class_name)
+            for function_name, blocks in self._blocks_by_function_name.items():
+                for file_path, _ in blocks:
+                    self._identifiers_by_file.setdefault(file_path, (set(), set()))[1].add(function_name)
+        return self._identifiers_by_file
+
+    def remove_file(self, file_path: str):
+        """Remove all blocks in a file from the indexes."""
+        class_names, function_names = self._get_identifiers_by_file().pop(file_path, (set(), set()))
+
+        for blocks_by_name, names in [
+            (self._blocks_by_class_name, class_names),
+            (self._blocks_by_function_name, function_names),
+        ]:
+            for name in names:
+                blocks = [block for block in blocks_by_name.get(name, []) if block[0] != file_path]
+                if blocks:
+                    blocks_by_name[name] = blocks
+                else:
+                    blocks_by_name.pop(name, None)
+
+        self._remove_from_tree(file_path)
+
+    def add_blocks(
+        self,
+        blocks_by_class_name: dict[str, list[tuple[str, str]]],
+        blocks_by_function_name: dict[str, list[tuple[str, str]]],
+    ):
+        """Add blocks to the indexes. Call remove_file() first to replace the blocks of an updated file."""
+        identifiers_by_file = self._get_identifiers_by_file()
+
+        for class_name, blocks in blocks_by_class_name.items():
+            self._blocks_by_class_name.setdefault(class_name, []).extend(blocks)
+            for file_path, _ in blocks:
+                identifiers_by_file.setdefault(file_path, (set(), set()))[0].add(class_name)
+                self._insert_into_tree(file_path)
+
+        for function_name, blocks in blocks_by_function_name.items():
+            self._blocks_by_function_name.setdefault(function_name, []).extend(blocks)
+            for file_path, _ in blocks:
+                identifiers_by_file.setdefault(file_path, (set(), set()))[1].add(function_name)
+                self._insert_into_tree(file_path)
+
+    def _remove_from_tree(self, file_path: str):
+        """Remove a file from the tree and prune directories left empty."""
+        parts = file_path.split("/")
+        nodes = [self._file_tree]
+        for part in parts[:-1]:
+            child = nodes[-1].get(part)
+            if not isinstance(child, dict):
+                return
+            nodes.append(child)
+
+        if parts[-1] not in nodes[-1] or nodes[-1][parts[-1]] is not None:
+            return
+
+        del nodes[-1][parts[-1]]
+        for i in range(len(nodes) - 1, 0, -1):
+            if nodes[i]:
+                break
+            del nodes[i - 1][parts[i - 1]]
+
     def _insert_into_tree(self, file_path: str):
         """Insert a file path into the tree.
         Directories are represented as dicts;
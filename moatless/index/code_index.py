@@ -16,10 +16,14 @@ from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from opentelemetry import trace
 from rapidfuzz import fuzz
 
-from moatless.codeblocks import CodeBlock, CodeBlockType, get_parser_by_path
+from moatless.codeblocks import CodeBlockType
 from moatless.codeblocks.module import Module
+from moatless.codeblocks.parse_cache import parse_module
 from moatless.index.code_block_index import CodeBlockIndex
-from moatless.index.embed_model import get_embed_model
+from moatless.index.file_manifest import FileEntry, FileManifest, hash_file
+from moatless.index.mmap_faiss import MmapFaissVectorStore
+from moatless.index.parallel_split import split_documents_parallel
+from moatless.index.query_embedder import QueryEmbedder, get_query_embedder
 from moatless.index.settings import IndexSettings
 from moatless.index.simple_faiss import SimpleFaissVectorStore
 from moatless.index.types import (
@@ -30,7 +34,6 @@ from moatless.index.types import (
 from moatless.repository import FileRepository
 from moatless.repository.repository import Repository
 from moatless.utils.file import is_test
-from moatless.utils.tokenizer import count_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -49,9 +52,20 @@ def default_vector_store(settings: IndexSettings):
         ) from e
 
     faiss_index = faiss.IndexIDMap(faiss.IndexFlatL2(settings.dimensions))
-    from moatless.index.simple_faiss import SimpleFaissVectorStore
+    return MmapFaissVectorStore(faiss_index, d=settings.dimensions)
 
-    return SimpleFaissVectorStore(faiss_index)
+
+def load_vector_store(persist_dir: str) -> BasePydanticVectorStore:
+    """Load the vector store in persist_dir, indexes persisted before the memory-mapped format are still supported."""
+    if MmapFaissVectorStore.exists(persist_dir):
+        return MmapFaissVectorStore.from_persist_dir(persist_dir)
+    return SimpleFaissVectorStore.from_persist_dir(persist_dir)
+
+
+async def load_vector_store_async(persist_dir: str) -> BasePydanticVectorStore:
+    if MmapFaissVectorStore.exists(persist_dir):
+        return await MmapFaissVectorStore.from_persist_dir_async(persist_dir)
+    return await SimpleFaissVectorStore.from_persist_dir_async(persist_dir)
 
 
 class CodeIndex:
@@ -63,6 +77,7 @@ class CodeIndex:
         docstore: Optional[DocumentStore] = None,
         embed_model: Optional[BaseEmbedding] = None,
         code_block_index: Optional[CodeBlockIndex] = None,
+        file_manifest: Optional[FileManifest] = None,
         settings: Optional[IndexSettings] = None,
         max_results: int = 25,
         max_hits_without_exact_match: int = 100,
@@ -78,8 +93,15 @@ class CodeIndex:
         self._file_repo = file_repo
 
         self._code_block_index = code_block_index
+        self._file_manifest = file_manifest
 
-        self._embed_model = embed_model or get_embed_model(self._settings.embed_model)
+        if embed_model:
+            self._embed_model = embed_model
+            self._query_embedder = QueryEmbedder(embed_model, self._settings.embed_model)
+        else:
+            # Query embeddings are cached and batched per model across all code indexes in the process
+            self._query_embedder = get_query_embedder(self._settings.embed_model)
+            self._embed_model = self._query_embedder.embed_model
         self._vector_store = vector_store or default_vector_store(self._settings)
         self._docstore = docstore or SimpleDocumentStore()
 
@@ -125,7 +147,7 @@ class CodeIndex:
     def from_persist_dir(cls, persist_dir: str, file_repo: Repository | None = None, **kwargs):
         """Synchronous version of from_persist_dir"""
 
-        vector_store = SimpleFaissVectorStore.from_persist_dir(persist_dir)
+        vector_store = load_vector_store(persist_dir)
 
         docstore, settings = (
             SimpleDocumentStore.from_persist_dir(persist_dir),
@@ -140,6 +162,7 @@ class CodeIndex:
             docstore=docstore,
             settings=settings,
             code_block_index=code_block_index,
+            file_manifest=FileManifest.from_persist_dir(persist_dir),
             **kwargs,
         )
 
@@ -149,15 +172,15 @@ class CodeIndex:
         # Run CPU-intensive synchronous operations in a thread pool
         loop = asyncio.get_event_loop()
 
-        # Use the async version of SimpleFaissVectorStore.from_persist_dir
-        vector_store = await SimpleFaissVectorStore.from_persist_dir_async(persist_dir)
+        vector_store = await load_vector_store_async(persist_dir)
 
         from llama_index.core.storage.docstore import SimpleDocumentStore
 
         # These are still synchronous operations
-        docstore, settings = await asyncio.gather(
+        docstore, settings, file_manifest = await asyncio.gather(
             loop.run_in_executor(None, SimpleDocumentStore.from_persist_dir, persist_dir),
             loop.run_in_executor(None, IndexSettings.from_persist_dir, persist_dir),
+            loop.run_in_executor(None, FileManifest.from_persist_dir, persist_dir),
         )
 
         inverted_index = await CodeBlockIndex.from_persist_dir_async(persist_dir)
@@ -168,6 +191,7 @@ class CodeIndex:
             docstore=docstore,
             settings=settings,
             code_block_index=inverted_index,
+            file_manifest=file_manifest,
             **kwargs,
         )
 
@@ -242,11 +266,7 @@ class CodeIndex:
         return {"index_name": self._index_name}
 
     async def get_module(self, file_path: str, content: str) -> Module | None:
-        parser = get_parser_by_path(file_path)
-        if parser:
-            module = parser.pars(content)
-            return module
-        return None
+        return parse_module(file_path, content)
 
     @tracer.start_as_current_span("semantic_search")
     async def semantic_search(
@@ -587,6 +607,8 @@ class CodeIndex:
         file_pattern: Optional[str] = None,
         exact_content_match: Optional[str] = None,
         top_k: int = 500,
+        min_results: int = 100,
+        max_page_factor: int = 8,
     ):
         # Import llama_index components only when needed
         from llama_index.core.vector_stores.types import VectorStoreQuery
@@ -602,28 +624,7 @@ class CodeIndex:
 
         logger.debug(f"vector_search() Searching for query [{query[:50]}...] and file pattern [{file_pattern}].")
 
-        # TODO: Make this async
-        query_embedding = self._embed_model.get_query_embedding(query)
-
-        # FIXME: Filters can't be used ATM. Category isn't set in some instance vector stores
-        # filters = MetadataFilters(filters=[], condition=FilterCondition.AND)
-        # if category:
-        #    filters.filters.append(MetadataFilter(key="category", value=category))
-
-        query_bundle = VectorStoreQuery(
-            query_str=query,
-            query_embedding=query_embedding,
-            similarity_top_k=top_k,  # TODO: Fix paging?
-            #    filters=filters,
-        )
-
-        result = self._vector_store.query(query_bundle)
-
-        filtered_out_snippets = 0
-        ignored_removed_snippets = 0
-        sum_tokens = 0
-
-        sum_tokens_per_file = {}
+        query_embedding = await self._query_embedder.get_query_embedding(query)
 
         if file_pattern:
             include_files = await self.matching_files(file_pattern)
@@ -633,85 +634,107 @@ class CodeIndex:
         else:
             include_files = []
 
+        # The mmap store can restrict the search to the matching files and category, other stores are post-filtered
+        filter_kwargs = {}
+        if isinstance(self._vector_store, MmapFaissVectorStore):
+            filter_kwargs = {"file_paths": include_files or None, "category": category}
+
+        filtered_out_snippets = 0
+        ignored_removed_snippets = 0
+        sum_tokens = 0
+
+        sum_tokens_per_file = {}
+
         search_results = []
+        seen_node_ids = set()
+        hits = 0
 
-        for node_id, distance in zip(result.ids, result.similarities, strict=False):
-            node_doc = self._docstore.get_document(node_id, raise_error=False)
-            if not node_doc:
-                ignored_removed_snippets += 1
-                # TODO: Retry to get top_k results
-                continue
+        page_size = top_k
+        max_page_size = top_k * max_page_factor
+        while True:
+            query_bundle = VectorStoreQuery(
+                query_str=query,
+                query_embedding=query_embedding,
+                similarity_top_k=page_size,
+            )
 
-            is_test_file = is_test(node_doc.metadata["file_path"])
-            if category and category != "test" and is_test_file:
-                filtered_out_snippets += 1
-                continue
+            result = self._vector_store.query(query_bundle, **filter_kwargs)
+            hits = len(result.ids)
 
-            if include_files and node_doc.metadata["file_path"] not in include_files:
-                filtered_out_snippets += 1
-                continue
+            for node_id, distance in zip(result.ids, result.similarities, strict=False):
+                if node_id in seen_node_ids:
+                    continue
+                seen_node_ids.add(node_id)
 
-            if category == "implementation" and is_test_file:
-                filtered_out_snippets += 1
-                continue
+                node_doc = self._docstore.get_document(node_id, raise_error=False)
+                if not node_doc:
+                    ignored_removed_snippets += 1
+                    continue
 
-            if category == "test" and not is_test_file:
-                filtered_out_snippets += 1
-                continue
+                is_test_file = is_test(node_doc.metadata["file_path"])
+                if category and category != "test" and is_test_file:
+                    filtered_out_snippets += 1
+                    continue
 
-            if exact_query_match and query not in node_doc.get_content():
-                filtered_out_snippets += 1
-                continue
+                if include_files and node_doc.metadata["file_path"] not in include_files:
+                    filtered_out_snippets += 1
+                    continue
 
-            if exact_content_match and not is_string_in(exact_content_match, node_doc.get_content()):
-                filtered_out_snippets += 1
-                continue
+                if category == "test" and not is_test_file:
+                    filtered_out_snippets += 1
+                    continue
 
-            if node_doc.metadata["file_path"] not in sum_tokens_per_file:
-                sum_tokens_per_file[node_doc.metadata["file_path"]] = 0
-
-            sum_tokens += node_doc.metadata["tokens"]
-            sum_tokens_per_file[node_doc.metadata["file_path"]] += node_doc.metadata["tokens"]
-
-            code_snippet = CodeSnippet(
-                id=node_doc.id_,
-                file_path=node_doc.metadata["file_path"],
-                distance=distance,
-                content=node_doc.get_content(),
-                tokens=node_doc.metadata["tokens"],
-                span_ids=node_doc.metadata.get("span_ids", []),
-                start_line=node_doc.metadata.get("start_line", None),
-                end_line=node_doc.metadata.get("end_line", None),
-            )
+                if exact_query_match and query not in node_doc.get_content():
+                    filtered_out_snippets += 1
+                    continue
+
+                if exact_content_match and not is_string_in(exact_content_match, node_doc.get_content()):
+                    filtered_out_snippets += 1
+                    continue
+
+                if node_doc.metadata["file_path"] not in sum_tokens_per_file:
+                    sum_tokens_per_file[node_doc.metadata["file_path"]] = 0
+
+                sum_tokens += node_doc.metadata["tokens"]
+                sum_tokens_per_file[node_doc.metadata["file_path"]] += node_doc.metadata["tokens"]
+
+                code_snippet = CodeSnippet(
+                    id=node_doc.id_,
+                    file_path=node_doc.metadata["file_path"],
+                    distance=distance,
+                    content=node_doc.get_content(),
+                    tokens=node_doc.metadata["tokens"],
+                    span_ids=node_doc.metadata.get("span_ids", []),
+                    start_line=node_doc.metadata.get("start_line", None),
+                    end_line=node_doc.metadata.get("end_line", None),
+                )
+
+                search_results.append(code_snippet)
+
+            # Search wider if filtering left too few results and there may be more hits in the index
+            if len(search_results) >= min(min_results, top_k) or hits < page_size or page_size >= max_page_size:
+                break
 
-            search_results.append(code_snippet)
+            page_size = min(page_size * 2, max_page_size)
+            logger.debug(
+                f"vector_search() Only {len(search_results)} results after filtering, "
+                f"searching again with top_k {page_size}."
+            )
 
         # TODO: Rerank by file pattern if no exact matches on file pattern
 
         logger.debug(
             f"vector_search() Returning {len(search_results)} search results. "
             f"(Ignored {ignored_removed_snippets} removed search results. "
-            f"Filtered out {filtered_out_snippets} search results from vector search result with {len(result.ids)} hits.)"
+            f"Filtered out {filtered_out_snippets} search results from vector search result with {hits} hits.)"
         )
 
         return search_results
 
-    def run_ingestion(
-        self,
-        repo_path: Optional[str] = None,
-        input_files: list[str] | None = None,
-        num_workers: Optional[int] = None,
-    ):
-        # Import llama_index components only when needed
-
-        repo_path = repo_path or self._file_repo.path
-
+    def _create_reader(self, repo_path: str, input_files: list[str] | None = None) -> SimpleDirectoryReader:
         # Only extract file name and type to not trigger unnecessary embedding jobs
         def file_metadata_func(file_path: str) -> dict:
-            file_path = file_path.replace(repo_path, "")
-            if file_path.startswith("/"):
-                file_path = file_path[1:]
-
+            file_path = _relative_path(repo_path, file_path)
             category = "test" if is_test(file_path) else "implementation"
 
             return {
@@ -726,11 +749,8 @@ class CodeIndex:
         else:
             required_exts = [".py"]
 
-        if input_files:
-            input_files = [os.path.join(repo_path, file) for file in input_files if not file.startswith(repo_path)]
-
         try:
-            reader = SimpleDirectoryReader(
+            return SimpleDirectoryReader(
                 input_dir=repo_path,
                 file_metadata=file_metadata_func,
                 input_files=input_files,
@@ -744,6 +764,34 @@ class CodeIndex:
             )
             raise e
 
+    def run_ingestion(
+        self,
+        repo_path: Optional[str] = None,
+        input_files: list[str] | None = None,
+        num_workers: Optional[int] = None,
+        incremental: bool = False,
+        split_workers: Optional[int] = None,
+    ):
+        """
+        Index the repository.
+
+        With incremental=True and an index loaded together with its file manifest, only files with a changed
+        content hash are re-read, split and embedded. Otherwise all files are indexed and a new manifest is created.
+
+        Files are parsed, chunked and token counted in split_workers processes, defaults to the number of CPUs.
+        """
+        repo_path = repo_path or self._file_repo.path
+
+        if incremental and not input_files:
+            if self._file_manifest is not None and self._code_block_index is not None:
+                return self._run_incremental_ingestion(repo_path, split_workers)
+            logger.info("No file manifest found for the index, running full ingestion.")
+
+        if input_files:
+            input_files = [os.path.join(repo_path, file) for file in input_files if not file.startswith(repo_path)]
+
+        reader = self._create_reader(repo_path, input_files)
+
         embed_pipeline = IngestionPipeline(
             transformations=[self._embed_model],
             docstore_strategy=DocstoreStrategy.UPSERTS_AND_DELETE,
@@ -754,52 +802,128 @@ class CodeIndex:
         docs = reader.load_data()
         logger.info(f"Read {len(docs)} documents")
 
-        blocks_by_class_name = {}
-        blocks_by_function_name = {}
+        split_result = split_documents_parallel(docs, self._settings, repo_path, max_workers=split_workers)
+        prepared_nodes = split_result.nodes
+        tokens_by_node_id = split_result.tokens_by_node_id
+        prepared_tokens = sum(tokens_by_node_id.values())
+        logger.info(f"Run embed pipeline with {len(prepared_nodes)} nodes and {prepared_tokens} tokens")
+
+        embedded_nodes = embed_pipeline.run(nodes=list(prepared_nodes), show_progress=True, num_workers=num_workers)
+        embedded_tokens = sum(tokens_by_node_id.get(node.id_, 0) for node in embedded_nodes)
+        logger.info(f"Embedded {len(embedded_nodes)} vectors with {embedded_tokens} tokens")
 
-        def index_callback(codeblock: CodeBlock):
-            if codeblock.type == CodeBlockType.CLASS:
-                if codeblock.identifier not in blocks_by_class_name:
-                    blocks_by_class_name[codeblock.identifier] = []
-                blocks_by_class_name[codeblock.identifier].append((codeblock.module.file_path, codeblock.full_path()))
+        self._code_block_index = CodeBlockIndex(split_result.blocks_by_class_name, split_result.blocks_by_function_name)
+        self._code_block_index.build_file_tree()
 
-            if codeblock.type == CodeBlockType.FUNCTION:
-                if codeblock.identifier not in blocks_by_function_name:
-                    blocks_by_function_name[codeblock.identifier] = []
-                blocks_by_function_name[codeblock.identifier].append(
-                    (codeblock.module.file_path, codeblock.full_path())
-                )
+        self._file_manifest = _create_file_manifest(_hash_files(repo_path, reader.input_files), prepared_nodes)
+
+        return len(embedded_nodes), embedded_tokens
+
+    def _run_incremental_ingestion(self, repo_path: str, split_workers: Optional[int] = None):
+        from llama_index.core.schema import MetadataMode
 
-        from moatless.index.epic_split import EpicSplitter
-
-        splitter = EpicSplitter(
-            language=self._settings.language,
-            min_chunk_size=self._settings.min_chunk_size,
-            chunk_size=self._settings.chunk_size,
-            hard_token_limit=self._settings.hard_token_limit,
-            max_chunks=self._settings.max_chunks,
-            comment_strategy=self._settings.comment_strategy,
-            index_callback=index_callback,
-            repo_path=repo_path,
+        reader = self._create_reader(repo_path)
+        content_hashes = _hash_files(repo_path, reader.input_files)
+        changed_files, removed_files = self._file_manifest.diff(content_hashes)
+
+        logger.info(
+            f"Incremental ingestion of {len(content_hashes)} files: {len(changed_files)} new or changed "
+            f"and {len(removed_files)} removed files."
         )
 
-        prepared_nodes = splitter.get_nodes_from_documents(docs, show_progress=True)
-        prepared_tokens = sum([count_tokens(node.get_content(), self._settings.embed_model) for node in prepared_nodes])
-        logger.info(f"Run embed pipeline with {len(prepared_nodes)} nodes and {prepared_tokens} tokens")
+        if not changed_files and not removed_files:
+            return 0, 0
 
-        embedded_nodes = embed_pipeline.run(nodes=list(prepared_nodes), show_progress=True, num_workers=num_workers)
-        embedded_tokens = sum([count_tokens(node.get_content(), self._settings.embed_model) for node in embedded_nodes])
-        logger.info(f"Embedded {len(embedded_nodes)} vectors with {embedded_tokens} tokens")
+        if changed_files:
+            changed_reader = self._create_reader(
+                repo_path, [os.path.join(repo_path, file_path) for file_path in changed_files]
+            )
+            docs = changed_reader.load_data()
+        else:
+            docs = []
 
-        self._code_block_index = CodeBlockIndex(blocks_by_class_name, blocks_by_function_name)
+        split_result = split_documents_parallel(docs, self._settings, repo_path, max_workers=split_workers)
+        prepared_nodes = split_result.nodes
 
-        return len(embedded_nodes), embedded_tokens
+        # Chunks that are unchanged since the last ingestion keep their vectors
+        nodes_to_embed = []
+        unchanged_nodes = []
+        for node in prepared_nodes:
+            if self._docstore.get_document_hash(node.id_) == node.hash:
+                unchanged_nodes.append(node)
+            else:
+                nodes_to_embed.append(node)
+
+        new_node_ids = {node.id_ for node in unchanged_nodes}
+        stale_node_ids = set()
+        for file_path in changed_files + removed_files:
+            entry = self._file_manifest.files.get(file_path)
+            if entry:
+                stale_node_ids.update(node_id for node_id in entry.node_ids if node_id not in new_node_ids)
+
+        for node_id in stale_node_ids:
+            self._vector_store.delete(node_id)
+            self._docstore.delete_document(node_id, raise_error=False)
+
+        embedded_tokens = sum(split_result.tokens_by_node_id[node.id_] for node in nodes_to_embed)
+        logger.info(
+            f"Embed {len(nodes_to_embed)} nodes with {embedded_tokens} tokens, "
+            f"reuse {len(unchanged_nodes)} unchanged nodes and remove {len(stale_node_ids)} stale nodes."
+        )
+
+        if nodes_to_embed:
+            embeddings = self._embed_model.get_text_embedding_batch(
+                [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes_to_embed],
+                show_progress=True,
+            )
+            for node, embedding in zip(nodes_to_embed, embeddings, strict=True):
+                node.embedding = embedding
+            self._vector_store.add(nodes_to_embed)
+
+        self._docstore.add_documents(nodes_to_embed)
+
+        for file_path in changed_files + removed_files:
+            self._code_block_index.remove_file(file_path)
+        self._code_block_index.add_blocks(split_result.blocks_by_class_name, split_result.blocks_by_function_name)
+
+        for file_path in removed_files:
+            del self._file_manifest.files[file_path]
+        changed_manifest = _create_file_manifest(
+            {file_path: content_hashes[file_path] for file_path in changed_files}, prepared_nodes
+        )
+        self._file_manifest.files.update(changed_manifest.files)
+
+        return len(nodes_to_embed), embedded_tokens
 
     def persist(self, persist_dir: str):
         self._vector_store.persist(persist_dir)
         self._docstore.persist(os.path.join(persist_dir, DEFAULT_PERSIST_FNAME))
         self._settings.persist(persist_dir)
         self._code_block_index.persist(persist_dir)
+        if self._file_manifest is not None:
+            self._file_manifest.persist(persist_dir)
+
+
+def _relative_path(repo_path: str, file_path: str) -> str:
+    file_path = file_path.replace(repo_path, "")
+    if file_path.startswith("/"):
+        file_path = file_path[1:]
+    return file_path
+
+
+def _hash_files(repo_path: str, input_files) -> dict[str, str]:
+    return {_relative_path(repo_path, str(file)): hash_file(str(file)) for file in input_files}
+
+
+def _create_file_manifest(content_hashes: dict[str, str], nodes: list) -> FileManifest:
+    manifest = FileManifest(
+        files={file_path: FileEntry(content_hash=content_hash) for file_path, content_hash in content_hashes.items()}
+    )
+    for node in nodes:
+        entry = manifest.files.get(node.metadata["file_path"])
+        if entry:
+            entry.node_ids.append(node.id_)
+    return manifest
 
 
 def _rerank_files(file_paths: list[str], file_pattern: str):
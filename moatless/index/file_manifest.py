@@ -0,0 +1,47 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+MANIFEST_FNAME = "file_manifest.json"
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class FileEntry(BaseModel):
+    content_hash: str = Field(description="SHA-256 of the file content when it was indexed.")
+    node_ids: list[str] = Field(default_factory=list, description="Ids of the nodes created from the file.")
+
+
+class FileManifest(BaseModel):
+    """Content hash and indexed nodes per file, used to only re-index changed files."""
+
+    files: dict[str, FileEntry] = Field(default_factory=dict)
+
+    def diff(self, content_hashes: dict[str, str]) -> tuple[list[str], list[str]]:
+        """Return the files that are new or changed and the files that have been removed."""
+        changed_files = [
+            file_path
+            for file_path, content_hash in content_hashes.items()
+            if file_path not in self.files or self.files[file_path].content_hash != content_hash
+        ]
+        removed_files = [file_path for file_path in self.files if file_path not in content_hashes]
+        return changed_files, removed_files
+
+    def persist(self, persist_dir: str):
+        with open(os.path.join(persist_dir, MANIFEST_FNAME), "w") as f:
+            f.write(self.model_dump_json())
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str) -> Optional["FileManifest"]:
+        path = os.path.join(persist_dir, MANIFEST_FNAME)
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            return cls.model_validate(json.load(f))
@@ -0,0 +1,571 @@
+"""Memory-mapped vector store using Faiss.
+
+Persisted layout (one directory):
+
+    vector_index.faiss           faiss index, opened with IO_FLAG_MMAP
+    vector_store.json            small manifest with format version, dimensions and next vector id
+    text_ids.bin/.offsets.npy    node id per vector id (utf-8 blob + int64 offsets)
+    ref_doc_ids.bin/.offsets.npy ref doc id per vector id
+    metadata.bin/.offsets.npy    JSON encoded node metadata per vector id
+    file_paths.bin/.offsets.npy  file path per vector id
+    ref_doc_hashes.npy           sorted 64-bit hashes of the ref doc ids
+    ref_doc_order.npy            vector ids in the same order as ref_doc_hashes
+    file_path_hashes.npy         sorted 64-bit hashes of the file paths
+    file_path_order.npy          vector ids in the same order as file_path_hashes
+    test_mask.npy                1 for vectors in test files
+    tombstones.npy               vector ids that have been deleted
+
+Vector ids are allocated sequentially so they double as row numbers in the columns. Opening a store only
+maps the files, nothing is parsed until a row is read. Searches can be restricted to a set of files and to test or
+implementation files, the restriction is applied inside the faiss search with an IDSelectorBitmap.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+from typing import Any, Optional, cast
+
+import faiss
+import fsspec
+import numpy as np
+from fsspec.implementations.local import LocalFileSystem
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.types import (
+    DEFAULT_PERSIST_DIR,
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+from moatless.utils.file import is_test
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_FNAME = "vector_store.json"
+FAISS_FNAME = "vector_index.faiss"
+
+_MMAP_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def _hash_id(value: str) -> int:
+    """Stable signed 64-bit hash used to look up rows by ref doc id."""
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _map_file(path: str) -> bytes | mmap.mmap:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _load_array(path: str, dtype=np.int64) -> np.ndarray:
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=dtype)
+    return np.load(path, mmap_mode="r")
+
+
+def _save_array(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class StringColumn:
+    """Append-only column of strings stored as one utf-8 blob and an array of offsets."""
+
+    def __init__(self, blob: bytes | mmap.mmap = b"", offsets: Optional[np.ndarray] = None):
+        self._blob = blob
+        self._offsets = offsets if offsets is not None and len(offsets) else np.zeros(1, dtype=np.int64)
+        self._pending: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1 + len(self._pending)
+
+    def __getitem__(self, row: int) -> str:
+        persisted = len(self._offsets) - 1
+        if row < persisted:
+            return bytes(self._blob[int(self._offsets[row]) : int(self._offsets[row + 1])]).decode("utf-8")
+        return self._pending[row - persisted]
+
+    def append(self, value: str):
+        self._pending.append(value)
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    @classmethod
+    def open(cls, path: str) -> "StringColumn":
+        return cls(_map_file(f"{path}.bin"), _load_array(f"{path}.offsets.npy"))
+
+    def write(self, path: str):
+        """Write the column to disk. Only the pending rows are encoded, the persisted blob is copied as is."""
+        encoded = [value.encode("utf-8") for value in self._pending]
+        lengths = np.fromiter((len(value) for value in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.concatenate([np.asarray(self._offsets, dtype=np.int64), self._offsets[-1] + np.cumsum(lengths)])
+
+        tmp_path = f"{path}.bin.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._blob[: int(self._offsets[-1])])
+            for value in encoded:
+                f.write(value)
+        os.replace(tmp_path, f"{path}.bin")
+        _save_array(f"{path}.offsets.npy", offsets)
+
+
+class HashIndex:
+    """Lookup of rows by a string key using sorted 64-bit hashes. Candidates must be verified against the key."""
+
+    def __init__(self, hashes: Optional[np.ndarray] = None, order: Optional[np.ndarray] = None):
+        self._hashes = hashes if hashes is not None else np.zeros(0, dtype=np.int64)
+        self._order = order if order is not None else np.zeros(0, dtype=np.int64)
+        self._pending: dict[str, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, key: str, row: int):
+        self._pending.setdefault(key, []).append(row)
+
+    def candidates(self, key: str) -> list[int]:
+        key_hash = _hash_id(key)
+        start = np.searchsorted(self._hashes, key_hash, side="left")
+        end = np.searchsorted(self._hashes, key_hash, side="right")
+        rows = [int(row) for row in self._order[start:end]]
+        rows.extend(self._pending.get(key, []))
+        return rows
+
+    @classmethod
+    def open(cls, path: str) -> "HashIndex":
+        return cls(_load_array(f"{path}_hashes.npy"), _load_array(f"{path}_order.npy"))
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(f"{path}_hashes.npy")
+
+    def write(self, path: str, column: StringColumn):
+        """Merge the pending rows, the keys of rows added since the last write are read from column."""
+        start_row = len(self._order)
+        end_row = len(column)
+        if end_row > start_row:
+            pending_hashes = np.fromiter(
+                (_hash_id(column[row]) for row in range(start_row, end_row)),
+                dtype=np.int64,
+                count=end_row - start_row,
+            )
+            hashes = np.concatenate([np.asarray(self._hashes), pending_hashes])
+            order = np.concatenate([np.asarray(self._order), np.arange(start_row, end_row, dtype=np.int64)])
+            sort_idx = np.argsort(hashes, kind="stable")
+            self._hashes = hashes[sort_idx]
+            self._order = order[sort_idx]
+
+        _save_array(f"{path}_hashes.npy", np.asarray(self._hashes))
+        _save_array(f"{path}_order.npy", np.asarray(self._order))
+        self._pending = {}
+
+
+class MmapFaissVectorStore(BasePydanticVectorStore):
+    """Vector store using Faiss with columnar, memory-mapped id and metadata tables.
+
+    Unlike SimpleFaissVectorStore nothing is parsed when the store is opened. New vector ids are allocated from a
+    counter and deleted vectors are tombstoned and filtered out at query time until the store is persisted.
+    """
+
+    stores_text: bool = False
+    d: int = 1536
+
+    _fs: fsspec.AbstractFileSystem = PrivateAttr()
+    _faiss_index: Any = PrivateAttr()
+    _index_path: Optional[str] = PrivateAttr(default=None)
+    _mmapped: bool = PrivateAttr(default=False)
+
+    _next_id: int = PrivateAttr(default=0)
+    _text_ids: StringColumn = PrivateAttr()
+    _ref_doc_ids: StringColumn = PrivateAttr()
+    _metadata: StringColumn = PrivateAttr()
+    _file_paths: StringColumn = PrivateAttr()
+
+    _ref_doc_index: HashIndex = PrivateAttr()
+    _file_path_index: HashIndex = PrivateAttr()
+
+    _persisted_test_mask: np.ndarray = PrivateAttr()
+    _pending_test_mask: list[bool] = PrivateAttr(default_factory=list)
+
+    _persisted_tombstones: np.ndarray = PrivateAttr()
+    _tombstones: Optional[set[int]] = PrivateAttr(default=None)
+    _pending_removals: set[int] = PrivateAttr(default_factory=set)
+
+    def __init__(
+        self,
+        faiss_index: Any,
+        d: int = 1536,
+        fs: fsspec.AbstractFileSystem | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(d=d, **kwargs)
+
+        self._faiss_index = cast(faiss.Index, faiss_index)
+        self._fs = fs or fsspec.filesystem("file")
+
+        self._text_ids = StringColumn()
+        self._ref_doc_ids = StringColumn()
+        self._metadata = StringColumn()
+        self._file_paths = StringColumn()
+        self._ref_doc_index = HashIndex()
+        self._file_path_index = HashIndex()
+        self._persisted_test_mask = np.zeros(0, dtype=np.uint8)
+        self._persisted_tombstones = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_defaults(cls, d: int = 1536):
+        return cls(faiss.IndexIDMap(faiss.IndexFlatL2(d)), d)
+
+    @property
+    def client(self) -> Any:
+        """Return the faiss index."""
+        return self._faiss_index
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def __len__(self) -> int:
+        return self._next_id - len(self._get_tombstones())
+
+    def _get_tombstones(self) -> set[int]:
+        # Loaded lazily to keep opening the store independent of the number of deleted vectors
+        if self._tombstones is None:
+            self._tombstones = {int(vector_id) for vector_id in self._persisted_tombstones}
+        return self._tombstones
+
+    def _writable_index(self):
+        """faiss can't mutate an index with memory-mapped storage, read it fully into memory before the first write."""
+        if self._mmapped:
+            logger.debug(f"Loading {self._index_path} into memory before modifying the index.")
+            self._faiss_index = faiss.read_index(self._index_path)
+            self._mmapped = False
+        return self._faiss_index
+
+    def add(
+        self,
+        nodes: list[BaseNode],
+        **add_kwargs: Any,
+    ) -> list[str]:
+        """Add nodes to index."""
+        if not nodes:
+            return []
+
+        start_id = self._next_id
+        logger.info(f"Adding {len(nodes)} nodes to index, start at id {start_id}.")
+
+        embeddings = []
+        for i, node in enumerate(nodes):
+            embeddings.append(node.get_embedding())
+
+            ref_doc_id = node.ref_doc_id or node.id_
+            self._text_ids.append(node.id_)
+            self._ref_doc_ids.append(ref_doc_id)
+            self._ref_doc_index.add(ref_doc_id, start_id + i)
+
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+            metadata.pop("_node_content", None)
+            self._metadata.append(json.dumps(metadata))
+
+            self._append_file_path(start_id + i, metadata.get("file_path", ""))
+
+        self._next_id += len(nodes)
+
+        vectors_ndarray = np.array(embeddings, dtype=np.float32)
+        ids_ndarray = np.arange(start_id, self._next_id, dtype=np.int64)
+        self._writable_index().add_with_ids(vectors_ndarray, ids_ndarray)
+
+        return [node.node_id for node in nodes]
+
+    def vector_ids_by_ref_doc_id(self, ref_doc_id: str) -> list[int]:
+        """Return the live vector ids for a ref doc id."""
+        tombstones = self._get_tombstones()
+        return [
+            vector_id
+            for vector_id in self._ref_doc_index.candidates(ref_doc_id)
+            if vector_id not in tombstones and self._ref_doc_ids[vector_id] == ref_doc_id
+        ]
+
+    def _append_file_path(self, vector_id: int, file_path: str):
+        self._file_paths.append(file_path)
+        self._file_path_index.add(file_path, vector_id)
+        self._pending_test_mask.append(is_test(file_path) if file_path else False)
+
+    def vector_ids_by_file_path(self, file_path: str) -> list[int]:
+        """Return the live vector ids for nodes in a file."""
+        tombstones = self._get_tombstones()
+        return [
+            vector_id
+            for vector_id in self._file_path_index.candidates(file_path)
+            if vector_id not in tombstones and self._file_paths[vector_id] == file_path
+        ]
+
+    def _test_mask(self) -> np.ndarray:
+        pending = np.array(self._pending_test_mask, dtype=bool)
+        return np.concatenate([np.asarray(self._persisted_test_mask, dtype=bool), pending])
+
+    def _create_search_mask(self, file_paths: Optional[list[str]], category: Optional[str]) -> np.ndarray:
+        if file_paths is not None:
+            mask = np.zeros(self._next_id, dtype=bool)
+            for file_path in file_paths:
+                mask[self.vector_ids_by_file_path(file_path)] = True
+        else:
+            mask = np.ones(self._next_id, dtype=bool)
+
+        if category == "test":
+            mask &= self._test_mask()
+        elif category:
+            mask &= ~self._test_mask()
+
+        tombstones = self._get_tombstones()
+        if tombstones:
+            mask[np.fromiter(tombstones, dtype=np.int64, count=len(tombstones))] = False
+
+        return mask
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """
+        Tombstone nodes with ref_doc_id. The vectors are removed from the faiss index on persist.
+
+        Args:
+            ref_doc_id (str): The doc_id of the document to delete.
+
+        """
+        vector_ids = self.vector_ids_by_ref_doc_id(ref_doc_id)
+        self._get_tombstones().update(vector_ids)
+        self._pending_removals.update(vector_ids)
+
+    def get_text_id(self, vector_id: int) -> str:
+        return self._text_ids[vector_id]
+
+    def get_metadata(self, vector_id: int) -> dict:
+        return json.loads(self._metadata[vector_id])
+
+    def query(
+        self,
+        query: VectorStoreQuery,
+        file_paths: Optional[list[str]] = None,
+        category: Optional[str] = None,
+        **kwargs: Any,
+    ) -> VectorStoreQueryResult:
+        """Query index for top k most similar nodes.
+
+        Args:
+            query_embedding (List[float]): query embedding
+            similarity_top_k (int): top k most similar nodes
+            file_paths (List[str]): only search nodes in these files
+            category (str): only search nodes in test files if "test", or in non test files for other categories
+
+        """
+        query_filter_fn = _build_metadata_filter_fn(lambda vector_id: self.get_metadata(vector_id), query.filters)
+
+        query_embedding = cast(list[float], query.query_embedding)
+        query_embedding_np = np.array(query_embedding, dtype="float32")[np.newaxis, :]
+
+        if file_paths is not None or category:
+            mask = self._create_search_mask(file_paths, category)
+            candidates = int(mask.sum())
+            if not candidates:
+                return VectorStoreQueryResult(similarities=[], ids=[])
+
+            bitmap = np.packbits(mask, bitorder="little")
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBitmap(bitmap))
+            top_k = min(query.similarity_top_k, candidates)
+            dists, indices = self._faiss_index.search(query_embedding_np, top_k, params=params)
+        else:
+            # Tombstoned vectors are still in the faiss index until next persist, search wider to compensate
+            top_k = query.similarity_top_k + len(self._pending_removals)
+            dists, indices = self._faiss_index.search(query_embedding_np, top_k)
+
+        if len(indices) == 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        tombstones = self._get_tombstones()
+
+        filtered_out = 0
+        filtered_dists = []
+        filtered_node_ids = []
+        seen_node_ids = set()
+        for dist, idx in zip(dists[0], indices[0], strict=False):
+            if idx < 0:
+                break
+
+            vector_id = int(idx)
+            if vector_id in tombstones or vector_id >= self._next_id:
+                continue
+
+            if not query_filter_fn(vector_id):
+                filtered_out += 1
+                continue
+
+            node_id = self._text_ids[vector_id]
+            if node_id in seen_node_ids:
+                continue
+
+            seen_node_ids.add(node_id)
+            filtered_node_ids.append(node_id)
+            filtered_dists.append(dist.item())
+
+            if len(filtered_node_ids) >= query.similarity_top_k:
+                break
+
+        if filtered_out:
+            logger.debug(f"Return {len(filtered_node_ids)} nodes ({filtered_out} filtered out).")
+
+        return VectorStoreQueryResult(similarities=filtered_dists, ids=filtered_node_ids)
+
+    def persist(
+        self,
+        persist_dir: str = DEFAULT_PERSIST_DIR,
+        fs: fsspec.AbstractFileSystem | None = None,
+    ) -> None:
+        """Persist the vector store to a directory."""
+        fs = fs or self._fs
+
+        # FAISS requires a path in the SWIG interface
+        if fs and not isinstance(fs, LocalFileSystem):
+            raise NotImplementedError("FAISS only supports local storage for now.")
+
+        if not os.path.exists(persist_dir):
+            os.makedirs(persist_dir)
+
+        if self._pending_removals:
+            ids_to_remove_array = np.array(sorted(self._pending_removals), dtype=np.int64)
+            removed = self._writable_index().remove_ids(ids_to_remove_array)
+            logger.info(f"Removed {removed} vectors from index.")
+            self._pending_removals = set()
+
+        index_path = os.path.join(persist_dir, FAISS_FNAME)
+        if self._mmapped and self._index_path == index_path:
+            logger.debug(f"Index at {index_path} is unchanged, skip writing it.")
+        else:
+            faiss.write_index(self._faiss_index, f"{index_path}.tmp")
+            os.replace(f"{index_path}.tmp", index_path)
+
+        self._ref_doc_index.write(os.path.join(persist_dir, "ref_doc"), self._ref_doc_ids)
+        self._file_path_index.write(os.path.join(persist_dir, "file_path"), self._file_paths)
+        _save_array(os.path.join(persist_dir, "test_mask.npy"), self._test_mask().astype(np.uint8))
+
+        self._text_ids.write(os.path.join(persist_dir, "text_ids"))
+        self._ref_doc_ids.write(os.path.join(persist_dir, "ref_doc_ids"))
+        self._metadata.write(os.path.join(persist_dir, "metadata"))
+        self._file_paths.write(os.path.join(persist_dir, "file_paths"))
+        _save_array(
+            os.path.join(persist_dir, "tombstones.npy"), np.array(sorted(self._get_tombstones()), dtype=np.int64)
+        )
+
+        # The manifest is written last so a partially persisted store is never picked up
+        manifest = {"version": FORMAT_VERSION, "dimensions": self.d, "next_id": self._next_id}
+        with fs.open(os.path.join(persist_dir, MANIFEST_FNAME), "w") as f:
+            json.dump(manifest, f)
+
+        # Reopen the columns from disk to drop the pending rows
+        self._open_columns(persist_dir)
+
+    def _open_columns(self, persist_dir: str):
+        self._text_ids = StringColumn.open(os.path.join(persist_dir, "text_ids"))
+        self._ref_doc_ids = StringColumn.open(os.path.join(persist_dir, "ref_doc_ids"))
+        self._metadata = StringColumn.open(os.path.join(persist_dir, "metadata"))
+        self._ref_doc_index = HashIndex.open(os.path.join(persist_dir, "ref_doc"))
+        self._pending_test_mask = []
+
+        if HashIndex.exists(os.path.join(persist_dir, "file_path")):
+            self._file_paths = StringColumn.open(os.path.join(persist_dir, "file_paths"))
+            self._file_path_index = HashIndex.open(os.path.join(persist_dir, "file_path"))
+            self._persisted_test_mask = _load_array(os.path.join(persist_dir, "test_mask.npy"), dtype=np.uint8)
+        else:
+            logger.info(f"No file path index found in {persist_dir}, building it from the metadata.")
+            self._file_paths = StringColumn()
+            self._file_path_index = HashIndex()
+            self._persisted_test_mask = np.zeros(0, dtype=np.uint8)
+            for vector_id in range(len(self._metadata)):
+                self._append_file_path(vector_id, self.get_metadata(vector_id).get("file_path", ""))
+
+    @classmethod
+    def exists(cls, persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, MANIFEST_FNAME))
+
+    @classmethod
+    def from_persist_dir(
+        cls, persist_dir: str, fs: fsspec.AbstractFileSystem | None = None, mmap_index: bool = True
+    ) -> "MmapFaissVectorStore":
+        """Open a MmapFaissVectorStore from a persist directory."""
+        fs = fs or fsspec.filesystem("file")
+        if not fs.exists(persist_dir):
+            raise ValueError(f"No existing index store found at {persist_dir}.")
+
+        if fs and not isinstance(fs, LocalFileSystem):
+            raise NotImplementedError("FAISS only supports local storage for now.")
+
+        with fs.open(os.path.join(persist_dir, MANIFEST_FNAME), "r") as f:
+            manifest = json.load(f)
+
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector store format version {manifest.get('version')} in {persist_dir}.")
+
+        index_path = os.path.join(persist_dir, FAISS_FNAME)
+        faiss_index = None
+        if mmap_index:
+            try:
+                faiss_index = faiss.read_index(index_path, _MMAP_FLAGS)
+            except RuntimeError:
+                logger.warning(f"Failed to memory map {index_path}, reading it into memory instead.")
+
+        store = cls(faiss_index=faiss_index or faiss.read_index(index_path), d=manifest["dimensions"])
+        store._index_path = index_path
+        store._mmapped = faiss_index is not None
+        store._next_id = manifest["next_id"]
+        store._open_columns(persist_dir)
+        store._persisted_tombstones = _load_array(os.path.join(persist_dir, "tombstones.npy"))
+
+        logger.info(f"Opened {__name__} from {persist_dir} with {store._next_id} vectors.")
+        return store
+
+    @classmethod
+    async def from_persist_dir_async(
+        cls, persist_dir: str, fs: fsspec.AbstractFileSystem | None = None
+    ) -> "MmapFaissVectorStore":
+        """Open a MmapFaissVectorStore from a persist directory (async version)."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, cls.from_persist_dir, persist_dir, fs)
+
+    @classmethod
+    def from_simple_store(cls, simple_store: Any) -> "MmapFaissVectorStore":
+        """Convert a SimpleFaissVectorStore to the memory-mapped format, vector ids are kept as is."""
+        data = simple_store._data
+        vector_ids = sorted(data.vector_id_to_text_id.keys())
+        next_id = vector_ids[-1] + 1 if vector_ids else 0
+
+        store = cls(faiss_index=simple_store.client, d=simple_store.d)
+        known_ids = set(vector_ids)
+        for vector_id in range(next_id):
+            if vector_id in known_ids:
+                text_id = data.vector_id_to_text_id[vector_id]
+                ref_doc_id = data.text_id_to_ref_doc_id.get(text_id, text_id)
+                metadata = data.metadata_dict.get(text_id, {})
+            else:
+                # Gaps left by earlier deletes are kept as tombstoned rows to keep ids aligned with rows
+                text_id, ref_doc_id, metadata = "", "", {}
+                store._get_tombstones().add(vector_id)
+
+            store._text_ids.append(text_id)
+            store._ref_doc_ids.append(ref_doc_id)
+            store._ref_doc_index.add(ref_doc_id, vector_id)
+            store._metadata.append(json.dumps(metadata))
+            store._append_file_path(vector_id, metadata.get("file_path", ""))
+
+        store._next_id = next_id
+        return store
@@ -0,0 +1,122 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import repeat
+from typing import Optional
+
+from llama_index.core.schema import BaseNode, Document
+
+from moatless.codeblocks.codeblocks import CodeBlock, CodeBlockType
+from moatless.index.settings import IndexSettings
+from moatless.utils.tokenizer import count_tokens_many
+
+logger = logging.getLogger(__name__)
+
+BlocksByName = dict[str, list[tuple[str, list[str]]]]
+
+# Starting worker processes costs more than splitting a few files
+MIN_DOCS_PER_WORKER = 25
+
+# More shards than workers to even out files that are slow to parse
+SHARDS_PER_WORKER = 4
+
+
+@dataclass
+class SplitResult:
+    """Chunk nodes with their token counts and the class and function blocks found while parsing."""
+
+    nodes: list[BaseNode] = field(default_factory=list)
+    tokens_by_node_id: dict[str, int] = field(default_factory=dict)
+    blocks_by_class_name: BlocksByName = field(default_factory=dict)
+    blocks_by_function_name: BlocksByName = field(default_factory=dict)
+
+    def merge(self, other: "SplitResult"):
+        self.nodes.extend(other.nodes)
+        self.tokens_by_node_id.update(other.tokens_by_node_id)
+        for name, blocks in other.blocks_by_class_name.items():
+            self.blocks_by_class_name.setdefault(name, []).extend(blocks)
+        for name, blocks in other.blocks_by_function_name.items():
+            self.blocks_by_function_name.setdefault(name, []).extend(blocks)
+
+
+def split_documents(
+    docs: list[Document], settings: IndexSettings, repo_path: str, show_progress: bool = False
+) -> SplitResult:
+    """Split documents into chunk nodes with the EpicSplitter and count the tokens of each node."""
+    from moatless.index.epic_split import EpicSplitter
+
+    result = SplitResult()
+
+    def index_callback(codeblock: CodeBlock):
+        if codeblock.type == CodeBlockType.CLASS:
+            blocks = result.blocks_by_class_name.setdefault(codeblock.identifier, [])
+            blocks.append((codeblock.module.file_path, codeblock.full_path()))
+
+        if codeblock.type == CodeBlockType.FUNCTION:
+            blocks = result.blocks_by_function_name.setdefault(codeblock.identifier, [])
+            blocks.append((codeblock.module.file_path, codeblock.full_path()))
+
+    splitter = EpicSplitter(
+        language=settings.language,
+        min_chunk_size=settings.min_chunk_size,
+        chunk_size=settings.chunk_size,
+        hard_token_limit=settings.hard_token_limit,
+        max_chunks=settings.max_chunks,
+        comment_strategy=settings.comment_strategy,
+        index_callback=index_callback,
+        repo_path=repo_path,
+    )
+
+    result.nodes = splitter.get_nodes_from_documents(docs, show_progress=show_progress)
+    tokens = count_tokens_many([node.get_content() for node in result.nodes], settings.embed_model)
+    result.tokens_by_node_id = {node.id_: node_tokens for node, node_tokens in zip(result.nodes, tokens, strict=True)}
+    return result
+
+
+def shard_documents(docs: list[Document], shards: int) -> list[list[Document]]:
+    """Split documents into contiguous shards of about the same content size to keep the order of the nodes."""
+    total_size = sum(len(doc.text) for doc in docs)
+    shard_size = max(total_size // shards, 1)
+
+    sharded_docs = []
+    current_shard = []
+    current_size = 0
+    for doc in docs:
+        current_shard.append(doc)
+        current_size += len(doc.text)
+        if current_size >= shard_size and len(sharded_docs) < shards - 1:
+            sharded_docs.append(current_shard)
+            current_shard = []
+            current_size = 0
+
+    if current_shard:
+        sharded_docs.append(current_shard)
+    return sharded_docs
+
+
+def split_documents_parallel(
+    docs: list[Document], settings: IndexSettings, repo_path: str, max_workers: Optional[int] = None
+) -> SplitResult:
+    """
+    Parse, chunk and count tokens of the documents in a pool of worker processes.
+
+    The result is the same as from split_documents(). Small sets of documents are split in the current process.
+    """
+    max_workers = min(max_workers or os.cpu_count() or 1, len(docs) // MIN_DOCS_PER_WORKER)
+    if max_workers <= 1:
+        return split_documents(docs, settings, repo_path, show_progress=True)
+
+    shards = shard_documents(docs, max_workers * SHARDS_PER_WORKER)
+    logger.info(f"Split {len(docs)} documents in {len(shards)} shards with {max_workers} worker processes")
+
+    start_time = time.time()
+    result = SplitResult()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for i, shard_result in enumerate(executor.map(split_documents, shards, repeat(settings), repeat(repo_path))):
+            result.merge(shard_result)
+            logger.debug(f"Merged shard {i + 1}/{len(shards)} with {len(shard_result.nodes)} nodes")
+
+    logger.info(f"Split {len(docs)} documents into {len(result.nodes)} nodes in {time.time() - start_time:.2f} seconds")
+    return result
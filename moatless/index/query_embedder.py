@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from llama_index.core.embeddings import BaseEmbedding
+from opentelemetry import trace
+
+from moatless.index.embed_model import get_embed_model
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[str, str]
+
+
+@dataclass
+class _Batch:
+    """Queries waiting to be embedded, futures and tasks are bound to the event loop the batch belongs to."""
+
+    pending: dict[CacheKey, asyncio.Future] = field(default_factory=dict)
+    queue: list[CacheKey] = field(default_factory=list)
+    flush_task: Optional[asyncio.Task] = None
+    full_batch_tasks: set[asyncio.Task] = field(default_factory=set)
+
+
+class QueryEmbedder:
+    """
+    Async query embeddings with a bounded LRU cache.
+
+    Concurrent requests for the same query share one embedding call, and queries requested within
+    batch_wait_seconds of each other are embedded concurrently in batches of at most max_batch_size queries. Requests
+    are batched per event loop, while the cache is shared by all event loops.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        model_name: str,
+        max_cache_size: int = 1000,
+        max_batch_size: int = 16,
+        batch_wait_seconds: float = 0.005,
+    ):
+        self._embed_model = embed_model
+        self._model_name = model_name
+        self._max_cache_size = max_cache_size
+        self._max_batch_size = max_batch_size
+        self._batch_wait_seconds = batch_wait_seconds
+
+        self._cache: OrderedDict[CacheKey, list[float]] = OrderedDict()
+        self._batches: dict[asyncio.AbstractEventLoop, _Batch] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.batches = 0
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        return self._embed_model
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / requests if requests else 0.0
+
+    async def get_query_embedding(self, query: str) -> list[float]:
+        key = (self._model_name, query)
+
+        embedding = self._cache.get(key)
+        if embedding is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            self._record("hit")
+            return embedding
+
+        loop = asyncio.get_running_loop()
+        batch = self._get_batch(loop)
+
+        future = batch.pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+            self._record("coalesced")
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        self._record("miss")
+
+        future = loop.create_future()
+        batch.pending[key] = future
+        batch.queue.append(key)
+
+        if len(batch.queue) >= self._max_batch_size:
+            task = loop.create_task(self._flush(batch))
+            batch.full_batch_tasks.add(task)
+            task.add_done_callback(batch.full_batch_tasks.discard)
+        elif batch.flush_task is None or batch.flush_task.done():
+            batch.flush_task = loop.create_task(self._flush_after_wait(batch))
+
+        return await asyncio.shield(future)
+
+    def _get_batch(self, loop: asyncio.AbstractEventLoop) -> _Batch:
+        if loop not in self._batches:
+            # Drop the batches of closed event loops, their tasks will never run
+            for closed_loop in [batch_loop for batch_loop in self._batches if batch_loop.is_closed()]:
+                del self._batches[closed_loop]
+            self._batches[loop] = _Batch()
+        return self._batches[loop]
+
+    async def _flush_after_wait(self, batch: _Batch):
+        await asyncio.sleep(self._batch_wait_seconds)
+        batch.flush_task = None
+        while batch.queue:
+            await self._flush(batch)
+
+    async def _flush(self, batch: _Batch):
+        keys = batch.queue[: self._max_batch_size]
+        batch.queue = batch.queue[self._max_batch_size :]
+        if not keys:
+            return
+
+        self.batches += 1
+        queries = [query for _, query in keys]
+        try:
+            embeddings = await self._embed_queries(queries)
+        except Exception as e:
+            for key in keys:
+                future = batch.pending.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, embedding in zip(keys, embeddings, strict=True):
+            self._add_to_cache(key, embedding)
+            future = batch.pending.pop(key)
+            if not future.done():
+                future.set_result(embedding)
+
+    def _add_to_cache(self, key: CacheKey, embedding: list[float]):
+        self._cache[key] = embedding
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_cache_size:
+            self._cache.popitem(last=False)
+
+    async def _embed_queries(self, queries: list[str]) -> list[list[float]]:
+        logger.debug(f"Embedding {len(queries)} queries with {self._model_name}")
+        # The batch embedding API embeds texts as documents, so the queries in a batch are embedded concurrently
+        return list(await asyncio.gather(*[self._embed_model.aget_query_embedding(query) for query in queries]))
+
+    def _record(self, result: str):
+        span = trace.get_current_span()
+        span.set_attribute("embedding.cache_result", result)
+        span.set_attribute("embedding.cache_hits", self.hits)
+        span.set_attribute("embedding.cache_misses", self.misses)
+        span.set_attribute("embedding.cache_coalesced", self.coalesced)
+        span.set_attribute("embedding.cache_hit_rate", self.hit_rate)
+
+
+_query_embedders: dict[str, QueryEmbedder] = {}
+
+
+def get_query_embedder(model_name: str) -> QueryEmbedder:
+    """Get the process-wide query embedder for a model to share its cache between code indexes."""
+    if model_name not in _query_embedders:
+        _query_embedders[model_name] = QueryEmbedder(get_embed_model(model_name), model_name)
+    return _query_embedders[model_name]
@@ -8,7 +8,7 @@ from moatless.completion.schema import (
 )
 from moatless.message_history.base import BaseMemory
 from moatless.node import Node
-from moatless.utils.tokenizer import count_tokens
+from moatless.utils.tokenizer import count_tokens, count_tokens_many
 from moatless.workspace import Workspace
 from pydantic import BaseModel, Field, PrivateAttr, model_serializer
 
@@ -92,7 +92,8 @@ class MessageHistoryGenerator(BaseMemory):
             all_messages.extend(node_messages)
 
         # If we don't have a token limit or all messages fit, return them all
-        total_tokens = sum(count_tokens(str(msg)) for msg in all_messages)
+        message_tokens = count_tokens_many([str(msg) for msg in all_messages])
+        total_tokens = sum(message_tokens)
         if not self.max_tokens or total_tokens <= self.max_tokens:
             logger.info(f"Generated {len(all_messages)} messages with {total_tokens} tokens")
             return all_messages
@@ -100,7 +101,7 @@ class MessageHistoryGenerator(BaseMemory):
         # We need to select messages based on the token limit
         # Always try to include the first message
         first_message = all_messages[0] if all_messages else None
-        first_message_tokens = count_tokens(str(first_message)) if first_message else 0
+        first_message_tokens = message_tokens[0] if first_message else 0
 
         # If we can't fit even the first message, we need to truncate it somehow
         if first_message_tokens > self.max_tokens:
@@ -109,24 +110,25 @@ class MessageHistoryGenerator(BaseMemory):
             raise RuntimeError("First message exceeds token limit")
 
         # Start with the first message
-        selected_messages = [first_message] if first_message else []
+        selected_indexes = [0] if first_message else []
         remaining_tokens = self.max_tokens - first_message_tokens
 
         # Try to include recent messages, starting from the most recent
-        for msg in reversed(all_messages[1:]):
-            msg_tokens = count_tokens(str(msg))
+        for i in range(len(all_messages) - 1, 0, -1):
+            msg_tokens = message_tokens[i]
             if msg_tokens <= remaining_tokens:
                 # We can include this message
-                selected_messages.insert(1, msg)  # Insert after first message
+                selected_indexes.append(i)
                 remaining_tokens -= msg_tokens
             else:
                 # This message doesn't fit
                 continue
 
         # Sort messages to maintain conversation order
-        selected_messages.sort(key=lambda msg: all_messages.index(msg))
+        selected_indexes.sort()
+        selected_messages = [all_messages[i] for i in selected_indexes]
 
-        actual_tokens = sum(count_tokens(str(msg)) for msg in selected_messages)
+        actual_tokens = sum(message_tokens[i] for i in selected_indexes)
         logger.info(
             f"Generated {len(selected_messages)} messages with {actual_tokens} tokens (limited by max_tokens={self.max_tokens})"
         )
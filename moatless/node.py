@@ -4,17 +4,21 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Optional, Union
 
-from pydantic import BaseModel, Field, field_validator, ConfigDict
+from pydantic import BaseModel, Field, field_validator, ConfigDict, PrivateAttr
 
 from moatless.actions.schema import ActionArguments, Observation
 from moatless.artifacts.artifact import ArtifactChange
 from moatless.completion.stats import CompletionInvocation, Usage
 from moatless.file_context import FileContext
+from moatless.node_registry import USAGE_FIELDS, NodeRegistry
 from moatless.repository.repository import Repository
 from moatless.runtime.runtime import RuntimeEnvironment
 
 logger = logging.getLogger(__name__)
 
+# Assigning these fields changes the structure of the tree and drops the node registry
+STRUCTURE_FIELDS = frozenset({"node_id", "parent", "children"})
+
 
 class ActionStep(BaseModel):
     action: ActionArguments
@@ -234,6 +238,10 @@ class Node(BaseModel):
     )
     evaluation_result: Optional[EvaluationResult] = Field(None, description="The evaluation result of the node")
 
+    _registry: Optional[NodeRegistry] = PrivateAttr(default=None)
+    # Whether the node changed since it was last taken by pop_changed_nodes
+    _changed: bool = PrivateAttr(default=True)
+
     model_config = ConfigDict(ser_json_timedelta="iso8601", json_encoders={datetime: lambda dt: dt.isoformat()})
 
     @field_validator("timestamp", mode="before")
@@ -243,6 +251,33 @@ class Node(BaseModel):
             return datetime.fromisoformat(value)
         return value
 
+    def __setattr__(self, name: str, value: Any):
+        if name in STRUCTURE_FIELDS:
+            # Drop the registry of the tree the node is detached from as well as the one it's attached to
+            self.get_root()._registry = None
+            super().__setattr__(name, value)
+            self.get_root()._registry = None
+        else:
+            super().__setattr__(name, value)
+            if name == "max_expansions" or name in USAGE_FIELDS:
+                registry = self.get_root()._registry
+                if registry:
+                    registry.node_changed(self, name)
+
+        if name not in self.__private_attributes__:
+            self._changed = True
+
+    def mark_changed(self):
+        """Mark the node as changed after changing it in place, assigning a field marks it as changed."""
+        self._changed = True
+
+    def pop_changed_nodes(self) -> list["Node"]:
+        """Get the nodes in the tree that changed since the last call, to persist only those nodes."""
+        nodes = [node for node in self.get_all_nodes() if node._changed]
+        for node in nodes:
+            node._changed = False
+        return nodes
+
     @property
     def action(self) -> Optional[ActionArguments]:
         """Backward compatibility: Get action from the latest action step"""
@@ -322,7 +357,7 @@ class Node(BaseModel):
 
     def create_child(self, **kwargs):
         child_node = Node(
-            node_id=len(self.get_root().get_all_nodes()) + 1,
+            node_id=self.get_root().node_count() + 1,
             parent=self,
             file_context=self.file_context.clone() if self.file_context else None,
             max_expansions=self.max_expansions,
@@ -335,9 +370,15 @@ class Node(BaseModel):
 
     def add_child(self, child_node: "Node"):
         """Add a child node to this node."""
-        child_node.parent = self
+        # Set the parent without dropping the registry, it's updated with the new child below
+        BaseModel.__setattr__(child_node, "parent", self)
+        child_node._registry = None
         self.children.append(child_node)
 
+        registry = self.get_root()._registry
+        if registry:
+            registry.child_added(self, child_node)
+
     def set_parent(self, parent: "Node"):
         if self.node_id == parent.node_id:
             raise ValueError(f"Node can't have same id {self.node_id} parent")
@@ -390,6 +431,9 @@ class Node(BaseModel):
 
     def get_expandable_descendants(self) -> list["Node"]:
         """Get all expandable descendants of this node, including self if expandable."""
+        if not self.parent:
+            return self._get_registry().get_expandable_nodes()
+
         expandable_nodes = []
         if self.is_expandable():
             expandable_nodes.append(self)
@@ -416,32 +460,27 @@ class Node(BaseModel):
         return expanded_nodes
 
     def get_all_nodes(self) -> list["Node"]:
-        if self.parent:
-            node = self.get_root()
-        else:
-            node = self
+        return self._get_registry().get_all_nodes()
 
-        return node._get_all_nodes()
+    def node_count(self) -> int:
+        """Get the number of nodes in the tree."""
+        return len(self._get_registry())
 
     def get_last_node(self) -> "Node":
-        return self.get_all_nodes()[-1]
+        return self._get_registry().get_last_node()
 
     def get_node_by_id(self, node_id: int) -> Optional["Node"]:
-        for node in self.get_all_nodes():
-            if node.node_id == node_id:
-                return node
-        return None
+        return self._get_registry().get(node_id)
 
     def get_leaf_nodes(self) -> list["Node"]:
         """Get all leaf nodes ."""
-        return [node for node in self.get_root().get_all_nodes() if node.is_leaf()]
+        return self._get_registry().get_leaf_nodes()
 
-    def _get_all_nodes(self) -> list["Node"]:
-        nodes = []
-        nodes.append(self)
-        for child in self.children:
-            nodes.extend(child._get_all_nodes())
-        return nodes
+    def _get_registry(self) -> NodeRegistry:
+        root = self.get_root()
+        if root._registry is None:
+            root._registry = NodeRegistry(root)
+        return root._registry
 
     def get_root(self) -> "Node":
         node = self
@@ -463,31 +502,43 @@ class Node(BaseModel):
 
     def total_usage(self) -> Usage:
         """Calculate total token usage all nodes."""
-        total_usage = Usage()
-        for node in self.get_all_nodes():
-            total_usage += node.usage()
-        return total_usage
+        return self._get_registry().total_usage()
 
     def usage(self) -> Usage:
         """Calculate total token usage for this node."""
         usage = Usage()
+        for completion in self._get_completions():
+            usage += completion.usage
+        return usage
 
-        # Sum usage across all action steps
-        for step in self.action_steps:
-            if step.completion and step.completion.usage:
-                usage += step.completion.usage
+    def usage_signature(self) -> tuple:
+        """Get a signature of the token counts and costs of the completion attempts of the node."""
+        return tuple(
+            tuple(
+                (
+                    attempt.usage.completion_cost,
+                    attempt.usage.completion_tokens,
+                    attempt.usage.prompt_tokens,
+                    attempt.usage.cache_read_tokens,
+                    attempt.usage.cache_write_tokens,
+                    attempt.usage.reasoning_tokens,
+                )
+                for attempt in completion.attempts
+            )
+            for completion in self._get_completions()
+        )
 
-        for completion in self.completions.values():
-            if completion and completion.usage:
-                usage += completion.usage
+    def _get_completions(self) -> list[CompletionInvocation]:
+        completions = [step.completion for step in self.action_steps if step.completion]
+        completions.extend(completion for completion in self.completions.values() if completion)
 
-        if self.reward and self.reward.completion and self.reward.completion.usage:
-            usage += self.reward.completion.usage
+        if self.reward and self.reward.completion:
+            completions.append(self.reward.completion)
 
-        if self.feedback_data and self.feedback_data.completion and self.feedback_data.completion.usage:
-            usage += self.feedback_data.completion.usage
+        if self.feedback_data and self.feedback_data.completion:
+            completions.append(self.feedback_data.completion)
 
-        return usage
+        return completions
 
     def has_same_action_steps(self, other: "Node"):
         if self.action_steps and not other.action_steps:
@@ -528,14 +579,12 @@ class Node(BaseModel):
 
     def clone(self) -> "Node":
         """Clone the node state."""
-        new_node = self.model_copy(deep=True, update={"children": []})
-        if self.parent:
-            self.parent.children.append(new_node)
-        else:
+        if not self.parent:
             raise ValueError("Cannot clone root node")
 
-        node_id = len(self.get_all_nodes())
-        new_node.node_id = node_id
+        new_node = self.model_copy(deep=True, update={"children": []})
+        new_node.node_id = self.node_count() + 1
+        self.parent.add_child(new_node)
         return new_node
 
     def model_dump(self, **kwargs) -> dict[str, Any]:
@@ -663,8 +712,7 @@ class Node(BaseModel):
 
             for child_data in children:
                 child = cls._reconstruct_node(child_data, repo=repo, runtime=runtime)
-                child.parent = node
-                node.children.append(child)
+                node.add_child(child)
 
             return node
         else:
@@ -683,12 +731,12 @@ class Node(BaseModel):
     def from_file(
         cls, file_path: Path, repo: Repository | None = None, runtime: RuntimeEnvironment | None = None, **kwargs
     ) -> "Node":
+        from moatless.flow.trajectory_journal import read_trajectory_file
+
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
 
-        with open(file_path) as f:
-            data = json.load(f)
-
+        data = read_trajectory_file(file_path)
         return cls.from_dict(data, repo=repo, runtime=runtime)
 
     @classmethod
@@ -756,11 +804,12 @@ class Node(BaseModel):
             logger.debug(f"Reconstructed tree:\n{tree}")
         return root_nodes[0]
 
-    def dump_as_list(self, **kwargs) -> list[dict[str, Any]]:
+    def dump_as_list(self, nodes: Optional[list["Node"]] = None, **kwargs) -> list[dict[str, Any]]:
         """
-        Dump all nodes as a flat list structure.
+        Dump all nodes, or only the given nodes, as a flat list structure.
         """
-        nodes = self.get_all_nodes()
+        if nodes is None:
+            nodes = self.get_all_nodes()
         node_list = []
 
         for node in nodes:
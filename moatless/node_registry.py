@@ -0,0 +1,147 @@
+from typing import TYPE_CHECKING, Optional
+
+from moatless.completion.stats import Usage
+
+if TYPE_CHECKING:
+    from moatless.node import Node
+
+# Node fields that the usage of a node is calculated from
+USAGE_FIELDS = frozenset({"action_steps", "completions", "reward", "feedback_data"})
+
+UsageEntry = tuple[tuple, Usage]
+
+
+class NodeRegistry:
+    """
+    Index of the nodes in a tree, owned by the root node and updated as children are added.
+
+    Nodes are looked up by id and counted without walking the tree. Leaf nodes and nodes that are not fully expanded
+    are kept as sets, and the usage of all nodes is kept as a running total. Only the usage signatures of leaf nodes
+    are checked for new completions, expanded nodes are updated when their completion fields are assigned.
+    The preorder of the nodes is only rebuilt when a child is added somewhere other than the end of the tree.
+    Other changes to the structure of the tree, like replacing the children of a node, drop the registry and it's
+    rebuilt on next use.
+    """
+
+    def __init__(self, root: "Node"):
+        self._root = root
+        self._nodes_by_id: dict[int, "Node"] = {}
+        self._node_count = 0
+        self._leaves: dict[int, "Node"] = {}
+        self._open: dict[int, "Node"] = {}
+        self._usage_by_node: dict[int, UsageEntry] = {}
+        self._total_usage = Usage()
+
+        self._preorder: Optional[list["Node"]] = None
+        self._positions: dict[int, int] = {}
+
+        nodes = _walk(root)
+        for node in nodes:
+            self._register(node)
+        self._set_preorder(nodes)
+
+    def __len__(self) -> int:
+        return self._node_count
+
+    def get(self, node_id: int) -> Optional["Node"]:
+        return self._nodes_by_id.get(node_id)
+
+    def get_all_nodes(self) -> list["Node"]:
+        """All nodes in preorder, the same order as a depth first walk from the root."""
+        return list(self._get_preorder())
+
+    def get_last_node(self) -> "Node":
+        node = self._root
+        while node.children:
+            node = node.children[-1]
+        return node
+
+    def get_leaf_nodes(self) -> list["Node"]:
+        return self._in_preorder(self._leaves.values())
+
+    def get_expandable_nodes(self) -> list["Node"]:
+        return [node for node in self._in_preorder(self._open.values()) if node.is_expandable()]
+
+    def total_usage(self) -> Usage:
+        for node in self._leaves.values():
+            self._update_usage(node)
+        return self._total_usage
+
+    def child_added(self, parent: "Node", child: "Node"):
+        if self._preorder is not None and self._is_last_in_preorder(parent):
+            subtree = _walk(child)
+            for node in subtree:
+                self._positions[id(node)] = len(self._preorder)
+                self._preorder.append(node)
+        else:
+            self._preorder = None
+            subtree = None
+
+        self._leaves.pop(id(parent), None)
+        self._update_open(parent)
+        self._update_usage(parent)
+
+        for node in subtree or _walk(child):
+            self._register(node)
+
+    def node_changed(self, node: "Node", name: str):
+        if name == "max_expansions":
+            self._update_open(node)
+        elif name in USAGE_FIELDS:
+            self._update_usage(node)
+
+    def _register(self, node: "Node"):
+        self._nodes_by_id.setdefault(node.node_id, node)
+        self._node_count += 1
+        if not node.children:
+            self._leaves[id(node)] = node
+        self._update_open(node)
+        self._update_usage(node)
+
+    def _update_open(self, node: "Node"):
+        if node.is_fully_expanded():
+            self._open.pop(id(node), None)
+        else:
+            self._open[id(node)] = node
+
+    def _update_usage(self, node: "Node"):
+        signature = node.usage_signature()
+        entry = self._usage_by_node.get(id(node))
+        if entry and entry[0] == signature:
+            return
+
+        usage = node.usage()
+        if entry:
+            self._total_usage -= entry[1]
+        self._total_usage += usage
+        self._usage_by_node[id(node)] = (signature, usage)
+
+    def _is_last_in_preorder(self, node: "Node") -> bool:
+        while node.parent:
+            if node.parent.children[-1] is not node:
+                return False
+            node = node.parent
+        return True
+
+    def _get_preorder(self) -> list["Node"]:
+        if self._preorder is None:
+            self._set_preorder(_walk(self._root))
+        return self._preorder
+
+    def _set_preorder(self, nodes: list["Node"]):
+        self._preorder = nodes
+        self._positions = {id(node): position for position, node in enumerate(nodes)}
+
+    def _in_preorder(self, nodes) -> list["Node"]:
+        self._get_preorder()
+        return sorted(nodes, key=lambda node: self._positions[id(node)])
+
+
+def _walk(node: "Node") -> list["Node"]:
+    nodes = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(reversed(node.children))
+    return nodes
@@ -1,15 +1,20 @@
 import asyncio
 import difflib
+import fnmatch
 import logging
 import os
+import re
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import anyio
-from moatless.codeblocks import get_parser_by_path
 from moatless.codeblocks.module import Module
+from moatless.codeblocks.parse_cache import parse_module
+from moatless.repository.file_tree import FileTree
 from moatless.repository.repository import Repository
+from moatless.repository.search_index import TrigramIndex, compile_regex, literal_query, read_lines, regex_query
 from opentelemetry import trace
 from pydantic import BaseModel, Field, PrivateAttr
 
@@ -26,6 +31,8 @@ class CodeFile(BaseModel):
     _module: Module | None = PrivateAttr(None)
     _dirty: bool = PrivateAttr(False)
     _last_modified: datetime | None = PrivateAttr(None)
+    _repository: Optional["FileRepository"] = PrivateAttr(None)
+    _version: Optional[tuple[int, int]] = PrivateAttr(None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -33,10 +40,11 @@ class CodeFile(BaseModel):
         self._repo_path = kwargs.get("repo_path", None)
         self._module = kwargs.get("_module", None)
         self._last_modified = kwargs.get("_last_modified", None)
+        self._repository = kwargs.get("repository", None)
 
     @classmethod
-    def from_file(cls, repo_path: str, file_path: str):
-        return cls(file_path=file_path, repo_path=repo_path)
+    def from_file(cls, repo_path: str, file_path: str, repository: Optional["FileRepository"] = None):
+        return cls(file_path=file_path, repo_path=repo_path, repository=repository)
 
     @classmethod
     def from_content(cls, file_path: str, content: str):
@@ -49,6 +57,9 @@ class CodeFile(BaseModel):
         if not self._repo_path:
             raise ValueError("CodeFile must be initialized with a repo path")
 
+        if self._repository and self._repository.trust_write_notifications:
+            return self._version != self._repository.get_file_version(self.file_path)
+
         try:
             full_file_path = os.path.join(self._repo_path, self.file_path)
             current_mod_time = datetime.fromtimestamp(os.path.getmtime(full_file_path))
@@ -71,11 +82,17 @@ class CodeFile(BaseModel):
             self._last_modified = datetime.fromtimestamp(os.path.getmtime(f.name))
             self._module = None
 
+        if self._repository:
+            self._repository._notify_file_written(self.file_path)
+            self._version = self._repository.get_file_version(self.file_path)
+
     @property
     def content(self):
         if self.has_been_modified():
             if self._repo_path is None:
                 raise ValueError("Repository path is not set")
+            if self._repository:
+                self._version = self._repository.get_file_version(self.file_path)
             try:
                 with open(os.path.join(self._repo_path, self.file_path)) as f:
                     self._content = f.read()
@@ -99,15 +116,13 @@ class CodeFile(BaseModel):
 
     @property
     def module(self) -> Module | None:
-        if self._module is None or self.has_been_modified() and self.content.strip():
-            parser = get_parser_by_path(self.file_path)
-            if parser:
-                try:
-                    self._module = parser.parse(self.content)
-                except Exception as e:
-                    logger.warning(f"Failed to parse {self.file_path}: {e}")
-                    return None
-            else:
+        # Reading the content resets the module if the file has been modified
+        content = self.content
+        if self._module is None:
+            try:
+                self._module = parse_module(self.file_path, content)
+            except Exception as e:
+                logger.warning(f"Failed to parse {self.file_path}: {e}")
                 return None
 
         return self._module
@@ -115,6 +130,30 @@ class CodeFile(BaseModel):
 
 class FileRepository(Repository):
     repo_path: str = Field(..., description="The path to the repository")
+    use_search_index: bool = Field(
+        True, description="Search file contents with an in-memory trigram index instead of running grep."
+    )
+    cache_file_tree: bool = Field(
+        True, description="Match glob patterns against an in-memory file tree instead of walking the file system."
+    )
+    file_tree_refresh_interval: float = Field(
+        1.0,
+        description="Seconds between checks of the file tree and the search index against the file system, files "
+        "changed outside of the repository in between are not matched until the next check or invalidate_files().",
+    )
+    trust_write_notifications: bool = Field(
+        False,
+        description="Assume files are only changed through the repository and don't check file modification times.",
+    )
+
+    _search_index: Optional[TrigramIndex] = PrivateAttr(None)
+    _file_tree: Optional[FileTree] = PrivateAttr(None)
+    _file_tree_refreshed_at: float = PrivateAttr(0.0)
+    _file_tree_generation: int = PrivateAttr(0)
+    _search_index_refreshed_at: float = PrivateAttr(0.0)
+    _search_index_generation: int = PrivateAttr(0)
+    _file_versions: dict[str, int] = PrivateAttr(default_factory=dict)
+    _files_generation: int = PrivateAttr(0)
 
     @property
     def repo_dir(self):
@@ -196,7 +235,7 @@ class FileRepository(Repository):
             logger.warning(f"{full_file_path} is not a file")
             return None
 
-        file = CodeFile.from_file(file_path=file_path, repo_path=self.repo_path)
+        file = CodeFile.from_file(file_path=file_path, repo_path=self.repo_path, repository=self)
         return file
 
     def file_exists(self, file_path: str):
@@ -212,6 +251,8 @@ class FileRepository(Repository):
         with open(full_file_path, "w") as f:
             f.write("")
 
+        self._notify_file_written(file_path)
+
     def save_file(self, file_path: str, updated_content: str):
         assert updated_content, "Updated content must be provided"
 
@@ -221,6 +262,8 @@ class FileRepository(Repository):
         with open(self.get_full_path(file_path), "w") as f:
             f.write(updated_content)
 
+        self._notify_file_written(file_path)
+
     @tracer.start_as_current_span("matching_files")
     async def matching_files(self, file_pattern: str) -> list[str]:
         """
@@ -269,6 +312,13 @@ class FileRepository(Repository):
             if pattern_parts[-1] != filename:
                 file_pattern = "/".join(pattern_parts)
 
+            if self.cache_file_tree:
+                file_tree = await asyncio.to_thread(self._get_file_tree)
+                matched_files = file_tree.match(file_pattern)
+                if not has_wildcards:
+                    matched_files = [path for path in matched_files if os.path.basename(path) == filename]
+                return matched_files
+
             repo_path = anyio.Path(self.repo_path)
             matched_files = []
 
@@ -292,6 +342,10 @@ class FileRepository(Repository):
         Uses native async file operations via anyio.Path.
         """
 
+        if self.cache_file_tree:
+            file_tree = await asyncio.to_thread(self._get_file_tree)
+            return [file_path for pattern in patterns for file_path in file_tree.match(f"**/{pattern}")]
+
         matched_files = []
         for pattern in patterns:
             repo_path = anyio.Path(self.repo_path)
@@ -311,6 +365,9 @@ class FileRepository(Repository):
         """
         Uses grep to search for exact text matches in files asynchronously.
         """
+        if self.use_search_index:
+            return await self._find_exact_matches_in_index(search_text, file_pattern)
+
         matches = []
         search_path = "."
         include_arg = []
@@ -431,6 +488,11 @@ class FileRepository(Repository):
         Lists files and directories in the specified directory.
         Returns a dictionary with 'files' and 'directories' lists.
         """
+        if self.cache_file_tree:
+            listing = self._get_file_tree().list_directory(self.get_relative_path(directory_path))
+            if listing is not None:
+                return listing
+
         full_path = self.get_full_path(directory_path)
 
         if not os.path.exists(full_path):
@@ -471,6 +533,12 @@ class FileRepository(Repository):
             List[Dict[str, Any]]: A list of dictionaries containing file path, line number,
                                  line content, and modification time
         """
+        if self.use_search_index:
+            regex = compile_regex(regex_pattern)
+            if regex:
+                return await self._find_regex_matches_in_index(regex, include_pattern, max_results)
+            logger.info(f"Regex {regex_pattern} isn't supported by the search index, falling back to grep")
+
         try:
             # Apply include pattern if provided
             if include_pattern and "**" in include_pattern:
@@ -539,6 +607,174 @@ class FileRepository(Repository):
             logger.exception(f"Grep command failed: {e}")
             return []
 
+    def get_file_version(self, file_path: str) -> tuple[int, int]:
+        """Version of a file that changes when it's written through the repository or files are invalidated."""
+        return self._files_generation, self._file_versions.get(self.get_relative_path(file_path), 0)
+
+    def invalidate_files(self):
+        """Mark all files as changed, call this after files have been changed outside of the repository."""
+        self._files_generation += 1
+
+    def _notify_file_written(self, file_path: str):
+        relative_path = self.get_relative_path(file_path)
+        self._file_versions[relative_path] = self._file_versions.get(relative_path, 0) + 1
+        if self._file_tree:
+            self._file_tree.add_file(relative_path)
+        if self._search_index:
+            self._search_index.update_file(relative_path)
+
+    def _get_file_tree(self) -> FileTree:
+        """
+        Get the file tree for the repository, built on first use and refreshed with changes on disk at most once per
+        file_tree_refresh_interval, or never with trust_write_notifications, until files are invalidated.
+        """
+        if self._file_tree is None:
+            self._file_tree = FileTree(self.repo_path)
+        elif self._file_tree_generation == self._files_generation and (
+            self.trust_write_notifications
+            or time.monotonic() - self._file_tree_refreshed_at < self.file_tree_refresh_interval
+        ):
+            return self._file_tree
+
+        self._file_tree.refresh()
+        self._file_tree_refreshed_at = time.monotonic()
+        self._file_tree_generation = self._files_generation
+        return self._file_tree
+
+    async def _get_search_index(self) -> TrigramIndex:
+        """
+        Get the trigram index for the repository, built on first use and refreshed with changes on disk at most once
+        per file_tree_refresh_interval, or never with trust_write_notifications, until files are invalidated. Files
+        written through the repository are re-indexed before the next search.
+        """
+        if self._search_index is None:
+            self._search_index = TrigramIndex(self.repo_path)
+        elif self._search_index_generation == self._files_generation and (
+            self.trust_write_notifications
+            or time.monotonic() - self._search_index_refreshed_at < self.file_tree_refresh_interval
+        ):
+            return self._search_index
+
+        await asyncio.to_thread(self._search_index.refresh)
+        self._search_index_refreshed_at = time.monotonic()
+        self._search_index_generation = self._files_generation
+        return self._search_index
+
+    async def _search_scope(
+        self, file_pattern: Optional[str], all_files: list[str], exact: bool
+    ) -> Optional[list[str]]:
+        """
+        Resolve the files to search in the same way as the grep commands, returns None to search all files.
+        """
+
+        def under_directory(directory: str, name_pattern: str) -> list[str]:
+            directory = directory.strip("/")
+            if directory.startswith("./"):
+                directory = directory[2:]
+            prefix = f"{directory}/" if directory and directory != "." else ""
+            return [
+                file_path
+                for file_path in all_files
+                if file_path.startswith(prefix) and fnmatch.fnmatchcase(os.path.basename(file_path), name_pattern)
+            ]
+
+        if not file_pattern or file_pattern == ".":
+            return None
+
+        if file_pattern.endswith("/") or os.path.isdir(os.path.join(self.repo_path, file_pattern)):
+            # When searching in a directory, include all common code files by default
+            return under_directory(file_pattern, "*.py")
+
+        if "**" in file_pattern and "/" not in file_pattern:
+            return under_directory("", file_pattern.replace("**", "*"))
+
+        if "/" in file_pattern and any(c in file_pattern for c in "*?"):
+            return await self.matching_files(file_pattern)
+
+        if "*" in file_pattern:
+            return under_directory("", file_pattern)
+
+        if "/" in file_pattern:
+            return under_directory(os.path.dirname(file_pattern), os.path.basename(file_pattern))
+
+        if exact:
+            # A specific file in the root directory
+            return [file_pattern]
+
+        return under_directory("", file_pattern)
+
+    @tracer.start_as_current_span("find_exact_matches_in_index")
+    async def _find_exact_matches_in_index(
+        self, search_text: str, file_pattern: Optional[str] = None
+    ) -> list[tuple[str, int]]:
+        index = await self._get_search_index()
+        search_scope = await self._search_scope(file_pattern, index.file_paths, exact=True)
+        if search_scope is not None and not search_scope:
+            return []
+
+        # Like grep -F, each line in the search text is a separate pattern
+        patterns = search_text.split("\n")
+
+        def search() -> list[tuple[str, int]]:
+            candidates = index.candidates(literal_query(search_text), search_scope)
+            matches = []
+            for file_path in candidates:
+                try:
+                    lines = read_lines(os.path.join(self.repo_path, file_path))
+                except OSError as e:
+                    logger.warning(f"Failed to read {file_path}: {e}")
+                    continue
+
+                for line_num, line in enumerate(lines, start=1):
+                    if any(pattern in line for pattern in patterns):
+                        matches.append((file_path, line_num))
+
+            logger.info(f"Found {len(matches)} matches in {len(candidates)} candidate files")
+            return matches
+
+        return await asyncio.to_thread(search)
+
+    @tracer.start_as_current_span("find_regex_matches_in_index")
+    async def _find_regex_matches_in_index(
+        self, regex: re.Pattern, include_pattern: Optional[str], max_results: int
+    ) -> list[dict[str, Any]]:
+        index = await self._get_search_index()
+        search_scope = await self._search_scope(include_pattern, index.file_paths, exact=False)
+        if search_scope is not None and not search_scope:
+            logger.info(f"No files matched pattern: {include_pattern}")
+            return []
+
+        def search() -> list[dict[str, Any]]:
+            candidates = []
+            for file_path in index.candidates(regex_query(regex.pattern), search_scope):
+                try:
+                    candidates.append((file_path, os.path.getmtime(os.path.join(self.repo_path, file_path))))
+                except OSError as e:
+                    logger.warning(f"Error getting file stats for {file_path}: {e}")
+
+            # Sort files by modification time (newest first) to return the same results as the grep commands
+            candidates.sort(key=lambda candidate: candidate[1], reverse=True)
+
+            matches = []
+            for file_path, mod_time in candidates:
+                try:
+                    lines = read_lines(os.path.join(self.repo_path, file_path))
+                except OSError as e:
+                    logger.warning(f"Failed to read {file_path}: {e}")
+                    continue
+
+                for line_num, line in enumerate(lines, start=1):
+                    if regex.search(line):
+                        matches.append(
+                            {"file_path": file_path, "line_num": line_num, "content": line, "mod_time": mod_time}
+                        )
+                        if len(matches) >= max_results:
+                            return matches
+
+            return matches
+
+        return await asyncio.to_thread(search)
+
     async def _run_grep_batch(
         self, regex_pattern: str, file_paths: list[str], max_results: int
     ) -> list[dict[str, Any]]:
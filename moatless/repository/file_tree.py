@@ -0,0 +1,192 @@
+import fnmatch
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DirectoryNode:
+    mtime_ns: int = 0
+    directories: dict[str, "DirectoryNode"] = field(default_factory=dict)
+    files: set[str] = field(default_factory=set)
+
+
+class FileTree:
+    """
+    In-memory tree of the files in a directory used to match glob patterns without walking the file system.
+
+    Lookups don't touch the file system. refresh() validates the tree by comparing directory modification times,
+    which change when entries are added, removed or renamed, so only directories with changes are listed again.
+    """
+
+    def __init__(self, root_path: str):
+        self._root_path = root_path
+        self._root: Optional[DirectoryNode] = None
+        self._lock = threading.RLock()
+
+    def build(self):
+        with self._lock:
+            self._root = self._scan_directory("")
+            logger.info(f"Built file tree for {self._root_path} with {len(self.file_paths())} files")
+
+    def refresh(self):
+        """List directories that have changed on disk since they were scanned."""
+        with self._lock:
+            if self._root is None:
+                self.build()
+            else:
+                self._refresh_directory(self._root, "")
+
+    def add_file(self, file_path: str):
+        with self._lock:
+            if self._root is None:
+                return
+
+            parts = file_path.strip("/").split("/")
+            node = self._root
+            for part in parts[:-1]:
+                node = node.directories.setdefault(part, DirectoryNode())
+            node.files.add(parts[-1])
+
+    def remove_file(self, file_path: str):
+        with self._lock:
+            node = self._get_node(os.path.dirname(file_path.strip("/")))
+            if node:
+                node.files.discard(os.path.basename(file_path))
+
+    def file_paths(self) -> list[str]:
+        with self._lock:
+            return self.match("**/*")
+
+    def is_directory(self, directory_path: str) -> bool:
+        with self._lock:
+            return self._get_node(directory_path) is not None
+
+    def list_directory(self, directory_path: str = "") -> Optional[dict[str, list[str]]]:
+        """Return files and directories in the directory, or None if the directory doesn't exist."""
+        with self._lock:
+            node = self._get_node(directory_path)
+            if node is None:
+                return None
+
+            prefix = self._normalize(directory_path)
+            prefix = f"{prefix}/" if prefix else ""
+            return {
+                "files": sorted(f"{prefix}{name}" for name in node.files),
+                "directories": sorted(f"{prefix}{name}" for name in node.directories),
+            }
+
+    def match(self, pattern: str) -> list[str]:
+        """
+        Match files against a glob pattern relative to the root, with the same semantics as pathlib where
+        '**' matches zero or more directories.
+        """
+        parts = [part for part in pattern.split("/") if part not in ("", ".")]
+        for part in parts:
+            if "**" in part and part != "**":
+                raise ValueError("Invalid pattern: '**' can only be an entire path component")
+
+        with self._lock:
+            if self._root is None or not parts:
+                return []
+
+            matches = set()
+            self._match(self._root, parts, "", matches)
+            return sorted(matches)
+
+    def _match(self, node: DirectoryNode, parts: list[str], current_path: str, matches: set[str]):
+        part, rest = parts[0], parts[1:]
+
+        if part == "**":
+            if rest:
+                self._match(node, rest, current_path, matches)
+            for name, child in node.directories.items():
+                self._match(child, parts, self._join(current_path, name), matches)
+            return
+
+        has_wildcards = any(c in part for c in "*?[")
+        if rest:
+            if has_wildcards:
+                children = [
+                    (name, child) for name, child in node.directories.items() if fnmatch.fnmatchcase(name, part)
+                ]
+            else:
+                children = [(part, node.directories[part])] if part in node.directories else []
+            for name, child in children:
+                self._match(child, rest, self._join(current_path, name), matches)
+        elif has_wildcards:
+            matches.update(self._join(current_path, name) for name in node.files if fnmatch.fnmatchcase(name, part))
+        elif part in node.files:
+            matches.add(self._join(current_path, part))
+
+    def _get_node(self, directory_path: str) -> Optional[DirectoryNode]:
+        node = self._root
+        directory_path = self._normalize(directory_path)
+        if node is None or not directory_path:
+            return node
+
+        for part in directory_path.split("/"):
+            node = node.directories.get(part)
+            if node is None:
+                return None
+        return node
+
+    def _scan_directory(self, relative_path: str) -> DirectoryNode:
+        full_path = os.path.join(self._root_path, relative_path)
+        node = DirectoryNode()
+        try:
+            node.mtime_ns = os.stat(full_path).st_mtime_ns
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        node.directories[entry.name] = self._scan_directory(self._join(relative_path, entry.name))
+                    elif entry.is_file():
+                        node.files.add(entry.name)
+        except OSError as e:
+            logger.debug(f"Failed to list {full_path}: {e}")
+        return node
+
+    def _refresh_directory(self, node: DirectoryNode, relative_path: str):
+        full_path = os.path.join(self._root_path, relative_path)
+        try:
+            mtime_ns = os.stat(full_path).st_mtime_ns
+        except OSError:
+            return
+
+        if mtime_ns != node.mtime_ns:
+            logger.debug(f"Directory {relative_path or '.'} changed, listing it again")
+            rescanned = DirectoryNode(mtime_ns=mtime_ns)
+            try:
+                with os.scandir(full_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            rescanned.directories[entry.name] = node.directories.get(entry.name) or (
+                                self._scan_directory(self._join(relative_path, entry.name))
+                            )
+                        elif entry.is_file():
+                            rescanned.files.add(entry.name)
+            except OSError as e:
+                logger.debug(f"Failed to list {full_path}: {e}")
+                return
+
+            node.mtime_ns = rescanned.mtime_ns
+            node.directories = rescanned.directories
+            node.files = rescanned.files
+
+        for name, child in node.directories.items():
+            self._refresh_directory(child, self._join(relative_path, name))
+
+    @staticmethod
+    def _join(path: str, name: str) -> str:
+        return f"{path}/{name}" if path else name
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        path = path.strip("/")
+        if path.startswith("./"):
+            path = path[2:]
+        return "" if path == "." else path
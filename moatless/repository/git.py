@@ -120,6 +120,7 @@ class GitRepository(FileRepository):
     def reset(self):
         self._repo.git.clean("-fd")
         self._repo.git.reset("--hard")
+        self.invalidate_files()
 
     @classmethod
     def from_dict(cls, data: dict):
@@ -0,0 +1,397 @@
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+EXCLUDED_DIRS = {".git"}
+
+# A clause is satisfied if any of its literals is in the file, a query is satisfied if all clauses are
+Query = list[list[str]]
+
+# Regex syntax that grep -E supports but Python's re module doesn't, these patterns are searched with grep
+_UNSUPPORTED_REGEX = re.compile(r"\[\[[:.=]|\\[<>]")
+
+_REPEAT_OPS = tuple(
+    getattr(sre_parse, name) for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") if hasattr(sre_parse, name)
+)
+
+
+@dataclass
+class FileState:
+    file_id: int
+    mtime_ns: int
+    size: int
+
+
+def _trigrams(data: bytes) -> np.ndarray:
+    """Unique byte trigrams in data, encoded as 24 bit integers."""
+    if len(data) < 3:
+        return np.empty(0, dtype=np.uint32)
+    b = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+
+
+def _literal_trigrams(literal: str) -> Optional[np.ndarray]:
+    """Trigrams a file must contain to contain literal, or None if the literal can't be used to filter files."""
+    # Undecodable bytes are replaced with U+FFFD when reading files, so the replacement character isn't in the index
+    if "\ufffd" in literal:
+        return None
+    data = literal.encode("utf-8")
+    if len(data) < 3:
+        return None
+    return _trigrams(data)
+
+
+def literal_query(search_text: str) -> Query:
+    """Query for grep -F semantics, where each line in the search text is a separate pattern."""
+    return [search_text.split("\n")]
+
+
+def regex_query(pattern: str) -> Query:
+    """
+    Derive literals that any line matching the regex must contain. The result may match more files than the
+    regex, but never fewer.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+
+    return _sequence_query(parsed)
+
+
+def _sequence_query(items: Iterable) -> Query:
+    clauses: Query = []
+    run = []
+
+    def flush():
+        if run:
+            clauses.append(["".join(run)])
+            run.clear()
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, _, subpattern = av
+            if add_flags & re.IGNORECASE:
+                continue
+            clauses.extend(_sequence_query(subpattern))
+        elif op is sre_parse.BRANCH:
+            clause = _alternation_clause([_sequence_query(branch) for branch in av[1]])
+            if clause:
+                clauses.append(clause)
+        elif op in _REPEAT_OPS:
+            min_repeat, _, item = av
+            if min_repeat > 0:
+                clauses.extend(_sequence_query(item))
+
+    flush()
+    return clauses
+
+
+def _alternation_clause(branches: list[Query]) -> Optional[list[str]]:
+    """Each branch requires its longest literal, so a match contains at least one of them."""
+    literals = []
+    for branch in branches:
+        branch_literals = [clause[0] for clause in branch if len(clause) == 1]
+        if not branch_literals:
+            return None
+        literals.append(max(branch_literals, key=len))
+    return literals
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index over the files in a directory, used to find the files that can contain a match
+    before reading them.
+
+    Postings are kept as two sorted numpy arrays of trigrams and file ids. Files that are changed after the
+    index was built are kept in a small overlay that is merged into the postings when it grows.
+    """
+
+    def __init__(self, root_path: str, max_file_size: int = 2 * 1024 * 1024, max_overlay_size: int = 500):
+        self._root_path = root_path
+        self._max_file_size = max_file_size
+        self._max_overlay_size = max_overlay_size
+
+        self._files: dict[str, FileState] = {}
+        self._paths: list[Optional[str]] = []
+
+        self._trigrams = np.empty(0, dtype=np.uint32)
+        self._file_ids = np.empty(0, dtype=np.uint32)
+
+        # File ids that are indexed in the overlay, or removed, and must be ignored in the postings
+        self._stale_ids: set[int] = set()
+        self._overlay: dict[int, np.ndarray] = {}
+
+        # Files too large or unreadable to index, these are always candidates
+        self._unindexed_ids: set[int] = set()
+
+        # Files written through the repository, re-indexed before the next search
+        self._pending_updates: set[str] = set()
+        self._pending_lock = threading.Lock()
+
+        self._lock = threading.RLock()
+        self._built = False
+
+    @property
+    def file_paths(self) -> list[str]:
+        with self._lock:
+            self._ensure_built()
+            return list(self._files.keys())
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def build(self):
+        with self._lock:
+            self._files = {}
+            self._paths = []
+            self._stale_ids = set()
+            self._overlay = {}
+            self._unindexed_ids = set()
+            with self._pending_lock:
+                self._pending_updates = set()
+
+            trigram_arrays = []
+            file_id_arrays = []
+            for file_path, stat in self._walk():
+                file_id = self._add_path(file_path, stat)
+                trigrams = self._read_trigrams(file_path)
+                if trigrams is None:
+                    self._unindexed_ids.add(file_id)
+                elif len(trigrams):
+                    trigram_arrays.append(trigrams)
+                    file_id_arrays.append(np.full(len(trigrams), file_id, dtype=np.uint32))
+
+            self._set_postings(trigram_arrays, file_id_arrays)
+            self._built = True
+            logger.info(f"Indexed {len(self._files)} files in {self._root_path} with {len(self._trigrams)} postings")
+
+    def refresh(self) -> int:
+        """Re-index files that were added, changed or removed on disk since they were indexed."""
+        with self._lock:
+            if not self._built:
+                self.build()
+                return len(self._files)
+
+            self._apply_pending_updates()
+
+            seen = set()
+            updated = 0
+            for file_path, stat in self._walk():
+                seen.add(file_path)
+                state = self._files.get(file_path)
+                if state is None or state.mtime_ns != stat.st_mtime_ns or state.size != stat.st_size:
+                    self._update_file(file_path, stat)
+                    updated += 1
+
+            for file_path in [path for path in self._files if path not in seen]:
+                self._remove_file(file_path)
+                updated += 1
+
+            if updated:
+                logger.debug(f"Refreshed {updated} files in search index for {self._root_path}")
+            return updated
+
+    def update_file(self, file_path: str):
+        """Mark a file written through the repository to be re-indexed before the next search."""
+        with self._pending_lock:
+            self._pending_updates.add(file_path)
+
+    def _apply_pending_updates(self):
+        with self._pending_lock:
+            file_paths = self._pending_updates
+            self._pending_updates = set()
+
+        for file_path in file_paths:
+            try:
+                stat = os.stat(os.path.join(self._root_path, file_path), follow_symlinks=False)
+            except OSError:
+                self._remove_file(file_path)
+                continue
+            self._update_file(file_path, stat)
+
+    def candidates(self, query: Query, file_paths: Optional[Iterable[str]] = None) -> list[str]:
+        """Return the files that can satisfy the query, optionally limited to the given files."""
+        with self._lock:
+            self._ensure_built()
+            self._apply_pending_updates()
+
+            if file_paths is None:
+                scope = {state.file_id for state in self._files.values()}
+            else:
+                scope = {self._files[path].file_id for path in file_paths if path in self._files}
+
+            for clause in query:
+                if not scope:
+                    break
+                matching = self._clause_file_ids(clause)
+                if matching is not None:
+                    scope &= matching
+
+            return sorted(self._paths[file_id] for file_id in scope)
+
+    def _clause_file_ids(self, clause: list[str]) -> Optional[set[int]]:
+        matching: set[int] = set()
+        for literal in clause:
+            trigrams = _literal_trigrams(literal)
+            if trigrams is None:
+                return None
+            matching.update(self._file_ids_with_all(trigrams))
+
+        matching.update(self._unindexed_ids)
+        return matching
+
+    def _file_ids_with_all(self, trigrams: np.ndarray) -> set[int]:
+        file_ids = None
+        for trigram in trigrams:
+            start = int(np.searchsorted(self._trigrams, trigram, side="left"))
+            end = int(np.searchsorted(self._trigrams, trigram, side="right"))
+            posting = self._file_ids[start:end]
+            file_ids = posting if file_ids is None else np.intersect1d(file_ids, posting, assume_unique=True)
+            if not len(file_ids):
+                break
+
+        result = {int(file_id) for file_id in file_ids} - self._stale_ids if file_ids is not None else set()
+        for file_id, file_trigrams in self._overlay.items():
+            if np.isin(trigrams, file_trigrams, assume_unique=True).all():
+                result.add(file_id)
+        return result
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def _walk(self) -> Iterable[tuple[str, os.stat_result]]:
+        stack = [""]
+        while stack:
+            relative_dir = stack.pop()
+            try:
+                with os.scandir(os.path.join(self._root_path, relative_dir)) as entries:
+                    for entry in entries:
+                        relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in EXCLUDED_DIRS:
+                                stack.append(relative_path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield relative_path, entry.stat(follow_symlinks=False)
+            except OSError as e:
+                logger.debug(f"Failed to list {relative_dir} in {self._root_path}: {e}")
+
+    def _read_trigrams(self, file_path: str) -> Optional[np.ndarray]:
+        """Trigrams in the file, an empty array for binary files and None if the file can't be indexed."""
+        full_path = os.path.join(self._root_path, file_path)
+        try:
+            if os.path.getsize(full_path) > self._max_file_size:
+                return None
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            logger.debug(f"Failed to read {file_path} for search index: {e}")
+            return None
+
+        # Binary files are skipped like grep does
+        if b"\0" in data:
+            return np.empty(0, dtype=np.uint32)
+        return _trigrams(data)
+
+    def _add_path(self, file_path: str, stat: os.stat_result) -> int:
+        file_id = len(self._paths)
+        self._paths.append(file_path)
+        self._files[file_path] = FileState(file_id=file_id, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        return file_id
+
+    def _update_file(self, file_path: str, stat: os.stat_result):
+        state = self._files.get(file_path)
+        if state is None:
+            file_id = self._add_path(file_path, stat)
+        else:
+            file_id = state.file_id
+            state.mtime_ns = stat.st_mtime_ns
+            state.size = stat.st_size
+
+        trigrams = self._read_trigrams(file_path)
+        self._stale_ids.add(file_id)
+        self._unindexed_ids.discard(file_id)
+        if trigrams is None:
+            self._overlay.pop(file_id, None)
+            self._unindexed_ids.add(file_id)
+        else:
+            self._overlay[file_id] = trigrams
+
+        if len(self._overlay) > self._max_overlay_size:
+            self._merge_overlay()
+
+    def _remove_file(self, file_path: str):
+        state = self._files.pop(file_path, None)
+        if state is None:
+            return
+        self._stale_ids.add(state.file_id)
+        self._overlay.pop(state.file_id, None)
+        self._unindexed_ids.discard(state.file_id)
+
+    def _merge_overlay(self):
+        keep = ~np.isin(self._file_ids, np.fromiter(self._stale_ids, dtype=np.uint32, count=len(self._stale_ids)))
+        trigram_arrays = [self._trigrams[keep]]
+        file_id_arrays = [self._file_ids[keep]]
+        for file_id, trigrams in self._overlay.items():
+            trigram_arrays.append(trigrams)
+            file_id_arrays.append(np.full(len(trigrams), file_id, dtype=np.uint32))
+
+        self._set_postings(trigram_arrays, file_id_arrays)
+        self._stale_ids = set()
+        self._overlay = {}
+
+    def _set_postings(self, trigram_arrays: list[np.ndarray], file_id_arrays: list[np.ndarray]):
+        if not trigram_arrays:
+            self._trigrams = np.empty(0, dtype=np.uint32)
+            self._file_ids = np.empty(0, dtype=np.uint32)
+            return
+
+        trigrams = np.concatenate(trigram_arrays)
+        file_ids = np.concatenate(file_id_arrays)
+        # Sort by trigram and then file id, so postings for a trigram are sorted and can be intersected
+        order = np.lexsort((file_ids, trigrams))
+        self._trigrams = trigrams[order]
+        self._file_ids = file_ids[order]
+
+
+def compile_regex(pattern: str) -> Optional[re.Pattern]:
+    """Compile a grep -E pattern with Python's re module, returns None if the pattern must be searched with grep."""
+    # grep treats each line as a separate pattern
+    if "\n" in pattern or _UNSUPPORTED_REGEX.search(pattern):
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error:
+        return None
+
+
+def read_lines(full_path: str) -> list[str]:
+    with open(full_path, "rb") as f:
+        data = f.read()
+    if b"\0" in data:
+        return []
+    lines = data.decode("utf-8", errors="replace").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return lines
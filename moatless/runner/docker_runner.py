@@ -4,6 +4,7 @@ import os
 import platform
 import re
 import subprocess
+import time
 from collections.abc import Callable
 from datetime import datetime
 from typing import Any, Optional, Dict, Tuple, List, Deque, NamedTuple
@@ -29,6 +30,19 @@ from moatless.telemetry import extract_trace_context
 
 logger = logging.getLogger(__name__)
 
+# Matches the exit code in the status column of docker ps, e.g. "Exited (137) 2 minutes ago"
+EXIT_CODE_PATTERN = re.compile(r"\((-?\d+)\)")
+
+
+class ContainerState(NamedTuple):
+    """State of a Moatless-managed container as listed by docker ps."""
+
+    name: str
+    project_id: str
+    trajectory_id: str
+    status: JobStatus
+    created_at: datetime
+
 
 class DockerRunner(BaseRunner):
     """Runner for managing jobs with Docker."""
@@ -45,6 +59,7 @@ class DockerRunner(BaseRunner):
         memory_limit: Optional[str] = None,
         memory_swap_limit: Optional[str] = None,
         architecture: Optional[str] = None,
+        status_cache_ttl_seconds: float = 2.0,
     ):
         """Initialize the runner with Docker configuration.
 
@@ -65,6 +80,8 @@ class DockerRunner(BaseRunner):
                               If None, defaults to twice the memory limit.
             architecture: Architecture string to use in image names (e.g., 'x86_64', 'arm64').
                          If None, defaults to 'x86_64' or can be set via MOATLESS_DOCKER_ARCHITECTURE env var.
+            status_cache_ttl_seconds: How long the state of all managed containers, listed with one docker ps call,
+                                      is reused by get_jobs, get_job_status, job_exists and get_runner_info.
         """
         self.job_ttl_seconds = job_ttl_seconds
         self.timeout_seconds = timeout_seconds
@@ -74,6 +91,17 @@ class DockerRunner(BaseRunner):
         self.update_branch = update_branch
         self.memory_limit = memory_limit or os.environ.get("DOCKER_MEMORY_LIMIT")
         self.memory_swap_limit = memory_swap_limit or os.environ.get("DOCKER_MEMORY_SWAP_LIMIT")
+        self.status_cache_ttl_seconds = status_cache_ttl_seconds
+
+        # Container states from the last docker ps call, keyed by container name
+        self._container_states: Optional[Dict[str, ContainerState]] = None
+        self._container_states_at = 0.0
+        self._container_states_lock = asyncio.Lock()
+
+        # Metrics exposed in get_runner_info
+        self.docker_calls = 0
+        self.status_cache_hits = 0
+        self.status_cache_misses = 0
 
         # Set architecture - priority: parameter > env var > default
         self.architecture = architecture or os.environ.get("MOATLESS_DOCKER_ARCHITECTURE") or "x86_64"
@@ -170,9 +198,9 @@ class DockerRunner(BaseRunner):
         container_name = self._container_name(project_id, trajectory_id)
 
         # Check if container already exists
-        if await self._container_exists(container_name):
+        container_status = await self._get_container_status(container_name)
+        if container_status is not None:
             # Check if the container is completed, failed, or pending (created but not started)
-            container_status = await self._get_container_status(container_name)
             if container_status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.PENDING]:
                 # Remove the existing container first
                 self.logger.info(
@@ -225,6 +253,14 @@ class DockerRunner(BaseRunner):
                 redis_url = self._convert_localhost_url(os.environ.get("REDIS_URL"))
                 env_vars.append(f"REDIS_URL={redis_url}")
 
+            # Replay or record completions in the jobs if a completion cache is configured
+            if os.environ.get("MOATLESS_COMPLETION_CACHE"):
+                env_vars.append(f"MOATLESS_COMPLETION_CACHE={os.environ['MOATLESS_COMPLETION_CACHE']}")
+
+            # Limit the LLM calls of the jobs together with the rate limits shared in Redis
+            if os.environ.get("MOATLESS_RATE_LIMITS"):
+                env_vars.append(f"MOATLESS_RATE_LIMITS={os.environ['MOATLESS_RATE_LIMITS']}")
+
             # Add API key environment variables from current environment
             for key, value in os.environ.items():
                 if (
@@ -319,6 +355,7 @@ class DockerRunner(BaseRunner):
             logger.info(f"Running Docker command: {' '.join(cmd)}")
             # Run the command
             stdout, returncode = await self._run_docker_command(*cmd)
+            self._invalidate_container_states()
 
             if returncode != 0:
                 self.logger.error(f"Failed to start Docker container: {stdout}")
@@ -342,113 +379,126 @@ class DockerRunner(BaseRunner):
         Returns:
             List of JobInfo objects
         """
-        result = []
-
         try:
-            # Build command to list containers
-            cmd = [
+            container_states = await self._get_container_states()
+            if container_states is None:
+                return []
+
+            sanitized_project_id = sanitize_label(project_id) if project_id else None
+
+            result = []
+            for state in container_states.values():
+                if sanitized_project_id and state.project_id != sanitized_project_id:
+                    continue
+
+                # TODO: Get trajectory id and project id from env vars
+                result.append(
+                    JobInfo(
+                        id=f"{state.project_id}:{state.trajectory_id}",
+                        project_id=state.project_id,
+                        trajectory_id=state.trajectory_id,
+                        status=state.status,
+                        enqueued_at=state.created_at,
+                        started_at=state.created_at,
+                        ended_at=datetime.now()
+                        if state.status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELED]
+                        else None,
+                    )
+                )
+
+            return result
+
+        except Exception as exc:
+            self.logger.exception(f"Error getting jobs: {exc}")
+            return []
+
+    async def _get_container_states(self) -> Optional[Dict[str, ContainerState]]:
+        """Get the state of all Moatless-managed containers.
+
+        The containers are listed with one docker ps call, including the exit code in the status column, and the
+        result is reused for status_cache_ttl_seconds. Concurrent callers wait for the same docker ps call.
+
+        Returns:
+            Container states keyed by container name, or None if the containers couldn't be listed
+        """
+        async with self._container_states_lock:
+            if (
+                self._container_states is not None
+                and time.monotonic() - self._container_states_at < self.status_cache_ttl_seconds
+            ):
+                self.status_cache_hits += 1
+                return self._container_states
+
+            self.status_cache_misses += 1
+            output, return_code = await self._run_docker_command(
                 "docker",
                 "ps",
                 "-a",
+                "--no-trunc",
+                "--filter",
+                "label=moatless.managed=true",
                 "--format",
-                '{{.Names}}|{{.Label "project_id"}}|{{.Label "trajectory_id"}}|{{.State}}|{{.CreatedAt}}',
-            ]
-
-            # Add filter by project if specified
-            if project_id:
-                sanitized_project_id = sanitize_label(project_id)
-                cmd.extend(["--filter", f"label=project_id={sanitized_project_id}"])
-
-            # Add filter for Moatless-managed containers
-            cmd.extend(["--filter", "label=moatless.managed=true"])
-
-            # Execute command
-            process = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                '{{.Names}}|{{.Label "project_id"}}|{{.Label "trajectory_id"}}|{{.State}}|{{.CreatedAt}}|{{.Status}}',
             )
-            stdout, stderr = await process.communicate()
 
-            if process.returncode != 0:
-                self.logger.error(f"Error listing containers: {stderr.decode()}")
-                return []
+            if return_code != 0:
+                self.logger.error(f"Error listing containers: {output}")
+                return None
 
-            # Parse output
-            output = stdout.decode().strip()
-            if not output:
-                return []
+            container_states = {}
+            for line in output.strip().split("\n"):
+                if not line.strip():
+                    continue
 
-            for line in output.split("\n"):
                 parts = line.strip().split("|")
-                if len(parts) < 5:
+                if len(parts) < 6:
                     self.logger.warning(f"Invalid container info format: {line}")
                     continue
 
-                container_name, container_project_id, container_trajectory_id, container_state, created_at = parts[:5]
+                container_name, container_project_id, container_trajectory_id, state, created_at, status = parts[:6]
 
                 # Skip containers without proper project or trajectory ID
                 if not container_project_id or not container_trajectory_id:
                     continue
 
-                status = await self._get_container_status(container_name)
-
-                # Skip containers with unknown status
-                if status is None:
-                    continue
-
-                # Parse timestamp
-                try:
-                    created_datetime = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S %z")
-                except ValueError:
-                    # fallback to alternative format if the first one doesn't work
-                    try:
-                        created_datetime = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S %Z")
-                    except ValueError:
-                        self.logger.warning(f"Could not parse timestamp: {created_at}")
-                        created_datetime = datetime.now()
-
-                # TODO: Get trajectory id and project id from env vars
+                exit_code_match = EXIT_CODE_PATTERN.search(status)
+                exit_code = exit_code_match.group(1) if exit_code_match else ""
 
-                # Create JobInfo object
-                job_info = JobInfo(
-                    id=f"{container_project_id}:{container_trajectory_id}",
+                container_states[container_name] = ContainerState(
+                    name=container_name,
                     project_id=container_project_id,
                     trajectory_id=container_trajectory_id,
-                    status=status,
-                    enqueued_at=created_datetime,
-                    started_at=created_datetime,
-                    ended_at=datetime.now()
-                    if status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELED]
-                    else None,
+                    status=self._parse_container_status(state, "false", exit_code),
+                    created_at=self._parse_created_at(created_at),
                 )
 
-                result.append(job_info)
+            self._container_states = container_states
+            self._container_states_at = time.monotonic()
+            return container_states
 
-            return result
-
-        except Exception as exc:
-            self.logger.exception(f"Error getting jobs: {exc}")
-            return []
+    def _invalidate_container_states(self) -> None:
+        """Make the next status lookup list the containers again, called after containers are started or removed."""
+        self._container_states = None
 
-    async def _get_container_exit_code(self, container_name: str) -> int:
-        """Get the exit code of a container.
+    def _parse_created_at(self, created_at: str) -> datetime:
+        """Parse the CreatedAt column of docker ps.
 
         Args:
-            container_name: The container name
+            created_at: Timestamp string
 
         Returns:
-            Exit code as an integer, or -1 if an error occurs
+            Parsed datetime, or the current time if the timestamp couldn't be parsed
         """
         try:
-            output, return_code = await self._run_docker_command(
-                "docker", "inspect", "--format", "{{.State.ExitCode}}", container_name
-            )
-
-            if return_code != 0:
-                return -1
-
-            return int(output.strip())
-        except Exception:
-            return -1
+            # docker ps appends the zone name to the offset, e.g. "2024-01-01 12:00:00 +0000 UTC"
+            return datetime.strptime(" ".join(created_at.split()[:3]), "%Y-%m-%d %H:%M:%S %z")
+        except ValueError:
+            # fallback to alternative format if the first one doesn't work
+            try:
+                return datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S %Z")
+            except ValueError:
+                self.logger.warning(f"Could not parse timestamp: {created_at}")
+                return datetime.now()
 
     async def cancel_job(self, project_id: str, trajectory_id: str | None = None) -> None:
         """Cancel a job or all jobs for a project.
@@ -496,6 +546,8 @@ class DockerRunner(BaseRunner):
 
         except Exception as exc:
             self.logger.exception(f"Error canceling job(s): {exc}")
+        finally:
+            self._invalidate_container_states()
 
     async def job_exists(self, project_id: str, trajectory_id: str) -> bool:
         """Check if a job exists as a Docker container.
@@ -534,48 +586,20 @@ class DockerRunner(BaseRunner):
             return None
 
     async def _get_container_status(self, container_name: str) -> Optional[JobStatus]:
-        try:
-            inspect_cmd = [
-                "docker",
-                "inspect",
-                "--format",
-                "{{.State.Status}},{{.State.Running}},{{.State.ExitCode}},{{.State.StartedAt}},{{.State.FinishedAt}}",
-                container_name,
-            ]
-            process = await asyncio.create_subprocess_exec(
-                *inspect_cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-
-            if process.returncode == 0:
-                container_info = stdout.decode().strip().split(",")
-                if len(container_info) < 5:
-                    self.logger.warning(
-                        f"Unexpected output format from docker inspect command {' '.join(inspect_cmd)}: {stdout.decode()}"
-                    )
-                    return None
+        """Get the status of a container from the cached state of all managed containers.
 
-                status, running, exit_code, started_at, finished_at = container_info[:5]
-
-                # If container has started but not finished, it's definitely running
-                if started_at != "0001-01-01T00:00:00Z" and finished_at == "0001-01-01T00:00:00Z":
-                    return JobStatus.RUNNING
-
-                return self._parse_container_status(status, running, exit_code)
-            else:
-                if "No such object" in stderr.decode():
-                    # Container doesn't exist, return None
-                    return None
-                else:
-                    self.logger.warning(
-                        f"Error getting job status. Stderr: {stderr.decode()}. Stdout: {stdout.decode()}"
-                    )
-                    return None
+        Args:
+            container_name: The container name
 
-        except Exception as exc:
-            self.logger.exception(f"Error getting job status: {exc}")
+        Returns:
+            JobStatus of the container, or None if the container doesn't exist
+        """
+        container_states = await self._get_container_states()
+        if container_states is None or container_name not in container_states:
             return None
 
+        return container_states[container_name].status
+
     async def get_runner_info(self) -> RunnerInfo:
         """Get information about the Docker runner.
 
@@ -583,15 +607,26 @@ class DockerRunner(BaseRunner):
             RunnerInfo object with runner status information
         """
         try:
-            # Check if Docker is accessible
-            _, return_code = await self._run_docker_command("docker", "info")
+            # Docker is accessible if the managed containers can be listed
+            container_states = await self._get_container_states()
 
-            if return_code != 0:
+            if container_states is None:
                 return RunnerInfo(
                     runner_type="docker", status=RunnerStatus.ERROR, data={"error": "Docker is not accessible"}
                 )
 
-            return RunnerInfo(runner_type="docker", status=RunnerStatus.RUNNING)
+            return RunnerInfo(
+                runner_type="docker",
+                status=RunnerStatus.RUNNING,
+                data={
+                    "running_containers": sum(
+                        1 for state in container_states.values() if state.status == JobStatus.RUNNING
+                    ),
+                    "docker_calls": self.docker_calls,
+                    "status_cache_hits": self.status_cache_hits,
+                    "status_cache_misses": self.status_cache_misses,
+                },
+            )
 
         except Exception as exc:
             self.logger.exception(f"Error checking if runner is up: {exc}")
@@ -606,6 +641,7 @@ class DockerRunner(BaseRunner):
         Returns:
             Tuple containing (stdout_text, return_code)
         """
+        self.docker_calls += 1
         try:
             process = await asyncio.create_subprocess_exec(
                 *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
@@ -763,6 +799,8 @@ class DockerRunner(BaseRunner):
         except Exception as exc:
             self.logger.exception(f"Error stopping container {container_name}: {exc}")
             return False
+        finally:
+            self._invalidate_container_states()
 
     async def cleanup_job(self, project_id: str, trajectory_id: str):
         """Stop and remove the container associated with a specific job.
@@ -788,15 +826,10 @@ class DockerRunner(BaseRunner):
         container_name = self._container_name(project_id, trajectory_id)
 
         try:
-            # Check if container exists
-            if not await self._container_exists(container_name):
-                return None
-
-            # Get basic container info
+            # Get basic container info, docker inspect fails if the container doesn't exist
             container_info, return_code = await self._run_docker_command("docker", "inspect", container_name)
 
             if return_code != 0:
-                self.logger.warning(f"Error getting container info for {container_name}")
                 return None
 
             # Parse container info as JSON
@@ -804,12 +837,13 @@ class DockerRunner(BaseRunner):
 
             container_data = json.loads(container_info)[0]
 
-            # Get container status
-            job_status = await self._get_container_status(container_name)
-
-            # If job status is None, return None
-            if job_status is None:
-                return None
+            # Get container status from the inspected state
+            container_state = container_data.get("State", {})
+            job_status = self._parse_container_status(
+                container_state.get("Status", ""),
+                str(container_state.get("Running", False)),
+                str(container_state.get("ExitCode", "")),
+            )
 
             # Get container logs
             logs = await self.get_job_logs(project_id, trajectory_id)
@@ -936,15 +970,11 @@ class DockerRunner(BaseRunner):
             Number of running containers managed by moatless
         """
         try:
-            cmd = ["docker", "ps", "-q", "--filter", "label=moatless.managed=true"]
-            stdout, return_code = await self._run_docker_command(*cmd)
-
-            if return_code != 0:
-                self.logger.error(f"Failed to get running container count: {stdout}")
+            container_states = await self._get_container_states()
+            if container_states is None:
                 return 0
 
-            container_ids = [id for id in stdout.strip().split("\n") if id]
-            return len(container_ids)
+            return sum(1 for state in container_states.values() if state.status == JobStatus.RUNNING)
         except Exception as exc:
             self.logger.exception(f"Error getting running container count: {exc}")
             return 0
@@ -814,6 +814,8 @@ class KubernetesRunner(BaseRunner):
                 client.V1EnvVar(name="REPO_DIR", value="/testbed"),
                 client.V1EnvVar(name="INSTANCE_PATH", value="/data/instance.json"),
                 client.V1EnvVar(name="REDIS_URL", value=os.environ.get("REDIS_URL")),
+                client.V1EnvVar(name="MOATLESS_COMPLETION_CACHE", value=os.environ.get("MOATLESS_COMPLETION_CACHE")),
+                client.V1EnvVar(name="MOATLESS_RATE_LIMITS", value=os.environ.get("MOATLESS_RATE_LIMITS")),
                 client.V1EnvVar(name="LITELLM_LOCAL_MODEL_COST_MAP", value="True"),
             ]
         )
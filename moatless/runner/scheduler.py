@@ -1,13 +1,16 @@
 """Scheduler runner implementation for Moatless."""
 
 import asyncio
+import heapq
 import logging
 import importlib
 import os
+import time
 from collections.abc import Callable
 from datetime import datetime
 from typing import Optional, Type
 
+from moatless.events import BaseEvent
 from moatless.runner.runner import (
     BaseRunner,
     JobInfo,
@@ -24,7 +27,13 @@ logger = logging.getLogger(__name__)
 
 
 class SchedulerRunner(BaseRunner):
-    """Runner implementation that schedules jobs with configurable limits."""
+    """Runner implementation that schedules jobs with configurable limits.
+
+    Pending jobs are kept in a priority queue ordered by when they were enqueued. The scheduler loop wakes up when a
+    job is submitted or finishes, and starts jobs from the queue until the job limits are reached. Every
+    scheduler_interval_seconds it also syncs running jobs with the underlying runner, cleans up terminal jobs and
+    reloads the queue from storage to pick up jobs queued by other processes.
+    """
 
     def __init__(
         self,
@@ -73,6 +82,13 @@ class SchedulerRunner(BaseRunner):
         # Initialize scheduler
         self._scheduler_task: Optional[asyncio.Task] = None
         self._scheduler_running = False
+        self._wakeup = asyncio.Event()
+
+        # Heap of (enqueued_at, job id, project id, trajectory id) for pending jobs, entries for jobs that are no
+        # longer pending are skipped when popped
+        self._pending_queue: list[tuple[datetime, str, str, str]] = []
+        self._queued_job_ids: set[str] = set()
+        self._start_lock = asyncio.Lock()
 
         # Start the scheduler
         self.start_scheduler()
@@ -131,12 +147,15 @@ class SchedulerRunner(BaseRunner):
                 node_id=node_id,
             )
 
-            # Store job in storage
+            # Store job in storage and queue it
             await self.storage.add_job(job_info)
+            self._enqueue_job(job_info)
 
-            # Try to start the job immediately if possible
+            # Start queued jobs, including this one if it's first in the queue and the limits allow it
             try:
-                return await self._try_start_job(job_info)
+                await self._start_pending_jobs()
+                job = await self.storage.get_job(project_id, trajectory_id)
+                return job is not None and job.status == JobStatus.RUNNING
             except Exception as e:
                 self.logger.exception(f"Error trying to start job {project_id}-{trajectory_id}: {e}")
                 # Mark job as failed if we can't start it
@@ -292,9 +311,7 @@ class SchedulerRunner(BaseRunner):
 
         # For pending jobs, return a message indicating the job is queued
         if job.status in [JobStatus.PENDING]:
-            queue_position = "unknown"
-            if job.metadata and "queue_position" in job.metadata:
-                queue_position = job.metadata["queue_position"]
+            queue_position = await self._get_queue_position(job)
 
             enqueued_at = "unknown time"
             if job.enqueued_at:
@@ -349,12 +366,33 @@ class SchedulerRunner(BaseRunner):
                 await self.storage.remove_job(job.project_id, job.trajectory_id)
 
             self.logger.info(f"Reset {len(jobs)} jobs{f' for project {project_id}' if project_id else ''}")
+            self.wake_up()
             return True
 
         except Exception as e:
             self.logger.exception(f"Error resetting jobs: {e}")
             return False
 
+    def wake_up(self) -> None:
+        """Wake up the scheduler loop to start queued jobs."""
+        self._wakeup.set()
+
+    async def handle_event(self, event: BaseEvent) -> None:
+        """Sync a job when its flow completes or fails, to start queued jobs without waiting for the next interval.
+
+        Args:
+            event: The event published on the event bus
+        """
+        if event.scope != "flow" or event.event_type not in ["completed", "error"]:
+            return
+
+        if not event.project_id or not event.trajectory_id:
+            return
+
+        job = await self.storage.get_job(event.project_id, event.trajectory_id)
+        if job and job.status == JobStatus.RUNNING:
+            await self._sync_job(job)
+
     def start_scheduler(self) -> None:
         """Start the job scheduler."""
         if self._scheduler_task is None or self._scheduler_task.done():
@@ -388,56 +426,123 @@ class SchedulerRunner(BaseRunner):
                 self.logger.warning(f"Error while waiting for scheduler task to complete: {e}")
 
     async def _scheduler_loop(self) -> None:
-        """Main scheduler loop that periodically tries to start queued jobs."""
+        """Main scheduler loop that starts queued jobs when woken up and periodically syncs jobs."""
         try:
             self.logger.info("Job scheduler started")
 
+            last_synced_at: Optional[float] = None
             while self._scheduler_running:
                 try:
-                    await self._sync_jobs_with_runner()
-
-                    # Clean up completed/terminal jobs that still exist in storage
-                    await self._cleanup_terminal_jobs()
-
-                    # Get all pending jobs
-                    all_jobs = await self.storage.get_jobs()
-                    pending_jobs = [job for job in all_jobs if job.status == JobStatus.PENDING]
+                    # Only sync with the runner and reload the queue on interval, not on every wake up
+                    if last_synced_at is None or time.monotonic() - last_synced_at >= self.scheduler_interval_seconds:
+                        last_synced_at = time.monotonic()
+                        await self._sync_jobs_with_runner()
 
-                    if pending_jobs:
-                        self.logger.debug(f"Found {len(pending_jobs)} pending jobs")
+                        # Clean up completed/terminal jobs that still exist in storage
+                        await self._cleanup_terminal_jobs()
 
-                        # Sort jobs by enqueued_at (oldest first)
-                        pending_jobs.sort(key=lambda j: j.enqueued_at or datetime.max)
+                        await self._load_pending_jobs()
 
-                        # Update queue position for each job
-                        for i, job in enumerate(pending_jobs):
-                            if not job.metadata:
-                                job.metadata = {}
-                            job.metadata["queue_position"] = i + 1
-                            await self.storage.update_job(job)
-
-                        # Try to start jobs
-                        for job in pending_jobs:
-                            await self._try_start_job(job)
+                    await self._start_pending_jobs()
 
                 except Exception as e:
                     self.logger.exception(f"Error in scheduler loop: {e}")
 
-                # Wait before next iteration
-                await asyncio.sleep(self.scheduler_interval_seconds)
+                # Wait for a job to be submitted or finish, or the next interval
+                await self._wait_for_wakeup()
 
         except asyncio.CancelledError:
             self.logger.info("Job scheduler task cancelled")
         except Exception as e:
             self.logger.exception(f"Error in job scheduler: {e}")
 
+    async def _wait_for_wakeup(self) -> None:
+        """Wait until the scheduler is woken up or the scheduler interval has passed."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.scheduler_interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._wakeup.clear()
+
+    async def _load_pending_jobs(self) -> None:
+        """Rebuild the queue from the pending jobs in storage."""
+        pending_jobs = await self.storage.get_jobs_by_status(JobStatus.PENDING)
+        self._pending_queue = [self._get_queue_entry(job) for job in pending_jobs]
+        heapq.heapify(self._pending_queue)
+        self._queued_job_ids = {job.id for job in pending_jobs}
+
+        if pending_jobs:
+            self.logger.debug(f"Found {len(pending_jobs)} pending jobs")
+
+    def _enqueue_job(self, job: JobInfo) -> None:
+        """Add a pending job to the queue."""
+        if job.id not in self._queued_job_ids:
+            heapq.heappush(self._pending_queue, self._get_queue_entry(job))
+            self._queued_job_ids.add(job.id)
+
+    def _get_queue_entry(self, job: JobInfo) -> tuple[datetime, str, str, str]:
+        return job.enqueued_at or datetime.max, job.id, job.project_id, job.trajectory_id
+
+    async def _start_pending_jobs(self) -> None:
+        """Start queued jobs, oldest first, until the job limits are reached."""
+        async with self._start_lock:
+            if self._pending_queue:
+                await self._start_queued_jobs()
+
+    async def _start_queued_jobs(self) -> None:
+        total_running = await self.storage.get_running_jobs_count()
+        project_running: dict[str, int] = {}
+        deferred = []
+
+        while self._pending_queue:
+            if self.max_total_jobs and total_running >= self.max_total_jobs:
+                break
+
+            entry = heapq.heappop(self._pending_queue)
+            _, job_id, project_id, trajectory_id = entry
+
+            # Keep jobs for projects at their limit queued without reading them from storage
+            if self.max_jobs_per_project:
+                if project_id not in project_running:
+                    project_running[project_id] = await self.storage.get_running_jobs_count(project_id)
+                if project_running[project_id] >= self.max_jobs_per_project:
+                    deferred.append(entry)
+                    continue
+
+            job = await self.storage.get_job(project_id, trajectory_id)
+            if job is None or job.status != JobStatus.PENDING:
+                self._queued_job_ids.discard(job_id)
+                continue
+
+            if await self._try_start_job(job):
+                self._queued_job_ids.discard(job_id)
+                total_running += 1
+                if project_id in project_running:
+                    project_running[project_id] += 1
+            elif job.status == JobStatus.PENDING:
+                # The runner can't start more jobs right now, try again on the next wake up
+                deferred.append(entry)
+                break
+            else:
+                self._queued_job_ids.discard(job_id)
+
+        for entry in deferred:
+            heapq.heappush(self._pending_queue, entry)
+
+    async def _get_queue_position(self, job: JobInfo) -> int:
+        """Get the position of a pending job in the queue, counting from 1."""
+        pending_jobs = await self.storage.get_jobs_by_status(JobStatus.PENDING)
+        job_entry = self._get_queue_entry(job)[:2]
+        return 1 + sum(1 for pending_job in pending_jobs if self._get_queue_entry(pending_job)[:2] < job_entry)
+
     async def _cleanup_terminal_jobs(self) -> None:
         """Clean up jobs that are in terminal states from storage."""
         try:
-            all_jobs = await self.storage.get_jobs()
             # Only clean up completed and canceled jobs automatically
             # Keep failed jobs for manual inspection unless explicitly canceled
-            terminal_jobs = [job for job in all_jobs if job.status in [JobStatus.COMPLETED, JobStatus.CANCELED]]
+            terminal_jobs = await self.storage.get_jobs_by_status(JobStatus.COMPLETED)
+            terminal_jobs += await self.storage.get_jobs_by_status(JobStatus.CANCELED)
 
             if terminal_jobs:
                 self.logger.debug(f"Cleaning up {len(terminal_jobs)} terminal jobs from storage")
@@ -555,12 +660,10 @@ class SchedulerRunner(BaseRunner):
     async def _sync_jobs_with_runner(self) -> None:
         """Synchronize job status with the underlying runner.
 
-        This method only checks active jobs (PENDING or RUNNING) to reduce unnecessary calls.
+        This method only checks RUNNING jobs, pending jobs are not known by the runner until they're started.
         """
         try:
-            # Get only PENDING or RUNNING jobs from our storage
-            all_jobs = await self.storage.get_jobs()
-            active_jobs = [job for job in all_jobs if job.status in [JobStatus.PENDING, JobStatus.RUNNING]]
+            active_jobs = await self.storage.get_jobs_by_status(JobStatus.RUNNING)
 
             if not active_jobs:
                 self.logger.debug("No active jobs found")
@@ -590,9 +693,11 @@ class SchedulerRunner(BaseRunner):
         if not job.project_id or not job.trajectory_id:
             self.logger.error(f"Job {job.id} missing required fields for sync")
             return
-            
+
+        finished = False
         try:
             job_status = await self.runner.get_job_status(job.project_id, job.trajectory_id)
+            finished = job.status == JobStatus.RUNNING and job_status != JobStatus.RUNNING
 
             if job_status is None:
                 if job.status == JobStatus.RUNNING:
@@ -655,6 +760,10 @@ class SchedulerRunner(BaseRunner):
         except Exception as e:
             self.logger.exception(f"Error syncing job {job.id}: {e}")
             # Don't update job status on sync errors to avoid corrupting state
+        finally:
+            # Start queued jobs when a running job is done
+            if finished:
+                self.wake_up()
 
     async def _update_job_status(self, job: JobInfo) -> None:
         """Update the status of a job by syncing with the underlying runner.
@@ -724,3 +833,4 @@ class SchedulerRunner(BaseRunner):
             await self.storage.update_job(job)
             # Remove from storage after updating status
             await self.storage.remove_job(project_id, trajectory_id)
+            self.wake_up()
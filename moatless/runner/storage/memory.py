@@ -1,19 +1,27 @@
 """In-memory storage implementation for job scheduler."""
 
 import asyncio
+from collections import Counter
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from moatless.runner.runner import JobInfo, JobStatus
-from moatless.runner.storage.storage import JobStorage
+from moatless.runner.storage.storage import JobStorage, paginate
 
 
 class InMemoryJobStorage(JobStorage):
-    """In-memory implementation of job storage."""
+    """In-memory implementation of job storage.
+
+    Jobs are indexed by status and the number of jobs per status and project is counted when jobs are added,
+    updated and removed, so listing jobs by status and counting running and queued jobs doesn't scan all jobs.
+    """
 
     def __init__(self):
         """Initialize in-memory job storage."""
         self._jobs: Dict[str, JobInfo] = {}
+        self._jobs_by_status: Dict[JobStatus, Dict[str, JobInfo]] = {status: {} for status in JobStatus}
+        self._indexed: Dict[str, Tuple[JobStatus, str]] = {}
+        self._counts: Counter[Tuple[JobStatus, str]] = Counter()
         self._lock = asyncio.Lock()
 
     async def add_job(self, job_info: JobInfo) -> None:
@@ -25,6 +33,7 @@ class InMemoryJobStorage(JobStorage):
         async with self._lock:
             job_key = self._get_job_key(job_info.project_id, job_info.trajectory_id)
             self._jobs[job_key] = job_info
+            self._index_job(job_key, job_info)
 
     async def update_job(self, job_info: JobInfo) -> None:
         """Update job information in storage.
@@ -35,6 +44,7 @@ class InMemoryJobStorage(JobStorage):
         async with self._lock:
             job_key = self._get_job_key(job_info.project_id, job_info.trajectory_id)
             self._jobs[job_key] = job_info
+            self._index_job(job_key, job_info)
 
     async def get_job(self, project_id: str, trajectory_id: str) -> Optional[JobInfo]:
         """Get job information from storage.
@@ -50,20 +60,46 @@ class InMemoryJobStorage(JobStorage):
             job_key = self._get_job_key(project_id, trajectory_id)
             return self._jobs.get(job_key)
 
-    async def get_jobs(self, project_id: Optional[str] = None) -> List[JobInfo]:
+    async def get_jobs(
+        self, project_id: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[JobInfo]:
         """Get all jobs or jobs for a specific project.
 
         Args:
             project_id: Optional project ID to filter by
+            offset: Number of jobs to skip
+            limit: Optional maximum number of jobs to return
 
         Returns:
             List of JobInfo objects
         """
         async with self._lock:
             if project_id is None:
-                return list(self._jobs.values())
+                return paginate(list(self._jobs.values()), offset, limit)
+
+            return paginate([job for job in self._jobs.values() if job.project_id == project_id], offset, limit)
+
+    async def get_jobs_by_status(
+        self, status: JobStatus, project_id: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[JobInfo]:
+        """Get jobs with the given status, optionally filtered by project.
 
-            return [job for job in self._jobs.values() if job.project_id == project_id]
+        Args:
+            status: The status to filter by
+            project_id: Optional project ID to filter by
+            offset: Number of jobs to skip
+            limit: Optional maximum number of jobs to return
+
+        Returns:
+            List of JobInfo objects
+        """
+        async with self._lock:
+            jobs = [
+                job
+                for job in self._jobs_by_status[status].values()
+                if job.status == status and (project_id is None or job.project_id == project_id)
+            ]
+            return paginate(jobs, offset, limit)
 
     async def remove_job(self, project_id: str, trajectory_id: str) -> None:
         """Remove a job from storage.
@@ -76,6 +112,7 @@ class InMemoryJobStorage(JobStorage):
             job_key = self._get_job_key(project_id, trajectory_id)
             if job_key in self._jobs:
                 del self._jobs[job_key]
+                self._unindex_job(job_key)
 
     async def get_running_jobs_count(self, project_id: Optional[str] = None) -> int:
         """Get count of running jobs, optionally filtered by project.
@@ -88,11 +125,9 @@ class InMemoryJobStorage(JobStorage):
         """
         async with self._lock:
             if project_id is None:
-                return sum(1 for job in self._jobs.values() if job.status in [JobStatus.RUNNING])
+                return len(self._jobs_by_status[JobStatus.RUNNING])
 
-            return sum(
-                1 for job in self._jobs.values() if job.project_id == project_id and job.status in [JobStatus.RUNNING]
-            )
+            return self._counts[(JobStatus.RUNNING, project_id)]
 
     async def get_queued_jobs_count(self, project_id: Optional[str] = None) -> int:
         """Get count of queued jobs, optionally filtered by project.
@@ -105,11 +140,9 @@ class InMemoryJobStorage(JobStorage):
         """
         async with self._lock:
             if project_id is None:
-                return sum(1 for job in self._jobs.values() if job.status == JobStatus.PENDING)
+                return len(self._jobs_by_status[JobStatus.PENDING])
 
-            return sum(
-                1 for job in self._jobs.values() if job.project_id == project_id and job.status == JobStatus.PENDING
-            )
+            return self._counts[(JobStatus.PENDING, project_id)]
 
     async def delete_jobs(self, project_id: Optional[str] = None) -> int:
         """Delete all jobs or jobs for a specific project.
@@ -125,6 +158,10 @@ class InMemoryJobStorage(JobStorage):
             if project_id is None:
                 count = len(self._jobs)
                 self._jobs.clear()
+                for jobs in self._jobs_by_status.values():
+                    jobs.clear()
+                self._indexed.clear()
+                self._counts.clear()
                 return count
 
             # Otherwise, delete jobs for the specified project
@@ -132,9 +169,33 @@ class InMemoryJobStorage(JobStorage):
 
             for key in keys_to_delete:
                 del self._jobs[key]
+                self._unindex_job(key)
 
             return len(keys_to_delete)
 
+    def _index_job(self, job_key: str, job_info: JobInfo) -> None:
+        """Add a job to the status index and counts, moving it from the status it was indexed with before."""
+        indexed = (job_info.status, job_info.project_id)
+        if self._indexed.get(job_key) == indexed:
+            self._jobs_by_status[job_info.status][job_key] = job_info
+            return
+
+        self._unindex_job(job_key)
+        self._jobs_by_status[job_info.status][job_key] = job_info
+        self._indexed[job_key] = indexed
+        self._counts[indexed] += 1
+
+    def _unindex_job(self, job_key: str) -> None:
+        """Remove a job from the status index and counts."""
+        indexed = self._indexed.pop(job_key, None)
+        if indexed is None:
+            return
+
+        self._jobs_by_status[indexed[0]].pop(job_key, None)
+        self._counts[indexed] -= 1
+        if not self._counts[indexed]:
+            del self._counts[indexed]
+
     def _get_job_key(self, project_id: str, trajectory_id: str) -> str:
         """Create a unique key for a job.
 
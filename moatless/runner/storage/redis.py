@@ -1,16 +1,127 @@
 """Redis storage implementation for job scheduler."""
 
 import json
+import logging
+import time
 from datetime import datetime
 from typing import List, Optional, Union
 
-
 from moatless.runner.runner import JobInfo, JobStatus
 from moatless.runner.storage.storage import JobStorage
 
+logger = logging.getLogger(__name__)
+
+# Number of keys read with each MGET and deleted with each DEL
+BATCH_SIZE = 500
+
+# Version of the job indexes, stored in the index version key when the jobs stored before have been indexed
+INDEX_VERSION = 1
+
+# Job statuses in the order their index keys are passed to the scripts
+STATUSES = [status.value for status in JobStatus]
+
+# Look up the status index and the status and project index of a status. They're passed in KEYS after the first five
+# keys, in the same order as the statuses passed in ARGV from statuses_offset.
+STATUS_INDEX_KEYS_FUNCTION = """
+local function status_index_keys(status, statuses_offset)
+    for i = statuses_offset, #ARGV do
+        if ARGV[i] == status then
+            local position = 6 + 2 * (i - statuses_offset)
+            return KEYS[position], KEYS[position + 1]
+        end
+    end
+end
+"""
+
+# Store a job and move it from the status it was indexed with to its current status.
+# KEYS: job key, job status hash, counts hash, all jobs index, project index, status indexes
+# ARGV: job data, status, project ID, score, statuses
+SET_JOB_SCRIPT = (
+    STATUS_INDEX_KEYS_FUNCTION
+    + """
+local old = redis.call('HGET', KEYS[2], KEYS[1])
+local new = ARGV[2]
+if old ~= new then
+    if old then
+        local old_index, old_project_index = status_index_keys(old, 5)
+        if old_index then
+            redis.call('ZREM', old_index, KEYS[1])
+            redis.call('ZREM', old_project_index, KEYS[1])
+        end
+        redis.call('HINCRBY', KEYS[3], old, -1)
+        redis.call('HINCRBY', KEYS[3], old .. ':' .. ARGV[3], -1)
+    end
+    redis.call('HSET', KEYS[2], KEYS[1], new)
+    redis.call('HINCRBY', KEYS[3], new, 1)
+    redis.call('HINCRBY', KEYS[3], new .. ':' .. ARGV[3], 1)
+end
+local new_index, new_project_index = status_index_keys(new, 5)
+redis.call('ZADD', new_index, ARGV[4], KEYS[1])
+redis.call('ZADD', new_project_index, ARGV[4], KEYS[1])
+redis.call('ZADD', KEYS[4], ARGV[4], KEYS[1])
+redis.call('ZADD', KEYS[5], ARGV[4], KEYS[1])
+redis.call('SET', KEYS[1], ARGV[1])
+return old
+"""
+)
+
+# Index a stored job that isn't indexed yet, without writing the job.
+# KEYS: job key, job status hash, counts hash, all jobs index, project index, status indexes
+# ARGV: status, project ID, score, statuses
+INDEX_JOB_SCRIPT = (
+    STATUS_INDEX_KEYS_FUNCTION
+    + """
+if redis.call('HEXISTS', KEYS[2], KEYS[1]) == 1 then
+    return 0
+end
+local status = ARGV[1]
+redis.call('HSET', KEYS[2], KEYS[1], status)
+redis.call('HINCRBY', KEYS[3], status, 1)
+redis.call('HINCRBY', KEYS[3], status .. ':' .. ARGV[2], 1)
+local index, project_index = status_index_keys(status, 4)
+redis.call('ZADD', index, ARGV[3], KEYS[1])
+redis.call('ZADD', project_index, ARGV[3], KEYS[1])
+redis.call('ZADD', KEYS[4], ARGV[3], KEYS[1])
+redis.call('ZADD', KEYS[5], ARGV[3], KEYS[1])
+return 1
+"""
+)
+
+# Remove a job from its indexes and counts and delete it.
+# KEYS: job key, job status hash, counts hash, all jobs index, project index, status indexes
+# ARGV: project ID, statuses
+REMOVE_JOB_SCRIPT = (
+    STATUS_INDEX_KEYS_FUNCTION
+    + """
+local old = redis.call('HGET', KEYS[2], KEYS[1])
+if old then
+    local old_index, old_project_index = status_index_keys(old, 2)
+    if old_index then
+        redis.call('ZREM', old_index, KEYS[1])
+        redis.call('ZREM', old_project_index, KEYS[1])
+    end
+    redis.call('HINCRBY', KEYS[3], old, -1)
+    redis.call('HINCRBY', KEYS[3], old .. ':' .. ARGV[1], -1)
+    redis.call('HDEL', KEYS[2], KEYS[1])
+end
+redis.call('ZREM', KEYS[4], KEYS[1])
+redis.call('ZREM', KEYS[5], KEYS[1])
+return redis.call('DEL', KEYS[1])
+"""
+)
+
 
 class RedisJobStorage(JobStorage):
-    """Redis implementation of job storage."""
+    """Redis implementation of job storage.
+
+    Each job is stored as JSON in its own key so jobs can be read with MGET. Jobs are indexed in sorted sets scored
+    by when they were enqueued, one for all jobs, one per project, one per status and one per status and project.
+    The status each job is indexed with and the number of jobs per status and per status and project are kept in
+    hashes. Jobs are stored and removed with Lua scripts, so the indexes and counts change atomically with the job.
+
+    Jobs stored before the jobs were indexed are indexed the first time the storage is used, and the project and
+    status sets they were kept in before are deleted. The index version key records that this is done.
+    """
 
     def __init__(self, redis_url: str, prefix: str = "moatless:jobs:"):
         """Initialize Redis job storage.
@@ -26,6 +137,10 @@ class RedisJobStorage(JobStorage):
 
         self._redis = redis.from_url(redis_url)
         self._prefix = prefix
+        self._set_job_script = self._redis.register_script(SET_JOB_SCRIPT)
+        self._remove_job_script = self._redis.register_script(REMOVE_JOB_SCRIPT)
+        self._index_job_script = self._redis.register_script(INDEX_JOB_SCRIPT)
+        self._index_checked = False
 
     async def add_job(self, job_info: JobInfo) -> None:
         """Add a job to storage.
@@ -33,19 +148,8 @@ class RedisJobStorage(JobStorage):
         Args:
             job_info: Information about the job to add
         """
-        job_key = self._get_job_key(job_info.project_id, job_info.trajectory_id)
-        job_data = self._serialize_job_info(job_info)
-
-        # Store job data
-        await self._redis.set(job_key, job_data)
-
-        # Add to project set
-        project_key = f"{self._prefix}project:{job_info.project_id}"
-        await self._redis.sadd(project_key, job_key)
-
-        # Add to status set
-        status_key = f"{self._prefix}status:{job_info.status.value}"
-        await self._redis.sadd(status_key, job_key)
+        await self._ensure_index()
+        await self._set_job(job_info, self._serialize_job_info(job_info))
 
     async def update_job(self, job_info: JobInfo) -> None:
         """Update job information in storage.
@@ -53,24 +157,8 @@ class RedisJobStorage(JobStorage):
         Args:
             job_info: Updated job information
         """
-        job_key = self._get_job_key(job_info.project_id, job_info.trajectory_id)
-
-        # Get current job data to check if status has changed
-        current_job_data = await self._redis.get(job_key)
-        if current_job_data:
-            current_job = self._deserialize_job_info(current_job_data)
-
-            # If status changed, update status sets
-            if current_job.status != job_info.status:
-                old_status_key = f"{self._prefix}status:{current_job.status.value}"
-                new_status_key = f"{self._prefix}status:{job_info.status.value}"
-
-                await self._redis.srem(old_status_key, job_key)
-                await self._redis.sadd(new_status_key, job_key)
-
-        # Update job data
-        job_data = self._serialize_job_info(job_info)
-        await self._redis.set(job_key, job_data)
+        await self._ensure_index()
+        await self._set_job(job_info, self._serialize_job_info(job_info))
 
     async def get_job(self, project_id: str, trajectory_id: str) -> Optional[JobInfo]:
         """Get job information from storage.
@@ -89,37 +177,45 @@ class RedisJobStorage(JobStorage):
             return self._deserialize_job_info(job_data)
         return None
 
-    async def get_jobs(self, project_id: Optional[str] = None) -> List[JobInfo]:
-        """Get all jobs or jobs for a specific project.
+    async def get_jobs(
+        self, project_id: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[JobInfo]:
+        """Get all jobs or jobs for a specific project, ordered by when they were enqueued.
 
         Args:
             project_id: Optional project ID to filter by
+            offset: Number of jobs to skip
+            limit: Optional maximum number of jobs to return
 
         Returns:
             List of JobInfo objects
         """
+        await self._ensure_index()
         if project_id is None:
-            # Get all job keys
-            pattern = f"{self._prefix}job:*"
-            keys = await self._redis.keys(pattern)
+            index_key = self._all_index_key()
         else:
-            # Get keys for specific project
-            project_key = f"{self._prefix}project:{project_id}"
-            keys = await self._redis.smembers(project_key)
+            index_key = self._project_index_key(project_id)
+        return await self._get_indexed_jobs(index_key, offset, limit)
 
-        jobs = []
-        for key in keys:
-            job_data = await self._redis.get(key)
-            if job_data:
-                try:
-                    jobs.append(self._deserialize_job_info(job_data))
-                except Exception as e:
-                    # Log error but continue processing other jobs
-                    import logging
+    async def get_jobs_by_status(
+        self, status: JobStatus, project_id: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[JobInfo]:
+        """Get jobs with the given status, optionally filtered by project, ordered by when they were enqueued.
 
-                    logging.getLogger(__name__).error(f"Error deserializing job data for key {key}: {e}")
+        Args:
+            status: The status to filter by
+            project_id: Optional project ID to filter by
+            offset: Number of jobs to skip
+            limit: Optional maximum number of jobs to return
 
-        return jobs
+        Returns:
+            List of JobInfo objects
+        """
+        await self._ensure_index()
+        index_key = self._status_index_key(status.value)
+        if project_id is not None:
+            index_key = f"{index_key}:{project_id}"
+        return await self._get_indexed_jobs(index_key, offset, limit)
 
     async def remove_job(self, project_id: str, trajectory_id: str) -> None:
         """Remove a job from storage.
@@ -128,29 +224,9 @@ class RedisJobStorage(JobStorage):
             project_id: The project ID
             trajectory_id: The trajectory ID
         """
+        await self._ensure_index()
         job_key = self._get_job_key(project_id, trajectory_id)
-
-        # Get job data to remove from sets
-        job_data = await self._redis.get(job_key)
-        if job_data:
-            try:
-                job = self._deserialize_job_info(job_data)
-
-                # Remove from project set
-                project_key = f"{self._prefix}project:{project_id}"
-                await self._redis.srem(project_key, job_key)
-
-                # Remove from status set
-                status_key = f"{self._prefix}status:{job.status.value}"
-                await self._redis.srem(status_key, job_key)
-            except Exception as e:
-                # Log error but continue with deletion
-                import logging
-
-                logging.getLogger(__name__).error(f"Error removing job references: {e}")
-
-        # Remove job data
-        await self._redis.delete(job_key)
+        await self._remove_job_script(keys=self._script_keys(job_key, project_id), args=self._remove_args(project_id))
 
     async def get_running_jobs_count(self, project_id: Optional[str] = None) -> int:
         """Get count of running jobs, optionally filtered by project.
@@ -161,21 +237,7 @@ class RedisJobStorage(JobStorage):
         Returns:
             Count of running jobs
         """
-        if project_id is None:
-            # Count all running jobs
-            running_key = f"{self._prefix}status:{JobStatus.RUNNING.value}"
-
-            running_count = await self._redis.scard(running_key)
-
-            return running_count
-
-        # For specific project, we need to get intersection of project set and status sets
-        project_key = f"{self._prefix}project:{project_id}"
-        running_key = f"{self._prefix}status:{JobStatus.RUNNING.value}"
-
-        running_count = await self._redis.sinter(project_key, running_key)
-
-        return len(running_count)
+        return await self._get_count(JobStatus.RUNNING, project_id)
 
     async def get_queued_jobs_count(self, project_id: Optional[str] = None) -> int:
         """Get count of queued jobs, optionally filtered by project.
@@ -186,17 +248,7 @@ class RedisJobStorage(JobStorage):
         Returns:
             Count of queued jobs
         """
-        if project_id is None:
-            # Count all pending jobs
-            pending_key = f"{self._prefix}status:{JobStatus.PENDING.value}"
-            return await self._redis.scard(pending_key)
-
-        # For specific project, get intersection of project set and pending status set
-        project_key = f"{self._prefix}project:{project_id}"
-        pending_key = f"{self._prefix}status:{JobStatus.PENDING.value}"
-
-        pending_count = await self._redis.sinter(project_key, pending_key)
-        return len(pending_count)
+        return await self._get_count(JobStatus.PENDING, project_id)
 
     async def delete_jobs(self, project_id: Optional[str] = None) -> int:
         """Delete all jobs or jobs for a specific project.
@@ -207,67 +259,166 @@ class RedisJobStorage(JobStorage):
         Returns:
             Number of jobs deleted
         """
-        import logging
-
-        logger = logging.getLogger(__name__)
-
         if project_id is None:
-            # Get all job keys
-            pattern = f"{self._prefix}job:*"
-            keys = await self._redis.keys(pattern)
-
-            # Get all project and status keys
-            project_keys = await self._redis.keys(f"{self._prefix}project:*")
-            status_keys = await self._redis.keys(f"{self._prefix}status:*")
-
-            count = len(keys)
-
-            # Delete all job data, project sets, and status sets
-            pipeline = self._redis.pipeline()
+            # Delete all keys with the prefix, jobs as well as indexes and counts
+            count = 0
+            keys = []
+            async for key in self._redis.scan_iter(match=f"{self._prefix}*", count=BATCH_SIZE):
+                keys.append(key)
+                if self._decode(key).startswith(f"{self._prefix}job:"):
+                    count += 1
+                if len(keys) >= BATCH_SIZE:
+                    await self._redis.delete(*keys)
+                    keys = []
 
             if keys:
-                pipeline.delete(*keys)
-
-            if project_keys:
-                pipeline.delete(*project_keys)
-
-            if status_keys:
-                pipeline.delete(*status_keys)
-
-            await pipeline.execute()
+                await self._redis.delete(*keys)
 
+            self._index_checked = False
             return count
-        else:
-            # Get keys for specific project
-            project_key = f"{self._prefix}project:{project_id}"
-            job_keys = await self._redis.smembers(project_key)
 
-            count = len(job_keys)
+        await self._ensure_index()
+        job_keys = await self._redis.zrange(self._project_index_key(project_id), 0, -1)
+        if not job_keys:
+            return 0
+
+        pipeline = self._redis.pipeline(transaction=False)
+        for job_key in job_keys:
+            await self._remove_job_script(
+                keys=self._script_keys(self._decode(job_key), project_id),
+                args=self._remove_args(project_id),
+                client=pipeline,
+            )
+        results = await pipeline.execute()
+        return sum(results)
+
+    async def _set_job(self, job_info: JobInfo, job_data: str, client=None) -> None:
+        job_key = self._get_job_key(job_info.project_id, job_info.trajectory_id)
+        enqueued_at = job_info.enqueued_at.timestamp() if job_info.enqueued_at else time.time()
+        await self._set_job_script(
+            keys=self._script_keys(job_key, job_info.project_id),
+            args=[job_data, job_info.status.value, job_info.project_id, enqueued_at, *STATUSES],
+            client=client,
+        )
 
-            if not job_keys:
-                return 0
+    async def _get_indexed_jobs(self, index_key: str, offset: int, limit: Optional[int]) -> List[JobInfo]:
+        """Read the jobs in a sorted set index with MGET in batches."""
+        if limit is not None and limit <= 0:
+            return []
 
-            # Get job info for each key to remove from status sets
-            pipeline = self._redis.pipeline()
+        end = offset + limit - 1 if limit is not None else -1
+        job_keys = await self._redis.zrange(index_key, offset, end)
+
+        jobs = []
+        for start in range(0, len(job_keys), BATCH_SIZE):
+            batch = job_keys[start : start + BATCH_SIZE]
+            for key, job_data in zip(batch, await self._redis.mget(batch)):
+                if not job_data:
+                    continue
 
-            # Delete all job data
-            for job_key in job_keys:
                 try:
-                    job_data = await self._redis.get(job_key)
-                    if job_data:
-                        job = self._deserialize_job_info(job_data)
-                        status_key = f"{self._prefix}status:{job.status.value}"
-                        pipeline.srem(status_key, job_key)
-                    pipeline.delete(job_key)
+                    jobs.append(self._deserialize_job_info(job_data))
                 except Exception as e:
-                    logger.error(f"Error processing job {job_key} for deletion: {e}")
+                    # Log error but continue processing other jobs
+                    logger.error(f"Error deserializing job data for key {self._decode(key)}: {e}")
 
-            # Delete project set
-            pipeline.delete(project_key)
+        return jobs
 
-            await pipeline.execute()
+    async def _get_count(self, status: JobStatus, project_id: Optional[str] = None) -> int:
+        await self._ensure_index()
+        field = status.value if project_id is None else f"{status.value}:{project_id}"
+        count = await self._redis.hget(self._counts_key(), field)
+        return int(count) if count else 0
+
+    async def _ensure_index(self) -> None:
+        """Index jobs stored before jobs were indexed, checked once per instance."""
+        if self._index_checked:
+            return
+
+        version = await self._redis.get(self._index_version_key())
+        if version is None or int(version) < INDEX_VERSION:
+            indexed = 0
+            batch = []
+            async for key in self._redis.scan_iter(match=f"{self._prefix}job:*", count=BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= BATCH_SIZE:
+                    indexed += await self._index_jobs(batch)
+                    batch = []
+
+            if batch:
+                indexed += await self._index_jobs(batch)
+
+            legacy_keys = []
+            for pattern in [f"{self._prefix}project:*", f"{self._prefix}status:*"]:
+                async for key in self._redis.scan_iter(match=pattern, count=BATCH_SIZE):
+                    legacy_keys.append(key)
+            for start in range(0, len(legacy_keys), BATCH_SIZE):
+                await self._redis.delete(*legacy_keys[start : start + BATCH_SIZE])
+
+            await self._redis.set(self._index_version_key(), INDEX_VERSION)
+
+            if indexed or legacy_keys:
+                logger.info(
+                    f"Indexed {indexed} jobs and deleted {len(legacy_keys)} legacy job sets in Redis job storage"
+                )
+
+        self._index_checked = True
+
+    async def _index_jobs(self, job_keys: list) -> int:
+        """Index the jobs that aren't indexed yet, jobs stored by other instances meanwhile are left as they are."""
+        pipeline = self._redis.pipeline(transaction=False)
+        for key, job_data in zip(job_keys, await self._redis.mget(job_keys)):
+            if not job_data:
+                continue
 
-            return count
+            try:
+                job_info = self._deserialize_job_info(job_data)
+            except Exception as e:
+                logger.error(f"Error deserializing job data for key {self._decode(key)}: {e}")
+                continue
+
+            enqueued_at = job_info.enqueued_at.timestamp() if job_info.enqueued_at else time.time()
+            await self._index_job_script(
+                keys=self._script_keys(self._decode(key), job_info.project_id),
+                args=[job_info.status.value, job_info.project_id, enqueued_at, *STATUSES],
+                client=pipeline,
+            )
+
+        results = await pipeline.execute()
+        return sum(results)
+
+    def _script_keys(self, job_key: str, project_id: str) -> list[str]:
+        keys = [
+            job_key,
+            f"{self._prefix}index:job_status",
+            self._counts_key(),
+            self._all_index_key(),
+            self._project_index_key(project_id),
+        ]
+        for status in STATUSES:
+            keys.extend([self._status_index_key(status), f"{self._status_index_key(status)}:{project_id}"])
+        return keys
+
+    def _remove_args(self, project_id: str) -> list[str]:
+        return [project_id, *STATUSES]
+
+    def _all_index_key(self) -> str:
+        return f"{self._prefix}index:all"
+
+    def _project_index_key(self, project_id: str) -> str:
+        return f"{self._prefix}index:project:{project_id}"
+
+    def _status_index_key(self, status: str) -> str:
+        return f"{self._prefix}index:status:{status}"
+
+    def _counts_key(self) -> str:
+        return f"{self._prefix}counts"
+
+    def _index_version_key(self) -> str:
+        return f"{self._prefix}index:version"
+
+    def _decode(self, value: Union[str, bytes]) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else value
 
     def _get_job_key(self, project_id: str, trajectory_id: str) -> str:
         """Create a unique key for a job.
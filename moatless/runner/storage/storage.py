@@ -41,17 +41,40 @@ class JobStorage(ABC):
         pass
 
     @abstractmethod
-    async def get_jobs(self, project_id: Optional[str] = None) -> List[JobInfo]:
+    async def get_jobs(
+        self, project_id: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[JobInfo]:
         """Get all jobs or jobs for a specific project.
 
         Args:
             project_id: Optional project ID to filter by
+            offset: Number of jobs to skip
+            limit: Optional maximum number of jobs to return
 
         Returns:
             List of JobInfo objects
         """
         pass
 
+    async def get_jobs_by_status(
+        self, status: JobStatus, project_id: Optional[str] = None, offset: int = 0, limit: Optional[int] = None
+    ) -> List[JobInfo]:
+        """Get jobs with the given status, optionally filtered by project.
+
+        Storages that index jobs by status should override this to avoid listing all jobs.
+
+        Args:
+            status: The status to filter by
+            project_id: Optional project ID to filter by
+            offset: Number of jobs to skip
+            limit: Optional maximum number of jobs to return
+
+        Returns:
+            List of JobInfo objects
+        """
+        jobs = [job for job in await self.get_jobs(project_id) if job.status == status]
+        return paginate(jobs, offset, limit)
+
     @abstractmethod
     async def remove_job(self, project_id: str, trajectory_id: str) -> None:
         """Remove a job from storage.
@@ -97,3 +120,10 @@ class JobStorage(ABC):
             Number of jobs deleted
         """
         pass
+
+
+def paginate(jobs: List[JobInfo], offset: int = 0, limit: Optional[int] = None) -> List[JobInfo]:
+    """Return the jobs from offset, at most limit jobs if limit is set."""
+    if limit is None:
+        return jobs[offset:]
+    return jobs[offset : offset + max(limit, 0)]
@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 
@@ -17,6 +18,8 @@ logger = logging.getLogger(__name__)
 _storage = None
 _event_bus = None
 _runner = None
+_completion_cache_configured = False
+_rate_limiter_configured = False
 
 model_manager = None
 agent_manager = None
@@ -160,6 +163,10 @@ async def get_runner():
 
         if os.environ.get("REDIS_URL"):
             _runner = SchedulerRunner(runner_impl, storage_type="redis", redis_url=os.environ.get("REDIS_URL"))
+
+            # Start queued jobs as soon as a flow completes or fails
+            event_bus = await get_event_bus()
+            await event_bus.subscribe(_runner.handle_event)
         else:
             _runner = runner_impl()
 
@@ -193,6 +200,62 @@ async def get_storage() -> BaseStorage:
     return _storage
 
 
+async def setup_completion_cache():
+    """
+    Set the completion cache used by all completion models in the process if MOATLESS_COMPLETION_CACHE is set to
+    record, replay or read_through. Responses are stored in the storage.
+    """
+    global _completion_cache_configured
+
+    load_dotenv()
+
+    if _completion_cache_configured:
+        return
+
+    cache_mode = os.environ.get("MOATLESS_COMPLETION_CACHE")
+    if cache_mode:
+        from moatless.completion.cache import CompletionCache, CompletionCacheMode, set_completion_cache
+
+        storage = await get_storage()
+        set_completion_cache(CompletionCache(storage, mode=CompletionCacheMode(cache_mode)))
+        logger.info(f"Completion cache initialized in {cache_mode} mode with storage {storage}")
+
+    _completion_cache_configured = True
+
+
+def setup_rate_limiter():
+    """
+    Set the rate limiter used by all completion models in the process if MOATLESS_RATE_LIMITS is set to limits per
+    model or provider as JSON, like `{"default": {"max_concurrent": 10}, "anthropic": {"requests_per_minute": 50,
+    "tokens_per_minute": 40000}}`. The limits are shared by all processes using REDIS_URL if it's set.
+    """
+    global _rate_limiter_configured
+
+    load_dotenv()
+
+    if _rate_limiter_configured:
+        return
+
+    rate_limits = os.environ.get("MOATLESS_RATE_LIMITS")
+    if rate_limits:
+        from moatless.completion.rate_limiter import RateLimiter, RateLimits, RedisRateLimiter, set_rate_limiter
+
+        limits = {key: RateLimits(**value) for key, value in json.loads(rate_limits).items()}
+        default_limits = limits.pop("default", None)
+
+        if os.environ.get("REDIS_URL"):
+            rate_limiter = RedisRateLimiter(
+                redis_url=os.environ["REDIS_URL"], default_limits=default_limits, limits=limits
+            )
+        else:
+            rate_limiter = RateLimiter(default_limits=default_limits, limits=limits)
+
+        set_rate_limiter(rate_limiter)
+        logger.info(f"Rate limiter initialized with limits {rate_limits}")
+
+    _rate_limiter_configured = True
+
+
 async def get_evaluation_manager():
     """Get the evaluation manager instance, ensuring it's initialized."""
     await ensure_managers_initialized()
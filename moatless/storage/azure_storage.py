@@ -9,13 +9,12 @@ import json
 import logging
 import os
 from datetime import datetime
-from typing import Union, List
 
 from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
 from opentelemetry import trace
 
-from moatless.storage.base import BaseStorage
+from moatless.storage.segmented_storage import SegmentedAppendStorage
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
@@ -34,12 +33,13 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
-class AzureBlobStorage(BaseStorage):
+class AzureBlobStorage(SegmentedAppendStorage):
     """
     Storage implementation that uses Azure Blob Storage.
 
     This class provides a storage implementation that reads and writes
-    data to Azure Blob Storage.
+    data to Azure Blob Storage. Appended lines are buffered and written
+    to segment blobs, see SegmentedAppendStorage.
     """
 
     def __init__(self, connection_string: str | None = None, container_name: str = "moatless-tools"):
@@ -50,6 +50,7 @@ class AzureBlobStorage(BaseStorage):
             connection_string: Azure Storage connection string
             container_name: Name of the container to use
         """
+        super().__init__()
         self.connection_string = connection_string or os.getenv("AZURE_STORAGE_CONNECTION_STRING")
         if not self.connection_string:
             raise ValueError("Azure Storage connection string is required")
@@ -79,9 +80,9 @@ class AzureBlobStorage(BaseStorage):
         """
         return self.normalize_path(path)
 
-    async def read_raw(self, path: str) -> str:
+    async def _get_object(self, path: str) -> str:
         """
-        Read raw string data from a blob without parsing.
+        Download a blob as a string.
 
         Args:
             path: The path to read
@@ -101,38 +102,9 @@ class AzureBlobStorage(BaseStorage):
         except ResourceNotFoundError:
             raise KeyError(f"No data found for path: {path}")
 
-    async def read_lines(self, path: str) -> List[dict]:
+    async def _put_object(self, path: str, data: str) -> None:
         """
-        Read data from a JSONL blob, parsing each line as a JSON object.
-
-        Args:
-            path: The path to read
-
-        Returns:
-            A list of parsed JSON objects, one per line
-
-        Raises:
-            KeyError: If the path does not exist
-        """
-        blob_name = self._get_blob_name(path)
-        try:
-            blob_client = self.container_client.get_blob_client(blob_name)
-            download_stream = await blob_client.download_blob()
-            content = await download_stream.readall()
-            content_str = content.decode("utf-8")
-
-            results = []
-            for line in content_str.splitlines():
-                line = line.strip()
-                if line:  # Skip empty lines
-                    results.append(json.loads(line))
-            return results
-        except ResourceNotFoundError:
-            raise KeyError(f"No data found for path: {path}")
-
-    async def write_raw(self, path: str, data: str) -> None:
-        """
-        Write raw string data to a blob.
+        Upload string data to a blob.
 
         Args:
             path: The path to write to
@@ -142,40 +114,7 @@ class AzureBlobStorage(BaseStorage):
         blob_client = self.container_client.get_blob_client(blob_name)
         await blob_client.upload_blob(data.encode("utf-8"), overwrite=True)
 
-    async def append(self, path: str, data: Union[dict, str]) -> None:
-        """
-        Append data to an existing blob.
-
-        Args:
-            path: The path to append to
-            data: The data to append. If dict, it will be serialized as JSON.
-                 If string, it will be written as-is with a newline.
-        """
-        blob_name = self._get_blob_name(path)
-        blob_client = self.container_client.get_blob_client(blob_name)
-
-        # Convert to JSON string if it's a dict
-        if isinstance(data, dict):
-            line = json.dumps(data, cls=DateTimeEncoder)
-        else:
-            line = data
-
-        # Make sure the line ends with a newline
-        if not line.endswith("\n"):
-            line += "\n"
-
-        try:
-            # Try to download existing content
-            download_stream = await blob_client.download_blob()
-            existing_content = await download_stream.readall()
-            content = existing_content + line.encode("utf-8")
-        except ResourceNotFoundError:
-            # If blob doesn't exist, just use the new line
-            content = line.encode("utf-8")
-
-        await blob_client.upload_blob(content, overwrite=True)
-
-    async def delete(self, path: str) -> None:
+    async def _delete_object(self, path: str) -> None:
         """
         Delete a blob.
 
@@ -192,7 +131,7 @@ class AzureBlobStorage(BaseStorage):
         except ResourceNotFoundError:
             raise KeyError(f"No data found for path: {path}")
 
-    async def exists(self, path: str) -> bool:
+    async def _object_exists(self, path: str) -> bool:
         """
         Check if a blob exists.
 
@@ -220,6 +159,21 @@ class AzureBlobStorage(BaseStorage):
             if not isinstance(e, ResourceNotFoundError):
                 raise
 
+    async def _list_object_versions(self, prefix: str) -> dict[str, str]:
+        """
+        List all blobs under a prefix with their ETags.
+
+        Args:
+            prefix: The prefix to filter paths by
+
+        Returns:
+            A dict of blob names to ETags
+        """
+        versions = {}
+        async for blob in self.container_client.list_blobs(name_starts_with=self._get_blob_name(prefix)):
+            versions[blob.name] = blob.etag
+        return versions
+
     async def list_paths(self, prefix: str = "") -> list[str]:
         """
         List all paths with the given prefix.
@@ -241,6 +195,7 @@ class AzureBlobStorage(BaseStorage):
 
     async def close(self) -> None:
         """
-        Close the Azure Blob Storage connection.
+        Flush buffered appends and close the Azure Blob Storage connection.
         """
+        await super().close()
         await self.blob_service_client.close()
@@ -117,6 +117,15 @@ class BaseStorage(abc.ABC):
         """
         pass
 
+    async def flush(self, path: Optional[str] = None) -> None:
+        """
+        Flush appended data that is buffered by the storage.
+
+        Args:
+            path: The identifier for the data to flush, all data is flushed if not set
+        """
+        pass
+
     @abc.abstractmethod
     async def delete(self, path: str) -> None:
         """
@@ -169,6 +178,19 @@ class BaseStorage(abc.ABC):
         """
         pass
 
+    async def list_versions(self, prefix: str = "") -> Optional[dict[str, str]]:
+        """
+        List all paths under the given prefix, recursively, with a version that changes when the data at the path
+        changes, like an ETag or a modification time.
+
+        Args:
+            prefix: The prefix to filter paths by
+
+        Returns:
+            A dict of paths to versions, or None if the storage can't list versions
+        """
+        return None
+
     def normalize_path(self, path: str) -> str:
         """
         Normalize a path to ensure consistent format.
@@ -366,6 +388,9 @@ class BaseStorage(abc.ABC):
         trajectory_path = f"projects/{project_id}/trajs/{trajectory_id}/{path}"
         await self.assert_exists(trajectory_path)
 
+    def get_project_path(self, project_id: str | None = None) -> str:
+        return f"projects/{self._get_project_id(project_id)}"
+
     def get_trajectory_path(self, project_id: str | None = None, trajectory_id: str | None = None) -> str:
         if project_id is None:
             project_id = self._get_project_id()
@@ -234,6 +234,45 @@ class FileStorage(BaseStorage):
         # Fallback to empty list if path doesn't exist at all
         return []
 
+    @tracer.start_as_current_span("FileStorage.list_versions")
+    async def list_versions(self, prefix: str = "") -> dict[str, str]:
+        """
+        List all files under the given prefix, recursively, with their modification time and size as version.
+
+        Args:
+            prefix: The directory or file prefix to filter paths by
+
+        Returns:
+            A dict of paths to versions
+        """
+        normalized_prefix = self.normalize_path(prefix)
+        if normalized_prefix:
+            prefix_path = self.base_dir / normalized_prefix.replace("/", os.path.sep)
+        else:
+            prefix_path = self.base_dir
+
+        # The prefix is either a directory or a file prefix in its parent directory, like list_paths
+        if prefix_path.is_dir():
+            matches = [prefix_path]
+        elif prefix_path.parent.is_dir():
+            matches = list(prefix_path.parent.glob(f"{prefix_path.name}*"))
+        else:
+            return {}
+
+        files = []
+        for match in matches:
+            if match.is_file():
+                files.append(match)
+            for dir_path, _, file_names in os.walk(match):
+                files.extend(Path(dir_path) / file_name for file_name in file_names)
+
+        versions = {}
+        for file_path in files:
+            stat = file_path.stat()
+            path_str = str(file_path.relative_to(self.base_dir)).replace(os.path.sep, "/")
+            versions[path_str] = f"{stat.st_mtime_ns}-{stat.st_size}"
+        return versions
+
     async def _list_paths_in_dir(self, directory: Path) -> list[str]:
         """
         List all paths in a specific directory.
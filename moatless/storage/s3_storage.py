@@ -9,13 +9,12 @@ import json
 import logging
 import os
 from datetime import datetime
-from typing import Union, List
 
 import aioboto3
 from botocore.exceptions import ClientError
 from opentelemetry import trace
 
-from moatless.storage.base import BaseStorage
+from moatless.storage.segmented_storage import SegmentedAppendStorage
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
@@ -30,12 +29,13 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
-class S3Storage(BaseStorage):
+class S3Storage(SegmentedAppendStorage):
     """
     Storage implementation that uses Amazon S3.
 
     This class provides a storage implementation that reads and writes
-    data to Amazon S3 buckets.
+    data to Amazon S3 buckets. Appended lines are buffered and written
+    to segment objects, see SegmentedAppendStorage.
     """
 
     def __init__(
@@ -56,6 +56,7 @@ class S3Storage(BaseStorage):
             aws_secret_access_key: AWS secret access key (optional, will use boto3 default)
             endpoint_url: Custom endpoint URL for S3 (useful for Minio, etc.)
         """
+        super().__init__()
         self.bucket_name = bucket_name or os.getenv("MOATLESS_S3_BUCKET_NAME")
         self.region_name = region_name or os.getenv("MOATLESS_S3_REGION_NAME")
         self.aws_access_key_id = aws_access_key_id
@@ -95,9 +96,9 @@ class S3Storage(BaseStorage):
         """
         return self.normalize_path(path)
 
-    async def read_raw(self, path: str) -> str:
+    async def _get_object(self, path: str) -> str:
         """
-        Read raw string data from an S3 object without parsing.
+        Download an S3 object as a string.
 
         Args:
             path: The path to read
@@ -127,48 +128,9 @@ class S3Storage(BaseStorage):
                 # Re-raise other AWS errors
                 raise
 
-    async def read_lines(self, path: str) -> List[dict]:
+    async def _put_object(self, path: str, data: str) -> None:
         """
-        Read data from a JSONL S3 object, parsing each line as a JSON object.
-
-        Args:
-            path: The path to read
-
-        Returns:
-            A list of parsed JSON objects, one per line
-
-        Raises:
-            KeyError: If the path does not exist
-        """
-        object_path = self._get_object_path(path)
-
-        try:
-            async with self.session.resource(**self.conn_params) as s3:
-                obj = await s3.Object(self.bucket_name, object_path)
-                response = await obj.get()
-
-                # Get the body as bytes and decode to string
-                streaming_body = response["Body"]
-                content = await streaming_body.read()
-                content_str = content.decode("utf-8")
-
-                results = []
-                for line in content_str.splitlines():
-                    line = line.strip()
-                    if line:  # Skip empty lines
-                        results.append(json.loads(line))
-                return results
-
-        except ClientError as e:
-            if e.response["Error"]["Code"] == "NoSuchKey":
-                raise KeyError(f"No data found for path: {path}")
-            else:
-                # Re-raise other AWS errors
-                raise
-
-    async def write_raw(self, path: str, data: str) -> None:
-        """
-        Write raw string data to an S3 object.
+        Upload string data to an S3 object.
 
         Args:
             path: The path to write to
@@ -180,40 +142,7 @@ class S3Storage(BaseStorage):
             obj = await s3.Object(self.bucket_name, object_path)
             await obj.put(Body=data.encode("utf-8"), ContentType="text/plain")
 
-    async def append(self, path: str, data: Union[dict, str]) -> None:
-        """
-        Append data to an existing S3 object.
-
-        Args:
-            path: The path to append to
-            data: The data to append. If dict, it will be serialized as JSON.
-                 If string, it will be written as-is with a newline.
-        """
-        object_path = self._get_object_path(path)
-
-        # Convert to JSON string if it's a dict
-        if isinstance(data, dict):
-            line = json.dumps(data, cls=DateTimeEncoder)
-        else:
-            line = data
-
-        # Make sure the line ends with a newline
-        if not line.endswith("\n"):
-            line += "\n"
-
-        # S3 doesn't support direct appends, so we need to download, modify, and re-upload
-        try:
-            # Try to get existing content
-            existing_content = await self.read_raw(path)
-            content = existing_content + line
-        except KeyError:
-            # If object doesn't exist, just use the new line
-            content = line
-
-        # Upload the combined content
-        await self.write_raw(path, content)
-
-    async def delete(self, path: str) -> None:
+    async def _delete_object(self, path: str) -> None:
         """
         Delete an S3 object.
 
@@ -238,7 +167,7 @@ class S3Storage(BaseStorage):
                 # Re-raise other AWS errors
                 raise
 
-    async def exists(self, path: str) -> bool:
+    async def _object_exists(self, path: str) -> bool:
         """
         Check if an S3 object exists.
 
@@ -262,6 +191,25 @@ class S3Storage(BaseStorage):
                 # Re-raise other AWS errors
                 raise
 
+    @tracer.start_as_current_span("S3Storage._list_object_versions")
+    async def _list_object_versions(self, prefix: str) -> dict[str, str]:
+        """
+        List all objects under a prefix with their ETags, a thousand objects per request.
+
+        Args:
+            prefix: The prefix to filter paths by
+
+        Returns:
+            A dict of object paths to ETags
+        """
+        versions = {}
+        async with self.session.client(**self.conn_params) as s3:
+            paginator = s3.get_paginator("list_objects_v2")
+            async for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self._get_object_path(prefix)):
+                for obj in page.get("Contents", []):
+                    versions[obj["Key"]] = obj["ETag"]
+        return versions
+
     @tracer.start_as_current_span("S3Storage.list_paths")
     async def list_paths(self, prefix: str = "", delimiter: str = "/") -> list[str]:
         """
@@ -325,8 +273,7 @@ class S3Storage(BaseStorage):
 
     async def close(self) -> None:
         """
-        Close any connections to S3.
+        Flush buffered appends and close any connections to S3.
         """
-        # aioboto3 manages connections automatically with context managers,
-        # but we provide this method for consistency with other storage implementations
-        pass
+        # aioboto3 manages connections automatically with context managers
+        await super().close()
@@ -0,0 +1,387 @@
+"""
+Base class for object storages without an append operation.
+
+This module provides buffered appends to segment objects for storages like
+Amazon S3 and Azure Blob Storage, where appending by downloading and
+re-uploading the whole object gets slower as the object grows.
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+from moatless.storage.base import BaseStorage, DateTimeEncoder
+
+logger = logging.getLogger(__name__)
+
+SEGMENTS_SUFFIX = ".segments"
+MANIFEST_FILE = "manifest.json"
+
+
+@dataclass
+class AppendLog:
+    """Segments of an appended path and the lines that are not flushed yet."""
+
+    segments: list[str] = field(default_factory=list)
+    segment_data: str = ""
+    pending: list[str] = field(default_factory=list)
+    pending_size: int = 0
+    first_pending_at: Optional[float] = None
+    flush_task: Optional[asyncio.Task] = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class SegmentedAppendStorage(BaseStorage):
+    """
+    Base class for object storages that appends lines to segment objects.
+
+    Appended lines are buffered per path and flushed to segment objects listed in a manifest,
+    `<path>.segments/000000.jsonl`, `<path>.segments/000001.jsonl` and `<path>.segments/manifest.json`.
+    The last segment is rewritten on each flush until it's larger than max_segment_size, so a flush uploads at most
+    one segment and the manifest is only written when a segment is added.
+
+    The buffer of a path is flushed when it's larger than flush_size, flush_interval seconds after the first line was
+    buffered, before the path is read and on flush() and close(). read_raw() and read_lines() return the lines in the
+    object at the path, written before appends were segmented, followed by the lines in the segments.
+
+    Only one process should append to a path at a time. Appends are expected to JSONL paths, for other paths
+    write_raw(), delete() and exists() only know about segments appended by this process.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        max_segment_size: int = 1024 * 1024,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_segment_size = max_segment_size
+        self._append_logs: dict[str, AppendLog] = {}
+
+    @abc.abstractmethod
+    async def _get_object(self, path: str) -> str:
+        """
+        Download an object.
+
+        Raises:
+            KeyError: If the object does not exist
+        """
+        pass
+
+    @abc.abstractmethod
+    async def _put_object(self, path: str, data: str) -> None:
+        """Upload an object, replacing any existing object."""
+        pass
+
+    @abc.abstractmethod
+    async def _delete_object(self, path: str) -> None:
+        """
+        Delete an object.
+
+        Raises:
+            KeyError: If the object does not exist
+        """
+        pass
+
+    @abc.abstractmethod
+    async def _object_exists(self, path: str) -> bool:
+        """Check if an object exists."""
+        pass
+
+    async def _list_object_versions(self, prefix: str) -> Optional[dict[str, str]]:
+        """List the objects under a prefix with their ETags, or None if the storage can't list them."""
+        return None
+
+    async def read_raw(self, path: str) -> str:
+        """
+        Read raw string data from an object and its segments without parsing.
+
+        Args:
+            path: The path to read
+
+        Returns:
+            The contents of the object at the path followed by the lines appended to it
+
+        Raises:
+            KeyError: If the path does not exist
+        """
+        contents = await self._read_contents(path)
+        if len(contents) == 1:
+            return contents[0]
+        return "".join(content if content.endswith("\n") else content + "\n" for content in contents if content)
+
+    async def read_lines(self, path: str) -> List[dict]:
+        """
+        Read data from a JSONL object and its segments, parsing each line as a JSON object.
+
+        Args:
+            path: The path to read
+
+        Returns:
+            A list of parsed JSON objects, one per line
+
+        Raises:
+            KeyError: If the path does not exist
+        """
+        results = []
+        for content in await self._read_contents(path):
+            for line in content.splitlines():
+                line = line.strip()
+                if line:  # Skip empty lines
+                    results.append(json.loads(line))
+        return results
+
+    async def write_raw(self, path: str, data: str) -> None:
+        """
+        Write raw string data to an object, replacing any lines appended to the path.
+
+        Args:
+            path: The path to write to
+            data: The string data to write
+        """
+        path = self.normalize_path(path)
+        await self._delete_segments(path)
+        await self._put_object(path, data)
+
+    async def append(self, path: str, data: Union[dict, str]) -> None:
+        """
+        Append data to the path. The data is buffered and flushed to a segment object.
+
+        Args:
+            path: The path to append to
+            data: The data to append. If dict, it will be serialized as JSON.
+                 If string, it will be written as-is with a newline.
+        """
+        path = self.normalize_path(path)
+
+        # Convert to JSON string if it's a dict
+        if isinstance(data, dict):
+            line = json.dumps(data, cls=DateTimeEncoder)
+        else:
+            line = data
+
+        # Make sure the line ends with a newline
+        if not line.endswith("\n"):
+            line += "\n"
+
+        append_log = self._append_logs.get(path)
+        if append_log is None:
+            # Continue the segments left by an earlier process
+            segments = await self._read_manifest(path) or []
+            segment_data = await self._get_object(self._segment_path(path, segments[-1])) if segments else ""
+            append_log = self._append_logs.setdefault(path, AppendLog(segments=segments, segment_data=segment_data))
+
+        append_log.pending.append(line)
+        append_log.pending_size += len(line)
+        if append_log.first_pending_at is None:
+            append_log.first_pending_at = time.monotonic()
+
+        if (
+            append_log.pending_size >= self.flush_size
+            or time.monotonic() - append_log.first_pending_at >= self.flush_interval
+        ):
+            await self._flush_log(path, append_log)
+        elif append_log.flush_task is None:
+            append_log.flush_task = asyncio.create_task(self._flush_later(path, append_log))
+
+    async def flush(self, path: Optional[str] = None) -> None:
+        """
+        Flush buffered lines to segment objects.
+
+        Args:
+            path: The path to flush, all paths are flushed if not set
+        """
+        if path is None:
+            paths = list(self._append_logs.keys())
+        else:
+            paths = [self.normalize_path(path)]
+
+        for path in paths:
+            append_log = self._append_logs.get(path)
+            if append_log and append_log.pending:
+                await self._flush_log(path, append_log)
+
+    async def delete(self, path: str) -> None:
+        """
+        Delete an object and any lines appended to it.
+
+        Args:
+            path: The path to delete
+
+        Raises:
+            KeyError: If the path does not exist
+        """
+        path = self.normalize_path(path)
+        deleted_segments = await self._delete_segments(path)
+        try:
+            await self._delete_object(path)
+        except KeyError:
+            if not deleted_segments:
+                raise
+
+    async def exists(self, path: str) -> bool:
+        """
+        Check if an object exists or lines have been appended to the path.
+
+        Args:
+            path: The path to check
+
+        Returns:
+            True if the path exists, False otherwise
+        """
+        path = self.normalize_path(path)
+        if path in self._append_logs or await self._object_exists(path):
+            return True
+        return self._may_have_segments(path) and await self._object_exists(self._manifest_path(path))
+
+    async def list_versions(self, prefix: str = "") -> Optional[dict[str, str]]:
+        """
+        List all objects under the given prefix with their ETags. Lines buffered for paths under the prefix are
+        flushed first, so the versions include them.
+
+        Args:
+            prefix: The prefix to filter paths by
+
+        Returns:
+            A dict of object paths to ETags, or None if the storage can't list them
+        """
+        prefix = self.normalize_path(prefix)
+        for path, append_log in list(self._append_logs.items()):
+            if path.startswith(prefix) and append_log.pending:
+                await self._flush_log(path, append_log)
+
+        return await self._list_object_versions(prefix)
+
+    async def close(self) -> None:
+        """
+        Flush all buffered lines.
+        """
+        await self.flush()
+        for append_log in self._append_logs.values():
+            if append_log.flush_task:
+                append_log.flush_task.cancel()
+        self._append_logs.clear()
+
+    async def _flush_later(self, path: str, append_log: AppendLog):
+        try:
+            await asyncio.sleep(self.flush_interval)
+            append_log.flush_task = None
+            if append_log.pending:
+                await self._flush_log(path, append_log)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Failed to flush appended lines to {path}")
+
+    async def _flush_log(self, path: str, append_log: AppendLog):
+        async with append_log.lock:
+            if not append_log.pending:
+                return
+
+            if append_log.flush_task and append_log.flush_task is not asyncio.current_task():
+                append_log.flush_task.cancel()
+            append_log.flush_task = None
+
+            pending = "".join(append_log.pending)
+            pending_lines = len(append_log.pending)
+            append_log.pending = []
+            append_log.pending_size = 0
+            append_log.first_pending_at = None
+
+            try:
+                if not append_log.segments or len(append_log.segment_data) >= self.max_segment_size:
+                    segments = append_log.segments + [f"{len(append_log.segments):06d}.jsonl"]
+                    await self._put_object(self._segment_path(path, segments[-1]), pending)
+                    await self._put_object(self._manifest_path(path), json.dumps({"segments": segments}))
+                    append_log.segments = segments
+                    append_log.segment_data = pending
+                else:
+                    segment_data = append_log.segment_data + pending
+                    await self._put_object(self._segment_path(path, append_log.segments[-1]), segment_data)
+                    append_log.segment_data = segment_data
+            except Exception:
+                # Keep the lines buffered to be flushed again
+                append_log.pending.insert(0, pending)
+                append_log.pending_size += len(pending)
+                append_log.first_pending_at = time.monotonic()
+                raise
+
+            logger.debug(f"Flushed {pending_lines} lines to {path} segment {append_log.segments[-1]}")
+
+    async def _read_contents(self, path: str) -> list[str]:
+        """Read the object at the path, written before appends were segmented, followed by its segments."""
+        path = self.normalize_path(path)
+        await self.flush(path)
+
+        found = False
+        contents = []
+        try:
+            contents.append(await self._get_object(path))
+            found = True
+        except KeyError:
+            pass
+
+        append_log = self._append_logs.get(path)
+        if append_log:
+            segments = append_log.segments
+        elif self._may_have_segments(path):
+            segments = await self._read_manifest(path)
+        else:
+            segments = None
+
+        if segments is not None:
+            found = True
+            segment_contents = await asyncio.gather(
+                *(self._get_object(self._segment_path(path, segment)) for segment in segments[:-1])
+            )
+            contents.extend(segment_contents)
+            if append_log:
+                contents.append(append_log.segment_data)
+            elif segments:
+                contents.append(await self._get_object(self._segment_path(path, segments[-1])))
+
+        if not found:
+            raise KeyError(f"No data found for path: {path}")
+        return contents
+
+    async def _read_manifest(self, path: str) -> Optional[list[str]]:
+        try:
+            manifest = json.loads(await self._get_object(self._manifest_path(path)))
+        except KeyError:
+            return None
+        return manifest["segments"]
+
+    async def _delete_segments(self, path: str) -> bool:
+        append_log = self._append_logs.pop(path, None)
+        if append_log:
+            if append_log.flush_task:
+                append_log.flush_task.cancel()
+            segments = append_log.segments
+        elif self._may_have_segments(path):
+            segments = await self._read_manifest(path)
+        else:
+            segments = None
+
+        if not segments:
+            return append_log is not None
+
+        for object_path in [self._manifest_path(path)] + [self._segment_path(path, segment) for segment in segments]:
+            try:
+                await self._delete_object(object_path)
+            except KeyError:
+                pass
+        return True
+
+    def _may_have_segments(self, path: str) -> bool:
+        return path in self._append_logs or path.endswith(".jsonl")
+
+    def _segment_path(self, path: str, segment: str) -> str:
+        return f"{path}{SEGMENTS_SUFFIX}/{segment}"
+
+    def _manifest_path(self, path: str) -> str:
+        return f"{path}{SEGMENTS_SUFFIX}/{MANIFEST_FILE}"
@@ -0,0 +1,278 @@
+import json
+import logging
+import uuid
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from moatless.storage.base import BaseStorage, DateTimeEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class JournalConflictError(Exception):
+    """Raised when another writer changed a snapshot or its journal since they were last read or written."""
+
+
+@dataclass(frozen=True)
+class JournalFormat:
+    """How the items and the metadata of a document are stored in journal records."""
+
+    items_field: str
+    item_id_field: str
+    item_record: str
+    metadata_record: str
+    # The document field holding the metadata, or None if the metadata is the document without the items
+    metadata_field: Optional[str] = None
+
+    def item_lines(self, data: dict[str, Any]) -> dict[Any, str]:
+        return {
+            item[self.item_id_field]: json.dumps(item, cls=DateTimeEncoder) for item in data.get(self.items_field, [])
+        }
+
+    def metadata(self, data: dict[str, Any]) -> Any:
+        if self.metadata_field:
+            return data.get(self.metadata_field)
+        return {key: value for key, value in data.items() if key != self.items_field}
+
+    def replay(self, data: dict[str, Any], records: list[dict], source: str) -> dict[str, Any]:
+        """Apply the journal records tagged with the snapshot's journal id and remove the journal id from the data."""
+        journal_id = data.pop("journal_id", None)
+        if not journal_id:
+            return data
+
+        # Changed items keep their position in the snapshot and new items are added in the order they were created
+        items_by_id = {item[self.item_id_field]: item for item in data.get(self.items_field, [])}
+        replayed = 0
+        ignored = 0
+        for record in records:
+            if record.get("journal_id") != journal_id:
+                ignored += 1
+                continue
+            if self.item_record in record:
+                item = record[self.item_record]
+                items_by_id[item[self.item_id_field]] = item
+            if self.metadata_record in record:
+                if self.metadata_field:
+                    data[self.metadata_field] = record[self.metadata_record]
+                else:
+                    data.update(record[self.metadata_record])
+            replayed += 1
+
+        if ignored:
+            logger.warning(f"Ignored {ignored} journal records of another snapshot for {source}")
+
+        if replayed:
+            data[self.items_field] = list(items_by_id.values())
+            logger.debug(f"Replayed {replayed} journal records for {source}")
+
+        return data
+
+
+class SnapshotJournal:
+    """
+    Persists a document as a snapshot and appends the items and metadata that changed since to a journal.
+
+    The snapshot holds a journal id that all journal records are tagged with. Records with another id, left by
+    an interrupted compaction or from before the snapshot was rewritten by another writer, are ignored on replay.
+    The journal is compacted into a new snapshot when it grows larger than the snapshot times compaction_ratio,
+    which keeps the amount of data written per persisted item constant as the document grows, or when items are
+    removed.
+
+    Once the document has been loaded or written, the versions of the paths under version_prefix are checked before
+    each write and JournalConflictError is raised if another writer changed them. The versions are listed again after
+    each write, so a change made by another writer between a write and the listing is not detected. This requires a
+    storage that supports list_versions.
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        journal_format: JournalFormat,
+        snapshot_path: str,
+        journal_path: str,
+        version_prefix: str,
+        compaction_ratio: float = 1.0,
+    ):
+        self._storage = storage
+        self._format = journal_format
+        self._snapshot_path = snapshot_path
+        self._journal_path = journal_path
+        self._version_prefix = version_prefix
+        self._compaction_ratio = compaction_ratio
+        self._journal_versioned = storage.normalize_path(journal_path).startswith(
+            storage.normalize_path(version_prefix)
+        )
+
+        self._journal_id: Optional[str] = None
+        self._versions: Optional[dict[str, str]] = None
+        self._versions_known = False
+        self._journal_size = 0
+        self._snapshot_size = 0
+        self._item_fingerprints: dict[Any, int] = {}
+        self._metadata_fingerprint: Optional[int] = None
+
+        self.snapshot_writes = 0
+        self.journal_appends = 0
+
+    async def load(self) -> Optional[dict[str, Any]]:
+        """
+        Read the snapshot and replay the journal on top of it, None if there is no snapshot.
+
+        Call track with the loaded data to append changes to the journal instead of writing a new snapshot.
+        """
+        versions = await self._storage.list_versions(self._version_prefix)
+        try:
+            data = await self._storage.read(self._snapshot_path)
+        except KeyError:
+            data = None
+
+        records = []
+        if isinstance(data, dict) and data.get("journal_id"):
+            try:
+                records = await self._storage.read_lines(self._journal_path)
+            except KeyError:
+                pass
+
+        self._reset()
+        self._versions = versions
+        self._versions_known = True
+        if not isinstance(data, dict):
+            return None
+
+        journal_id = data.get("journal_id")
+        data = self._format.replay(data, records, self._snapshot_path)
+        if journal_id:
+            self._journal_id = journal_id
+            self._journal_size = sum(
+                len(json.dumps(record)) + 1 for record in records if record.get("journal_id") == journal_id
+            )
+        return data
+
+    def track(self, data: dict[str, Any]) -> None:
+        """Set the data the changes persisted next are compared with, like the data returned by load."""
+        item_lines = self._format.item_lines(data)
+        self._snapshot_size = sum(len(line) for line in item_lines.values())
+        self._item_fingerprints = {item_id: hash(line) for item_id, line in item_lines.items()}
+        self._metadata_fingerprint = hash(self._metadata_line(data))
+
+    def changes(self, data: dict[str, Any]) -> tuple[set, bool]:
+        """Get the ids of the items and whether the metadata changed since the data was loaded or persisted."""
+        changed_items = {
+            item_id
+            for item_id, line in self._format.item_lines(data).items()
+            if self._item_fingerprints.get(item_id) != hash(line)
+        }
+        return changed_items, hash(self._metadata_line(data)) != self._metadata_fingerprint
+
+    async def is_current(self) -> bool:
+        """Check that no other writer changed the snapshot or journal since they were last loaded or written."""
+        if not self._versions_known:
+            return True
+        return await self._storage.list_versions(self._version_prefix) == self._versions
+
+    async def persist(self, data: dict[str, Any], compact: bool = False) -> int:
+        """
+        Persist the data and return the number of records appended to the journal.
+
+        A new snapshot is written on the first call, when compact is set or when the journal has grown too large.
+
+        Raises:
+            JournalConflictError: If another writer changed the snapshot or journal
+        """
+        if not await self.is_current():
+            raise JournalConflictError(f"{self._snapshot_path} was changed by another writer")
+
+        item_lines = self._format.item_lines(data)
+        metadata_line = self._metadata_line(data)
+
+        removed_items = self._item_fingerprints.keys() - item_lines.keys()
+        if compact or self._journal_id is None or removed_items:
+            await self._write_snapshot(data, item_lines, metadata_line)
+            return 0
+
+        appended = await self._append(item_lines, metadata_line)
+        if appended is None:
+            await self._write_snapshot(data, item_lines, metadata_line)
+            return 0
+        return appended
+
+    async def append(self, data: dict[str, Any]) -> Optional[int]:
+        """
+        Append the items in the data that changed and the metadata to the journal, without reading the items that
+        are left out of the data. Items can't be removed this way.
+
+        Returns:
+            The number of records appended, or None if there is no snapshot yet or the journal has grown too large
+            and a new snapshot must be written with persist
+
+        Raises:
+            JournalConflictError: If another writer changed the snapshot or journal
+        """
+        if self._journal_id is None:
+            return None
+        if not await self.is_current():
+            raise JournalConflictError(f"{self._snapshot_path} was changed by another writer")
+
+        return await self._append(self._format.item_lines(data), self._metadata_line(data))
+
+    async def _append(self, item_lines: dict[Any, str], metadata_line: str) -> Optional[int]:
+        records = []
+        if hash(metadata_line) != self._metadata_fingerprint:
+            records.append(f'{{"journal_id": "{self._journal_id}", "{self._format.metadata_record}": {metadata_line}}}')
+
+        changed_fingerprints = {}
+        for item_id, line in item_lines.items():
+            fingerprint = hash(line)
+            if self._item_fingerprints.get(item_id) != fingerprint:
+                records.append(f'{{"journal_id": "{self._journal_id}", "{self._format.item_record}": {line}}}')
+                changed_fingerprints[item_id] = fingerprint
+
+        if not records:
+            return 0
+
+        journal_data = "\n".join(records)
+        if self._journal_size + len(journal_data) > self._snapshot_size * self._compaction_ratio:
+            return None
+
+        await self._storage.append(self._journal_path, journal_data)
+        self.journal_appends += 1
+        if self._journal_versioned:
+            await self._update_versions()
+
+        self._journal_size += len(journal_data) + 1
+        self._item_fingerprints.update(changed_fingerprints)
+        self._metadata_fingerprint = hash(metadata_line)
+        logger.debug(f"Appended {len(records)} records to {self._journal_path}")
+        return len(records)
+
+    async def write_snapshot(self, data: dict[str, Any]) -> None:
+        """Write a new snapshot of the data, also if another writer changed it."""
+        await self._write_snapshot(data, self._format.item_lines(data), self._metadata_line(data))
+
+    async def _write_snapshot(self, data: dict[str, Any], item_lines: dict[Any, str], metadata_line: str):
+        self._journal_id = uuid.uuid4().hex
+
+        await self._storage.write(self._snapshot_path, {**data, "journal_id": self._journal_id})
+        await self._storage.write_raw(self._journal_path, "")
+        self.snapshot_writes += 1
+        await self._update_versions()
+
+        self._journal_size = 0
+        self._snapshot_size = sum(len(line) for line in item_lines.values())
+        self._item_fingerprints = {item_id: hash(line) for item_id, line in item_lines.items()}
+        self._metadata_fingerprint = hash(metadata_line)
+        logger.debug(f"Wrote snapshot with {len(item_lines)} items to {self._snapshot_path}")
+
+    async def _update_versions(self):
+        self._versions = await self._storage.list_versions(self._version_prefix)
+        self._versions_known = True
+
+    def _metadata_line(self, data: dict[str, Any]) -> str:
+        return json.dumps(self._format.metadata(data), cls=DateTimeEncoder)
+
+    def _reset(self):
+        self._journal_id = None
+        self._journal_size = 0
+        self._snapshot_size = 0
+        self._item_fingerprints = {}
+        self._metadata_fingerprint = None
@@ -1,18 +1,137 @@
+import hashlib
 import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Optional
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+# Rough average for code and English text with the OpenAI tokenizers
+APPROXIMATE_CHARS_PER_TOKEN = 4
 
 _voyage_clients = {}
 _tiktoken_encoders = {}
 _hf_tokenizers = {}
 
+CacheKey = tuple[str, bytes]
+
+
+class TokenCountCache:
+    """
+    Size-bounded LRU cache of token counts keyed by model and a BLAKE2b digest of the content.
 
-def count_tokens(content: str, model: str = "gpt-3.5-turbo") -> int:
+    Only the counts and digests are kept, the content is not referenced by the cache.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self._max_entries = max_entries
+        self._counts: OrderedDict[CacheKey, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    @staticmethod
+    def key(model: str, content: str) -> CacheKey:
+        return model, hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get(self, key: CacheKey) -> Optional[int]:
+        with self._lock:
+            tokens = self._counts.get(key)
+            if tokens is None:
+                self.misses += 1
+                return None
+
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+    def put(self, key: CacheKey, tokens: int):
+        with self._lock:
+            self._counts[key] = tokens
+            self._counts.move_to_end(key)
+            while len(self._counts) > self._max_entries:
+                self._counts.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+_token_count_cache: Optional[TokenCountCache] = None
+
+
+def get_token_count_cache() -> TokenCountCache:
+    global _token_count_cache
+    if _token_count_cache is None:
+        _token_count_cache = TokenCountCache()
+    return _token_count_cache
+
+
+def count_tokens(content: str, model: str = DEFAULT_MODEL, approximate: bool = False) -> int:
     """
     Count tokens in `content` based on the model name.
 
     1) If `model.startswith("voyage")`, use VoyageAI client.
     2) Otherwise, try to use `tiktoken`. If tiktoken raises KeyError
        (unrecognized model name), fallback to Hugging Face tokenizer.
+
+    Counts are cached by a digest of the content. With approximate=True the count is estimated from the length of the
+    content without tokenizing, which is good enough to decide if something fits in a budget.
     """
+    if approximate:
+        return _approximate_tokens(content)
+
+    cache = get_token_count_cache()
+    key = cache.key(model, content)
+    tokens = cache.get(key)
+    if tokens is None:
+        tokens = _count_tokens_uncached([content], model)[0]
+        cache.put(key, tokens)
+    return tokens
+
+
+def count_tokens_many(
+    contents: Sequence[str], model: str = DEFAULT_MODEL, approximate: bool = False, num_threads: int = 8
+) -> list[int]:
+    """
+    Count tokens of each of the contents.
+
+    Contents not in the cache are tokenized in one batch, with tiktoken the batch is encoded in num_threads threads.
+    """
+    if approximate:
+        return [_approximate_tokens(content) for content in contents]
+
+    cache = get_token_count_cache()
+    keys = [cache.key(model, content) for content in contents]
+    counts = [cache.get(key) for key in keys]
+
+    missing = {}
+    for key, content, tokens in zip(keys, contents, counts, strict=True):
+        if tokens is None:
+            missing.setdefault(key, content)
+
+    if not missing:
+        return counts
+
+    missing_counts = dict(
+        zip(missing.keys(), _count_tokens_uncached(list(missing.values()), model, num_threads), strict=True)
+    )
+    for key, tokens in missing_counts.items():
+        cache.put(key, tokens)
+
+    return [missing_counts[key] if tokens is None else tokens for key, tokens in zip(keys, counts, strict=True)]
+
+
+def _approximate_tokens(content: str) -> int:
+    return (len(content) + APPROXIMATE_CHARS_PER_TOKEN - 1) // APPROXIMATE_CHARS_PER_TOKEN
+
+
+def _count_tokens_uncached(contents: list[str], model: str, num_threads: int = 8) -> list[int]:
     if model.startswith("voyage"):
         if model not in _voyage_clients:
             # Lazy-import VoyageAI & create a client
@@ -23,8 +142,8 @@ def count_tokens(content: str, model: str = "gpt-3.5-turbo") -> int:
 
             _voyage_clients[model] = voyageai.Client()
 
-        # VoyageAI expects a list of texts
-        return _voyage_clients[model].count_tokens([content])
+        # Tokenize locally instead of calling count_tokens() that only returns the sum for all texts
+        return [len(encoding) for encoding in _voyage_clients[model].tokenize(contents)]
 
     try:
         import tiktoken
@@ -51,7 +170,11 @@ def count_tokens(content: str, model: str = "gpt-3.5-turbo") -> int:
 
         # Now we can encode
         encoder = _tiktoken_encoders[model]
-        return len(encoder.encode(content, allowed_special="all"))
+        if len(contents) == 1:
+            return [len(encoder.encode(contents[0], allowed_special="all"))]
+
+        encoded = encoder.encode_batch(contents, num_threads=num_threads, allowed_special="all")
+        return [len(tokens) for tokens in encoded]
 
     except ImportError as e:
         # tiktoken isn't installed at all
@@ -75,4 +198,4 @@ def count_tokens(content: str, model: str = "gpt-3.5-turbo") -> int:
 
         hf_tokenizer = _hf_tokenizers[model]
         # For HF, simply return the length of the encoded IDs
-        return len(hf_tokenizer.encode(content))
+        return [len(hf_tokenizer.encode(content)) for content in contents]
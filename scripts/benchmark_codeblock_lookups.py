@@ -0,0 +1,106 @@
+import argparse
+import logging
+import statistics
+import time
+
+from moatless.codeblocks.parser.python import PythonParser
+
+
+def create_module_content(classes: int, methods: int) -> str:
+    lines = ["import os", ""]
+    for class_index in range(classes):
+        lines.append(f"class Class{class_index}:")
+        for method_index in range(methods):
+            lines.append(f"    def method_{method_index}(self, value):")
+            lines.append("        if value:")
+            lines.append(f"            return value + {method_index}")
+            lines.append("        return None")
+            lines.append("")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def time_it(func, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: list[float], lookups: int):
+    print(
+        f"{name:<45} median {statistics.median(timings) * 1000:9.2f} ms"
+        f"   min {min(timings) * 1000:9.2f} ms   max {max(timings) * 1000:9.2f} ms   ({lookups} lookups)"
+    )
+
+
+def benchmark(content: str, repeat: int):
+    start = time.perf_counter()
+    module = PythonParser().parse(content)
+    print(f"Parse: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    module.block_index
+    print(f"Build block index: {(time.perf_counter() - start) * 1000:.2f} ms ({len(module.block_index)} blocks)\n")
+
+    span_ids = list(module.spans_by_id.keys())
+    identifiers = sorted({block.identifier for block in module.get_all_child_blocks() if block.identifier})
+    lines = list(range(1, module.end_line + 1, max(1, module.end_line // 500)))
+
+    cases = [
+        (
+            "find_blocks_by_span_id",
+            span_ids,
+            lambda: [module._find_blocks_by_span_id(span_id) for span_id in span_ids],
+            lambda: [module.find_blocks_by_span_id(span_id) for span_id in span_ids],
+        ),
+        (
+            "find_last_by_span_id",
+            span_ids,
+            lambda: [module._find_last_by_span_id(span_id) for span_id in span_ids],
+            lambda: [module.find_last_by_span_id(span_id) for span_id in span_ids],
+        ),
+        (
+            "find_blocks_with_identifier",
+            identifiers,
+            lambda: [module._find_blocks_with_identifier(identifier) for identifier in identifiers],
+            lambda: [module.find_blocks_with_identifier(identifier) for identifier in identifiers],
+        ),
+        (
+            "find_spans_by_line_numbers",
+            lines,
+            lambda: [module._find_spans_by_line_numbers(line, line + 5, None) for line in lines],
+            lambda: [module.find_spans_by_line_numbers(line, line + 5) for line in lines],
+        ),
+    ]
+
+    for name, lookups, recursive, indexed in cases:
+        assert recursive() == indexed(), f"{name} returned different results"
+        report(f"{name} recursive", time_it(recursive, repeat), len(lookups))
+        report(f"{name} indexed", time_it(indexed, repeat), len(lookups))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recursive and indexed code block lookups on a large module")
+    parser.add_argument("--file", help="Python file to parse, e.g. sympy/core/expr.py")
+    parser.add_argument("--classes", type=int, default=40, help="Number of classes in the synthetic module")
+    parser.add_argument("--methods", type=int, default=50, help="Number of methods per class in the synthetic module")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.file:
+        with open(args.file) as f:
+            content = f.read()
+    else:
+        content = create_module_content(args.classes, args.methods)
+        print(f"Synthetic module with {args.classes * args.methods} methods")
+
+    benchmark(content, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+from typing import Any, List, Optional, Tuple
+
+import litellm
+from litellm.types.utils import ModelResponse
+from pydantic import Field
+
+from moatless.completion.base import BaseCompletionModel
+from moatless.completion.cache import CompletionCache, CompletionCacheMode, set_completion_cache
+from moatless.completion.schema import ResponseSchema
+from moatless.storage.file_storage import FileStorage
+
+
+class Answer(ResponseSchema):
+    answer: str = Field(description="The answer")
+
+
+class BenchmarkCompletionModel(BaseCompletionModel):
+    async def _validate_completion(
+        self, completion_response: Any
+    ) -> Tuple[List[ResponseSchema], Optional[str], Optional[str]]:
+        answer = completion_response.choices[0].message.content
+        return [Answer(answer=answer)], answer, None
+
+
+def simulated_completion(latency: float, response_size: int):
+    """LLM that responds after a fixed latency, replacing litellm.acompletion."""
+
+    async def acompletion(model: str, messages: list[dict], **kwargs) -> ModelResponse:
+        await asyncio.sleep(latency)
+        return ModelResponse(
+            model=model,
+            choices=[
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": f"step {len(messages)} " + "x" * response_size},
+                }
+            ],
+            usage={"prompt_tokens": sum(len(str(m["content"])) for m in messages) // 4, "completion_tokens": 500},
+        )
+
+    return acompletion
+
+
+async def run_trajectories(model: BaseCompletionModel, trajectories: int, steps: int, observation_size: int):
+    """Agent loops where each step sends the whole history and appends the response and an observation."""
+    durations = []
+    for trajectory in range(trajectories):
+        messages = [{"role": "user", "content": f"Solve issue {trajectory}"}]
+        for step in range(steps):
+            start = time.perf_counter()
+            response = await model.create_completion(list(messages))
+            durations.append(time.perf_counter() - start)
+            messages.append({"role": "assistant", "content": response.text_response})
+            messages.append({"role": "user", "content": f"Observation {step}: " + "y" * observation_size})
+    return durations
+
+
+def report(name: str, durations: list[float], cache: Optional[CompletionCache]):
+    counters = f"   {cache.hits} hits {cache.misses} misses {cache.writes} writes" if cache else ""
+    print(
+        f"{name:<14} {sum(durations):7.2f} s   median {statistics.median(durations) * 1000:7.2f} ms per completion"
+        f"{counters}"
+    )
+
+
+async def benchmark(args):
+    litellm.acompletion = simulated_completion(args.latency, args.response_size)
+    model = BenchmarkCompletionModel(model="gpt-4o-mini")
+    model.initialize(response_schema=Answer, system_prompt="Solve the issue")
+    run_args = (model, args.trajectories, args.steps, args.observation_size)
+
+    print(
+        f"{args.trajectories} trajectories with {args.steps} steps, "
+        f"{args.latency * 1000:.0f} ms simulated LLM latency"
+    )
+
+    report("no cache", await run_trajectories(*run_args), None)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = FileStorage(base_dir=temp_dir)
+
+        cache = CompletionCache(storage, mode=CompletionCacheMode.RECORD)
+        set_completion_cache(cache)
+        report("record", await run_trajectories(*run_args), cache)
+
+        cache = CompletionCache(storage, mode=CompletionCacheMode.REPLAY)
+        set_completion_cache(cache)
+        report("replay", await run_trajectories(*run_args), cache)
+
+    set_completion_cache(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record completions of simulated agent loops and replay them")
+    parser.add_argument("--trajectories", type=int, default=10)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per simulated LLM call")
+    parser.add_argument("--response-size", type=int, default=2000)
+    parser.add_argument("--observation-size", type=int, default=4000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
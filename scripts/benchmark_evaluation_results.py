@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from moatless.evaluation.manager import EvaluationManager
+from moatless.evaluation.schema import Evaluation, EvaluationInstance
+from moatless.storage.file_storage import FileStorage
+
+
+class RemoteFileStorage(FileStorage):
+    """File storage with a fixed latency per request, like S3 or Azure, listing a thousand paths per request."""
+
+    def __init__(self, base_dir: str, latency: float):
+        super().__init__(base_dir=base_dir)
+        self.latency = latency
+        self.requests = 0
+
+    async def _request(self, requests: int = 1):
+        self.requests += requests
+        if self.latency:
+            await asyncio.sleep(self.latency * requests)
+
+    async def read_raw(self, path: str) -> str:
+        await self._request()
+        return await super().read_raw(path)
+
+    async def read_lines(self, path: str):
+        await self._request()
+        return await super().read_lines(path)
+
+    async def exists(self, path: str) -> bool:
+        await self._request()
+        return await super().exists(path)
+
+    async def list_versions(self, prefix: str = ""):
+        versions = await super().list_versions(prefix)
+        await self._request(len(versions) // 1000 + 1)
+        return versions
+
+
+class UnversionedStorage(RemoteFileStorage):
+    """Storage that can't list versions, as before list_versions was added."""
+
+    async def list_versions(self, prefix: str = ""):
+        return None
+
+
+class IdleRunner:
+    """Runner without jobs."""
+
+    async def get_job_status(self, project_id: str, trajectory_id: str):
+        return None
+
+
+class BenchmarkEvaluationManager(EvaluationManager):
+    """Evaluation manager that reads the trajectory and events of an instance instead of parsing the flow."""
+
+    def __init__(self, storage: FileStorage, max_concurrent_reads: int):
+        super().__init__(
+            runner=IdleRunner(),
+            storage=storage,
+            eventbus=None,
+            flow_manager=None,
+            max_concurrent_reads=max_concurrent_reads,
+        )
+
+    async def _process_trajectory_results(
+        self, evaluation, instance, force_update: bool = True, trajectory_exists: bool | None = None
+    ):
+        project_id = evaluation.evaluation_name
+        if trajectory_exists is None:
+            await self.storage.exists_in_trajectory("trajectory.json", project_id, instance.instance_id)
+        await self.storage.read_from_trajectory("trajectory.json", project_id, instance.instance_id)
+        await self.storage.read_lines(f"projects/{project_id}/trajs/{instance.instance_id}/events.jsonl")
+        instance.set_resolution(True)
+        return instance
+
+
+async def serial_process_evaluation_results(manager: EvaluationManager, evaluation_name: str):
+    """EvaluationManager.process_evaluation_results before the concurrent refresh."""
+    evaluation = await manager._load_evaluation(evaluation_name)
+    for instance in evaluation.instances:
+        await manager._process_trajectory_results(evaluation, instance)
+    await manager._save_evaluation(evaluation)
+
+
+async def get_all_serial(manager: EvaluationManager):
+    """EvaluationManager.get_all_evaluation_instances before the concurrent reads, without the evaluation lookup."""
+    for instance_id in await manager.list_evaluation_instances("benchmark"):
+        if await manager.storage.exists_in_trajectory("instance.json", "benchmark", instance_id):
+            data = await manager.storage.read_from_trajectory("instance.json", "benchmark", instance_id)
+            EvaluationInstance.model_validate(data)
+
+
+async def create_evaluation(storage: FileStorage, instances: int):
+    evaluation = Evaluation(
+        evaluation_name="benchmark",
+        dataset_name="instance_ids",
+        instances=[EvaluationInstance(instance_id=f"instance-{i}") for i in range(instances)],
+    )
+    for instance in evaluation.instances:
+        trajectory_path = storage.get_trajectory_path("benchmark", instance.instance_id)
+        await storage.write(f"{trajectory_path}/trajectory.json", {"nodes": [{"node_id": i} for i in range(20)]})
+        await storage.write(f"{trajectory_path}/instance.json", instance.model_dump(mode="json"))
+        for i in range(20):
+            await storage.append(f"{trajectory_path}/events.jsonl", {"scope": "flow", "event_type": f"event-{i}"})
+    return evaluation
+
+
+async def measure(storage: RemoteFileStorage, refresh) -> tuple[float, int]:
+    requests = storage.requests
+    start = time.perf_counter()
+    await refresh()
+    return time.perf_counter() - start, storage.requests - requests
+
+
+def report(name: str, result: tuple[float, int]):
+    elapsed, requests = result
+    print(f"{name:<40} {elapsed:7.2f} s   {requests:6d} storage requests")
+
+
+async def benchmark(args):
+    print(
+        f"{args.instances} instances, {args.latency * 1000:.1f} ms per storage request, "
+        f"{args.max_concurrent_reads} concurrent reads, {args.changed} trajectories changed between refreshes"
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = UnversionedStorage(temp_dir, 0)
+        manager = BenchmarkEvaluationManager(storage, args.max_concurrent_reads)
+        await manager.save_evaluation(await create_evaluation(storage, args.instances))
+        storage.latency = args.latency
+
+        refresh = lambda: serial_process_evaluation_results(manager, "benchmark")  # noqa: E731
+        report("serial refresh", await measure(storage, refresh))
+        report("serial get_all_evaluation_instances", await measure(storage, lambda: get_all_serial(manager)))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = RemoteFileStorage(temp_dir, 0)
+        manager = BenchmarkEvaluationManager(storage, args.max_concurrent_reads)
+        await manager.save_evaluation(await create_evaluation(storage, args.instances))
+        storage.latency = args.latency
+
+        refresh = lambda: manager.process_evaluation_results("benchmark")  # noqa: E731
+        report("concurrent refresh", await measure(storage, refresh))
+        for i in range(args.changed):
+            await storage.append(f"projects/benchmark/trajs/instance-{i}/events.jsonl", {"event_type": "changed"})
+        report("concurrent refresh, unchanged skipped", await measure(storage, refresh))
+
+        get_all = lambda: manager.get_all_evaluation_instances("benchmark")  # noqa: E731
+        report("concurrent get_all_evaluation_instances", await measure(storage, get_all))
+        report("cached get_all_evaluation_instances", await measure(storage, get_all))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh evaluation results serially and concurrently")
+    parser.add_argument("--instances", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per storage request")
+    parser.add_argument("--max-concurrent-reads", type=int, default=16)
+    parser.add_argument("--changed", type=int, default=10, help="Trajectories changed before the second refresh")
+    args = parser.parse_args()
+
+    # The benchmark has no datasets or flows, which the manager logs as errors
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.disable(logging.ERROR)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
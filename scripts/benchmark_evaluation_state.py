@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from moatless.evaluation.manager import EvaluationManager
+from moatless.evaluation.schema import (
+    Evaluation,
+    EvaluationInstance,
+    EvaluationSummary,
+    ExecutionStatus,
+    ResolutionStatus,
+)
+from moatless.events import BaseEvent
+from moatless.storage.file_storage import FileStorage
+
+
+class RemoteFileStorage(FileStorage):
+    """File storage with a fixed latency per request, like S3 or Azure, that counts the requests and bytes written."""
+
+    def __init__(self, base_dir: str, latency: float):
+        super().__init__(base_dir=base_dir)
+        self.latency = latency
+        self.requests = 0
+        self.bytes_written = 0
+
+    async def _request(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def read(self, path: str):
+        await self._request()
+        return await super().read(path)
+
+    async def read_lines(self, path: str):
+        await self._request()
+        return await super().read_lines(path)
+
+    async def exists(self, path: str) -> bool:
+        await self._request()
+        return await super().exists(path)
+
+    async def write_raw(self, path: str, data: str) -> None:
+        await self._request()
+        self.bytes_written += len(data)
+        await super().write_raw(path, data)
+
+    async def append(self, path: str, data) -> None:
+        await self._request()
+        self.bytes_written += len(data)
+        await super().append(path, data)
+
+
+class BenchmarkEvaluationManager(EvaluationManager):
+    """Evaluation manager that resolves every second instance instead of reading the trajectory results."""
+
+    def __init__(self, storage: FileStorage):
+        super().__init__(runner=None, storage=storage, eventbus=None, flow_manager=None)
+
+    async def _process_trajectory_results(self, evaluation, instance, force_update: bool = True):
+        if instance.evaluated_at:
+            instance.set_resolution(int(instance.instance_id.split("-")[-1]) % 2 == 0)
+        return instance
+
+
+async def legacy_handle_event(manager: BenchmarkEvaluationManager, event: BaseEvent):
+    """EvaluationManager._handle_event before the state store, rewriting evaluation.json and the summaries per event."""
+    storage = manager.storage
+    data = await storage.read_from_project("evaluation.json", project_id=event.project_id)
+    evaluation = Evaluation.model_validate(data)
+    instance = evaluation.get_instance(event.trajectory_id)
+
+    if event.scope == "flow" and event.event_type == "started":
+        instance.started_at = event.timestamp
+        instance.mark_running()
+    elif event.scope == "flow" and event.event_type == "completed":
+        instance.execution_status = ExecutionStatus.COMPLETED
+        instance.completed_at = event.timestamp
+        await manager._process_trajectory_results(evaluation, instance)
+    elif event.scope == "evaluation" and event.event_type == "started":
+        instance.start_evaluating_at = event.timestamp
+        instance.mark_evaluating()
+    elif event.scope == "evaluation" and event.event_type == "completed":
+        instance.evaluated_at = event.timestamp
+        await manager._process_trajectory_results(evaluation, instance)
+
+    eval_dump = evaluation.model_dump()
+    del eval_dump["flow"]
+    await storage.write_to_project("evaluation.json", eval_dump, project_id=evaluation.evaluation_name)
+
+    # Like _load_all_summaries, a summary index that can't be read, as while another event writes it, is replaced
+    try:
+        summaries = await storage.read("evaluation_summaries.json")
+    except Exception:
+        summaries = {}
+    summaries[evaluation.evaluation_name] = json.loads(EvaluationSummary.from_evaluation(evaluation).model_dump_json())
+    await storage.write("evaluation_summaries.json", summaries)
+
+
+def create_event_stream(instances: int, parallel: int) -> list[BaseEvent]:
+    """Started, completed, evaluation started and evaluation completed events for each instance, parallel at a time."""
+    random.seed(0)
+    events = []
+    slots = [datetime(2025, 1, 1, tzinfo=timezone.utc)] * parallel
+    for index in range(instances):
+        slot = min(range(parallel), key=lambda i: slots[i])
+        started_at = slots[slot]
+        completed_at = started_at + timedelta(seconds=random.uniform(60, 900))
+        evaluating_at = completed_at + timedelta(seconds=1)
+        evaluated_at = evaluating_at + timedelta(seconds=random.uniform(30, 300))
+        slots[slot] = evaluated_at
+
+        for scope, event_type, timestamp in [
+            ("flow", "started", started_at),
+            ("flow", "completed", completed_at),
+            ("evaluation", "started", evaluating_at),
+            ("evaluation", "completed", evaluated_at),
+        ]:
+            events.append(
+                BaseEvent(
+                    scope=scope,
+                    event_type=event_type,
+                    project_id="benchmark",
+                    trajectory_id=f"instance-{index}",
+                    timestamp=timestamp,
+                )
+            )
+
+    return sorted(events, key=lambda event: event.timestamp)
+
+
+def read_event_stream(path: str) -> list[BaseEvent]:
+    with open(path) as f:
+        events = [BaseEvent.from_dict(json.loads(line)) for line in f if line.strip()]
+    return [event for event in events if event.scope in ["flow", "evaluation"] and event.trajectory_id]
+
+
+async def replay(
+    storage: RemoteFileStorage, events: list[BaseEvent], concurrency: int, flush_interval: float, legacy: bool
+) -> dict:
+    manager = BenchmarkEvaluationManager(storage)
+    manager._state_store.flush_interval_seconds = flush_interval
+    for project_id in {event.project_id for event in events}:
+        instance_ids = dict.fromkeys(event.trajectory_id for event in events if event.project_id == project_id)
+        await manager.save_evaluation(
+            Evaluation(
+                evaluation_name=project_id,
+                dataset_name="instance_ids",
+                instances=[EvaluationInstance(instance_id=instance_id) for instance_id in instance_ids],
+            )
+        )
+
+    requests = storage.requests
+    bytes_written = storage.bytes_written
+    start = time.perf_counter()
+
+    # Events are handled concurrently, as by the event bus when many instances run in parallel
+    for i in range(0, len(events), concurrency):
+        batch = events[i : i + concurrency]
+        if legacy:
+            await asyncio.gather(*(legacy_handle_event(manager, event) for event in batch))
+        else:
+            await asyncio.gather(*(manager._handle_event(event) for event in batch))
+
+    await manager.close()
+    elapsed = time.perf_counter() - start
+
+    # Count the instances missing a change from any of their events when read back from storage
+    lost_updates = 0
+    for project_id in {event.project_id for event in events}:
+        evaluation = await BenchmarkEvaluationManager(storage)._load_evaluation(project_id)
+        lost_updates += sum(
+            1
+            for instance in evaluation.instances
+            if not (instance.started_at and instance.completed_at and instance.evaluated_at)
+            or instance.resolution_status == ResolutionStatus.PENDING
+        )
+
+    return {
+        "elapsed": elapsed,
+        "requests": storage.requests - requests,
+        "written": storage.bytes_written - bytes_written,
+        "lost_updates": lost_updates,
+    }
+
+
+def report(name: str, events: int, result: dict):
+    print(
+        f"{name:<14} {result['elapsed']:7.2f} s   {result['elapsed'] / events * 1000:6.2f} ms per event"
+        f"   {result['requests']:6d} storage requests   {result['written'] / 1024 / 1024:8.1f} MB written"
+        f"   {result['lost_updates']:4d} instances with lost updates"
+    )
+
+
+async def benchmark(args):
+    events = read_event_stream(args.events_file) if args.events_file else create_event_stream(args.instances, 50)
+    print(
+        f"Replaying {len(events)} events, {args.concurrency} handled concurrently, "
+        f"{args.latency * 1000:.1f} ms per storage request, flushed every {args.flush_interval} s"
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = RemoteFileStorage(temp_dir, args.latency)
+        report(
+            "write-behind",
+            len(events),
+            await replay(storage, events, args.concurrency, args.flush_interval, legacy=False),
+        )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        storage = RemoteFileStorage(temp_dir, args.latency)
+        report(
+            "rewrite", len(events), await replay(storage, events, args.concurrency, args.flush_interval, legacy=True)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay evaluation events with the state store and full rewrites")
+    parser.add_argument("--instances", type=int, default=500)
+    parser.add_argument("--events-file", help="JSONL file with recorded events to replay instead of generated ones")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of events handled concurrently")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per storage request")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="Seconds between state store flushes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.disable(logging.WARNING)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
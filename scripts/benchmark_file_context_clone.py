@@ -0,0 +1,101 @@
+import argparse
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+
+from moatless.file_context import FileContext
+from moatless.repository.repository import InMemRepository
+
+
+def create_repository(files: int, functions: int) -> InMemRepository:
+    contents = {}
+    for file_index in range(files):
+        content = ""
+        for function_index in range(functions):
+            content += f"def function_{file_index}_{function_index}(value):\n"
+            content += "".join(f"    value = value * {line} + {function_index}\n" for line in range(10))
+            content += "    return value\n\n\n"
+        contents[f"module_{file_index}.py"] = content
+    return InMemRepository(contents)
+
+
+def dump_clone(file_context: FileContext) -> FileContext:
+    """The clone used before context files were shared, a full dump and rebuild of all files."""
+    dump = file_context.model_dump(exclude={"files": {"__all__": {"was_edited", "was_viewed"}}})
+    cloned_context = FileContext(repo=file_context._repo)
+    cloned_context.load_files_from_dict(files=dump.get("files", []), test_files=dump.get("test_files", []))
+    return cloned_context
+
+
+def run_trajectory(
+    repo: InMemRepository, files: int, functions: int, nodes: int, clone
+) -> tuple[list[float], list[float], int]:
+    """
+    Create a trajectory where each node clones the file context of its parent, views a span in one file and
+    renders the prompt. Returns the clone time and total time per node and the memory held by all file contexts.
+    """
+    random.seed(0)
+    file_context = FileContext(repo=repo)
+    for file_index in range(files):
+        file_context.add_span_to_context(f"module_{file_index}.py", f"function_{file_index}_0")
+    file_context = clone(file_context)
+
+    contexts = [file_context]
+    clone_timings = []
+    timings = []
+    for _ in range(nodes):
+        start = time.perf_counter()
+        file_context = clone(file_context)
+        clone_timings.append(time.perf_counter() - start)
+        file_index = random.randrange(files)
+        file_context.add_span_to_context(
+            f"module_{file_index}.py", f"function_{file_index}_{random.randrange(functions)}"
+        )
+        file_context.create_prompt(show_line_numbers=True, show_outcommented_code=True)
+        timings.append(time.perf_counter() - start)
+        contexts.append(file_context)
+
+    # Measure the memory held by the trajectory by cloning it again with tracing enabled
+    tracemalloc.start()
+    file_context = contexts[0]
+    traced = []
+    for _ in range(nodes):
+        file_context = clone(file_context)
+        file_index = random.randrange(files)
+        file_context.add_span_to_context(
+            f"module_{file_index}.py", f"function_{file_index}_{random.randrange(functions)}"
+        )
+        traced.append(file_context)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return clone_timings, timings, memory
+
+
+def report(name: str, clone_timings: list[float], timings: list[float], memory: int, nodes: int):
+    print(
+        f"{name:<20} clone median {statistics.median(clone_timings) * 1000:8.3f} ms"
+        f"   node median {statistics.median(timings) * 1000:8.3f} ms"
+        f"   memory {memory / nodes / 1024:8.1f} KB per node"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dump and rebuild cloning of file contexts with sharing files")
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 50], help="Number of files in context")
+    parser.add_argument("--functions", type=int, default=20, help="Number of functions in each file")
+    parser.add_argument("--nodes", type=int, default=100, help="Number of nodes in the trajectory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    for files in args.files:
+        print(f"\n{files} files in context, {args.nodes} nodes")
+        repo = create_repository(files, args.functions)
+        report("dump and rebuild", *run_trajectory(repo, files, args.functions, args.nodes, dump_clone), args.nodes)
+        report("shared files", *run_trajectory(repo, files, args.functions, args.nodes, FileContext.clone), args.nodes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from moatless.repository.file import FileRepository
+
+DEFAULT_PATTERNS = ["*.py", "**/tests/**/*.py", "core/*.py", "models.py", "**/utils/*.py", "setup.cfg"]
+
+
+def create_repo(repo_path: str, packages: int, modules_per_package: int):
+    for package in range(packages):
+        for sub_dir in ["core", "utils", "tests"]:
+            dir_path = os.path.join(repo_path, f"package_{package}", sub_dir)
+            os.makedirs(dir_path, exist_ok=True)
+            for module in range(modules_per_package):
+                with open(os.path.join(dir_path, f"module_{module}.py"), "w") as f:
+                    f.write(f"def function_{module}():\n    pass\n")
+            with open(os.path.join(dir_path, "models.py"), "w") as f:
+                f.write("class Model:\n    pass\n")
+    with open(os.path.join(repo_path, "setup.cfg"), "w") as f:
+        f.write("[metadata]\n")
+
+
+async def time_it(func, repeat: int) -> tuple[list[float], int]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await func()
+        timings.append(time.perf_counter() - start)
+    return timings, len(result)
+
+
+def report(name: str, timings: list[float], hits: int):
+    print(
+        f"{name:<45} median {statistics.median(timings) * 1000:9.2f} ms"
+        f"   min {min(timings) * 1000:9.2f} ms   max {max(timings) * 1000:9.2f} ms   ({hits} files)"
+    )
+
+
+async def benchmark(repo_path: str, patterns: list[str], repeat: int):
+    glob_repo = FileRepository(repo_path=repo_path, cache_file_tree=False)
+    tree_repo = FileRepository(repo_path=repo_path)
+
+    start = time.perf_counter()
+    await tree_repo.matching_files("*.py")
+    print(f"Build file tree: {(time.perf_counter() - start) * 1000:.2f} ms\n")
+
+    for pattern in patterns:
+        for name, repo in [("glob", glob_repo), ("file tree", tree_repo)]:
+            timings, hits = await time_it(lambda: repo.matching_files(pattern), repeat)
+            report(f"matching_files({pattern}) {name}", timings, hits)
+
+    for name, repo in [("glob", glob_repo), ("file tree", tree_repo)]:
+        timings, hits = await time_it(lambda: repo.find_by_pattern(["models.py", "setup.cfg"]), repeat)
+        report(f"find_by_pattern {name}", timings, hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare glob latency of FileRepository with and without file tree")
+    parser.add_argument("--repo-path", help="Existing checkout to benchmark, e.g. a django or sympy repository")
+    parser.add_argument("--packages", type=int, default=200, help="Number of packages in the synthetic repository")
+    parser.add_argument("--modules", type=int, default=20, help="Number of modules per package directory")
+    parser.add_argument("--pattern", action="append", dest="patterns", help="Glob pattern, can be repeated")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = None
+    try:
+        if args.repo_path:
+            repo_path = args.repo_path
+        else:
+            work_dir = tempfile.mkdtemp(prefix="moatless_file_tree_bench_")
+            repo_path = work_dir
+            print(f"Creating synthetic repository with {args.packages * 3 * (args.modules + 1)} files...")
+            create_repo(repo_path, args.packages, args.modules)
+
+        asyncio.run(benchmark(repo_path, args.patterns or DEFAULT_PATTERNS, args.repeat))
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import logging
+import random
+import statistics
+import time
+
+from moatless.completion.stats import CompletionAttempt, CompletionInvocation, Usage
+from moatless.node import Node
+
+
+def walk_tree(node: Node) -> list[Node]:
+    """The recursive walk the tree lookups used before the node registry."""
+    nodes = [node]
+    for child in node.children:
+        nodes.extend(walk_tree(child))
+    return nodes
+
+
+def tree_walk_iteration(root: Node, node_id: int):
+    """Bookkeeping done by SearchTree in each iteration, by walking the tree."""
+    nodes = walk_tree(root)
+    len(nodes)
+    next(node for node in nodes if node.node_id == node_id)
+    nodes[-1]
+    [node for node in nodes if node.is_leaf() and node.is_terminal()]
+    [node for node in nodes if node.is_expandable()]
+    total_usage = Usage()
+    for node in nodes:
+        total_usage += node.usage()
+
+
+def registry_iteration(root: Node, node_id: int):
+    """The same bookkeeping with the node registry."""
+    root.node_count()
+    root.get_node_by_id(node_id)
+    root.get_last_node()
+    [node for node in root.get_leaf_nodes() if node.is_terminal()]
+    root.get_expandable_descendants()
+    root.total_usage()
+
+
+def create_tree(size: int, max_expansions: int) -> Node:
+    random.seed(0)
+    root = Node(node_id=0, max_expansions=max_expansions)
+    expandable = [root]
+    while root.node_count() < size:
+        index = random.randrange(len(expandable))
+        parent = expandable[index]
+        child = parent.create_child()
+        child.completions["build_action"] = CompletionInvocation(
+            model="benchmark",
+            attempts=[CompletionAttempt(usage=Usage(prompt_tokens=1000, completion_tokens=100, completion_cost=0.01))],
+        )
+        expandable.append(child)
+        if parent.is_fully_expanded():
+            expandable[index] = expandable[-1]
+            expandable.pop()
+    return root
+
+
+def time_it(func, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    print(
+        f"{name:<45} median {statistics.median(timings) * 1000:9.3f} ms"
+        f"   min {min(timings) * 1000:9.3f} ms   max {max(timings) * 1000:9.3f} ms"
+    )
+
+
+def benchmark(size: int, max_expansions: int, repeat: int):
+    start = time.perf_counter()
+    root = create_tree(size, max_expansions)
+    print(f"\nTree with {size} nodes created in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    node_ids = [node.node_id for node in walk_tree(root)]
+    node_id = random.choice(node_ids)
+
+    report("iteration bookkeeping, tree walk", time_it(lambda: tree_walk_iteration(root, node_id), repeat))
+    report("iteration bookkeeping, registry", time_it(lambda: registry_iteration(root, node_id), repeat))
+
+    report(
+        "get_node_by_id, tree walk",
+        time_it(lambda: next(node for node in walk_tree(root) if node.node_id == node_id), repeat),
+    )
+    report("get_node_by_id, registry", time_it(lambda: root.get_node_by_id(node_id), repeat))
+
+    def expand(parent: Node, bookkeeping):
+        child = Node(node_id=root.node_count() + 1)
+        parent.add_child(child)
+        bookkeeping(root, child.node_id)
+
+    report(
+        "expand random node + bookkeeping, tree walk",
+        time_it(lambda: expand(root.get_node_by_id(random.choice(node_ids)), tree_walk_iteration), repeat),
+    )
+    report(
+        "expand random node + bookkeeping, registry",
+        time_it(lambda: expand(root.get_node_by_id(random.choice(node_ids)), registry_iteration), repeat),
+    )
+    report(
+        "expand last node + bookkeeping, tree walk",
+        time_it(lambda: expand(root.get_last_node(), tree_walk_iteration), repeat),
+    )
+    report(
+        "expand last node + bookkeeping, registry",
+        time_it(lambda: expand(root.get_last_node(), registry_iteration), repeat),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tree walks with the node registry on synthetic trees")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Number of nodes in each tree")
+    parser.add_argument("--max-expansions", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    for size in args.sizes:
+        benchmark(size, args.max_expansions, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from typing import ClassVar
+from unittest.mock import Mock
+
+from pydantic import ConfigDict
+
+from moatless.actions.action import Action
+from moatless.actions.schema import ActionArguments, Observation
+from moatless.agent.agent import ActionAgent
+from moatless.file_context import FileContext
+from moatless.node import ActionStep, Node
+from moatless.repository.repository import InMemRepository
+from moatless.workspace import Workspace
+
+
+class SimulatedSearchArgs(ActionArguments):
+    file_path: str
+    span_id: str
+    latency: float
+
+    model_config = ConfigDict(title="SimulatedSearch")
+
+
+class SimulatedSearch(Action):
+    """Read-only action like FindClass or GrepTool, adding the found span to the file context after a latency."""
+
+    args_schema = SimulatedSearchArgs
+    is_read_only: ClassVar[bool] = True
+
+    async def execute(self, args: SimulatedSearchArgs, file_context: FileContext | None = None) -> Observation:
+        await asyncio.sleep(args.latency)
+        file_context.add_span_to_context(args.file_path, args.span_id)
+        return Observation.create(message=f"Found {args.span_id} in {args.file_path}")
+
+
+def create_repository(files: int, functions: int) -> InMemRepository:
+    return InMemRepository(
+        {
+            f"module_{i}.py": "\n\n".join(f"def function_{j}():\n    return {j}\n" for j in range(functions))
+            for i in range(files)
+        }
+    )
+
+
+def create_node(repository: InMemRepository, actions: int, latency: float, seed: int) -> Node:
+    """Node with an exploratory turn of read-only actions with latencies from half to twice the mean latency."""
+    rng = random.Random(seed)
+    node = Node.create_root("Find the functions", shadow_mode=True)
+    node.file_context = FileContext(repo=repository)
+    node.action_steps = [
+        ActionStep(
+            action=SimulatedSearchArgs(
+                file_path=f"module_{rng.randrange(10)}.py",
+                span_id=f"function_{rng.randrange(20)}",
+                latency=rng.uniform(latency / 2, latency * 2),
+            )
+        )
+        for _ in range(actions)
+    ]
+    return node
+
+
+async def run_turns(agent: ActionAgent, args) -> tuple[list[float], list[float], list[set]]:
+    repository = create_repository(10, 20)
+    durations = []
+    slowest = []
+    contexts = []
+    for turn in range(args.turns):
+        node = create_node(repository, args.actions, args.latency, seed=turn)
+        start = time.perf_counter()
+        await agent.run(node)
+        durations.append(time.perf_counter() - start)
+        slowest.append(max(step.action.latency for step in node.action_steps))
+        contexts.append({(span.span_id, file.file_path) for file in node.file_context.files for span in file.spans})
+    return durations, slowest, contexts
+
+
+def report(name: str, durations: list[float], slowest: list[float]):
+    overhead = statistics.median(d - s for d, s in zip(durations, slowest)) * 1000
+    print(
+        f"{name:<12} {sum(durations):7.2f} s   median {statistics.median(durations) * 1000:7.1f} ms per node   "
+        f"{overhead:7.1f} ms over the slowest action"
+    )
+
+
+async def benchmark(args):
+    agent = ActionAgent(agent_id="benchmark", system_prompt="Find the functions", actions=[SimulatedSearch()])
+    agent.workspace = Mock(spec=Workspace)
+    agent.completion_model = Mock()
+
+    print(f"{args.turns} turns with {args.actions} read-only actions, {args.latency * 1000:.0f} ms mean latency")
+
+    agent.parallel_read_only_actions = False
+    sequential, slowest, sequential_contexts = await run_turns(agent, args)
+    report("sequential", sequential, slowest)
+
+    agent.parallel_read_only_actions = True
+    concurrent, slowest, concurrent_contexts = await run_turns(agent, args)
+    report("concurrent", concurrent, slowest)
+
+    print(f"same file context: {sequential_contexts == concurrent_contexts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run exploratory turns of read-only actions one by one and concurrently"
+    )
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--actions", type=int, default=5, help="Read-only actions per turn")
+    parser.add_argument("--latency", type=float, default=0.1, help="Mean seconds per action")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
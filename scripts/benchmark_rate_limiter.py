@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+import httpx
+import litellm
+from litellm import RateLimitError
+from litellm.types.utils import ModelResponse
+from pydantic import Field
+
+from moatless.completion import rate_limiter as rate_limiter_module
+from moatless.completion.base import BaseCompletionModel
+from moatless.completion.rate_limiter import RateLimiter, RateLimits, set_rate_limiter
+from moatless.completion.schema import ResponseSchema
+
+
+class Answer(ResponseSchema):
+    answer: str = Field(description="The answer")
+
+
+class BenchmarkCompletionModel(BaseCompletionModel):
+    async def _validate_completion(
+        self, completion_response: Any
+    ) -> Tuple[List[ResponseSchema], Optional[str], Optional[str]]:
+        answer = completion_response.choices[0].message.content
+        return [Answer(answer=answer)], answer, None
+
+
+class SimulatedProvider:
+    """LLM provider allowing a number of requests per window and responding 429 with retry-after to the rest."""
+
+    def __init__(self, requests_per_window: int, window: float, latency: float):
+        self.requests_per_window = requests_per_window
+        self.window = window
+        self.latency = latency
+        self.requests: deque[float] = deque()
+        self.rate_limited = 0
+
+    async def acompletion(self, model: str, messages: list[dict], **kwargs) -> ModelResponse:
+        now = time.monotonic()
+        while self.requests and self.requests[0] <= now - self.window:
+            self.requests.popleft()
+
+        if len(self.requests) >= self.requests_per_window:
+            self.rate_limited += 1
+            retry_after = self.requests[0] + self.window - now
+            response = httpx.Response(
+                429, headers={"retry-after": f"{retry_after:.3f}"}, request=httpx.Request("POST", "https://api.test")
+            )
+            raise RateLimitError("Rate limit exceeded", llm_provider="openai", model=model, response=response)
+
+        self.requests.append(now)
+        await asyncio.sleep(self.latency)
+        return ModelResponse(
+            model=model,
+            choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "done"}}],
+            usage={"prompt_tokens": 1000, "completion_tokens": 100},
+        )
+
+
+async def run_trajectories(model: BaseCompletionModel, trajectories: int, steps: int):
+    """Concurrent agent loops calling the model once per step, stopping at the first failed completion."""
+    queue_waits = []
+    failed = 0
+
+    async def run_trajectory(trajectory: int):
+        nonlocal failed
+        messages = [{"role": "user", "content": f"Solve issue {trajectory}"}]
+        for step in range(steps):
+            try:
+                response = await model.create_completion(list(messages))
+            except Exception:
+                failed += 1
+                return
+            queue_waits.append(response.completion_invocation.queue_wait_ms)
+            messages.append({"role": "assistant", "content": response.text_response})
+            messages.append({"role": "user", "content": f"Observation {step}"})
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run_trajectory(trajectory) for trajectory in range(trajectories)])
+    return time.perf_counter() - start, queue_waits, failed
+
+
+def report(name: str, result: tuple[float, list[float], int], provider: SimulatedProvider, completions: int):
+    elapsed, queue_waits, failed = result
+    median_wait = statistics.median(queue_waits) if queue_waits else 0
+    print(
+        f"{name:<32} {elapsed:7.2f} s   {len(queue_waits):4d}/{completions} completions   "
+        f"{failed:3d} failed trajectories   {provider.rate_limited:5d} 429 responses   "
+        f"median queue wait {median_wait:7.1f} ms"
+    )
+
+
+async def benchmark(args):
+    model = BenchmarkCompletionModel(model="gpt-4o-mini")
+    model.initialize(response_schema=Answer, system_prompt="Solve the issue")
+    completions = args.trajectories * args.steps
+
+    # Scale the one minute rate limit window down to the simulated provider window
+    rate_limiter_module.WINDOW_SECONDS = args.window
+
+    print(
+        f"{args.trajectories} concurrent trajectories with {args.steps} steps, provider allows "
+        f"{args.provider_limit} requests per {args.window:.1f} s with {args.latency * 1000:.0f} ms latency"
+    )
+
+    runs = [
+        ("blind backoff", None),
+        ("limiter, provider limit", RateLimiter(default_limits=RateLimits(requests_per_minute=args.provider_limit))),
+        (
+            "limiter, 2x provider limit",
+            RateLimiter(default_limits=RateLimits(requests_per_minute=args.provider_limit * 2)),
+        ),
+    ]
+    for name, rate_limiter in runs:
+        provider = SimulatedProvider(args.provider_limit, args.window, args.latency)
+        litellm.acompletion = provider.acompletion
+        set_rate_limiter(rate_limiter)
+        report(name, await run_trajectories(model, args.trajectories, args.steps), provider, completions)
+
+    set_rate_limiter(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent agent loops against a rate limited simulated LLM")
+    parser.add_argument("--trajectories", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--provider-limit", type=int, default=20, help="Requests per window allowed by the provider")
+    parser.add_argument("--window", type=float, default=1.0, help="Seconds per rate limit window")
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per simulated LLM call")
+    args = parser.parse_args()
+
+    # Failed completions are logged with their stack traces
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.disable(logging.ERROR)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
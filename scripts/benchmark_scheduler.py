@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import fakeredis
+
+from moatless.flow.events import FlowCompletedEvent
+from moatless.runner.runner import BaseRunner, JobFunction, JobInfo, JobStatus, RunnerInfo, RunnerStatus
+from moatless.runner.scheduler import SchedulerRunner
+from moatless.runner.storage.memory import InMemoryJobStorage
+from moatless.runner.storage.redis import REMOVE_JOB_SCRIPT, SET_JOB_SCRIPT, RedisJobStorage
+from moatless.runner.storage.storage import JobStorage
+
+
+def benchmark_job():
+    pass
+
+
+class BenchmarkRunner(BaseRunner):
+    """Runner that starts jobs instantly and counts status requests, as they're API calls for Kubernetes and Docker."""
+
+    def __init__(self):
+        self.jobs: dict[str, JobStatus] = {}
+        self.status_requests = 0
+
+    async def start_job(self, project_id: str, trajectory_id: str, job_func, node_id: int | None = None) -> bool:
+        self.jobs[f"{project_id}:{trajectory_id}"] = JobStatus.RUNNING
+        return True
+
+    async def get_jobs(self, project_id: str | None = None) -> list[JobInfo]:
+        return []
+
+    async def cancel_job(self, project_id: str, trajectory_id: str | None = None) -> None:
+        self.jobs.pop(f"{project_id}:{trajectory_id}", None)
+
+    async def job_exists(self, project_id: str, trajectory_id: str) -> bool:
+        return f"{project_id}:{trajectory_id}" in self.jobs
+
+    async def get_job_status(self, project_id: str, trajectory_id: str) -> Optional[JobStatus]:
+        self.status_requests += 1
+        return self.jobs.get(f"{project_id}:{trajectory_id}")
+
+    async def get_runner_info(self) -> RunnerInfo:
+        return RunnerInfo(runner_type="benchmark", status=RunnerStatus.RUNNING)
+
+
+class RedisStandIn(fakeredis.FakeAsyncRedis):
+    """In-process Redis that counts the round trips, commands and pipelines, sent by RedisJobStorage."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+
+    async def execute_command(self, *args, **options):
+        self.round_trips += 1
+        return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        pipeline = super().pipeline(transaction, shard_hint)
+        execute = pipeline.execute
+
+        async def execute_counted(raise_on_error: bool = True):
+            self.round_trips += 1
+            return await execute(raise_on_error)
+
+        pipeline.execute = execute_counted
+        return pipeline
+
+
+async def full_scan_tick(scheduler: SchedulerRunner):
+    """One iteration of the scheduler loop before it was event driven, listing all jobs three times."""
+    storage = scheduler.storage
+
+    all_jobs = await storage.get_jobs()
+    for job in [job for job in all_jobs if job.status in [JobStatus.PENDING, JobStatus.RUNNING]]:
+        await scheduler._sync_job(job)
+
+    all_jobs = await storage.get_jobs()
+    for job in [job for job in all_jobs if job.status in [JobStatus.COMPLETED, JobStatus.CANCELED]]:
+        await storage.remove_job(job.project_id, job.trajectory_id)
+
+    all_jobs = await storage.get_jobs()
+    pending_jobs = [job for job in all_jobs if job.status == JobStatus.PENDING]
+    pending_jobs.sort(key=lambda j: j.enqueued_at or datetime.max)
+    for i, job in enumerate(pending_jobs):
+        if not job.metadata:
+            job.metadata = {}
+        job.metadata["queue_position"] = i + 1
+        await storage.update_job(job)
+
+    for job in pending_jobs:
+        await scheduler._try_start_job(job)
+
+
+async def interval_tick(scheduler: SchedulerRunner):
+    """The work done by the scheduler loop every scheduler interval."""
+    await scheduler._sync_jobs_with_runner()
+    await scheduler._cleanup_terminal_jobs()
+    await scheduler._load_pending_jobs()
+    await scheduler._start_pending_jobs()
+
+
+async def finish_job_with_event(scheduler: SchedulerRunner, job: JobInfo):
+    """A running job finishes, its flow completed event syncs it and the woken up scheduler starts the next job."""
+    scheduler.runner.jobs[f"{job.project_id}:{job.trajectory_id}"] = JobStatus.COMPLETED
+    await scheduler.handle_event(FlowCompletedEvent(project_id=job.project_id, trajectory_id=job.trajectory_id))
+    await scheduler._start_pending_jobs()
+
+
+async def finish_job_with_full_scan(scheduler: SchedulerRunner, job: JobInfo):
+    """A running job finishes and the next job is started on the next full scan tick."""
+    scheduler.runner.jobs[f"{job.project_id}:{job.trajectory_id}"] = JobStatus.COMPLETED
+    await full_scan_tick(scheduler)
+
+
+async def create_scheduler(
+    storage: JobStorage, jobs: int, projects: int, max_total_jobs: int, max_jobs_per_project: int
+) -> SchedulerRunner:
+    scheduler = SchedulerRunner(
+        runner_impl=BenchmarkRunner,
+        max_total_jobs=max_total_jobs,
+        max_jobs_per_project=max_jobs_per_project,
+        auto_cleanup_completed=True,
+    )
+    # The benchmark drives the scheduler loop itself
+    await scheduler.cleanup()
+    scheduler.storage = storage
+
+    enqueued_at = datetime.now()
+    for index in range(jobs):
+        await storage.add_job(
+            JobInfo(
+                id=f"project-{index % projects}-job-{index}",
+                status=JobStatus.PENDING,
+                project_id=f"project-{index % projects}",
+                trajectory_id=f"job-{index}",
+                enqueued_at=enqueued_at + timedelta(microseconds=index),
+                job_func=JobFunction(module=benchmark_job.__module__, name=benchmark_job.__name__),
+            )
+        )
+
+    # Fill the running slots
+    await interval_tick(scheduler)
+    return scheduler
+
+
+def count_round_trips(storage: JobStorage) -> int:
+    return storage._redis.round_trips if isinstance(storage, RedisJobStorage) else 0
+
+
+async def measure(scheduler: SchedulerRunner, func, repeat: int) -> tuple[list[float], float, float]:
+    """Returns the timings, and the Redis round trips and runner status requests per call."""
+    round_trips = count_round_trips(scheduler.storage)
+    status_requests = scheduler.runner.status_requests
+    timings = []
+    for _ in range(repeat):
+        running_jobs = await scheduler.storage.get_jobs_by_status(JobStatus.RUNNING)
+        start = time.perf_counter()
+        await func(scheduler, running_jobs[0])
+        timings.append(time.perf_counter() - start)
+    return (
+        timings,
+        (count_round_trips(scheduler.storage) - round_trips) / repeat,
+        (scheduler.runner.status_requests - status_requests) / repeat,
+    )
+
+
+def report(name: str, latency: float, timings: list[float], round_trips: float, status_requests: float):
+    print(
+        f"{name:<28} median {statistics.median(timings) * 1000:8.2f} ms   max {max(timings) * 1000:8.2f} ms"
+        f"   {round_trips:6.0f} redis round trips (~{round_trips * latency * 1000:7.1f} ms)"
+        f"   {status_requests:5.0f} status requests"
+    )
+
+
+def create_redis_storage() -> RedisJobStorage:
+    storage = RedisJobStorage("redis://localhost:6379")
+    storage._redis = RedisStandIn()
+    storage._set_job_script = storage._redis.register_script(SET_JOB_SCRIPT)
+    storage._remove_job_script = storage._redis.register_script(REMOVE_JOB_SCRIPT)
+    return storage
+
+
+async def benchmark(
+    jobs: int, projects: int, max_total_jobs: int, max_jobs_per_project: int, repeat: int, latency: float
+):
+    print(
+        f"{jobs} queued jobs in {projects} projects, {max_total_jobs} running at a time, "
+        f"estimated with {latency * 1000:.1f} ms per redis round trip"
+    )
+
+    for storage_name, create_storage in [("in memory", InMemoryJobStorage), ("redis stand-in", create_redis_storage)]:
+        print(f"\n{storage_name}")
+        args = (jobs, projects, max_total_jobs, max_jobs_per_project)
+
+        async def idle_full_scan(scheduler, job):
+            await full_scan_tick(scheduler)
+
+        async def idle_interval(scheduler, job):
+            await interval_tick(scheduler)
+
+        scheduler = await create_scheduler(create_storage(), *args)
+        report("idle tick, full scan", latency, *await measure(scheduler, idle_full_scan, repeat))
+        report("job finished, full scan", latency, *await measure(scheduler, finish_job_with_full_scan, repeat))
+
+        scheduler = await create_scheduler(create_storage(), *args)
+        report("idle tick, event driven", latency, *await measure(scheduler, idle_interval, repeat))
+        report("job finished, event driven", latency, *await measure(scheduler, finish_job_with_event, repeat))
+        capacity = min(max_total_jobs, projects * max_jobs_per_project) if max_jobs_per_project else max_total_jobs
+        assert await scheduler.storage.get_running_jobs_count() == capacity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the full scan scheduler loop with the event driven scheduler")
+    parser.add_argument("--jobs", type=int, default=5000, help="Number of queued jobs")
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--max-total-jobs", type=int, default=50)
+    parser.add_argument("--max-jobs-per-project", type=int, default=0, help="0 for no limit per project")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0005, help="Estimated seconds per redis round trip")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(
+        benchmark(args.jobs, args.projects, args.max_total_jobs, args.max_jobs_per_project, args.repeat, args.latency)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Union
+
+from moatless.storage.base import DateTimeEncoder
+from moatless.storage.segmented_storage import SegmentedAppendStorage
+
+
+class ObjectStoreStandIn(SegmentedAppendStorage):
+    """
+    In-memory stand-in for S3 or MinIO that counts requests and bytes transferred.
+
+    Requests are not delayed, the time they would take is estimated from the latency and bandwidth.
+    """
+
+    def __init__(self, latency: float, bandwidth: float, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.objects: dict[str, str] = {}
+        self.requests = 0
+        self.bytes_transferred = 0
+
+    @property
+    def estimated_time(self) -> float:
+        return self.requests * self.latency + self.bytes_transferred / self.bandwidth
+
+    async def _get_object(self, path: str) -> str:
+        self.requests += 1
+        if path not in self.objects:
+            raise KeyError(f"No data found for path: {path}")
+        self.bytes_transferred += len(self.objects[path])
+        return self.objects[path]
+
+    async def _put_object(self, path: str, data: str) -> None:
+        self.requests += 1
+        self.bytes_transferred += len(data)
+        self.objects[path] = data
+
+    async def _delete_object(self, path: str) -> None:
+        self.requests += 1
+        if path not in self.objects:
+            raise KeyError(f"No data found for path: {path}")
+        del self.objects[path]
+
+    async def _object_exists(self, path: str) -> bool:
+        self.requests += 1
+        return path in self.objects
+
+    async def list_paths(self, prefix: str = "") -> list[str]:
+        self.requests += 1
+        return [path for path in self.objects if path.startswith(prefix)]
+
+
+class DownloadAndUploadStandIn(ObjectStoreStandIn):
+    """Appends by downloading the object and uploading it with the new line, as before appends were segmented."""
+
+    async def append(self, path: str, data: Union[dict, str]) -> None:
+        line = json.dumps(data, cls=DateTimeEncoder) if isinstance(data, dict) else data
+        if not line.endswith("\n"):
+            line += "\n"
+
+        try:
+            content = await self.read_raw(path) + line
+        except KeyError:
+            content = line
+        await self.write_raw(path, content)
+
+    async def write_raw(self, path: str, data: str) -> None:
+        await self._put_object(path, data)
+
+
+def create_event(index: int, event_size: int) -> dict:
+    return {
+        "project_id": "benchmark",
+        "trajectory_id": "benchmark",
+        "scope": "node",
+        "event_type": "action_executed",
+        "timestamp": datetime.now(timezone.utc),
+        "data": {"node_id": index, "output": "x" * event_size},
+    }
+
+
+async def append_events(storage: ObjectStoreStandIn, events: int, event_size: int, trajectories: int) -> float:
+    """Append events the way the event bus does, one at a time under a lock, spread over trajectories."""
+    lock = asyncio.Lock()
+    start = time.perf_counter()
+    for index in range(events):
+        path = f"projects/benchmark/trajs/{index % trajectories}/events.jsonl"
+        async with lock:
+            await storage.append(path, create_event(index, event_size))
+    await storage.flush()
+    return time.perf_counter() - start
+
+
+def report(name: str, storage: ObjectStoreStandIn, elapsed: float, events: int):
+    print(
+        f"{name:<22} {events / elapsed:10.0f} events/s   {storage.requests:7d} requests"
+        f"   {storage.bytes_transferred / 1024 / 1024:9.1f} MB transferred"
+        f"   estimated object store time {storage.estimated_time:8.1f} s"
+    )
+
+
+async def benchmark(events: int, event_size: int, trajectories: int, latency: float, bandwidth: float):
+    print(
+        f"{events} events of ~{event_size} bytes over {trajectories} trajectories, "
+        f"estimated with {latency * 1000:.0f} ms per request and {bandwidth / 1024 / 1024:.0f} MB/s\n"
+    )
+
+    storage = DownloadAndUploadStandIn(latency, bandwidth)
+    report("download and upload", storage, await append_events(storage, events, event_size, trajectories), events)
+
+    storage = ObjectStoreStandIn(latency, bandwidth)
+    elapsed = await append_events(storage, events, event_size, trajectories)
+    report("segmented", storage, elapsed, events)
+
+    for trajectory in range(trajectories):
+        lines = await storage.read_lines(f"projects/benchmark/trajs/{trajectory}/events.jsonl")
+        assert len(lines) == len(range(trajectory, events, trajectories))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare appending events to object storage with segmented appends")
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--event-size", type=int, default=500, help="Size of the data in each event")
+    parser.add_argument("--trajectories", type=int, default=1, help="Number of trajectories to spread events over")
+    parser.add_argument("--latency", type=float, default=0.02, help="Estimated seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=50 * 1024 * 1024, help="Estimated bytes per second")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark(args.events, args.event_size, args.trajectories, args.latency, args.bandwidth))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+
+from moatless.flow.trajectory_journal import TrajectoryJournal
+from moatless.node import Node
+from moatless.storage.file_storage import FileStorage
+
+
+class CountingFileStorage(FileStorage):
+    """File storage that counts the bytes written, which is what a persist costs on S3 or Azure."""
+
+    bytes_written = 0
+
+    async def write_raw(self, path: str, data: str) -> None:
+        self.bytes_written += len(data)
+        await super().write_raw(path, data)
+
+    async def append(self, path: str, data) -> None:
+        self.bytes_written += len(data)
+        await super().append(path, data)
+
+
+def create_node(node_id: int, message_size: int) -> Node:
+    return Node(
+        node_id=node_id,
+        user_message=f"Observation {node_id}\n" + "x" * message_size,
+        assistant_message=f"Thoughts {node_id}\n" + "y" * (message_size // 2),
+    )
+
+
+def trajectory_data(root: Node) -> dict:
+    return {
+        "trajectory_id": "benchmark",
+        "project_id": "benchmark",
+        "metadata": {},
+        "nodes": root.dump_as_list(exclude_none=True, exclude_unset=True),
+    }
+
+
+async def grow_tree(
+    storage: CountingFileStorage, nodes: int, message_size: int, use_journal: bool
+) -> tuple[list[float], list[int]]:
+    """Expand a random tree one node at a time and return the persist time and bytes written for each expansion."""
+    random.seed(0)
+    journal = TrajectoryJournal(storage, "benchmark", "journal" if use_journal else "rewrite")
+
+    root = create_node(0, message_size)
+    all_nodes = [root]
+    timings = []
+    written = []
+    for node_id in range(1, nodes + 1):
+        parent = random.choice(all_nodes)
+        node = create_node(node_id, message_size)
+        parent.add_child(node)
+        all_nodes.append(node)
+
+        # Backpropagation updates the visits of the ancestors
+        ancestor = node
+        while ancestor:
+            ancestor.visits += 1
+            ancestor = ancestor.parent
+
+        bytes_written = storage.bytes_written
+        start = time.perf_counter()
+        if use_journal:
+            await journal.persist(trajectory_data(root))
+        else:
+            await storage.write_to_trajectory("trajectory.json", trajectory_data(root), "benchmark", "rewrite")
+        timings.append(time.perf_counter() - start)
+        written.append(storage.bytes_written - bytes_written)
+
+    return timings, written
+
+
+def report(name: str, timings: list[float], written: list[int], checkpoints: list[int]):
+    window = max(1, checkpoints[0] // 5)
+    time_columns = []
+    kb_columns = []
+    for size in checkpoints:
+        time_columns.append(f"{statistics.median(timings[max(0, size - window) : size]) * 1000:8.2f}")
+        kb_columns.append(f"{statistics.mean(written[max(0, size - window) : size]) / 1024:8.1f}")
+    print(f"{name + ' ms':<12} {'  '.join(time_columns)}   total {sum(timings):7.2f} s")
+    print(f"{name + ' KB':<12} {'  '.join(kb_columns)}   total {sum(written) / 1024 / 1024:7.1f} MB")
+
+
+async def benchmark(nodes: int, message_size: int):
+    checkpoints = [size for size in (25, 50, 100, 200, 400, 800, 1600) if size <= nodes]
+    print(f"Median persist time and mean data written per expansion by tree size, {message_size} bytes per message\n")
+    print(f"{'tree size':<12} {'  '.join(f'{size:>8}' for size in checkpoints)}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report("rewrite", *await grow_tree(CountingFileStorage(temp_dir), nodes, message_size, False), checkpoints)
+        report("journal", *await grow_tree(CountingFileStorage(temp_dir), nodes, message_size, True), checkpoints)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rewriting trajectory.json with the trajectory journal")
+    parser.add_argument("--nodes", type=int, default=400, help="Number of nodes to expand")
+    parser.add_argument("--message-size", type=int, default=2000, help="Size of the messages in each node")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark(args.nodes, args.message_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from moatless.index.mmap_faiss import MmapFaissVectorStore
+from moatless.index.simple_faiss import SimpleFaissVectorStore
+
+
+def create_nodes(count: int, dimensions: int, nodes_per_file: int = 10) -> list[TextNode]:
+    rng = np.random.default_rng(42)
+    embeddings = rng.random((count, dimensions), dtype=np.float32)
+    nodes = []
+    for i in range(count):
+        file_path = f"pkg/module_{i // nodes_per_file}.py"
+        nodes.append(
+            TextNode(
+                id_=f"{file_path}_{i % nodes_per_file}",
+                embedding=embeddings[i].tolist(),
+                metadata={
+                    "file_path": file_path,
+                    "category": "implementation",
+                    "span_ids": [f"Class{i}", f"Class{i}.method"],
+                    "start_line": i,
+                    "end_line": i + 20,
+                    "tokens": 250,
+                },
+            )
+        )
+    return nodes
+
+
+def time_it(func, repeat: int) -> tuple[list[float], object]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def report(name: str, timings: list[float]):
+    print(
+        f"{name:<40} median {statistics.median(timings) * 1000:9.2f} ms"
+        f"   min {min(timings) * 1000:9.2f} ms   max {max(timings) * 1000:9.2f} ms"
+    )
+
+
+def benchmark(simple_dir: str, mmap_dir: str, dimensions: int, repeat: int, top_k: int):
+    query = VectorStoreQuery(
+        query_embedding=np.random.default_rng(7).random(dimensions, dtype=np.float32).tolist(),
+        similarity_top_k=top_k,
+    )
+
+    for name, store_cls, persist_dir in [
+        ("SimpleFaissVectorStore", SimpleFaissVectorStore, simple_dir),
+        ("MmapFaissVectorStore", MmapFaissVectorStore, mmap_dir),
+    ]:
+        timings, store = time_it(lambda: store_cls.from_persist_dir(persist_dir), repeat)
+        report(f"{name} open", timings)
+
+        timings, _ = time_it(lambda: store.query(query), repeat)
+        report(f"{name} query top_k={top_k}", timings)
+
+        timings, _ = time_it(lambda: store_cls.from_persist_dir(persist_dir).query(query), repeat)
+        report(f"{name} open + first query", timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare open and query latency of the vector store formats")
+    parser.add_argument("--index-dir", help="Existing index persisted with SimpleFaissVectorStore to convert and use")
+    parser.add_argument("--vectors", type=int, default=50000, help="Number of synthetic vectors")
+    parser.add_argument("--dimensions", type=int, default=1024, help="Dimensions of synthetic vectors")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix="moatless_vector_bench_")
+    try:
+        mmap_dir = os.path.join(work_dir, "mmap")
+
+        if args.index_dir:
+            simple_dir = args.index_dir
+            simple_store = SimpleFaissVectorStore.from_persist_dir(simple_dir)
+            dimensions = simple_store.client.d
+        else:
+            simple_dir = os.path.join(work_dir, "simple")
+            dimensions = args.dimensions
+            print(f"Creating {args.vectors} synthetic vectors with {dimensions} dimensions...")
+            nodes = create_nodes(args.vectors, dimensions)
+            simple_store = SimpleFaissVectorStore(faiss.IndexIDMap(faiss.IndexFlatL2(dimensions)), d=dimensions)
+            simple_store.add(nodes)
+            simple_store.persist(simple_dir)
+
+        MmapFaissVectorStore.from_simple_store(simple_store).persist(mmap_dir)
+
+        benchmark(simple_dir, mmap_dir, dimensions, args.repeat, args.top_k)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
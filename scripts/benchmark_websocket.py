@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+from moatless.api.websocket import ConnectionManager
+from moatless.events import BaseEvent
+from moatless.flow.events import FlowStartedEvent, NodeRewardEvent
+from starlette.websockets import WebSocketState
+
+
+class SimulatedClient:
+    """WebSocket client that takes a fixed time to receive each frame and records the delivery latency per event."""
+
+    def __init__(self, latency: float, published_at: dict[int, float]):
+        self.client_state = WebSocketState.CONNECTED
+        self.latency = latency
+        self.published_at = published_at
+        self.delivery_latencies: list[float] = []
+        self.last_seq = -1
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        self.client_state = WebSocketState.DISCONNECTED
+
+    async def send_json(self, data):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.latency)
+        self.frames += 1
+        message = json.loads(text)
+        now = time.perf_counter()
+        for event in message["events"] if message.get("type") == "batch" else [message]:
+            self.delivery_latencies.append(now - self.published_at[event["data"]["seq"]])
+            self.last_seq = max(self.last_seq, event["data"]["seq"])
+
+
+async def sequential_broadcast(manager: ConnectionManager, event: BaseEvent):
+    """ConnectionManager.broadcast_event before the fan-out queues, serializing and sending per subscriber in turn."""
+    event_dict = event.model_dump(mode="json")
+    for connection in manager.trajectory_subscriptions.get(event_dict["trajectory_id"], set()).copy():
+        await connection.send_text(json.dumps(event_dict))
+
+
+def create_event(seq: int, events: int, node_events_per_flow_event: int) -> BaseEvent:
+    """Mostly node reward events, flow events are never coalesced so the last event shows that a client caught up."""
+    if seq % (node_events_per_flow_event + 1) == 0 or seq == events - 1:
+        return FlowStartedEvent(project_id="project", trajectory_id="trajectory", data={"seq": seq})
+    return NodeRewardEvent(
+        project_id="project", trajectory_id="trajectory", node_id=seq % 7, reward=0.5, data={"seq": seq}
+    )
+
+
+async def run(
+    broadcast,
+    manager: ConnectionManager,
+    subscribers: int,
+    slow_subscribers: int,
+    events: int,
+    latency: float,
+    slow_latency: float,
+    publish_interval: float,
+):
+    published_at: dict[int, float] = {}
+    clients = [
+        SimulatedClient(slow_latency if i < slow_subscribers else latency, published_at) for i in range(subscribers)
+    ]
+    for client in clients:
+        await manager.connect(client)
+        await manager.subscribe_to_trajectory(client, "project", "trajectory")
+
+    serializations = 0
+    dumps = json.dumps
+
+    def counted_dumps(*args, **kwargs):
+        nonlocal serializations
+        serializations += 1
+        return dumps(*args, **kwargs)
+
+    json.dumps = counted_dumps
+    try:
+        blocked = 0.0
+        start = time.perf_counter()
+        for seq in range(events):
+            event = create_event(seq, events, 9)
+            published_at[seq] = time.perf_counter()
+            await broadcast(event)
+            blocked += time.perf_counter() - published_at[seq]
+            await asyncio.sleep(publish_interval)
+
+        # Wait until the fast clients have received the last event
+        fast_clients = clients[slow_subscribers:]
+        while any(client.last_seq < events - 1 for client in fast_clients):
+            if time.perf_counter() - start > 120:
+                break
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+    finally:
+        json.dumps = dumps
+
+    for client in clients:
+        await manager.disconnect(client)
+
+    fast_latencies = sorted(latency for client in fast_clients for latency in client.delivery_latencies)
+    return {
+        "elapsed": elapsed,
+        "blocked": blocked,
+        "serializations": serializations,
+        "delivered": sum(len(client.delivery_latencies) for client in fast_clients) / len(fast_clients),
+        "frames": sum(client.frames for client in fast_clients) / len(fast_clients),
+        "p50": statistics.median(fast_latencies),
+        "p99": fast_latencies[int(len(fast_latencies) * 0.99) - 1],
+        "slow_disconnects": manager.slow_disconnects,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<12} total {result['elapsed']:7.2f} s   publisher blocked {result['blocked']:7.2f} s"
+        f"   fast client latency p50 {result['p50'] * 1000:8.1f} ms p99 {result['p99'] * 1000:8.1f} ms"
+        f"   {result['delivered']:3.0f} events in {result['frames']:3.0f} frames per fast client"
+        f"   {result['serializations']:6d} json.dumps calls"
+        f"   {result['slow_disconnects']} slow clients disconnected"
+    )
+
+
+async def benchmark(args):
+    print(
+        f"{args.events} events to {args.subscribers} subscribers ({args.slow_subscribers} slow), "
+        f"{args.latency * 1000:.1f} ms per send, {args.slow_latency * 1000:.0f} ms per send to slow subscribers"
+    )
+    run_args = (
+        args.subscribers,
+        args.slow_subscribers,
+        args.events,
+        args.latency,
+        args.slow_latency,
+        args.publish_interval,
+    )
+
+    manager = ConnectionManager(max_queue_size=args.max_queue_size, batch_interval_seconds=args.batch_interval)
+    report("fan-out", await run(manager.broadcast_event, manager, *run_args))
+
+    manager = ConnectionManager()
+    report("sequential", await run(lambda event: sequential_broadcast(manager, event), manager, *run_args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the WebSocket event fan-out with simulated subscribers")
+    parser.add_argument("--subscribers", type=int, default=300)
+    parser.add_argument("--slow-subscribers", type=int, default=5)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0005, help="Seconds per send to a subscriber")
+    parser.add_argument("--slow-latency", type=float, default=0.05, help="Seconds per send to a slow subscriber")
+    parser.add_argument("--publish-interval", type=float, default=0.002, help="Seconds between published events")
+    parser.add_argument("--batch-interval", type=float, default=0.05)
+    parser.add_argument("--max-queue-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -75,7 +75,8 @@ def create_index(
 def ingest_instance(instance: Dict, code_index: CodeIndex, index_store_dir: str, num_workers: int) -> tuple[int, int]:
     logger.info(f"Processing instance: {instance['instance_id']}")
 
-    vectors, indexed_tokens = code_index.run_ingestion(num_workers=num_workers)
+    # Indexes loaded from a previous instance only re-index the files that differ between the commits
+    vectors, indexed_tokens = code_index.run_ingestion(num_workers=num_workers, incremental=True)
     logger.info(f"Indexed {vectors} vectors and {indexed_tokens} tokens")
 
     persist_dir = get_persist_dir(instance["instance_id"], index_store_dir)
@@ -88,6 +88,7 @@ async def run_docker_evaluation(
         logger.info(f"Using local moatless source code from: {moatless_source_dir}")
 
     runner = SchedulerRunner(runner_impl=DockerRunner, max_total_jobs=num_parallel_jobs)
+    await eventbus.subscribe(runner.handle_event)
 
     # Create evaluation manager with the runner
     eval_manager = EvaluationManager(
@@ -149,6 +150,8 @@ async def run_docker_evaluation(
     except Exception as e:
         logger.exception(f"Error running Docker evaluation: {e}")
         return False
+    finally:
+        await eval_manager.close()
 
 
 def main():
@@ -1,7 +1,13 @@
 import asyncio
+import time
+from typing import ClassVar
 from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+from pydantic import ConfigDict
+
+from moatless.actions.action import Action
+from moatless.actions.schema import ActionArguments, Observation
 from moatless.actions.string_replace import StringReplace, StringReplaceArgs
 from moatless.agent.agent import ActionAgent
 from moatless.completion import BaseCompletionModel, CompletionResponse
@@ -208,3 +214,144 @@ Action: StringReplace
         # Verify original structure is preserved
         assert "def hello_world():" in updated_content
         assert "print(message)" in updated_content
+
+
+class SlowViewArgs(ActionArguments):
+    file_path: str
+    span_id: str
+    delay: float = 0.1
+    terminal: bool = False
+
+    model_config = ConfigDict(title="SlowView")
+
+
+class SlowView(Action):
+    """Read-only action adding a span to the file context after a delay."""
+
+    args_schema = SlowViewArgs
+    is_read_only: ClassVar[bool] = True
+
+    async def execute(self, args: SlowViewArgs, file_context: FileContext | None = None) -> Observation:
+        await asyncio.sleep(args.delay)
+        if args.span_id == "missing":
+            raise ValueError("Span not found")
+        file_context.add_span_to_context(args.file_path, args.span_id)
+        return Observation.create(message=f"Viewed {args.span_id}", terminal=args.terminal)
+
+
+@pytest.fixture
+def view_repository():
+    repo = InMemRepository()
+    repo.save_file(
+        "view_file.py",
+        """def first():
+    return 1
+
+
+def second():
+    return 2
+
+
+def third():
+    return 3
+""",
+    )
+    return repo
+
+
+@pytest.fixture
+def view_agent(mock_completion_model, workspace):
+    agent = ActionAgent(
+        agent_id="test-agent",
+        system_prompt="You are a helpful assistant",
+        actions=[SlowView(), StringReplace()],
+        memory=MessageHistoryGenerator(),
+    )
+    agent.workspace = workspace
+    agent.completion_model = mock_completion_model
+    return agent
+
+
+def create_view_node(repository, action_steps: list[ActionArguments]) -> Node:
+    node = Node.create_root("Find the functions", shadow_mode=True)
+    node.file_context = FileContext(repo=repository)
+    node.action_steps = [ActionStep(action=action) for action in action_steps]
+    return node
+
+
+@pytest.mark.asyncio
+async def test_agent_runs_read_only_actions_concurrently(view_agent, view_repository):
+    node = create_view_node(
+        view_repository,
+        [
+            SlowViewArgs(file_path="view_file.py", span_id="first", delay=0.3),
+            SlowViewArgs(file_path="view_file.py", span_id="second", delay=0.1),
+            SlowViewArgs(file_path="view_file.py", span_id="third", delay=0.2),
+        ],
+    )
+
+    start = time.monotonic()
+    await view_agent.run(node)
+    assert time.monotonic() - start < 0.5
+
+    # The spans are added in step order, not in the order the actions finished
+    assert node.file_context.get_file("view_file.py").span_ids == {"first", "second", "third"}
+    span_ids = [span.span_id for span in node.file_context.get_file("view_file.py").spans]
+    assert [span_id for span_id in span_ids if span_id in ("first", "second", "third")] == ["first", "second", "third"]
+
+    for step in node.action_steps:
+        assert step.observation.message == f"Viewed {step.action.span_id}"
+        assert [change.artifact_id for change in step.observation.artifact_changes] == ["view_file.py"]
+
+
+def test_agent_groups_consecutive_read_only_actions(view_agent):
+    view = ActionStep(action=SlowViewArgs(file_path="view_file.py", span_id="first"))
+    replace = ActionStep(action=StringReplaceArgs(path="view_file.py", old_str="1", new_str="2"))
+
+    groups = view_agent._group_action_steps([view, view, replace, view, replace])
+    assert [[i for i, _ in group] for group in groups] == [[0, 1], [2], [3], [4]]
+
+    view_agent.parallel_read_only_actions = False
+    assert len(view_agent._group_action_steps([view, view, view])) == 3
+
+
+@pytest.mark.asyncio
+async def test_agent_discards_concurrent_actions_after_failed_action(view_agent, view_repository):
+    node = create_view_node(
+        view_repository,
+        [
+            SlowViewArgs(file_path="view_file.py", span_id="first", delay=0.1),
+            SlowViewArgs(file_path="view_file.py", span_id="missing", delay=0.1),
+            SlowViewArgs(file_path="view_file.py", span_id="third", delay=0.0),
+        ],
+    )
+
+    with pytest.raises(ValueError, match="Span not found"):
+        await view_agent.run(node)
+
+    assert node.action_steps[0].observation is not None
+    assert node.action_steps[2].observation is None
+    assert node.file_context.get_file("view_file.py").span_ids >= {"first"}
+    assert "third" not in node.file_context.get_file("view_file.py").span_ids
+
+
+@pytest.mark.asyncio
+async def test_agent_ignores_concurrent_actions_after_terminal_action(view_agent, view_repository):
+    node = create_view_node(
+        view_repository,
+        [
+            SlowViewArgs(file_path="view_file.py", span_id="first", delay=0.1, terminal=True),
+            SlowViewArgs(file_path="view_file.py", span_id="missing", delay=0.0),
+            SlowViewArgs(file_path="view_file.py", span_id="third", delay=0.0),
+        ],
+    )
+
+    # The failed step would not have been reached when run one by one
+    await view_agent.run(node)
+
+    assert node.terminal
+    assert node.error is None
+    assert node.action_steps[0].observation.terminal
+    assert [step.observation for step in node.action_steps[1:]] == [None, None]
+    assert node.file_context.get_file("view_file.py").span_ids >= {"first"}
+    assert "third" not in node.file_context.get_file("view_file.py").span_ids
@@ -0,0 +1,181 @@
+"""Tests for the WebSocket connection manager."""
+
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from moatless.agent.events import ActionExecutedEvent
+from moatless.api.websocket import ConnectionManager
+from moatless.flow.events import FlowCompletedEvent, FlowStartedEvent, NodeRewardEvent
+
+
+class FakeWebSocket:
+    """WebSocket that records the sent frames, optionally blocking sends until released."""
+
+    def __init__(self, blocked: bool = False):
+        self.client_state = WebSocketState.CONNECTED
+        self.close_code = None
+        self.frames = []
+        self.json_messages = []
+        self.released = asyncio.Event()
+        if not blocked:
+            self.released.set()
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        self.client_state = WebSocketState.DISCONNECTED
+        self.close_code = code
+
+    async def send_json(self, data):
+        self.json_messages.append(data)
+
+    async def send_text(self, text):
+        await self.released.wait()
+        self.frames.append(json.loads(text))
+
+
+def events_in(frames):
+    events = []
+    for frame in frames:
+        events.extend(frame["events"] if frame.get("type") == "batch" else [frame])
+    return events
+
+
+async def subscribe(manager, project_id="project", trajectory_id="trajectory", blocked=False):
+    websocket = FakeWebSocket(blocked=blocked)
+    await manager.connect(websocket)
+    await manager.subscribe_to_trajectory(websocket, project_id, trajectory_id)
+    return websocket
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_does_not_delay_others():
+    """Test that events reach fast subscribers while a slow subscriber is blocked."""
+    manager = ConnectionManager(batch_interval_seconds=0)
+    slow = await subscribe(manager, blocked=True)
+    fast = await subscribe(manager)
+
+    await manager.broadcast_event(FlowStartedEvent(project_id="project", trajectory_id="trajectory"))
+    await asyncio.sleep(0.01)
+
+    assert [event["event_type"] for event in events_in(fast.frames)] == ["started"]
+    assert slow.frames == []
+
+    # The slow subscriber receives the event once unblocked
+    slow.released.set()
+    await asyncio.sleep(0.01)
+    assert [event["event_type"] for event in events_in(slow.frames)] == ["started"]
+
+    for websocket in [slow, fast]:
+        await manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_node_events_are_batched():
+    """Test that node events published within the batch interval are sent as one frame, other events as they are."""
+    manager = ConnectionManager(batch_interval_seconds=0.05)
+    websocket = await subscribe(manager)
+
+    await manager.broadcast_event(FlowStartedEvent(project_id="project", trajectory_id="trajectory"))
+    for action_name in ["ViewCode", "GrepTool"]:
+        await manager.broadcast_event(
+            ActionExecutedEvent(project_id="project", trajectory_id="trajectory", node_id=1, action_name=action_name)
+        )
+    for node_id, reward in [(1, 0.1), (1, 0.2), (2, 0.3)]:
+        await manager.broadcast_event(
+            NodeRewardEvent(project_id="project", trajectory_id="trajectory", node_id=node_id, reward=reward)
+        )
+    await manager.broadcast_event(FlowCompletedEvent(project_id="project", trajectory_id="trajectory"))
+    await asyncio.sleep(0.1)
+
+    # Only the node events are wrapped in a batch frame, in the order they were published
+    assert [frame.get("type", frame.get("event_type")) for frame in websocket.frames] == [
+        "started",
+        "executed",
+        "executed",
+        "batch",
+        "completed",
+    ]
+    assert [event["reward"] for event in websocket.frames[3]["events"]] == [0.1, 0.2, 0.3]
+    assert manager.connection_queues[websocket].messages_coalesced == 0
+
+    await manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_other_events_are_not_batched():
+    """Test that events other than node events are sent as plain frames, also when published together."""
+    manager = ConnectionManager(batch_interval_seconds=0.05)
+    websocket = await subscribe(manager)
+
+    await manager.broadcast_event(FlowStartedEvent(project_id="project", trajectory_id="trajectory"))
+    await manager.broadcast_event(FlowCompletedEvent(project_id="project", trajectory_id="trajectory"))
+    await asyncio.sleep(0.01)
+
+    assert [frame["event_type"] for frame in websocket.frames] == ["started", "completed"]
+
+    await manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_node_state_events_coalesced_when_backlogged():
+    """Test that a newer reward replaces the queued one for the same node only for a backlogged connection."""
+    manager = ConnectionManager(batch_interval_seconds=0, coalesce_backlog=3)
+    websocket = await subscribe(manager, blocked=True)
+
+    # The first event is taken by the writer, which blocks on sending it
+    await manager.broadcast_event(FlowStartedEvent(project_id="project", trajectory_id="trajectory"))
+    await asyncio.sleep(0)
+
+    for action_name in ["ViewCode", "GrepTool", "FindClass"]:
+        await manager.broadcast_event(
+            ActionExecutedEvent(project_id="project", trajectory_id="trajectory", node_id=1, action_name=action_name)
+        )
+    for node_id, reward in [(1, 0.1), (2, 0.5), (1, 0.2), (1, 0.3)]:
+        await manager.broadcast_event(
+            NodeRewardEvent(project_id="project", trajectory_id="trajectory", node_id=node_id, reward=reward)
+        )
+
+    websocket.released.set()
+    await asyncio.sleep(0.01)
+
+    events = events_in(websocket.frames)
+    assert [(event["event_type"], event.get("action_name"), event.get("reward")) for event in events] == [
+        ("started", None, None),
+        ("executed", "ViewCode", None),
+        ("executed", "GrepTool", None),
+        ("executed", "FindClass", None),
+        ("reward_generated", None, 0.3),
+        ("reward_generated", None, 0.5),
+    ]
+    assert manager.connection_queues[websocket].messages_coalesced == 2
+
+    await manager.disconnect(websocket)
+
+
+@pytest.mark.asyncio
+async def test_subscriber_falling_behind_is_disconnected():
+    """Test that a subscriber with a full queue is disconnected without affecting the others."""
+    manager = ConnectionManager(max_queue_size=3, batch_interval_seconds=0)
+    slow = await subscribe(manager, blocked=True)
+    fast = await subscribe(manager)
+
+    for _ in range(5):
+        await manager.broadcast_event(FlowStartedEvent(project_id="project", trajectory_id="trajectory"))
+        await asyncio.sleep(0)
+
+    assert slow not in manager.active_connections
+    assert slow.client_state == WebSocketState.DISCONNECTED
+    assert slow.close_code == 1013
+    assert "trajectory" in manager.trajectory_subscriptions
+    assert manager.trajectory_subscriptions["trajectory"] == {fast}
+    assert manager.slow_disconnects == 1
+
+    await asyncio.sleep(0.01)
+    assert len(events_in(fast.frames)) == 5
+
+    await manager.disconnect(fast)
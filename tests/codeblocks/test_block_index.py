@@ -0,0 +1,60 @@
+from moatless.codeblocks import CodeBlock, CodeBlockType
+from moatless.codeblocks.parser.python import PythonParser
+
+content = """import os
+
+
+class Foo:
+    def __init__(self):
+        self.value = 1
+
+    def bar(self):
+        return self.value
+
+
+class Bar:
+    def bar(self):
+        return 2
+
+
+def bar():
+    return 3
+"""
+
+
+def test_indexed_lookups_match_tree_walk():
+    module = PythonParser().parse(content)
+
+    for block in [module] + module.get_all_child_blocks():
+        for span_id in module.spans_by_id:
+            assert block.find_blocks_by_span_id(span_id) == block._find_blocks_by_span_id(span_id)
+            assert block.find_first_by_span_id(span_id) is block._find_first_by_span_id(span_id)
+            assert block.find_last_by_span_id(span_id) is block._find_last_by_span_id(span_id)
+
+        for identifier in ["Foo", "Bar", "bar", "__init__"]:
+            assert block.find_blocks_with_identifier(identifier) == block._find_blocks_with_identifier(identifier)
+
+    for line in range(1, module.end_line + 1):
+        assert module.find_spans_by_line_numbers(line, line + 2) == module._find_spans_by_line_numbers(
+            line, line + 2, None
+        )
+
+    assert [block.full_path() for block in module.find_blocks_with_identifier("bar")] == [
+        ["Foo", "bar"],
+        ["Bar", "bar"],
+        ["bar"],
+    ]
+    assert module.find_by_identifier("bar", type=CodeBlockType.FUNCTION, recursive=True).full_path() == ["Foo", "bar"]
+    assert [span.span_id for span in module.find_spans_by_line_numbers(9, 9)] == ["Foo", "Foo.bar"]
+
+
+def test_index_is_reset_on_change():
+    module = PythonParser().parse(content)
+    assert len(module.find_blocks_with_identifier("bar")) == 3
+
+    module.remove_child(module.children.index(module.find_by_identifier("bar")))
+    assert len(module.find_blocks_with_identifier("bar")) == 2
+
+    class_block = module.find_by_identifier("Bar")
+    class_block.append_child(CodeBlock(type=CodeBlockType.FUNCTION, identifier="baz", content="def baz(self):"))
+    assert [block.full_path() for block in module.find_blocks_with_identifier("baz")] == [["Bar", "baz"]]
@@ -0,0 +1,56 @@
+import pytest
+
+from moatless.codeblocks import CodeBlock, CodeBlockType
+from moatless.codeblocks.codeblocks import FrozenModuleError
+from moatless.codeblocks.parse_cache import ParseCache, parse_module
+
+content = """class Foo:
+    def bar(self):
+        return 1
+"""
+
+
+def test_parse_returns_shared_module():
+    cache = ParseCache()
+
+    module = cache.parse("python", content)
+
+    assert cache.parse("python", content) is module
+    assert cache.parse("python", content + "\n") is not module
+    assert cache.hits == 1
+    assert cache.misses == 2
+    assert module.frozen
+    assert module.to_string() == content
+
+
+def test_lru_eviction():
+    cache = ParseCache(max_entries=2)
+
+    first = cache.parse("python", "a = 1\n")
+    cache.parse("python", "b = 2\n")
+    cache.parse("python", "a = 1\n")
+    cache.parse("python", "c = 3\n")
+
+    assert len(cache) == 2
+    assert cache.parse("python", "a = 1\n") is first
+    assert cache.misses == 3
+
+
+def test_frozen_module_raises_on_change():
+    module = ParseCache().parse("python", content)
+    class_block = module.find_by_identifier("Foo")
+
+    with pytest.raises(FrozenModuleError):
+        class_block.append_child(CodeBlock(type=CodeBlockType.COMMENT, content="# comment"))
+
+    copy = module.copy()
+    assert not copy.frozen
+    assert copy.to_string() == content
+
+    copy.find_by_identifier("Foo").remove_child(0)
+    assert module.to_string() == content
+
+
+def test_parse_module_by_path():
+    assert parse_module("foo.py", content) is parse_module("bar.py", content)
+    assert parse_module("README.md", content) is None
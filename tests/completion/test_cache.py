@@ -0,0 +1,152 @@
+from typing import Any, List, Optional, Tuple
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from litellm.types.utils import ModelResponse
+from pydantic import Field
+
+from moatless.completion.base import BaseCompletionModel
+from moatless.completion.cache import CompletionCache, CompletionCacheMode, set_completion_cache
+from moatless.completion.schema import ResponseSchema
+from moatless.completion.stats import CompletionInvocation
+from moatless.exceptions import CompletionRuntimeError
+from moatless.storage.file_storage import FileStorage
+
+
+class CachedResponse(ResponseSchema):
+    answer: str = Field(description="The answer to the question")
+
+
+class CachedCompletionModel(BaseCompletionModel):
+    model: str = "test-model"
+
+    async def _validate_completion(
+        self, completion_response: Any
+    ) -> Tuple[List[ResponseSchema], Optional[str], Optional[str]]:
+        answer = completion_response.choices[0].message.content
+        return [CachedResponse(answer=answer)], answer, None
+
+
+def create_response(content: str) -> ModelResponse:
+    return ModelResponse(
+        model="test-model",
+        choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        usage={"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+    )
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    yield storage
+    set_completion_cache(None)
+
+
+def create_model(**kwargs) -> CachedCompletionModel:
+    model = CachedCompletionModel(**kwargs)
+    model.initialize(response_schema=CachedResponse, system_prompt="Answer the question")
+    return model
+
+
+@pytest.mark.asyncio
+async def test_read_through_replays_recorded_completion(storage):
+    cache = CompletionCache(storage, mode=CompletionCacheMode.READ_THROUGH)
+    set_completion_cache(cache)
+    model = create_model()
+
+    with patch("litellm.acompletion", new_callable=AsyncMock) as mock_litellm:
+        mock_litellm.return_value = create_response("42")
+        response = await model.create_completion([{"role": "user", "content": "What is the answer?"}])
+        assert response.text_response == "42"
+        assert mock_litellm.call_count == 1
+        assert cache.writes == 1
+
+        # The same request is replayed when running again, prompt caching breakpoints are not part of the key
+        cache = CompletionCache(storage, mode=CompletionCacheMode.READ_THROUGH)
+        set_completion_cache(cache)
+        messages = [{"role": "user", "content": "What is the answer?", "cache_control": {"type": "ephemeral"}}]
+        replayed = await model.create_completion(messages)
+        assert replayed.text_response == "42"
+        assert mock_litellm.call_count == 1
+        assert cache.hits == 1
+
+        attempt = replayed.completion_invocation.attempts[0]
+        assert attempt.from_cache is True
+        assert attempt.usage.prompt_tokens == 100
+
+        # Another message is a miss
+        await model.create_completion([{"role": "user", "content": "What is the question?"}])
+        assert mock_litellm.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_replay_fails_without_recorded_completion(storage):
+    set_completion_cache(CompletionCache(storage, mode=CompletionCacheMode.REPLAY))
+    model = create_model()
+
+    with patch("litellm.acompletion", new_callable=AsyncMock) as mock_litellm:
+        with pytest.raises(CompletionRuntimeError, match="No recorded completion"):
+            await model._execute_completion([{"role": "user", "content": "Hello"}], CompletionInvocation())
+        mock_litellm.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_record_always_calls_the_model(storage):
+    set_completion_cache(CompletionCache(storage, mode=CompletionCacheMode.RECORD))
+    model = create_model()
+    messages = [{"role": "user", "content": "Hello"}]
+
+    with patch("litellm.acompletion", new_callable=AsyncMock) as mock_litellm:
+        mock_litellm.side_effect = [create_response("first"), create_response("second")]
+        await model._execute_completion(list(messages), CompletionInvocation())
+        await model._execute_completion(list(messages), CompletionInvocation())
+        assert mock_litellm.call_count == 2
+
+    # Each occurrence of the request replays its own response, in the order they were recorded
+    set_completion_cache(CompletionCache(storage, mode=CompletionCacheMode.REPLAY))
+    first = await model._execute_completion(list(messages), CompletionInvocation())
+    second = await model._execute_completion(list(messages), CompletionInvocation())
+    assert first.choices[0].message.content == "first"
+    assert second.choices[0].message.content == "second"
+
+    with pytest.raises(CompletionRuntimeError, match="No recorded completion"):
+        await model._execute_completion(list(messages), CompletionInvocation())
+
+
+@pytest.mark.asyncio
+async def test_read_through_calls_the_model_for_repeated_request(storage):
+    cache = CompletionCache(storage, mode=CompletionCacheMode.READ_THROUGH)
+    set_completion_cache(cache)
+    model = create_model()
+    messages = [{"role": "user", "content": "Hello"}]
+
+    with patch("litellm.acompletion", new_callable=AsyncMock) as mock_litellm:
+        mock_litellm.side_effect = [create_response("first"), create_response("second")]
+        first = await model._execute_completion(list(messages), CompletionInvocation())
+        second = await model._execute_completion(list(messages), CompletionInvocation())
+
+    assert first.choices[0].message.content == "first"
+    assert second.choices[0].message.content == "second"
+    assert cache.misses == 2
+    assert cache.writes == 2
+
+
+def test_key_depends_on_request_but_not_credentials(storage):
+    cache = CompletionCache(storage)
+    messages = [{"role": "user", "content": "Hello"}]
+    key = cache.get_key("gpt-4o", messages, {"temperature": 0.0, "tools": [{"name": "a"}], "api_key": "one"})
+
+    assert key == cache.get_key("gpt-4o", messages, {"tools": [{"name": "a"}], "temperature": 0.0, "api_key": "two"})
+    assert key != cache.get_key("gpt-4o", messages, {"temperature": 0.7, "tools": [{"name": "a"}]})
+    assert key != cache.get_key("gpt-4o", messages, {"temperature": 0.0, "tools": [{"name": "b"}]})
+    assert key != cache.get_key("gpt-4o-mini", messages, {"temperature": 0.0, "tools": [{"name": "a"}]})
+
+
+def test_next_key_counts_occurrences(storage):
+    cache = CompletionCache(storage)
+    messages = [{"role": "user", "content": "Hello"}]
+    key = cache.get_key("gpt-4o", messages, {})
+
+    assert cache.next_key("gpt-4o", messages, {}) == key
+    assert cache.next_key("gpt-4o", messages, {}) == f"{key}-1"
+    assert cache.next_key("gpt-4o-mini", messages, {}) == cache.get_key("gpt-4o-mini", messages, {})
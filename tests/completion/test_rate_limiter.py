@@ -0,0 +1,202 @@
+import asyncio
+import time
+from typing import Any, List, Optional, Tuple
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from litellm import RateLimitError
+from litellm.types.utils import ModelResponse
+from pydantic import Field
+
+from moatless.completion import rate_limiter as rate_limiter_module
+from moatless.completion.base import BaseCompletionModel
+from moatless.completion.rate_limiter import Clock, RateLimiter, RateLimits, RedisRateLimiter, set_rate_limiter
+from moatless.completion.schema import ResponseSchema
+
+
+class LimitedResponse(ResponseSchema):
+    answer: str = Field(description="The answer to the question")
+
+
+class LimitedCompletionModel(BaseCompletionModel):
+    model: str = "test-model"
+
+    async def _validate_completion(
+        self, completion_response: Any
+    ) -> Tuple[List[ResponseSchema], Optional[str], Optional[str]]:
+        answer = completion_response.choices[0].message.content
+        return [LimitedResponse(answer=answer)], answer, None
+
+
+def create_rate_limit_error(retry_after: str) -> RateLimitError:
+    response = httpx.Response(
+        429, headers={"Retry-After": retry_after}, request=httpx.Request("POST", "https://api.test")
+    )
+    return RateLimitError("Rate limit exceeded", llm_provider="openai", model="test-model", response=response)
+
+
+class FakeClock(Clock):
+    """Clock that moves forward when the limiter sleeps."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+@pytest.fixture(autouse=True)
+def short_window(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "WINDOW_SECONDS", 0.2)
+    yield
+    set_rate_limiter(None)
+
+
+async def run_calls(limiter: RateLimiter, calls: int, key: str = "test-model", tokens: int = 10) -> list:
+    """Start the calls in order and return the call numbers and reservations in the order they were allowed."""
+    allowed = []
+
+    async def call(number: int):
+        async with limiter.limit(key, tokens) as reservation:
+            allowed.append((number, reservation))
+
+    tasks = []
+    for number in range(calls):
+        tasks.append(asyncio.create_task(call(number)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return allowed
+
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_are_queued_in_order():
+    limiter = RateLimiter(limits={"openai": RateLimits(requests_per_minute=2)})
+
+    start = time.monotonic()
+    allowed = await run_calls(limiter, 5, key="openai/gpt-4o")
+
+    assert time.monotonic() - start >= 0.4
+    assert [number for number, _ in allowed] == [0, 1, 2, 3, 4]
+    assert [reservation.wait_seconds > 0.1 for _, reservation in allowed] == [False, False, True, True, True]
+
+    # Other keys use the default limits
+    assert limiter.get_limits("anthropic/claude-3-5-sonnet") == RateLimits()
+
+
+@pytest.mark.asyncio
+async def test_tokens_per_minute_use_actual_tokens():
+    limiter = RateLimiter(default_limits=RateLimits(tokens_per_minute=100))
+
+    async with limiter.limit("test-model", 80) as reservation:
+        reservation.tokens = 20
+
+    # The actual tokens leave room for another call in the window
+    assert (await limiter.acquire("test-model", 70)).wait_seconds < 0.1
+
+    # A call with more tokens than the limit waits until the window is empty
+    assert (await limiter.acquire("test-model", 150)).wait_seconds > 0.1
+
+
+@pytest.mark.asyncio
+async def test_max_concurrent_calls():
+    limiter = RateLimiter(default_limits=RateLimits(max_concurrent=2))
+    running = 0
+    max_running = 0
+
+    async def call():
+        nonlocal running, max_running
+        async with limiter.limit("test-model", 10):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*[call() for _ in range(6)])
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_blocks_until_retry_after_and_lowers_limits():
+    limiter = RateLimiter(default_limits=RateLimits(requests_per_minute=10), recovery_step=0.25)
+
+    with pytest.raises(RateLimitError):
+        async with limiter.limit("test-model", 10):
+            raise create_rate_limit_error("0.3")
+
+    assert limiter.rate_limited == 1
+    assert limiter._limit_factors["test-model"] == 0.5
+
+    reservation = await limiter.acquire("test-model", 10)
+    assert reservation.wait_seconds >= 0.25
+    await limiter.release(reservation, success=True)
+    assert limiter._limit_factors["test-model"] == 0.75
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_is_retried_after_the_limiter_wait():
+    limiter = RateLimiter(default_retry_after=0.1)
+    set_rate_limiter(limiter)
+    model = LimitedCompletionModel()
+    model.initialize(response_schema=LimitedResponse, system_prompt="Answer the question")
+
+    response = ModelResponse(
+        model="test-model",
+        choices=[{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "42"}}],
+        usage={"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+    )
+
+    with patch("litellm.acompletion", new_callable=AsyncMock) as mock_litellm:
+        mock_litellm.side_effect = [create_rate_limit_error("0.2"), response]
+        start = time.monotonic()
+        result = await model.create_completion([{"role": "user", "content": "What is the answer?"}])
+
+    # Retried after the retry-after time instead of the exponential backoff
+    assert time.monotonic() - start < 2
+    assert result.text_response == "42"
+
+    invocation = result.completion_invocation
+    assert [attempt.success for attempt in invocation.attempts] == [False, True]
+    assert invocation.attempts[1].queue_wait_ms >= 150
+    assert invocation.queue_wait_ms == sum(attempt.queue_wait_ms for attempt in invocation.attempts)
+    assert limiter._windows["test-model"][-1][2] == 110
+
+
+@pytest.mark.asyncio
+async def test_redis_rate_limiter_is_shared_between_processes():
+    # The limiter reserves calls with Lua scripts, which fakeredis runs with lupa
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+
+    redis = fakeredis.FakeAsyncRedis()
+    clock = FakeClock()
+    with patch("redis.asyncio.from_url", return_value=redis):
+        limits = RateLimits(requests_per_minute=2, tokens_per_minute=1000)
+        first = RedisRateLimiter(redis_url="redis://mock:6379/0", default_limits=limits, clock=clock)
+        second = RedisRateLimiter(redis_url="redis://mock:6379/0", default_limits=limits, clock=clock)
+
+    allowed = await run_calls(first, 2)
+    assert [reservation.wait_seconds for _, reservation in allowed] == [0.0, 0.0]
+
+    # The window is shared, so the other process waits for the calls to expire
+    reservation = await second.acquire("test-model", 10)
+    assert reservation.wait_seconds == pytest.approx(0.2)
+    await second.release(reservation, success=True)
+
+    with pytest.raises(RateLimitError):
+        async with first.limit("test-model", 10):
+            raise create_rate_limit_error("0.3")
+
+    # The other process waits until the retry-after time and its limits are lowered
+    reservation = await second.acquire("test-model", 10)
+    assert reservation.wait_seconds == pytest.approx(0.3)
+    assert float(await redis.hget("moatless:rate_limits:test-model:state", "limit_factor")) == 0.5
+    await second.release(reservation, success=True)
+    assert float(await redis.hget("moatless:rate_limits:test-model:state", "limit_factor")) == 0.55
@@ -0,0 +1,86 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from moatless.evaluation.manager import EvaluationManager
+from moatless.evaluation.schema import Evaluation, EvaluationInstance
+from moatless.storage.file_storage import FileStorage
+
+
+class RecordingEvaluationManager(EvaluationManager):
+    """Evaluation manager that records the instances it processes results for."""
+
+    def __init__(self, storage: FileStorage):
+        runner = AsyncMock()
+        runner.get_job_status.return_value = None
+        super().__init__(runner=runner, storage=storage, eventbus=AsyncMock(), flow_manager=AsyncMock())
+        self.processed = []
+
+    async def _process_trajectory_results(
+        self, evaluation, instance, force_update: bool = True, trajectory_exists: bool | None = None
+    ):
+        self.processed.append(instance.instance_id)
+        return instance
+
+
+async def create_evaluation(storage: FileStorage, manager: EvaluationManager) -> Evaluation:
+    evaluation = Evaluation(
+        evaluation_name="eval",
+        dataset_name="instance_ids",
+        instances=[EvaluationInstance(instance_id=f"instance-{i}") for i in range(3)],
+    )
+    await manager.save_evaluation(evaluation)
+    for instance in evaluation.instances[:2]:
+        await storage.write_to_trajectory(
+            "trajectory.json", {"nodes": []}, project_id="eval", trajectory_id=instance.instance_id
+        )
+        await storage.write_to_trajectory(
+            "instance.json", instance.model_dump(mode="json"), project_id="eval", trajectory_id=instance.instance_id
+        )
+    return evaluation
+
+
+@pytest.mark.asyncio
+async def test_only_changed_trajectories_are_processed(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    manager = RecordingEvaluationManager(storage)
+    await create_evaluation(storage, manager)
+
+    await manager.process_evaluation_results("eval")
+    assert sorted(manager.processed) == ["instance-0", "instance-1", "instance-2"]
+
+    # Instances without a trajectory are processed every time to create it
+    manager.processed = []
+    await manager.process_evaluation_results("eval")
+    assert manager.processed == ["instance-2"]
+
+    manager.processed = []
+    await storage.append("projects/eval/trajs/instance-1/events.jsonl", {"event_type": "started"})
+    await manager.process_evaluation_results("eval")
+    assert sorted(manager.processed) == ["instance-1", "instance-2"]
+
+    # The processed versions are persisted with the evaluation
+    loaded = await RecordingEvaluationManager(storage)._load_evaluation("eval")
+    assert loaded.get_instance("instance-0").trajectory_version is not None
+    assert loaded.get_instance("instance-2").trajectory_version is None
+
+
+@pytest.mark.asyncio
+async def test_unchanged_instance_files_are_not_read_again(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    manager = RecordingEvaluationManager(storage)
+    evaluation = await create_evaluation(storage, manager)
+
+    instances = await manager.get_all_evaluation_instances("eval")
+    assert [instance.instance_id for instance in instances] == ["instance-0", "instance-1"]
+    assert manager.instance_cache_misses == 2
+
+    changed = evaluation.get_instance("instance-0").model_copy(update={"error": "failed"})
+    await storage.write_to_trajectory(
+        "instance.json", changed.model_dump(mode="json"), project_id="eval", trajectory_id="instance-0"
+    )
+
+    instances = await manager.get_all_evaluation_instances("eval")
+    assert [instance.error for instance in instances] == ["failed", None]
+    assert manager.instance_cache_hits == 1
+    assert manager.instance_cache_misses == 3
@@ -0,0 +1,114 @@
+import pytest
+
+from moatless.evaluation.schema import Evaluation, EvaluationInstance, EvaluationStatus, ExecutionStatus
+from moatless.evaluation.state_store import JOURNAL_FILE, SUMMARIES_FILE, EvaluationStateStore
+from moatless.storage.file_storage import FileStorage
+
+
+def create_evaluation(instances: int = 3) -> Evaluation:
+    return Evaluation(
+        evaluation_name="eval",
+        dataset_name="instance_ids",
+        instances=[EvaluationInstance(instance_id=f"instance-{i}") for i in range(instances)],
+    )
+
+
+@pytest.mark.asyncio
+async def test_changes_are_written_behind_and_replayed(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    store = EvaluationStateStore(storage, flush_interval_seconds=60, compaction_ratio=10.0)
+    await store.save(create_evaluation())
+    assert store.snapshot_writes == 1
+
+    # Events from different instances change the shared evaluation
+    evaluation = await store.get("eval")
+    evaluation.get_instance("instance-0").mark_running()
+    store.mark_changed(evaluation)
+    evaluation = await store.get("eval")
+    evaluation.get_instance("instance-1").set_resolution(True)
+    evaluation.status = EvaluationStatus.RUNNING
+    store.mark_changed(evaluation)
+
+    # Nothing is written before the flush
+    assert store.journal_appends == 0
+    summaries = await store.load_summaries()
+    assert summaries["eval"]["status_summary"]["running"] == 1
+
+    await store.close()
+    assert store.journal_appends == 1
+    assert store.snapshot_writes == 1
+    assert len(await storage.read_lines(f"projects/eval/{JOURNAL_FILE}")) == 3
+
+    loaded = await EvaluationStateStore(storage).get("eval")
+    assert loaded.status == EvaluationStatus.RUNNING
+    assert loaded.get_instance("instance-0").execution_status == ExecutionStatus.RUNNING
+    assert loaded.get_instance("instance-1").resolved is True
+    assert [instance.instance_id for instance in loaded.instances] == ["instance-0", "instance-1", "instance-2"]
+
+    summaries = await storage.read(SUMMARIES_FILE)
+    assert summaries["eval"]["status_summary"]["running"] == 1
+    assert summaries["eval"]["resolved_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_journal_is_compacted(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    store = EvaluationStateStore(storage, compaction_ratio=0.6)
+    evaluation = create_evaluation(instances=4)
+    await store.save(evaluation)
+
+    evaluation.get_instance("instance-0").mark_running()
+    await store.save(evaluation)
+    assert store.journal_appends == 1
+
+    # The journal would grow larger than 60% of the snapshot
+    for instance in evaluation.instances:
+        instance.fail("error")
+    await store.save(evaluation)
+    assert store.journal_appends == 1
+    assert store.snapshot_writes == 2
+    assert await storage.read_lines(f"projects/eval/{JOURNAL_FILE}") == []
+
+    loaded = await EvaluationStateStore(storage).get("eval")
+    assert all(instance.execution_status == ExecutionStatus.ERROR for instance in loaded.instances)
+
+
+@pytest.mark.asyncio
+async def test_changes_from_other_writers_are_loaded(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    store = EvaluationStateStore(storage)
+    await store.save(create_evaluation())
+    evaluation = await store.get("eval")
+
+    other_store = EvaluationStateStore(storage)
+    other_evaluation = await other_store.get("eval")
+    other_evaluation.get_instance("instance-0").mark_running()
+    await other_store.save(other_evaluation)
+
+    # The instance held by callers is updated in place
+    assert await store.get("eval") is evaluation
+    assert evaluation.get_instance("instance-0").execution_status == ExecutionStatus.RUNNING
+
+
+@pytest.mark.asyncio
+async def test_stale_writer_merges_changes_from_other_writers(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    store = EvaluationStateStore(storage, compaction_ratio=10.0)
+    evaluation = create_evaluation()
+    await store.save(evaluation)
+
+    other_store = EvaluationStateStore(storage, compaction_ratio=10.0)
+    other_evaluation = await other_store.get("eval")
+    other_evaluation.get_instance("instance-0").mark_running()
+    other_evaluation.status = EvaluationStatus.RUNNING
+    await other_store.save(other_evaluation)
+
+    # Saved without reading the changes made by the other store first
+    evaluation.get_instance("instance-1").set_resolution(True)
+    await store.save(evaluation)
+
+    for loaded in [evaluation, await EvaluationStateStore(storage).get("eval")]:
+        assert loaded.status == EvaluationStatus.RUNNING
+        assert loaded.get_instance("instance-0").execution_status == ExecutionStatus.RUNNING
+        assert loaded.get_instance("instance-1").resolved is True
+        assert [instance.instance_id for instance in loaded.instances] == ["instance-0", "instance-1", "instance-2"]
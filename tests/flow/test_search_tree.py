@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 
@@ -32,6 +33,17 @@ class MockAction(Action):
         return "Mock action executed"
 
 
+class ReadOnlyMockActionArgs(MockActionArgs):
+    @property
+    def name(self) -> str:
+        return "ReadOnlyMockAction"
+
+
+class ReadOnlyMockAction(MockAction):
+    args_schema = ReadOnlyMockActionArgs
+    is_read_only = True
+
+
 # Test Fixtures
 @pytest.fixture
 def mock_workspace():
@@ -48,7 +60,7 @@ def simple_agent(mock_workspace):
     # Agent needs at least one action for generation logic to work
     agent = ActionAgent(
         agent_id="test_agent",
-        actions=[MockAction()],
+        actions=[MockAction(), ReadOnlyMockAction()],
         system_prompt="Test system prompt",
         completion_model=MagicMock(spec=BaseCompletionModel),
     )
@@ -76,7 +88,14 @@ def simple_agent(mock_workspace):
 
 @pytest.fixture
 def search_tree_factory(simple_agent):  # Renamed to indicate it's a factory
-    def _create_tree(root: Node, max_iterations=5, max_depth=10, auto_expand_root=False, max_expansions=1):
+    def _create_tree(
+        root: Node,
+        max_iterations=5,
+        max_depth=10,
+        auto_expand_root=False,
+        max_expansions=1,
+        max_concurrent_simulations=1,
+    ):
         selector = SimpleSelector()
         # Allow overriding expander settings per test
         expander = Expander(max_expansions=max_expansions, auto_expand_root=auto_expand_root)
@@ -92,6 +111,7 @@ def search_tree_factory(simple_agent):  # Renamed to indicate it's a factory
             max_iterations=max_iterations,
             max_depth=max_depth,
             max_expansions=max_expansions,  # Pass max_expansions here as well if create uses it
+            max_concurrent_simulations=max_concurrent_simulations,
         )
         return tree
 
@@ -445,3 +465,73 @@ async def test_search_tree_selects_unexecuted_node(search_tree_factory, root_nod
     finally:
         simple_agent._generate_actions = original_generate
         simple_agent._execute_action_step = original_execute
+
+
+def track_concurrent_execution(simple_agent, root_node, action_args_class=MockActionArgs):
+    stats = {"running": 0, "max_running": 0, "max_root_visits": 0}
+
+    async def slow_execute(node: Node, action_step: ActionStep):
+        stats["running"] += 1
+        stats["max_running"] = max(stats["max_running"], stats["running"])
+        stats["max_root_visits"] = max(stats["max_root_visits"], root_node.visits)
+        await asyncio.sleep(0.01)
+        stats["running"] -= 1
+        return Observation(message="Mock observation")
+
+    async def generate_unique_actions(node: Node):
+        node.action_steps = [ActionStep(action=action_args_class(arg1=f"arg for node {node.node_id}"))]
+
+    simple_agent._generate_actions = AsyncMock(side_effect=generate_unique_actions)
+    simple_agent._execute_action_step = AsyncMock(side_effect=slow_execute)
+    return stats
+
+
+@pytest.mark.asyncio
+async def test_search_tree_concurrent_simulations(search_tree_factory, root_node, simple_agent):
+    stats = track_concurrent_execution(simple_agent, root_node, ReadOnlyMockActionArgs)
+    tree = search_tree_factory(root=root_node, max_iterations=7, max_expansions=3, max_concurrent_simulations=3)
+
+    final_node, reason = await tree._run()
+
+    assert reason == "max_iterations"
+    nodes = root_node.get_all_nodes()
+    assert len(nodes) == 7
+    assert len(root_node.children) == 3
+    assert all(node.is_executed() for node in nodes)
+    assert simple_agent._execute_action_step.call_count == 6
+
+    # Three nodes were simulated at the same time, visits are only updated by backpropagation
+    assert stats["max_running"] == 3
+    assert stats["max_root_visits"] == 0
+    assert all(node.visits == 0 for node in nodes)
+    assert not tree._in_flight
+    assert simple_agent._mutating_action_lock is None
+
+
+@pytest.mark.asyncio
+async def test_search_tree_concurrent_simulations_execute_mutating_actions_one_at_a_time(
+    search_tree_factory, root_node, simple_agent
+):
+    stats = track_concurrent_execution(simple_agent, root_node)
+    tree = search_tree_factory(root=root_node, max_iterations=7, max_expansions=3, max_concurrent_simulations=3)
+
+    final_node, reason = await tree._run()
+
+    assert reason == "max_iterations"
+    assert all(node.is_executed() for node in root_node.get_all_nodes())
+    assert stats["max_running"] == 1
+
+
+@pytest.mark.asyncio
+async def test_search_tree_runs_simulations_one_by_one_without_shadow_mode(
+    search_tree_factory, root_node, simple_agent
+):
+    stats = track_concurrent_execution(simple_agent, root_node, ReadOnlyMockActionArgs)
+    simple_agent.shadow_mode = False
+    tree = search_tree_factory(root=root_node, max_iterations=4, max_expansions=3, max_concurrent_simulations=3)
+
+    final_node, reason = await tree._run()
+
+    assert reason == "max_iterations"
+    assert len(root_node.get_all_nodes()) == 4
+    assert stats["max_running"] == 1
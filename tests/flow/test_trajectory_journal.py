@@ -0,0 +1,153 @@
+import pytest
+
+from moatless.flow.trajectory_journal import JOURNAL_FILE, TrajectoryJournal, read_trajectory_data
+from moatless.node import Node
+from moatless.storage.file_storage import FileStorage
+
+
+def trajectory_data(root: Node, metadata: dict | None = None, nodes: list[Node] | None = None) -> dict:
+    return {
+        "trajectory_id": "traj",
+        "project_id": "proj",
+        "metadata": metadata or {},
+        "nodes": root.dump_as_list(nodes, exclude_none=True, exclude_unset=True),
+    }
+
+
+async def read_nodes(storage: FileStorage) -> list[dict]:
+    return (await read_trajectory_data(storage, "proj", "traj"))["nodes"]
+
+
+@pytest.mark.asyncio
+async def test_journal_replays_to_full_trajectory(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    journal = TrajectoryJournal(storage, "proj", "traj", compaction_ratio=10.0)
+
+    root = Node(node_id=0, user_message="Solve the issue")
+    assert await journal.persist(trajectory_data(root)) == 0
+
+    child = Node(node_id=1)
+    root.add_child(child)
+    assert await journal.persist(trajectory_data(root)) == 1
+
+    child.add_child(Node(node_id=2))
+    child.visits = 3
+    assert await journal.persist(trajectory_data(root, {"status": "running"})) == 3
+
+    assert await journal.persist(trajectory_data(root, {"status": "running"})) == 0
+
+    snapshot = await storage.read_from_trajectory("trajectory.json", "proj", "traj")
+    assert len(snapshot["nodes"]) == 1
+
+    data = await read_trajectory_data(storage, "proj", "traj")
+    assert data["nodes"] == trajectory_data(root)["nodes"]
+    assert data["metadata"] == {"status": "running"}
+    assert "journal_id" not in data
+    assert len(Node.from_dict(data).get_all_nodes()) == 3
+
+
+@pytest.mark.asyncio
+async def test_journal_is_compacted(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    journal = TrajectoryJournal(storage, "proj", "traj", compaction_ratio=2.0)
+
+    root = Node(node_id=0)
+    await journal.persist(trajectory_data(root))
+
+    appended = []
+    for node_id in range(1, 10):
+        root.add_child(Node(node_id=node_id))
+        appended.append(await journal.persist(trajectory_data(root)))
+
+    assert 0 in appended[1:]
+    snapshot = await storage.read_from_trajectory("trajectory.json", "proj", "traj")
+    assert len(snapshot["nodes"]) > 1
+
+    journal_path = f"{storage.get_trajectory_path('proj', 'traj')}/{JOURNAL_FILE}"
+    assert len(await storage.read_lines(journal_path)) < 9
+    assert await read_nodes(storage) == trajectory_data(root)["nodes"]
+
+    await journal.persist(trajectory_data(root), compact=True)
+    assert await storage.read_lines(journal_path) == []
+    assert await read_nodes(storage) == trajectory_data(root)["nodes"]
+
+
+@pytest.mark.asyncio
+async def test_journal_is_ignored_after_full_rewrite(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    journal = TrajectoryJournal(storage, "proj", "traj")
+
+    root = Node(node_id=0)
+    await journal.persist(trajectory_data(root))
+    root.add_child(Node(node_id=1))
+    await journal.persist(trajectory_data(root))
+
+    reset_root = Node(node_id=0)
+    await storage.write_to_trajectory("trajectory.json", trajectory_data(reset_root), "proj", "traj")
+
+    assert await read_nodes(storage) == trajectory_data(reset_root)["nodes"]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_written_after_rewrite_by_another_writer(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    journal = TrajectoryJournal(storage, "proj", "traj", compaction_ratio=10.0)
+
+    root = Node(node_id=0)
+    await journal.persist(trajectory_data(root))
+
+    # Rewritten without a journal id, like FlowManager does when a trajectory is reset
+    await storage.write_to_trajectory("trajectory.json", trajectory_data(Node(node_id=0)), "proj", "traj")
+
+    root.add_child(Node(node_id=1))
+    assert await journal.persist(trajectory_data(root)) == 0
+    assert await read_nodes(storage) == trajectory_data(root)["nodes"]
+
+    root.add_child(Node(node_id=2))
+    assert await journal.persist(trajectory_data(root)) == 1
+    assert await read_nodes(storage) == trajectory_data(root)["nodes"]
+
+
+@pytest.mark.asyncio
+async def test_node_from_file_replays_journal(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    journal = TrajectoryJournal(storage, "proj", "traj", compaction_ratio=10.0)
+
+    root = Node(node_id=0)
+    await journal.persist(trajectory_data(root))
+    root.add_child(Node(node_id=1))
+    assert await journal.persist(trajectory_data(root)) == 1
+
+    trajectory_path = tmp_path / storage.get_trajectory_path("proj", "traj") / "trajectory.json"
+    assert len(Node.from_file(trajectory_path).get_all_nodes()) == 2
+
+
+@pytest.mark.asyncio
+async def test_only_changed_nodes_are_appended(tmp_path):
+    storage = FileStorage(base_dir=str(tmp_path))
+    journal = TrajectoryJournal(storage, "proj", "traj", compaction_ratio=10.0)
+
+    root = Node(node_id=0, user_message="Solve the issue")
+    for node_id in range(1, 4):
+        root.add_child(Node(node_id=node_id))
+
+    # There is no snapshot to append to yet
+    assert await journal.append(trajectory_data(root, nodes=root.pop_changed_nodes())) is None
+    await journal.persist(trajectory_data(root), compact=True)
+    assert root.pop_changed_nodes() == []
+
+    child = root.children[1]
+    child.visits = 2
+    new_child = Node(node_id=4)
+    child.add_child(new_child)
+    root.children[2].mark_changed()
+
+    changed_nodes = root.pop_changed_nodes()
+    assert [node.node_id for node in changed_nodes] == [2, 4, 3]
+
+    # The node marked as changed without changes is not appended
+    assert await journal.append(trajectory_data(root, nodes=changed_nodes)) == 2
+
+    # New nodes are replayed in the order they were added
+    nodes = sorted(await read_nodes(storage), key=lambda node: node["node_id"])
+    assert nodes == sorted(trajectory_data(root)["nodes"], key=lambda node: node["node_id"])
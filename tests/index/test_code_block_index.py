@@ -0,0 +1,64 @@
+import pytest
+
+from moatless.index.code_block_index import CodeBlockIndex
+from moatless.index.file_manifest import FileEntry, FileManifest
+
+
+@pytest.fixture
+def code_block_index():
+    index = CodeBlockIndex(
+        blocks_by_class_name={
+            "Foo": [("pkg/foo.py", "Foo")],
+            "Bar": [("pkg/bar.py", "Bar"), ("pkg/sub/bar.py", "Bar")],
+        },
+        blocks_by_function_name={
+            "run": [("pkg/foo.py", "Foo.run"), ("pkg/sub/bar.py", "run")],
+        },
+    )
+    index.build_file_tree()
+    return index
+
+
+@pytest.mark.asyncio
+async def test_remove_file(code_block_index):
+    code_block_index.remove_file("pkg/sub/bar.py")
+
+    assert await code_block_index.get_blocks_by_class("Bar") == [("pkg/bar.py", "Bar")]
+    assert await code_block_index.get_blocks_by_function("run") == [("pkg/foo.py", "Foo.run")]
+    assert await code_block_index.match_glob_pattern("**/*.py") == {"pkg/foo.py", "pkg/bar.py"}
+    assert "sub" not in code_block_index._file_tree["pkg"]
+
+
+@pytest.mark.asyncio
+async def test_replace_file_blocks(code_block_index):
+    code_block_index.remove_file("pkg/foo.py")
+    code_block_index.add_blocks(
+        {"Baz": [("pkg/foo.py", "Baz")]},
+        {"run": [("pkg/foo.py", "Baz.run")]},
+    )
+
+    assert await code_block_index.get_blocks_by_class("Foo") == []
+    assert await code_block_index.get_blocks_by_class("Baz") == [("pkg/foo.py", "Baz")]
+    assert await code_block_index.get_blocks_by_function("run") == [
+        ("pkg/sub/bar.py", "run"),
+        ("pkg/foo.py", "Baz.run"),
+    ]
+    assert "pkg/foo.py" in await code_block_index.match_glob_pattern("foo.py")
+
+
+def test_file_manifest_diff(temp_dir):
+    manifest = FileManifest(
+        files={
+            "a.py": FileEntry(content_hash="1", node_ids=["a.py_1"]),
+            "b.py": FileEntry(content_hash="2", node_ids=["b.py_1"]),
+            "c.py": FileEntry(content_hash="3"),
+        }
+    )
+    manifest.persist(temp_dir)
+
+    loaded = FileManifest.from_persist_dir(temp_dir)
+    changed_files, removed_files = loaded.diff({"a.py": "1", "b.py": "changed", "d.py": "4"})
+
+    assert changed_files == ["b.py", "d.py"]
+    assert removed_files == ["c.py"]
+    assert loaded.files["a.py"].node_ids == ["a.py_1"]
@@ -0,0 +1,105 @@
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+
+from moatless.index.code_index import CodeIndex
+from moatless.index.mmap_faiss import MmapFaissVectorStore
+from moatless.index.settings import IndexSettings
+
+DIMENSIONS = 8
+
+
+class RecordingEmbedding(MockEmbedding):
+    """Mock embedding model that records the texts it embeds."""
+
+    embedded_texts: list[str] = []
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        self.embedded_texts.append(text)
+        return super()._get_text_embedding(text)
+
+
+def write_module(repo_path, file_name: str, class_name: str, body: str = "return 1"):
+    (repo_path / file_name).write_text(
+        f"""class {class_name}:
+
+    def run(self):
+        {body}
+"""
+    )
+
+
+def node_ids_for(code_index: CodeIndex, file_path: str) -> list[str]:
+    return code_index._file_manifest.files[file_path].node_ids
+
+
+@pytest.fixture
+def repo_path(tmp_path):
+    repo_path = tmp_path / "repo"
+    repo_path.mkdir()
+    write_module(repo_path, "unchanged.py", "Unchanged")
+    write_module(repo_path, "modified.py", "Modified")
+    write_module(repo_path, "deleted.py", "Deleted")
+    return repo_path
+
+
+@pytest.fixture
+def code_index(repo_path):
+    code_index = CodeIndex(
+        embed_model=RecordingEmbedding(embed_dim=DIMENSIONS),
+        vector_store=MmapFaissVectorStore.from_defaults(d=DIMENSIONS),
+        settings=IndexSettings(dimensions=DIMENSIONS),
+    )
+    code_index.run_ingestion(repo_path=str(repo_path))
+    return code_index
+
+
+@pytest.mark.asyncio
+async def test_incremental_ingestion(repo_path, code_index):
+    embed_model = code_index._embed_model
+    unchanged_node_ids = node_ids_for(code_index, "unchanged.py")
+    deleted_node_ids = node_ids_for(code_index, "deleted.py")
+
+    write_module(repo_path, "modified.py", "Modified", body="return 2")
+    (repo_path / "deleted.py").unlink()
+    write_module(repo_path, "added.py", "Added")
+
+    embed_model.embedded_texts.clear()
+    embedded_nodes, _ = code_index.run_ingestion(repo_path=str(repo_path), incremental=True)
+
+    assert set(code_index._file_manifest.files) == {"unchanged.py", "modified.py", "added.py"}
+
+    # Only the chunks of the modified and added files are embedded
+    assert embedded_nodes == len(embed_model.embedded_texts) > 0
+    assert not any("Unchanged" in text for text in embed_model.embedded_texts)
+    assert any("return 2" in text for text in embed_model.embedded_texts)
+    assert any("Added" in text for text in embed_model.embedded_texts)
+
+    # Unchanged files keep their nodes, nodes of the deleted file are removed
+    assert node_ids_for(code_index, "unchanged.py") == unchanged_node_ids
+    for node_id in unchanged_node_ids:
+        assert code_index._docstore.get_document(node_id, raise_error=False) is not None
+    for node_id in deleted_node_ids:
+        assert code_index._docstore.get_document(node_id, raise_error=False) is None
+    assert len(code_index._vector_store) == sum(
+        len(entry.node_ids) for entry in code_index._file_manifest.files.values()
+    )
+
+    assert await code_index._code_block_index.get_blocks_by_class("Deleted") == []
+    assert await code_index._code_block_index.get_blocks_by_class("Added") == [("added.py", ["Added"])]
+    assert await code_index._code_block_index.get_blocks_by_class("Unchanged") == [("unchanged.py", ["Unchanged"])]
+    assert await code_index._code_block_index.match_glob_pattern("*.py") == {
+        "unchanged.py",
+        "modified.py",
+        "added.py",
+    }
+
+
+def test_incremental_ingestion_without_changes(repo_path, code_index):
+    embed_model = code_index._embed_model
+    manifest_before = code_index._file_manifest.model_copy(deep=True)
+
+    embed_model.embedded_texts.clear()
+    assert code_index.run_ingestion(repo_path=str(repo_path), incremental=True) == (0, 0)
+
+    assert embed_model.embedded_texts == []
+    assert code_index._file_manifest == manifest_before
@@ -0,0 +1,174 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from moatless.index.mmap_faiss import MANIFEST_FNAME, MmapFaissVectorStore
+from moatless.index.simple_faiss import SimpleFaissVectorStore
+
+DIMENSIONS = 8
+
+
+def create_nodes(start: int, count: int) -> list[TextNode]:
+    rng = np.random.default_rng(start)
+    return [
+        TextNode(
+            id_=f"file_{i // 3}.py_{i % 3}",
+            embedding=rng.random(DIMENSIONS).tolist(),
+            metadata={"file_path": f"file_{i // 3}.py", "tokens": 10},
+        )
+        for i in range(start, start + count)
+    ]
+
+
+def query_for(node: TextNode, top_k: int = 5) -> VectorStoreQuery:
+    return VectorStoreQuery(query_embedding=node.embedding, similarity_top_k=top_k)
+
+
+def test_add_and_query():
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    nodes = create_nodes(0, 12)
+
+    store.add(nodes)
+
+    assert store.next_id == 12
+    result = store.query(query_for(nodes[4]))
+    assert result.ids[0] == nodes[4].id_
+    assert len(result.ids) == 5
+
+
+def test_persist_and_open(temp_dir):
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    nodes = create_nodes(0, 12)
+    store.add(nodes)
+    store.persist(temp_dir)
+
+    assert MmapFaissVectorStore.exists(temp_dir)
+    assert os.path.exists(os.path.join(temp_dir, MANIFEST_FNAME))
+
+    opened = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    assert opened.next_id == 12
+    assert opened.query(query_for(nodes[7])).ids == store.query(query_for(nodes[7])).ids
+    assert opened.get_metadata(7)["file_path"] == "file_2.py"
+
+
+def test_delete_tombstones_until_persist(temp_dir):
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    nodes = create_nodes(0, 12)
+    store.add(nodes)
+    store.persist(temp_dir)
+
+    opened = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    for node in nodes[3:6]:
+        opened.delete(node.id_)
+
+    result = opened.query(query_for(nodes[4], top_k=12))
+    assert not any(node_id.startswith("file_1.py") for node_id in result.ids)
+    assert len(result.ids) == 9
+    assert opened.client.ntotal == 12
+
+    opened.persist(temp_dir)
+    assert opened.client.ntotal == 9
+
+    reopened = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    assert len(reopened) == 9
+    assert reopened.vector_ids_by_ref_doc_id("file_1.py_1") == []
+
+
+def test_add_after_open_continues_ids(temp_dir):
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    store.add(create_nodes(0, 6))
+    store.persist(temp_dir)
+
+    opened = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    new_nodes = create_nodes(6, 6)
+    opened.add(new_nodes)
+
+    assert opened.next_id == 12
+    assert opened.vector_ids_by_ref_doc_id("file_3.py_1") == [10]
+
+    opened.persist(temp_dir)
+    reopened = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    assert reopened.vector_ids_by_ref_doc_id("file_3.py_1") == [10]
+    assert reopened.query(query_for(new_nodes[0])).ids[0] == new_nodes[0].id_
+
+
+def test_from_simple_store():
+    simple_store = SimpleFaissVectorStore(faiss.IndexIDMap(faiss.IndexFlatL2(DIMENSIONS)), d=DIMENSIONS)
+    nodes = create_nodes(0, 12)
+    simple_store.add(nodes)
+
+    store = MmapFaissVectorStore.from_simple_store(simple_store)
+
+    query = query_for(nodes[3])
+    assert store.query(query).ids == simple_store.query(query).ids
+
+
+def create_test_nodes() -> list[TextNode]:
+    rng = np.random.default_rng(1)
+    file_paths = ["src/module.py", "src/other.py", "tests/test_module.py"]
+    return [
+        TextNode(
+            id_=f"{file_path}_{i}",
+            embedding=rng.random(DIMENSIONS).tolist(),
+            metadata={"file_path": file_path, "tokens": 10},
+        )
+        for file_path in file_paths
+        for i in range(4)
+    ]
+
+
+def test_query_with_file_paths():
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    nodes = create_test_nodes()
+    store.add(nodes)
+
+    result = store.query(query_for(nodes[0], top_k=10), file_paths=["src/other.py"])
+
+    assert len(result.ids) == 4
+    assert all(node_id.startswith("src/other.py") for node_id in result.ids)
+
+    result = store.query(query_for(nodes[0]), file_paths=["src/missing.py"])
+    assert result.ids == []
+
+
+def test_query_with_category(temp_dir):
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    nodes = create_test_nodes()
+    store.add(nodes)
+    store.delete("src/module.py_1")
+    store.persist(temp_dir)
+
+    store = MmapFaissVectorStore.from_persist_dir(temp_dir)
+
+    result = store.query(query_for(nodes[0], top_k=20), category="test")
+    assert sorted(result.ids) == [f"tests/test_module.py_{i}" for i in range(4)]
+
+    result = store.query(query_for(nodes[0], top_k=20), category="implementation")
+    assert len(result.ids) == 7
+    assert "src/module.py_1" not in result.ids
+    assert not any(node_id.startswith("tests/") for node_id in result.ids)
+
+    result = store.query(query_for(nodes[0], top_k=20), file_paths=["src/module.py"], category="implementation")
+    assert sorted(result.ids) == ["src/module.py_0", "src/module.py_2", "src/module.py_3"]
+
+
+def test_file_path_index_after_reopen(temp_dir):
+    store = MmapFaissVectorStore.from_defaults(d=DIMENSIONS)
+    nodes = create_test_nodes()
+    store.add(nodes[:6])
+    store.persist(temp_dir)
+
+    store = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    store.add(nodes[6:])
+
+    assert store.vector_ids_by_file_path("src/other.py") == [4, 5, 6, 7]
+    store.persist(temp_dir)
+
+    store = MmapFaissVectorStore.from_persist_dir(temp_dir)
+    assert store.vector_ids_by_file_path("tests/test_module.py") == [8, 9, 10, 11]
+    result = store.query(query_for(nodes[9], top_k=2), file_paths=["tests/test_module.py"])
+    assert result.ids[0] == nodes[9].id_
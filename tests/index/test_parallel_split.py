@@ -0,0 +1,42 @@
+from llama_index.core.schema import Document
+
+from moatless.index import parallel_split
+from moatless.index.parallel_split import shard_documents, split_documents, split_documents_parallel
+from moatless.index.settings import IndexSettings
+
+
+def create_docs(count: int) -> list[Document]:
+    docs = []
+    for i in range(count):
+        content = f"class Model{i}:\n"
+        for j in range(i % 5 + 1):
+            content += f"    def method_{j}(self):\n        return {i} * {j}\n\n"
+        content += f"\ndef helper_{i}():\n    return Model{i}()\n"
+        file_path = f"package/module_{i}.py"
+        docs.append(Document(id_=f"/repo/{file_path}", text=content, metadata={"file_path": file_path}))
+    return docs
+
+
+def test_shard_documents_keeps_order():
+    docs = create_docs(50)
+
+    shards = shard_documents(docs, 8)
+
+    assert len(shards) <= 8
+    assert [doc for shard in shards for doc in shard] == docs
+
+
+def test_parallel_split_matches_serial_split(monkeypatch):
+    monkeypatch.setattr(parallel_split, "MIN_DOCS_PER_WORKER", 5)
+    docs = create_docs(40)
+    settings = IndexSettings()
+
+    serial = split_documents(docs, settings, "/repo")
+    parallel = split_documents_parallel(docs, settings, "/repo", max_workers=2)
+
+    assert [node.id_ for node in parallel.nodes] == [node.id_ for node in serial.nodes]
+    assert [node.get_content() for node in parallel.nodes] == [node.get_content() for node in serial.nodes]
+    assert parallel.tokens_by_node_id == serial.tokens_by_node_id
+    assert parallel.blocks_by_class_name == serial.blocks_by_class_name
+    assert parallel.blocks_by_function_name == serial.blocks_by_function_name
+    assert parallel.blocks_by_function_name["method_0"][0] == ("package/module_0.py", ["Model0", "method_0"])
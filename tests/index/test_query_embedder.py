@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from moatless.index.query_embedder import QueryEmbedder
+
+
+class FakeEmbedModel:
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    async def aget_query_embedding(self, query: str) -> list[float]:
+        self.calls.append([query])
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return [float(len(query))]
+
+
+@pytest.mark.asyncio
+async def test_cached_query():
+    embed_model = FakeEmbedModel()
+    embedder = QueryEmbedder(embed_model, "test-model")
+
+    assert await embedder.get_query_embedding("foo") == [3.0]
+    assert await embedder.get_query_embedding("foo") == [3.0]
+
+    assert embed_model.calls == [["foo"]]
+    assert embedder.hits == 1
+    assert embedder.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_queries_are_coalesced():
+    embed_model = FakeEmbedModel()
+    embedder = QueryEmbedder(embed_model, "test-model")
+
+    results = await asyncio.gather(*[embedder.get_query_embedding("foo") for _ in range(5)])
+
+    assert results == [[3.0]] * 5
+    assert embed_model.calls == [["foo"]]
+    assert embedder.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_batched():
+    embed_model = FakeEmbedModel()
+    embedder = QueryEmbedder(embed_model, "test-model", max_batch_size=2)
+
+    results = await asyncio.gather(*[embedder.get_query_embedding(query) for query in ["a", "bb", "ccc"]])
+
+    assert results == [[1.0], [2.0], [3.0]]
+    assert embed_model.calls == [["a"], ["bb"], ["ccc"]]
+    assert embed_model.max_running > 1
+    assert embedder.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction():
+    embed_model = FakeEmbedModel()
+    embedder = QueryEmbedder(embed_model, "test-model", max_cache_size=2)
+
+    for query in ["a", "bb", "a", "ccc", "bb"]:
+        await embedder.get_query_embedding(query)
+
+    # "bb" was least recently used when "ccc" was added
+    assert embed_model.calls == [["a"], ["bb"], ["ccc"], ["bb"]]
+
+
+@pytest.mark.asyncio
+async def test_failed_embedding_is_not_cached():
+    class FailingEmbedModel(FakeEmbedModel):
+        async def aget_query_embedding(self, query: str) -> list[float]:
+            self.calls.append([query])
+            raise ValueError("Embedding failed")
+
+    embed_model = FailingEmbedModel()
+    embedder = QueryEmbedder(embed_model, "test-model")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await embedder.get_query_embedding("foo")
+
+    assert len(embed_model.calls) == 2
+
+
+def test_queries_from_several_event_loops():
+    embed_model = FakeEmbedModel()
+    embedder = QueryEmbedder(embed_model, "test-model", max_cache_size=2)
+
+    async def embed(queries: list[str]):
+        return await asyncio.gather(*[embedder.get_query_embedding(query) for query in queries])
+
+    assert asyncio.run(embed(["a", "bb"])) == [[1.0], [2.0]]
+
+    # A batch that was waiting when its event loop closed doesn't block requests from the next loop
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(asyncio.wait([loop.create_task(embed(["ccc"]))], timeout=0))
+    loop.close()
+
+    assert asyncio.run(asyncio.wait_for(embed(["dddd", "ccc"]), timeout=1)) == [[4.0], [3.0]]
+    assert len(embedder._cache) == 2
+    assert len(embedder._batches) == 1
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from moatless.repository.file import FileRepository
+from moatless.repository.file_tree import FileTree
+
+
+@pytest.fixture
+def repo_dir(tmp_path):
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "src" / "utils").mkdir(parents=True)
+    (repo_dir / "tests").mkdir()
+    (repo_dir / ".git").mkdir()
+
+    (repo_dir / "setup.py").touch()
+    (repo_dir / "src" / "main.py").touch()
+    (repo_dir / "src" / "utils" / "helpers.py").touch()
+    (repo_dir / "tests" / "test_main.py").touch()
+    (repo_dir / ".git" / "config").touch()
+    return repo_dir
+
+
+def test_match(repo_dir):
+    tree = FileTree(str(repo_dir))
+    tree.build()
+
+    assert tree.match("**/*.py") == ["setup.py", "src/main.py", "src/utils/helpers.py", "tests/test_main.py"]
+    assert tree.match("src/*.py") == ["src/main.py"]
+    assert tree.match("src/**/*.py") == ["src/main.py", "src/utils/helpers.py"]
+    assert tree.match("**/utils/helpers.py") == ["src/utils/helpers.py"]
+    assert tree.match("*/test_*.py") == ["tests/test_main.py"]
+    assert tree.match("**/config") == [".git/config"]
+    assert tree.match("src/**") == []
+
+    with pytest.raises(ValueError):
+        tree.match("**.py")
+
+
+def test_refresh_lists_changed_directories(repo_dir):
+    tree = FileTree(str(repo_dir))
+    tree.build()
+
+    (repo_dir / "src" / "utils" / "strings.py").touch()
+    os.remove(repo_dir / "src" / "main.py")
+    (repo_dir / "docs").mkdir()
+    (repo_dir / "docs" / "conf.py").touch()
+
+    tree.refresh()
+
+    assert tree.match("**/*.py") == [
+        "docs/conf.py",
+        "setup.py",
+        "src/utils/helpers.py",
+        "src/utils/strings.py",
+        "tests/test_main.py",
+    ]
+
+
+def test_list_directory(repo_dir):
+    tree = FileTree(str(repo_dir))
+    tree.build()
+
+    assert tree.list_directory("src") == {"files": ["src/main.py"], "directories": ["src/utils"]}
+    assert tree.list_directory("") == {"files": ["setup.py"], "directories": [".git", "src", "tests"]}
+    assert tree.list_directory("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_repository_uses_file_tree(repo_dir):
+    repo = FileRepository(repo_path=str(repo_dir))
+
+    assert await repo.matching_files("helpers.py") == ["src/utils/helpers.py"]
+
+    repo.save_file("src/utils/strings.py", "def strip():\n    pass\n")
+
+    assert await repo.matching_files("utils/*.py") == ["src/utils/helpers.py", "src/utils/strings.py"]
+    assert await repo.find_by_pattern(["strings.py", "setup.py"]) == ["src/utils/strings.py", "setup.py"]
+    assert repo.list_directory("src/utils") == {
+        "files": ["src/utils/helpers.py", "src/utils/strings.py"],
+        "directories": [],
+    }
+
+    with pytest.raises(ValueError):
+        repo.list_directory("missing")
+
+
+@pytest.mark.asyncio
+async def test_repository_refreshes_file_tree_once_per_interval(repo_dir, monkeypatch):
+    repo = FileRepository(repo_path=str(repo_dir), file_tree_refresh_interval=60)
+    assert await repo.matching_files("*.py") == ["setup.py", "src/main.py", "src/utils/helpers.py", "tests/test_main.py"]
+
+    refreshes = []
+    monkeypatch.setattr(FileTree, "refresh", lambda tree: refreshes.append(tree))
+
+    # Lookups within the interval use the tree as is
+    (repo_dir / "src" / "added.py").touch()
+    assert await repo.matching_files("src/*.py") == ["src/main.py"]
+    assert repo.list_directory("src") == {"files": ["src/main.py"], "directories": ["src/utils"]}
+    assert refreshes == []
+
+    monkeypatch.undo()
+    repo.invalidate_files()
+    assert await repo.matching_files("src/*.py") == ["src/added.py", "src/main.py"]
@@ -0,0 +1,125 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from moatless.repository.file import FileRepository
+from moatless.repository.search_index import TrigramIndex, compile_regex, literal_query, regex_query
+
+
+@pytest.fixture
+def repo_dir(tmp_path):
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "src").mkdir(parents=True)
+    (repo_dir / "tests").mkdir()
+    (repo_dir / ".git").mkdir()
+
+    (repo_dir / "src" / "errors.py").write_text("class TimeoutError(Exception):\n    pass\n")
+    (repo_dir / "src" / "models.py").write_text("class Response:\n    def json(self):\n        raise DecodeError()\n")
+    (repo_dir / "tests" / "test_models.py").write_text("def test_json():\n    assert Response().json()\n")
+    (repo_dir / ".git" / "config").write_text("class TimeoutError\n")
+    (repo_dir / "data.bin").write_bytes(b"class TimeoutError\0\1\2")
+    return repo_dir
+
+
+def test_regex_query():
+    assert regex_query("TimeoutError|DecodeError") == [["TimeoutError", "DecodeError"]]
+    assert regex_query(r"def _parse_(other|params)_section") == [["def _parse_"], ["other", "params"], ["_section"]]
+    assert regex_query(r"class \w+Error\(") == [["class "], ["Error("]]
+    assert regex_query("x(abc)?yz") == [["x"], ["yz"]]
+    assert regex_query("(?i)timeout") == []
+
+
+def test_compile_regex_falls_back_on_posix_classes():
+    assert compile_regex("[[:space:]]+def") is None
+    assert compile_regex(r"\<def\>") is None
+    assert compile_regex("def (") is None
+    assert compile_regex(r"def \w+") is not None
+
+
+def test_candidates(repo_dir):
+    index = TrigramIndex(str(repo_dir))
+
+    assert sorted(index.file_paths) == ["data.bin", "src/errors.py", "src/models.py", "tests/test_models.py"]
+    assert index.candidates(literal_query("class TimeoutError")) == ["src/errors.py"]
+    assert index.candidates(regex_query("TimeoutError|DecodeError")) == ["src/errors.py", "src/models.py"]
+    assert index.candidates(literal_query("Response"), ["src/models.py"]) == ["src/models.py"]
+    assert index.candidates(literal_query("missing")) == []
+
+    # Short literals can't be filtered on
+    assert len(index.candidates(literal_query("js"))) == 4
+
+
+def test_refresh_picks_up_changes_on_disk(repo_dir):
+    index = TrigramIndex(str(repo_dir))
+    assert index.candidates(literal_query("ConnectionError")) == []
+
+    (repo_dir / "src" / "errors.py").write_text("class ConnectionError(Exception):\n    pass\n")
+    os.remove(repo_dir / "src" / "models.py")
+    (repo_dir / "src" / "client.py").write_text("raise ConnectionError()\n")
+
+    assert index.refresh() == 3
+    assert index.candidates(literal_query("ConnectionError")) == ["src/client.py", "src/errors.py"]
+    assert index.candidates(literal_query("TimeoutError")) == []
+    assert "src/models.py" not in index.file_paths
+
+
+def test_overlay_is_merged(repo_dir):
+    index = TrigramIndex(str(repo_dir), max_overlay_size=1)
+    index.build()
+
+    for i in range(3):
+        (repo_dir / "src" / f"module_{i}.py").write_text(f"def function_{i}():\n    return TimeoutError\n")
+    index.refresh()
+
+    assert index.candidates(literal_query("def function_")) == [f"src/module_{i}.py" for i in range(3)]
+    assert index.candidates(literal_query("TimeoutError")) == ["src/errors.py"] + [
+        f"src/module_{i}.py" for i in range(3)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_find_matches_after_save_file(repo_dir):
+    repo = FileRepository(repo_path=str(repo_dir))
+
+    assert await repo.find_exact_matches("class TimeoutError") == [("src/errors.py", 1)]
+
+    repo.save_file("src/models.py", "class Response:\n    pass\n\nclass TimeoutError(Exception):\n    pass\n")
+
+    assert await repo.find_exact_matches("class TimeoutError") == [("src/errors.py", 1), ("src/models.py", 4)]
+    assert await repo.find_exact_matches("class TimeoutError", "src/models.py") == [("src/models.py", 4)]
+
+    matches = await repo.find_regex_matches(r"class \w+Error", "*.py")
+    assert {(m["file_path"], m["line_num"]) for m in matches} == {("src/errors.py", 1), ("src/models.py", 4)}
+    assert matches[0]["content"] == "class TimeoutError(Exception):"
+
+
+@pytest.mark.asyncio
+async def test_search_index_is_refreshed_after_interval_or_invalidation(repo_dir, monkeypatch):
+    repo = FileRepository(repo_path=str(repo_dir), file_tree_refresh_interval=60)
+    assert await repo.find_exact_matches("class TimeoutError") == [("src/errors.py", 1)]
+
+    refreshes = []
+    refresh = TrigramIndex.refresh
+    monkeypatch.setattr(TrigramIndex, "refresh", lambda index: refreshes.append(index) or refresh(index))
+
+    # Files written through the repository are found without walking the checkout
+    repo.save_file("src/models.py", "class TimeoutError(Exception):\n    pass\n")
+    assert await repo.find_exact_matches("class TimeoutError") == [("src/errors.py", 1), ("src/models.py", 1)]
+    assert refreshes == []
+
+    # Changes outside of the repository are found after invalidate_files()
+    (repo_dir / "src" / "other.py").write_text("class TimeoutError:\n    pass\n")
+    assert len(await repo.find_exact_matches("class TimeoutError")) == 2
+    repo.invalidate_files()
+    assert len(await repo.find_exact_matches("class TimeoutError")) == 3
+    assert len(refreshes) == 1
+
+
+@pytest.mark.asyncio
+async def test_find_regex_matches_falls_back_to_grep(repo_dir):
+    repo = FileRepository(repo_path=str(repo_dir))
+
+    matches = await repo.find_regex_matches("^class[[:space:]]+Response", "src/models.py")
+
+    assert [(m["file_path"], m["line_num"]) for m in matches] == [("src/models.py", 1)]
@@ -181,6 +181,31 @@ class TestInMemoryJobStorage(IsolatedAsyncioTestCase):
         count = await self.storage.get_queued_jobs_count("project2")
         self.assertEqual(count, 1)
 
+    async def test_status_index_follows_transitions(self):
+        """Test that jobs by status and counts follow status updates and removals."""
+        await self.storage.add_job(self.test_job1)  # PENDING
+        await self.storage.add_job(self.test_job2)  # RUNNING
+        await self.storage.add_job(self.test_job3)  # COMPLETED
+
+        pending = await self.storage.get_jobs_by_status(JobStatus.PENDING)
+        self.assertEqual([job.id for job in pending], ["project1-trajectory1"])
+
+        # Start the pending job
+        self.test_job1.status = JobStatus.RUNNING
+        await self.storage.update_job(self.test_job1)
+
+        self.assertEqual(await self.storage.get_jobs_by_status(JobStatus.PENDING), [])
+        running = await self.storage.get_jobs_by_status(JobStatus.RUNNING, "project1")
+        self.assertEqual(sorted(job.id for job in running), ["project1-trajectory1", "project1-trajectory2"])
+        self.assertEqual(await self.storage.get_running_jobs_count("project1"), 2)
+        self.assertEqual(await self.storage.get_queued_jobs_count(), 0)
+
+        # Remove a running job and delete the other project
+        await self.storage.remove_job("project1", "trajectory2")
+        self.assertEqual(await self.storage.get_running_jobs_count(), 1)
+        self.assertEqual(await self.storage.delete_jobs("project2"), 1)
+        self.assertEqual(await self.storage.get_jobs_by_status(JobStatus.COMPLETED), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -6,74 +6,19 @@ from datetime import datetime
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import fakeredis
+
 from moatless.runner.runner import JobInfo, JobStatus
 from moatless.runner.storage.redis import RedisJobStorage
 
 
-class MockRedis:
-    """Mock Redis implementation for testing."""
-
-    def __init__(self):
-        """Initialize with empty dictionaries for keys and sets."""
-        self.data = {}
-        self.sets = {}
-
-    async def set(self, key, value):
-        """Mock Redis SET command."""
-        self.data[key] = value
-        return True
-
-    async def get(self, key):
-        """Mock Redis GET command."""
-        return self.data.get(key)
-
-    async def delete(self, key):
-        """Mock Redis DELETE command."""
-        if key in self.data:
-            del self.data[key]
-        return True
-
-    async def keys(self, pattern):
-        """Mock Redis KEYS command with simple pattern matching."""
-        prefix = pattern.replace("*", "")
-        return [key for key in self.data.keys() if key.startswith(prefix)]
-
-    async def sadd(self, key, value):
-        """Mock Redis SADD command."""
-        if key not in self.sets:
-            self.sets[key] = set()
-        self.sets[key].add(value)
-        return 1
-
-    async def srem(self, key, value):
-        """Mock Redis SREM command."""
-        if key in self.sets and value in self.sets[key]:
-            self.sets[key].remove(value)
-            return 1
-        return 0
-
-    async def smembers(self, key):
-        """Mock Redis SMEMBERS command."""
-        return self.sets.get(key, set())
-
-    async def scard(self, key):
-        """Mock Redis SCARD command."""
-        return len(self.sets.get(key, set()))
-
-    async def sinter(self, key1, key2):
-        """Mock Redis SINTER command."""
-        set1 = self.sets.get(key1, set())
-        set2 = self.sets.get(key2, set())
-        return set1.intersection(set2)
-
-
 class TestRedisJobStorage(IsolatedAsyncioTestCase):
     """Test cases for RedisJobStorage class."""
 
     def setUp(self):
         """Set up test fixtures."""
-        # Create a mock Redis client
-        self.mock_redis = MockRedis()
+        # Create a fake Redis client
+        self.mock_redis = fakeredis.FakeAsyncRedis()
 
         # Patch the redis.from_url function to return our mock
         patcher = patch("redis.asyncio.from_url", return_value=self.mock_redis)
@@ -126,14 +71,14 @@ class TestRedisJobStorage(IsolatedAsyncioTestCase):
         self.assertEqual(job.status, JobStatus.PENDING)
         self.assertEqual(job.metadata, {"test": "data1"})
 
-        # Check that Redis sets were updated correctly
+        # Check that Redis indexes were updated correctly
         job_key = self.storage._get_job_key(self.test_job1.project_id, self.test_job1.trajectory_id)
-        project_key = f"{self.storage._prefix}project:{self.test_job1.project_id}"
-        status_key = f"{self.storage._prefix}status:{self.test_job1.status.value}"
+        project_key = self.storage._project_index_key(self.test_job1.project_id)
+        status_key = self.storage._status_index_key(self.test_job1.status.value)
 
-        self.assertTrue(job_key in self.mock_redis.data)
-        self.assertTrue(job_key in self.mock_redis.sets.get(project_key, set()))
-        self.assertTrue(job_key in self.mock_redis.sets.get(status_key, set()))
+        self.assertTrue(await self.mock_redis.exists(job_key))
+        self.assertIn(job_key, await self._index_members(project_key))
+        self.assertIn(job_key, await self._index_members(status_key))
 
     async def test_get_nonexistent_job(self):
         """Test retrieving a job that doesn't exist."""
@@ -157,13 +102,15 @@ class TestRedisJobStorage(IsolatedAsyncioTestCase):
         self.assertEqual(job.status, JobStatus.RUNNING)
         self.assertIsNotNone(job.started_at)
 
-        # Check that Redis sets were updated correctly
+        # Check that Redis indexes and counts were updated correctly
         job_key = self.storage._get_job_key(self.test_job1.project_id, self.test_job1.trajectory_id)
-        old_status_key = f"{self.storage._prefix}status:{JobStatus.PENDING.value}"
-        new_status_key = f"{self.storage._prefix}status:{JobStatus.RUNNING.value}"
+        old_status_key = self.storage._status_index_key(JobStatus.PENDING.value)
+        new_status_key = self.storage._status_index_key(JobStatus.RUNNING.value)
 
-        self.assertNotIn(job_key, self.mock_redis.sets.get(old_status_key, set()))
-        self.assertIn(job_key, self.mock_redis.sets.get(new_status_key, set()))
+        self.assertNotIn(job_key, await self._index_members(old_status_key))
+        self.assertIn(job_key, await self._index_members(new_status_key))
+        self.assertEqual(await self.storage.get_queued_jobs_count(), 0)
+        self.assertEqual(await self.storage.get_running_jobs_count("project1"), 1)
 
     async def test_get_jobs(self):
         """Test retrieving all jobs."""
@@ -198,8 +145,8 @@ class TestRedisJobStorage(IsolatedAsyncioTestCase):
 
         # Get keys for verification
         job_key = self.storage._get_job_key(self.test_job1.project_id, self.test_job1.trajectory_id)
-        project_key = f"{self.storage._prefix}project:{self.test_job1.project_id}"
-        status_key = f"{self.storage._prefix}status:{self.test_job1.status.value}"
+        project_key = self.storage._project_index_key(self.test_job1.project_id)
+        status_key = self.storage._status_index_key(self.test_job1.status.value)
 
         # Remove one job
         await self.storage.remove_job(self.test_job1.project_id, self.test_job1.trajectory_id)
@@ -208,10 +155,11 @@ class TestRedisJobStorage(IsolatedAsyncioTestCase):
         job = await self.storage.get_job(self.test_job1.project_id, self.test_job1.trajectory_id)
         self.assertIsNone(job)
 
-        # Verify it's gone from Redis sets
-        self.assertNotIn(job_key, self.mock_redis.data)
-        self.assertNotIn(job_key, self.mock_redis.sets.get(project_key, set()))
-        self.assertNotIn(job_key, self.mock_redis.sets.get(status_key, set()))
+        # Verify it's gone from Redis indexes
+        self.assertFalse(await self.mock_redis.exists(job_key))
+        self.assertNotIn(job_key, await self._index_members(project_key))
+        self.assertNotIn(job_key, await self._index_members(status_key))
+        self.assertEqual(await self.storage.get_queued_jobs_count(), 0)
 
         # Verify other job still exists
         job = await self.storage.get_job(self.test_job2.project_id, self.test_job2.trajectory_id)
@@ -322,6 +270,105 @@ class TestRedisJobStorage(IsolatedAsyncioTestCase):
         # Metadata should be preserved
         self.assertEqual(deserialized.metadata["complex"]["nested"], "data")
 
+    async def test_get_jobs_by_status_with_pagination(self):
+        """Test listing jobs by status in the order they were enqueued, a page at a time."""
+        for i in reversed(range(5)):
+            await self.storage.add_job(
+                JobInfo(
+                    id=f"project1-pending{i}",
+                    status=JobStatus.PENDING,
+                    project_id="project1",
+                    trajectory_id=f"pending{i}",
+                    enqueued_at=datetime(2025, 1, 1, 0, 0, i),
+                )
+            )
+        await self.storage.add_job(self.test_job2)  # RUNNING
+
+        pending = await self.storage.get_jobs_by_status(JobStatus.PENDING)
+        self.assertEqual([job.trajectory_id for job in pending], [f"pending{i}" for i in range(5)])
+
+        page = await self.storage.get_jobs_by_status(JobStatus.PENDING, "project1", offset=1, limit=2)
+        self.assertEqual([job.trajectory_id for job in page], ["pending1", "pending2"])
+
+        page = await self.storage.get_jobs(offset=4, limit=10)
+        self.assertEqual([job.trajectory_id for job in page], ["pending4", "trajectory2"])
+
+        self.assertEqual(await self.storage.get_jobs_by_status(JobStatus.PENDING, "project2"), [])
+
+    async def test_delete_jobs(self):
+        """Test deleting the jobs for a project and all jobs."""
+        await self.storage.add_job(self.test_job1)
+        await self.storage.add_job(self.test_job2)
+        await self.storage.add_job(self.test_job3)
+
+        self.assertEqual(await self.storage.delete_jobs("project1"), 2)
+        self.assertEqual(await self.storage.get_running_jobs_count(), 0)
+        self.assertEqual([job.id for job in await self.storage.get_jobs()], [self.test_job3.id])
+
+        self.assertEqual(await self.storage.delete_jobs(), 1)
+        self.assertEqual(await self.mock_redis.keys("*"), [])
+
+    async def test_index_jobs_stored_before_indexing(self):
+        """Test that jobs stored without indexes are indexed the first time the storage is used."""
+        for job in [self.test_job1, self.test_job2, self.test_job3]:
+            job_key = self.storage._get_job_key(job.project_id, job.trajectory_id)
+            await self.mock_redis.set(job_key, self.storage._serialize_job_info(job))
+
+        self.assertEqual(await self.storage.get_running_jobs_count(), 1)
+        self.assertEqual(await self.storage.get_queued_jobs_count("project1"), 1)
+        self.assertEqual(len(await self.storage.get_jobs()), 3)
+
+    async def test_index_legacy_jobs_after_new_job_was_added(self):
+        """Test that legacy jobs are indexed and their sets deleted even if another instance indexed a job first."""
+        for job in [self.test_job1, self.test_job2]:
+            job_key = self.storage._get_job_key(job.project_id, job.trajectory_id)
+            await self.mock_redis.set(job_key, self.storage._serialize_job_info(job))
+            await self.mock_redis.sadd(f"moatless:jobs:project:{job.project_id}", job_key)
+            await self.mock_redis.sadd(f"moatless:jobs:status:{job.status.value}", job_key)
+
+        # An instance that doesn't index legacy jobs adds a job first, so the all jobs index exists
+        self.storage._index_checked = True
+        await self.storage.add_job(self.test_job3)
+        self.assertEqual(len(await self.storage.get_jobs()), 1)
+
+        # The job updated by the other instance is left as it is
+        updated_job = self.test_job1.model_copy(deep=True)
+        updated_job.status = JobStatus.COMPLETED
+        await self.storage.update_job(updated_job)
+
+        storage = RedisJobStorage(redis_url="redis://mock:6379/0")
+        self.assertEqual(len(await storage.get_jobs()), 3)
+        self.assertEqual(await storage.get_running_jobs_count("project1"), 1)
+        self.assertEqual(await storage.get_queued_jobs_count(), 0)
+        self.assertEqual(len(await storage.get_jobs_by_status(JobStatus.COMPLETED)), 2)
+        self.assertEqual((await storage.get_job("project1", "trajectory1")).status, JobStatus.COMPLETED)
+
+        self.assertEqual(await self.mock_redis.keys("moatless:jobs:project:*"), [])
+        self.assertEqual(await self.mock_redis.keys("moatless:jobs:status:*"), [])
+        self.assertEqual(await self.mock_redis.get("moatless:jobs:index:version"), b"1")
+
+    async def test_scripts_only_write_keys_passed_in_keys(self):
+        """Test that the Lua scripts only write keys they're passed in KEYS, as required by Redis Cluster."""
+        script_keys = set()
+        for job in [self.test_job1, self.test_job2, self.test_job3]:
+            job_key = self.storage._get_job_key(job.project_id, job.trajectory_id)
+            script_keys.update(self.storage._script_keys(job_key, job.project_id))
+            await self.storage.add_job(job)
+
+        updated_job = self.test_job1.model_copy(deep=True)
+        updated_job.status = JobStatus.COMPLETED
+        await self.storage.update_job(updated_job)
+        await self.storage.remove_job(self.test_job2.project_id, self.test_job2.trajectory_id)
+
+        # The index version key is only written when the storage is first used
+        written_keys = {key.decode("utf-8") for key in await self.mock_redis.keys("*")}
+        written_keys.discard(self.storage._index_version_key())
+        self.assertTrue(written_keys)
+        self.assertLessEqual(written_keys, script_keys)
+
+    async def _index_members(self, key: str) -> set[str]:
+        return {member.decode("utf-8") for member in await self.mock_redis.zrange(key, 0, -1)}
+
 
 if __name__ == "__main__":
     unittest.main()
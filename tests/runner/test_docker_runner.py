@@ -2,7 +2,7 @@
 
 import asyncio
 import subprocess
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import AsyncGenerator, List, Dict, Optional
 from unittest.mock import AsyncMock, MagicMock, patch, call
 
@@ -69,93 +69,107 @@ async def test_start_job(docker_runner):
 async def test_start_job_already_exists(docker_runner):
     """Test that starting a job that already exists returns False."""
     with patch("asyncio.create_subprocess_exec") as mock_subprocess:
-        # Mock process for container existence check (returns zero to indicate container exists)
-        mock_existence_process = AsyncMock()
-        mock_existence_process.returncode = 0
-        mock_existence_process.communicate.return_value = (b"container-id\n", b"")
-
-        # Mock process for container status check
-        mock_status_process = AsyncMock()
-        mock_status_process.returncode = 0
-        mock_status_process.communicate.return_value = (b"running\n", b"")
-
-        # Configure subprocess to return different mocks for different calls
-        mock_subprocess.side_effect = [mock_existence_process, mock_status_process]
+        # Mock process for listing containers, the container exists and is running
+        container_name = docker_runner._container_name("test-project", "test-repo__instance")
+        mock_list_process = AsyncMock()
+        mock_list_process.returncode = 0
+        mock_list_process.communicate.return_value = (
+            f"{container_name}|test-project|test-repo__instance|running|2023-01-01 00:00:00 +0000 UTC|Up 1 minute\n".encode(),
+            b"",
+        )
+        mock_subprocess.return_value = mock_list_process
 
         # Start the job
         result = await docker_runner.start_job("test-project", "test-repo__instance", lambda: None)
 
         # Check that the attempt failed because container already exists
         assert result is False
+        assert mock_subprocess.call_count == 1
 
 
 @pytest.mark.asyncio
 async def test_get_jobs(docker_runner):
     """Test that jobs can be retrieved."""
-    with (
-        patch("asyncio.create_subprocess_exec") as mock_subprocess,
-        patch.object(docker_runner, "_get_container_status") as mock_get_status,
-    ):
+    with patch("asyncio.create_subprocess_exec") as mock_subprocess:
         # Mock process for docker ps
         mock_process = AsyncMock()
         mock_process.returncode = 0
-        # Format: container_name|project_id|trajectory_id|state|started_at
+        # Format: container_name|project_id|trajectory_id|state|created_at|status
         mock_process.communicate.return_value = (
-            b"moatless-test-project-test-repo__instance|test-project|test-repo__instance|running|2023-01-01T00:00:00\n"
-            b"moatless-other-project-other-repo__instance|other-project|other-repo__instance|exited|2023-01-01T00:00:00\n",
+            b"moatless-test-project-test-repo__instance|test-project|test-repo__instance|running"
+            b"|2023-01-01 00:00:00 +0000 UTC|Up 5 minutes\n"
+            b"moatless-other-project-other-repo__instance|other-project|other-repo__instance|exited"
+            b"|2023-01-01 00:00:00 +0000 UTC|Exited (0) 2 minutes ago\n"
+            b"moatless-other-project-failed__instance|other-project|failed__instance|exited"
+            b"|2023-01-01 00:00:00 +0000 UTC|Exited (137) 1 minute ago\n",
             b"",
         )
         mock_subprocess.return_value = mock_process
 
-        # Mock container status queries
-        mock_get_status.side_effect = (
-            lambda container_name: JobStatus.RUNNING if "test-project" in container_name else JobStatus.COMPLETED
-        )
-
         # Get all jobs
         jobs = await docker_runner.get_jobs()
 
         # Check jobs
-        assert len(jobs) == 2
+        assert len(jobs) == 3
 
         # Check first job
         assert jobs[0].project_id == "test-project"
         assert jobs[0].trajectory_id == "test-repo__instance"
         assert jobs[0].status == JobStatus.RUNNING
+        assert jobs[0].enqueued_at == datetime(2023, 1, 1, tzinfo=timezone.utc)
 
         # Check second job
         assert jobs[1].project_id == "other-project"
         assert jobs[1].trajectory_id == "other-repo__instance"
         assert jobs[1].status == JobStatus.COMPLETED
 
-        # For the second part of the test, we need to handle exit code checks
-        # that might happen during job status determination
-        mock_subprocess.reset_mock()
-        mock_get_status.reset_mock()
+        # The exit code is read from the status column
+        assert jobs[2].status == JobStatus.FAILED
 
-        # First create a mock for the initial docker ps call with project filter
-        mock_ps_process = AsyncMock()
-        mock_ps_process.returncode = 0
-        mock_ps_process.communicate.return_value = (
-            b"moatless-test-project-test-repo__instance|test-project|test-repo__instance|running|2023-01-01T00:00:00\n",
-            b"",
-        )
+        # Get jobs filtered by project from the same docker ps call
+        jobs = await docker_runner.get_jobs("test-project")
+        assert [job.trajectory_id for job in jobs] == ["test-repo__instance"]
 
-        # Set up the side effect for _get_container_status to return RUNNING for test-project
-        mock_get_status.side_effect = lambda container_name: JobStatus.RUNNING
+        # All managed containers are listed with one command
+        mock_subprocess.assert_called_once()
+        cmd_str = " ".join(str(arg) for arg in mock_subprocess.call_args[0])
+        assert "docker ps -a" in cmd_str
+        assert "label=moatless.managed=true" in cmd_str
 
-        # Set up the sequence of returns
-        mock_subprocess.return_value = mock_ps_process
 
-        # Get jobs filtered by project
-        jobs = await docker_runner.get_jobs("test-project")
+@pytest.mark.asyncio
+async def test_container_states_are_cached(docker_runner):
+    """Test that job statuses share one docker ps call until the cache expires or a container is removed."""
+    with patch("asyncio.create_subprocess_exec") as mock_subprocess:
+        lines = [
+            f"moatless-project-job{i}|project|job{i}|running|2023-01-01 00:00:00 +0000 UTC|Up 1 minute"
+            for i in range(200)
+        ]
+        mock_process = AsyncMock()
+        mock_process.returncode = 0
+        mock_process.communicate.return_value = ("\n".join(lines).encode(), b"")
+        mock_subprocess.return_value = mock_process
 
-        # Verify the first call was to docker ps with filter
-        first_call = mock_subprocess.call_args_list[0]
-        cmd_str = " ".join(str(arg) for arg in first_call[0])
-        assert "docker" in cmd_str
-        # The command should have the filter for the project with the new label format
-        assert "label=project_id=test-project" in cmd_str
+        with patch.object(docker_runner, "_container_name", side_effect=lambda p, t: f"moatless-{p}-{t}"):
+            for i in range(200):
+                assert await docker_runner.get_job_status("project", f"job{i}") == JobStatus.RUNNING
+            assert await docker_runner.job_exists("project", "missing") is False
+
+            info = await docker_runner.get_runner_info()
+            assert info.data["running_containers"] == 200
+            assert info.data["docker_calls"] == 1
+            assert mock_subprocess.call_count == 1
+
+            # Cancelling a job invalidates the cache, the inspect, stop and rm calls are followed by a new listing
+            await docker_runner.cancel_job("project", "job0")
+            await docker_runner.get_job_status("project", "job1")
+            assert mock_subprocess.call_count == 5
+
+            # The cache expires after the TTL
+            docker_runner.status_cache_ttl_seconds = 0
+            await docker_runner.get_job_status("project", "job1")
+            assert mock_subprocess.call_count == 6
+            assert docker_runner.docker_calls == 6
 
 
 @pytest.mark.asyncio
@@ -287,6 +301,7 @@ async def test_get_runner_info(docker_runner):
         assert info.runner_type == "docker"
 
         # Case 2: Docker is not accessible
+        docker_runner._invalidate_container_states()
         mock_process.returncode = 1
         mock_process.communicate.return_value = (b"", b"Error\n")
 
@@ -474,14 +489,18 @@ async def test_image_name_override():
 
 @pytest.mark.asyncio
 async def test_get_container_status():
-    """Test the _get_container_status method with proper docker inspect command."""
+    """Test the _get_container_status method with the batched docker ps command."""
     # Create a DockerRunner instance
     runner = DockerRunner()
 
     # Create a mock for the create_subprocess_exec function
     process_mock = AsyncMock()
     process_mock.returncode = 0
-    process_mock.communicate.return_value = (b"running,true,0,test_project,test_trajectory", b"")
+    process_mock.communicate.return_value = (
+        b"moatless_test_project_test_trajectory|test_project|test_trajectory|running"
+        b"|2023-01-01 00:00:00 +0000 UTC|Up 2 seconds",
+        b"",
+    )
 
     # Patch the asyncio.create_subprocess_exec function
     with patch("asyncio.create_subprocess_exec", return_value=process_mock) as mock_exec:
@@ -500,5 +519,8 @@ async def test_get_container_status():
         # Verify the correct status is returned
         assert status == JobStatus.RUNNING
 
+        # Unknown containers don't exist
+        assert await runner._get_container_status("moatless_other") is None
+
         # Ensure the process.communicate method was called
         process_mock.communicate.assert_called_once()
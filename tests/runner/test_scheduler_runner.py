@@ -18,6 +18,7 @@ from moatless.runner.runner import (
     JobDetailSection,
     JobFunction,
 )
+from moatless.flow.events import FlowCompletedEvent
 from moatless.runner.scheduler import SchedulerRunner
 
 
@@ -781,3 +782,28 @@ async def test_invalid_fsm_transitions_blocked(scheduler):
     job = await scheduler.storage.get_job("test-project", "canceled-job")
     assert job.status == old_status
     assert job.ended_at == old_ended_at
+
+
+@pytest.mark.asyncio
+async def test_queued_jobs_start_in_order_when_running_job_finishes(scheduler):
+    """Test that a finished job wakes up the scheduler and the oldest queued job is started next."""
+    scheduler.max_total_jobs = 1
+
+    assert await scheduler.start_job("test-project", "job-1", mock_job_func) is True
+    assert await scheduler.start_job("test-project", "job-2", mock_job_func) is False
+    assert await scheduler.start_job("test-project", "job-3", mock_job_func) is False
+
+    # Queue positions are computed when read
+    assert "position: 1" in await scheduler.get_job_logs("test-project", "job-2")
+    assert "position: 2" in await scheduler.get_job_logs("test-project", "job-3")
+
+    # The first job finishes and its flow completed event is published
+    scheduler.runner.jobs["test-project-job-1"]["status"] = JobStatus.COMPLETED
+    await scheduler.handle_event(FlowCompletedEvent(project_id="test-project", trajectory_id="job-1"))
+    assert scheduler._wakeup.is_set()
+
+    await scheduler._start_pending_jobs()
+
+    assert (await scheduler.storage.get_job("test-project", "job-2")).status == JobStatus.RUNNING
+    assert (await scheduler.storage.get_job("test-project", "job-3")).status == JobStatus.PENDING
+    assert "position: 1" in await scheduler.get_job_logs("test-project", "job-3")
@@ -175,6 +175,29 @@ async def test_list_paths(file_storage):
     assert any_subprefix_path
 
 
+@pytest.mark.asyncio
+async def test_list_versions(file_storage):
+    """Test listing files recursively with versions that change when a file is written."""
+    await file_storage.write("projects/p/trajs/a/trajectory.json", {"id": 1})
+    await file_storage.write("projects/p/trajs/b/trajectory.json", {"id": 2})
+    await file_storage.append("projects/p/trajs/b/events.jsonl", {"id": 3})
+
+    versions = await file_storage.list_versions("projects/p/trajs/")
+    assert set(versions) == {
+        "projects/p/trajs/a/trajectory.json",
+        "projects/p/trajs/b/trajectory.json",
+        "projects/p/trajs/b/events.jsonl",
+    }
+
+    await file_storage.append("projects/p/trajs/b/events.jsonl", {"id": 4})
+    changed = await file_storage.list_versions("projects/p/trajs/b")
+    assert set(changed) == {"projects/p/trajs/b/trajectory.json", "projects/p/trajs/b/events.jsonl"}
+    assert changed["projects/p/trajs/b/events.jsonl"] != versions["projects/p/trajs/b/events.jsonl"]
+    assert changed["projects/p/trajs/b/trajectory.json"] == versions["projects/p/trajs/b/trajectory.json"]
+
+    assert await file_storage.list_versions("missing/") == {}
+
+
 @pytest.mark.asyncio
 async def test_list_projects(file_storage):
     """Test listing projects."""
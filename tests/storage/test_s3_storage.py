@@ -0,0 +1,89 @@
+import boto3
+import pytest
+import pytest_asyncio
+from moto.server import ThreadedMotoServer
+
+from moatless.storage.s3_storage import S3Storage
+
+BUCKET_NAME = "moatless-test"
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """Runs a local S3-compatible server, like MinIO, with an empty bucket."""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint_url = f"http://{host}:{port}"
+
+    boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        region_name="us-east-1",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+    ).create_bucket(Bucket=BUCKET_NAME)
+
+    yield endpoint_url
+    server.stop()
+
+
+@pytest_asyncio.fixture
+async def storage(s3_endpoint):
+    storage = S3Storage(
+        bucket_name=BUCKET_NAME,
+        region_name="us-east-1",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+        endpoint_url=s3_endpoint,
+    )
+    yield storage
+    for path in await storage.list_paths("test"):
+        await storage.delete(path)
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_write_read_and_delete(storage):
+    await storage.write("test/a.json", {"name": "a"})
+
+    assert await storage.exists("test/a.json")
+    assert await storage.read("test/a.json") == {"name": "a"}
+    assert await storage.list_paths("test") == ["test/a.json"]
+
+    await storage.delete("test/a.json")
+    assert not await storage.exists("test/a.json")
+    with pytest.raises(KeyError):
+        await storage.read_raw("test/a.json")
+    with pytest.raises(KeyError):
+        await storage.delete("test/a.json")
+
+
+@pytest.mark.asyncio
+async def test_appended_lines_are_written_to_segments(storage, s3_endpoint):
+    storage.flush_size = 50
+    for i in range(10):
+        await storage.append("test/events.jsonl", {"index": i})
+
+    assert await storage.read_lines("test/events.jsonl") == [{"index": i} for i in range(10)]
+
+    versions = await storage.list_versions("test/")
+    assert "test/events.jsonl.segments/manifest.json" in versions
+    assert "test/events.jsonl.segments/000000.jsonl" in versions
+
+    # Another process reads the segments from the bucket
+    await storage.close()
+    reader = S3Storage(
+        bucket_name=BUCKET_NAME,
+        region_name="us-east-1",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+        endpoint_url=s3_endpoint,
+    )
+    assert await reader.exists("test/events.jsonl")
+    assert [line["index"] for line in await reader.read_lines("test/events.jsonl")] == list(range(10))
+    assert (await reader.read_raw("test/events.jsonl")).count("\n") == 10
+
+    await reader.delete("test/events.jsonl")
+    assert not await reader.exists("test/events.jsonl")
+    assert await reader.list_versions("test/") == {}
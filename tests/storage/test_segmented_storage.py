@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from moatless.storage.segmented_storage import SegmentedAppendStorage
+
+
+class InMemoryObjectStorage(SegmentedAppendStorage):
+    """Object storage stand-in that keeps objects in a dict shared between instances."""
+
+    def __init__(self, objects: dict[str, str] | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {} if objects is None else objects
+        self.puts = 0
+
+    async def _get_object(self, path: str) -> str:
+        if path not in self.objects:
+            raise KeyError(f"No data found for path: {path}")
+        return self.objects[path]
+
+    async def _put_object(self, path: str, data: str) -> None:
+        self.puts += 1
+        self.objects[path] = data
+
+    async def _delete_object(self, path: str) -> None:
+        if path not in self.objects:
+            raise KeyError(f"No data found for path: {path}")
+        del self.objects[path]
+
+    async def _object_exists(self, path: str) -> bool:
+        return path in self.objects
+
+    async def list_paths(self, prefix: str = "") -> list[str]:
+        return [path for path in self.objects if path.startswith(prefix)]
+
+    async def _list_object_versions(self, prefix: str) -> dict[str, str]:
+        return {path: str(hash(data)) for path, data in self.objects.items() if path.startswith(prefix)}
+
+
+@pytest.mark.asyncio
+async def test_appends_are_buffered_and_written_to_segments():
+    storage = InMemoryObjectStorage(flush_size=100, flush_interval=60, max_segment_size=250)
+
+    for i in range(20):
+        await storage.append("events.jsonl", {"index": i, "data": "x" * 10})
+
+    # Lines are flushed when the buffer is larger than flush_size
+    assert 0 < storage.puts < 20
+    assert await storage.exists("events.jsonl")
+    assert await storage.read_lines("events.jsonl") == [{"index": i, "data": "x" * 10} for i in range(20)]
+
+    manifest = storage.objects["events.jsonl.segments/manifest.json"]
+    assert "000001.jsonl" in manifest
+    assert all(len(data) < 350 for path, data in storage.objects.items() if path.endswith("jsonl"))
+
+    # Another process reads the flushed segments and continues appending to the last one
+    await storage.close()
+    other = InMemoryObjectStorage(storage.objects, flush_size=100, flush_interval=60, max_segment_size=250)
+    assert await other.exists("events.jsonl")
+    await other.append("events.jsonl", {"index": 20})
+    await other.close()
+
+    reader = InMemoryObjectStorage(storage.objects)
+    assert [line["index"] for line in await reader.read_lines("events.jsonl")] == list(range(21))
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_flushed_after_interval():
+    storage = InMemoryObjectStorage(flush_interval=0.01)
+
+    await storage.append("events.jsonl", '{"index": 0}')
+    assert storage.puts == 0
+
+    await asyncio.sleep(0.05)
+    assert storage.puts == 2
+    assert storage.objects["events.jsonl.segments/000000.jsonl"] == '{"index": 0}\n'
+
+
+@pytest.mark.asyncio
+async def test_write_raw_replaces_segments():
+    storage = InMemoryObjectStorage(flush_interval=60)
+    storage.objects["journal.jsonl"] = '{"index": 0}\n'
+
+    await storage.append("journal.jsonl", {"index": 1})
+    assert await storage.read_lines("journal.jsonl") == [{"index": 0}, {"index": 1}]
+
+    await storage.write_raw("journal.jsonl", "")
+    assert await storage.read_lines("journal.jsonl") == []
+    assert list(storage.objects) == ["journal.jsonl"]
+
+    await storage.append("journal.jsonl", {"index": 2})
+    await storage.delete("journal.jsonl")
+    assert not await storage.exists("journal.jsonl")
+    assert storage.objects == {}
+
+    with pytest.raises(KeyError):
+        await storage.read_lines("journal.jsonl")
+
+
+@pytest.mark.asyncio
+async def test_list_versions_includes_buffered_appends():
+    storage = InMemoryObjectStorage(flush_interval=60)
+    storage.objects["trajs/a/trajectory.json"] = "{}"
+    await storage.append("trajs/a/events.jsonl", {"index": 0})
+
+    versions = await storage.list_versions("trajs/a")
+    assert set(versions) == {
+        "trajs/a/trajectory.json",
+        "trajs/a/events.jsonl.segments/000000.jsonl",
+        "trajs/a/events.jsonl.segments/manifest.json",
+    }
+
+    # A buffered append changes the version of the segment it's flushed to
+    await storage.append("trajs/a/events.jsonl", {"index": 1})
+    changed = await storage.list_versions("trajs/a")
+    segment = "trajs/a/events.jsonl.segments/000000.jsonl"
+    assert changed[segment] != versions[segment]
+    assert changed["trajs/a/trajectory.json"] == versions["trajs/a/trajectory.json"]
+
+
+@pytest.mark.asyncio
+async def test_read_raw_includes_segments():
+    storage = InMemoryObjectStorage(flush_interval=60)
+    storage.objects["journal.jsonl"] = '{"index": 0}'
+
+    await storage.append("journal.jsonl", {"index": 1})
+    assert await storage.read_raw("journal.jsonl") == '{"index": 0}\n{"index": 1}\n'
+
+    # Only segments exist for a path that was never written
+    await storage.append("events.jsonl", {"index": 0})
+    await storage.close()
+    reader = InMemoryObjectStorage(storage.objects)
+    assert await reader.read_raw("events.jsonl") == '{"index": 0}\n'
+
+    with pytest.raises(KeyError):
+        await reader.read_raw("missing.jsonl")
@@ -10,6 +10,7 @@ from moatless.codeblocks import CodeBlock, CodeBlockType
 from moatless.codeblocks.module import Module
 from moatless.file_context import FileContext, ContextFile
 from moatless.repository.repository import InMemRepository
+from moatless.utils.tokenizer import count_tokens
 
 
 def test_to_prompt_string_outcommented_code_block_with_line_numbers():
@@ -386,3 +387,116 @@ def test_multiple_changes_to_same_contextfile():
     # Verify the patch contains all changes
     expected_patch = context_file.generate_patch(base_content, modified_content)
     assert context_file.patch == expected_patch
+
+
+def test_clone_shares_unchanged_files():
+    repo = InMemRepository(
+        {
+            "a.py": "def foo():\n    return 1\n\n\ndef bar():\n    return 2\n",
+            "b.py": "def baz():\n    return 3\n",
+        }
+    )
+    file_context = FileContext(repo=repo)
+    file_context.add_span_to_context("a.py", "foo")
+    file_context.add_span_to_context("b.py", "baz")
+    module = file_context.get_file("a.py").module
+
+    parent = file_context.clone()
+    child = parent.clone()
+    assert child._files["a.py"] is parent._files["a.py"]
+    assert child._files["b.py"] is parent._files["b.py"]
+
+    # Changing a file in the child copies it and keeps the parsed module
+    child.add_span_to_context("a.py", "bar")
+    child_file = child._files["a.py"]
+    assert child_file is not parent._files["a.py"]
+    assert child_file.module is module
+    assert child_file.was_viewed
+    assert child_file.span_ids == {"foo", "bar"}
+    assert parent.get_file("a.py").span_ids == {"foo"}
+    assert child._files["b.py"] is parent._files["b.py"]
+
+    # Reading the files doesn't copy them
+    assert [file.file_path for file in child.files] == ["a.py", "b.py"]
+    assert [file.file_path for file in child.get_context_files()] == ["a.py", "b.py"]
+    assert child.create_summary()
+    assert child._files["b.py"] is parent._files["b.py"]
+
+    # The parent copies shared files before changing them as well
+    parent.get_file("b.py").apply_changes("def baz():\n    return 4\n")
+    assert "return 4" in parent.get_file("b.py").content
+    assert "return 3" in child.get_file("b.py").content
+
+    # Files edited or viewed in the parent are copied without the status flags
+    grandchild = child.clone()
+    assert grandchild._files["a.py"] is not child._files["a.py"]
+    assert not grandchild.get_file("a.py").was_viewed
+    assert grandchild.model_dump() == child.model_dump()
+
+
+def test_add_context_changes_merges_clones_in_order():
+    repo = InMemRepository(
+        {
+            "a.py": "def foo():\n    return 1\n\n\ndef bar():\n    return 2\n",
+            "b.py": "def baz():\n    return 3\n",
+        }
+    )
+    file_context = FileContext(repo=repo)
+    file_context.add_span_to_context("a.py", "foo")
+    snapshot = file_context.clone()
+
+    first = snapshot.clone()
+    first.add_span_to_context("b.py", "baz")
+    first.add_span_to_context("a.py", "foo", tokens=100, pinned=True)
+    second = snapshot.clone()
+    second.add_span_to_context("a.py", "bar")
+    second.add_span_to_context("b.py", "baz")
+    unchanged = snapshot.clone()
+    unchanged.get_file("a.py")
+
+    assert file_context.add_context_changes(snapshot, first)
+    assert file_context.add_context_changes(snapshot, second)
+    assert not file_context.add_context_changes(snapshot, unchanged)
+
+    assert file_context.file_paths == ["a.py", "b.py"]
+    assert [span.span_id for span in file_context.get_file("a.py").spans] == ["foo", "bar"]
+    assert file_context.get_file("a.py").get_span("foo").pinned
+    assert file_context.get_file("b.py").span_ids == {"baz"}
+
+    # The clones and the snapshot are not changed by the merge
+    assert snapshot.get_file("a.py").span_ids == {"foo"}
+    assert not snapshot.has_file("b.py")
+    assert second.get_file("a.py").get_span("foo").pinned is False
+
+
+def test_context_size_is_counted_per_file():
+    repo = InMemRepository(
+        {
+            "a.py": "def foo():\n    return 1\n\n\ndef bar():\n    return 2\n",
+            "b.py": "def baz():\n    return 3\n",
+        }
+    )
+    file_context = FileContext(repo=repo)
+
+    def prompt_tokens():
+        return count_tokens(
+            file_context.create_prompt(
+                show_line_numbers=True, show_outcommented_code=True, outcomment_code_comment="..."
+            )
+        )
+
+    file_context.add_span_to_context("a.py", "foo")
+    file_context.add_span_to_context("b.py", "baz")
+    assert file_context.context_size() == prompt_tokens()
+
+    prompt = file_context.get_file("a.py").to_prompt(show_line_numbers=True)
+    assert file_context.get_file("a.py").to_prompt(show_line_numbers=True) is prompt
+
+    # The cached prompt is rendered again when spans or content change
+    file_context.add_span_to_context("a.py", "bar")
+    assert file_context.context_size() == prompt_tokens()
+    assert "return 2" in file_context.get_file("a.py").to_prompt(show_line_numbers=True)
+
+    file_context.get_file("b.py").apply_changes("def baz():\n    return 3 + 4\n")
+    assert file_context.context_size() == prompt_tokens()
+    assert "3 + 4" in file_context.get_file("b.py").to_prompt(show_line_numbers=True)
@@ -7,7 +7,7 @@ from moatless.actions.finish import FinishArgs
 from moatless.actions.schema import Observation, ActionArguments
 from moatless.completion.stats import CompletionInvocation, CompletionAttempt, Usage
 from moatless.file_context import FileContext
-from moatless.node import ActionStep, Node, Selection
+from moatless.node import ActionStep, Node, Reward, Selection
 from moatless.repository.repository import InMemRepository
 
 
@@ -154,3 +154,103 @@ def test_node_model_dump():
     # Test with exclude_none=True
     none_dump = root.model_dump(exclude_none=True)
     assert "reward" not in none_dump  # 'reward' should be excluded as it's None
+
+
+def walk_tree(node: Node) -> list[Node]:
+    nodes = [node]
+    for child in node.children:
+        nodes.extend(walk_tree(child))
+    return nodes
+
+
+def create_completion(cost: float) -> CompletionInvocation:
+    return CompletionInvocation(
+        model="test-model",
+        attempts=[CompletionAttempt(usage=Usage(completion_tokens=10, prompt_tokens=20, completion_cost=cost))],
+    )
+
+
+def test_node_registry_matches_tree_walk():
+    import random
+
+    random.seed(1)
+    root = Node(node_id=0, max_expansions=3)
+    for _ in range(200):
+        parent = random.choice(walk_tree(root))
+        child = parent.create_child()
+        child.completions["build_action"] = create_completion(0.01)
+        if random.random() < 0.2:
+            child.terminal = True
+
+        nodes = walk_tree(root)
+        assert root.get_all_nodes() == nodes
+        assert root.node_count() == len(nodes)
+        assert root.get_last_node() is nodes[-1]
+        assert root.get_leaf_nodes() == [node for node in nodes if not node.children]
+        assert root.get_expandable_descendants() == [node for node in nodes if node.is_expandable()]
+        assert root.get_node_by_id(child.node_id) is child
+
+    assert root.total_usage().completion_cost == pytest.approx(2.0)
+
+
+def test_node_registry_follows_tree_changes():
+    root = Node(node_id=0, max_expansions=2)
+    child1 = root.create_child()
+    grandchild = child1.create_child()
+    child2 = root.create_child()
+    grandchild.completions["build_action"] = create_completion(0.5)
+
+    assert root.node_count() == 4
+    assert root.get_leaf_nodes() == [grandchild, child2]
+    assert root.total_usage().completion_cost == pytest.approx(0.5)
+
+    child1.reward = Reward(value=10, completion=create_completion(0.25))
+    assert root.total_usage().completion_cost == pytest.approx(0.75)
+
+    root.truncate_children_by_id(grandchild.node_id)
+    assert root.get_all_nodes() == [root, child1, grandchild]
+    assert root.get_node_by_id(child2.node_id) is None
+    assert root.get_expandable_descendants() == [root, child1, grandchild]
+
+    child1.max_expansions = 1
+    assert root.get_expandable_descendants() == [root, grandchild]
+
+    clone = grandchild.clone()
+    assert clone.parent is child1
+    assert root.get_last_node() is clone
+    assert root.get_node_by_id(clone.node_id) is clone
+
+    child1.reset()
+    assert root.get_all_nodes() == [root, child1]
+    assert root.total_usage().completion_cost == 0
+
+
+def test_node_registry_follows_usage_updated_in_place():
+    root = Node(node_id=0)
+    child = root.create_child()
+    completion = create_completion(0.5)
+    child.completions["build_action"] = completion
+    assert root.total_usage().completion_cost == pytest.approx(0.5)
+
+    completion.attempts[0].usage.completion_cost = 0.75
+    assert root.total_usage().completion_cost == pytest.approx(0.75)
+
+
+def test_node_registry_follows_reparented_node():
+    root = Node(node_id=0)
+    child = root.create_child()
+    child.completions["build_action"] = create_completion(0.5)
+    assert root.node_count() == 2
+
+    other_root = Node(node_id=10)
+    assert other_root.node_count() == 1
+
+    root.children.remove(child)
+    child.parent = other_root
+    other_root.children = [child]
+
+    assert root.node_count() == 1
+    assert root.total_usage().completion_cost == 0
+    assert other_root.node_count() == 2
+    assert other_root.get_node_by_id(child.node_id) is child
+    assert other_root.total_usage().completion_cost == pytest.approx(0.5)
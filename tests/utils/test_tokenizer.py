@@ -0,0 +1,55 @@
+import hashlib
+
+from moatless.utils.tokenizer import TokenCountCache, count_tokens, count_tokens_many, get_token_count_cache
+
+
+def test_count_tokens_is_cached():
+    cache = get_token_count_cache()
+    cache.clear()
+    hits, misses = cache.hits, cache.misses
+
+    assert count_tokens("def foo():\n    return 1\n") == count_tokens("def foo():\n    return 1\n")
+
+    assert cache.misses == misses + 1
+    assert cache.hits == hits + 1
+
+
+def test_count_tokens_many():
+    contents = ["hello world", "def foo():\n    pass\n", "hello world", ""]
+
+    counts = count_tokens_many(contents)
+
+    assert counts == [count_tokens(content) for content in contents]
+    assert counts[0] == 2
+    assert counts[3] == 0
+
+
+def test_approximate_count():
+    assert count_tokens("a" * 40, approximate=True) == 10
+    assert count_tokens_many(["abc", ""], approximate=True) == [1, 0]
+
+
+def test_lru_eviction():
+    cache = TokenCountCache(max_entries=2)
+
+    cache.put(cache.key("model", "a"), 1)
+    cache.put(cache.key("model", "b"), 1)
+    cache.get(cache.key("model", "a"))
+    cache.put(cache.key("model", "c"), 1)
+
+    assert len(cache) == 2
+    assert cache.get(cache.key("model", "b")) is None
+    assert cache.get(cache.key("model", "a")) == 1
+
+
+def test_key_is_content_digest():
+    cache = TokenCountCache()
+
+    assert cache.key("model", "a") == cache.key("model", "a")
+    assert cache.key("model", "a") != cache.key("model", "b")
+    assert cache.key("model", "a") != cache.key("other", "a")
+
+    # Contents of the same length get different keys, the key doesn't depend on hash()
+    cache.put(cache.key("model", "ab"), 1)
+    assert cache.get(cache.key("model", "ba")) is None
+    assert cache.key("model", "ab")[1] == hashlib.blake2b(b"ab", digest_size=16).digest()